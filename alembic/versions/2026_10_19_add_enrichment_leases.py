@@ -0,0 +1,34 @@
+"""add enrichment queue leases
+
+Revision ID: enrichment_leases_20261019
+Revises: search_synonyms_20261019
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "enrichment_leases_20261019"
+down_revision: Union[str, Sequence[str], None] = "search_synonyms_20261019"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("metadata_enrichment_attempts", sa.Column("leased_until", sa.DateTime(), nullable=True))
+    op.add_column("metadata_enrichment_attempts", sa.Column("worker_id", sa.Text(), nullable=True))
+    op.create_index(
+        "ix_metadata_enrichment_attempts_claimable",
+        "metadata_enrichment_attempts",
+        ["leased_until"],
+        postgresql_where=sa.text("status IN ('pending', 'leased')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_metadata_enrichment_attempts_claimable", table_name="metadata_enrichment_attempts")
+    op.drop_column("metadata_enrichment_attempts", "worker_id")
+    op.drop_column("metadata_enrichment_attempts", "leased_until")
@@ -0,0 +1,45 @@
+"""add enrichment queue claim priority
+
+Revision ID: enrichment_priority_20261019
+Revises: tree_data_versions_20261019
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "enrichment_priority_20261019"
+down_revision: Union[str, Sequence[str], None] = "tree_data_versions_20261019"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("metadata_enrichment_attempts", sa.Column("priority", sa.BigInteger(), nullable=True))
+    # Rows queued before this revision keep their enqueue order.
+    op.execute(
+        """
+        UPDATE metadata_enrichment_attempts a
+        SET priority = queued.position
+        FROM (
+            SELECT node_id, row_number() OVER (ORDER BY created_at NULLS LAST, node_id) AS position
+            FROM metadata_enrichment_attempts
+            WHERE status IN ('pending', 'leased')
+        ) queued
+        WHERE a.node_id = queued.node_id
+        """
+    )
+    op.create_index(
+        "ix_metadata_enrichment_attempts_claim_priority",
+        "metadata_enrichment_attempts",
+        ["priority"],
+        postgresql_where=sa.text("status IN ('pending', 'leased')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_metadata_enrichment_attempts_claim_priority", table_name="metadata_enrichment_attempts")
+    op.drop_column("metadata_enrichment_attempts", "priority")
@@ -0,0 +1,31 @@
+"""add search synonyms
+
+Revision ID: search_synonyms_20261019
+Revises: enrichment_attempts_20260624
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "search_synonyms_20261019"
+down_revision: Union[str, Sequence[str], None] = "enrichment_attempts_20260624"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "search_synonyms",
+        sa.Column("term", sa.Text(), primary_key=True),
+        sa.Column("synonym", sa.Text(), primary_key=True),
+        sa.Column("source", sa.Text(), nullable=False, server_default="manual"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("search_synonyms")
@@ -0,0 +1,41 @@
+"""add tree data versions
+
+Revision ID: tree_data_versions_20261019
+Revises: enrichment_leases_20261019
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "tree_data_versions_20261019"
+down_revision: Union[str, Sequence[str], None] = "enrichment_leases_20261019"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tree_data_versions",
+        sa.Column("version", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("source", sa.Text(), nullable=True),
+        sa.Column("inserted", sa.Integer(), nullable=True),
+        sa.Column("updated", sa.Integer(), nullable=True),
+        sa.Column("deleted", sa.Integer(), nullable=True),
+        sa.Column("unchanged", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "tree_node_changes",
+        sa.Column("version", sa.Integer(), sa.ForeignKey("tree_data_versions.version"), primary_key=True),
+        sa.Column("node_id", sa.Text(), primary_key=True),
+        sa.Column("change", sa.Text(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("tree_node_changes")
+    op.drop_table("tree_data_versions")
@@ -1,9 +1,23 @@
-from sqlalchemy import select
+from typing import Any
+
+from sqlalchemy import inspect, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from cladecanvas.schema import node_aliases
 
+# Whether each engine's database has node_aliases (the dev seed does not).
+_node_aliases_present: dict[Any, bool] = {}
+
+
+def has_node_aliases(db: Session) -> bool:
+    """Whether ``node_aliases`` exists; inspected once per engine."""
+    bind = db.get_bind()
+    present = _node_aliases_present.get(bind)
+    if present is None:
+        present = _node_aliases_present[bind] = inspect(db.connection()).has_table(node_aliases.name)
+    return present
+
 
 def resolve_node_id(db: Session, node_id: str, max_depth: int = 8) -> str:
     current = node_id
@@ -26,6 +40,36 @@ def resolve_node_id(db: Session, node_id: str, max_depth: int = 8) -> str:
     return current
 
 
+def resolve_node_ids(db: Session, node_ids, max_depth: int = 8) -> dict[str, str]:
+    """Resolve many ids at once, one query per alias-chain hop."""
+    current = {node_id: node_id for node_id in node_ids}
+    seen = {node_id: {node_id} for node_id in current}
+    pending = set(current)
+    for _ in range(max_depth):
+        if not pending:
+            break
+        lookup = {current[node_id] for node_id in pending}
+        try:
+            rows = db.execute(
+                select(node_aliases.c.alias_node_id, node_aliases.c.canonical_node_id).where(
+                    node_aliases.c.alias_node_id.in_(lookup)
+                )
+            ).fetchall()
+        except SQLAlchemyError:
+            break
+        canonical_by_alias = dict(rows)
+        for node_id in list(pending):
+            target = canonical_by_alias.get(current[node_id])
+            if target is None:
+                pending.discard(node_id)
+                continue
+            current[node_id] = target
+            if target in seen[node_id]:
+                pending.discard(node_id)
+            seen[node_id].add(target)
+    return current
+
+
 def alias_ids_for_canonical(db: Session, canonical_node_id: str) -> list[str]:
     try:
         rows = db.execute(
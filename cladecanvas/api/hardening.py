@@ -10,6 +10,8 @@ from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from cladecanvas.observability import record_cache_latency
+
 
 ANON_READ_RATE_LIMIT = int(os.environ.get("CLADECANVAS_ANON_READS_PER_MINUTE", "120"))
 QUERY_TIMEOUT_MS = int(os.environ.get("CLADECANVAS_QUERY_TIMEOUT_MS", "3000"))
@@ -18,12 +20,16 @@ STALE_REVALIDATE_SECONDS = int(os.environ.get("CLADECANVAS_STALE_REVALIDATE_SECO
 HOT_READ_CACHE_SECONDS = int(os.environ.get("CLADECANVAS_HOT_READ_CACHE_SECONDS", "30"))
 
 MAX_BULK_NODE_IDS = int(os.environ.get("CLADECANVAS_MAX_BULK_NODE_IDS", "100"))
+MAX_BATCH_NODE_IDS = int(os.environ.get("CLADECANVAS_MAX_BATCH_NODE_IDS", "200"))
 MAX_CHILDREN_LIMIT = int(os.environ.get("CLADECANVAS_MAX_CHILDREN_LIMIT", "200"))
 MAX_SEARCH_LIMIT = int(os.environ.get("CLADECANVAS_MAX_SEARCH_LIMIT", "50"))
 MAX_LINEAGE_DEPTH = int(os.environ.get("CLADECANVAS_MAX_LINEAGE_DEPTH", "128"))
 MAX_SUBTREE_DEPTH = int(os.environ.get("CLADECANVAS_MAX_SUBTREE_DEPTH", "4"))
 MAX_SUBTREE_NODES = int(os.environ.get("CLADECANVAS_MAX_SUBTREE_NODES", "500"))
 
+SEARCH_PARALLEL_STAGES = os.environ.get("CLADECANVAS_SEARCH_PARALLEL_STAGES", "1").strip() != "0"
+SEARCH_STAGE_WORKERS = int(os.environ.get("CLADECANVAS_SEARCH_STAGE_WORKERS", "8"))
+
 _rate_windows: dict[str, deque[float]] = defaultdict(deque)
 _rate_lock = RLock()
 
@@ -32,7 +38,17 @@ def rate_limit_anonymous_reads(request: Request) -> None:
     """Bound anonymous GET traffic per client without adding external services."""
     if request.method != "GET" or request.headers.get("authorization"):
         return
+    _count_anonymous_read(request)
+
+
+def rate_limit_anonymous_batch_reads(request: Request) -> None:
+    """Count a read-only POST (e.g. ``/node/batch``) as one anonymous read."""
+    if request.headers.get("authorization"):
+        return
+    _count_anonymous_read(request)
+
 
+def _count_anonymous_read(request: Request) -> None:
     client = request.client.host if request.client else "unknown"
     forwarded_for = request.headers.get("x-forwarded-for")
     if forwarded_for:
@@ -54,18 +70,27 @@ def rate_limit_anonymous_reads(request: Request) -> None:
 
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int = HOT_READ_CACHE_SECONDS, max_entries: int = 512) -> None:
+    def __init__(
+        self,
+        ttl_seconds: int = HOT_READ_CACHE_SECONDS,
+        max_entries: int = 512,
+        name: str = "hot_read",
+    ) -> None:
         self.ttl_seconds = ttl_seconds
         self.max_entries = max_entries
+        self.name = name
         self._entries: dict[tuple[Any, ...], tuple[float, Any]] = {}
         self._lock = RLock()
 
     def get_or_set(self, key: tuple[Any, ...], loader: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
         now = time.monotonic()
         with self._lock:
             entry = self._entries.get(key)
-            if entry and entry[0] > now:
-                return entry[1]
+            hit = bool(entry and entry[0] > now)
+        record_cache_latency(self.name, "get", (time.perf_counter() - started) * 1000, hit=hit)
+        if hit:
+            return entry[1]
 
         value = loader()
         with self._lock:
@@ -74,6 +99,36 @@ class TTLCache:
             self._entries[key] = (now + self.ttl_seconds, value)
         return value
 
+    def get_many(self, keys: list[tuple[Any, ...]]) -> dict[tuple[Any, ...], Any]:
+        """Live entries for ``keys``; each key counts as one hit or miss."""
+        found = {}
+        now = time.monotonic()
+        for key in keys:
+            started = time.perf_counter()
+            with self._lock:
+                entry = self._entries.get(key)
+            hit = bool(entry and entry[0] > now)
+            record_cache_latency(self.name, "get", (time.perf_counter() - started) * 1000, hit=hit)
+            if hit:
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, values: dict[tuple[Any, ...], Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                if len(self._entries) >= self.max_entries:
+                    self._prune(now)
+                self._entries[key] = (now + self.ttl_seconds, value)
+
+    def evict(self, match: Callable[[tuple[Any, ...], Any], bool] | None = None) -> int:
+        """Drop entries for which ``match(key, value)`` is true, or all of them."""
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if match is None or match(key, value)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
     def _prune(self, now: float) -> None:
         expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
         for key in expired:
@@ -1,9 +1,24 @@
 import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from cladecanvas.api.routes import tree, node, search
+from cladecanvas.api.deps import SessionLocal
+from cladecanvas.api.search_cache import search_candidate_cache
+from cladecanvas.api.synonym_map import synonym_refresher
+from cladecanvas.api.tree_version import tree_version_watcher
+from cladecanvas.profiling import (
+    MAX_SAMPLE_SECONDS,
+    ProfileRequestMiddleware,
+    continuous_sampler,
+    require_profiling_token,
+    sample_for,
+)
+from cladecanvas.query_insights import SORT_KEYS, query_insights
 from cladecanvas.observability import (
+    PROMETHEUS_ENABLED,
     RequestObservabilityMiddleware,
     configure_logging,
     metrics,
@@ -26,10 +41,22 @@ def get_cors_origins() -> list[str]:
     return [origin.strip().rstrip("/") for origin in configured.split(",") if origin.strip()]
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    synonym_refresher.start(SessionLocal)
+    tree_version_watcher.start(SessionLocal)
+    try:
+        yield
+    finally:
+        tree_version_watcher.stop()
+        synonym_refresher.stop()
+
+
 app = FastAPI(
     title="CladeCanvas API",
     description="API for exploring the tree of life",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -38,10 +65,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Total-Count", "X-Limit", "X-Offset", "X-Has-More"],
+    expose_headers=["X-Total-Count", "X-Limit", "X-Offset", "X-Has-More", "Server-Timing"],
 )
+# Last added runs outermost: request ids and stats wrap profiled requests.
+app.add_middleware(ProfileRequestMiddleware)
 app.add_middleware(RequestObservabilityMiddleware)
 
+if continuous_sampler is not None:
+    continuous_sampler.start()
+
 app.include_router(tree.router, prefix="/tree", tags=["Tree"])
 app.include_router(node.router, prefix="/node", tags=["Node"])
 app.include_router(search.router, prefix="/search", tags=["Search"])
@@ -49,4 +81,55 @@ app.include_router(search.router, prefix="/search", tags=["Search"])
 
 @app.get("/metrics", tags=["Observability"])
 def get_metrics():
-    return metrics.snapshot()
+    return {
+        **metrics.snapshot(),
+        "caches": {"search_candidates": search_candidate_cache.stats()},
+    }
+
+
+@app.get("/metrics/prometheus", tags=["Observability"], response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    if not PROMETHEUS_ENABLED:
+        raise HTTPException(status_code=404, detail="Prometheus metrics are disabled")
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/queries", tags=["Observability"])
+def get_query_metrics(
+    limit: int = Query(50, ge=1, le=500),
+    sort: str = Query("total_ms", pattern=f"^({'|'.join(SORT_KEYS)})$"),
+    plans: bool = False,
+    x_profile_token: str | None = Header(default=None),
+):
+    if plans:
+        # EXPLAIN output embeds the literal parameter values the slow-query log redacts.
+        require_profiling_token(x_profile_token)
+    return query_insights.snapshot(limit=limit, sort=sort, include_plans=plans)
+
+
+@app.get(
+    "/debug/profile/stacks",
+    tags=["Observability"],
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_profiling_token)],
+)
+def get_profile_stacks(
+    seconds: float | None = Query(None, gt=0, le=MAX_SAMPLE_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    reset: bool = False,
+):
+    """Collapsed stack samples (flamegraph.pl / speedscope input)."""
+    if seconds is not None:
+        sampler = sample_for(seconds, interval_ms)
+    elif continuous_sampler is not None:
+        sampler = continuous_sampler
+    else:
+        raise HTTPException(
+            status_code=409,
+            detail="No continuous sampler running; pass seconds=N or set CLADECANVAS_PROFILE_SAMPLER_INTERVAL_MS",
+        )
+    body = sampler.collapsed()
+    samples = sampler.samples
+    if reset and sampler is continuous_sampler:
+        sampler.reset()
+    return PlainTextResponse(body, headers={"X-Profile-Samples": str(samples), "Cache-Control": "no-store"})
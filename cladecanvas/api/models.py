@@ -1,6 +1,7 @@
 from datetime import datetime
 from pydantic import BaseModel, ConfigDict, Field
 from typing import Any, Optional, List, Dict, Literal
+from cladecanvas.api.hardening import MAX_BATCH_NODE_IDS
 
 
 class FieldSource(BaseModel):
@@ -82,3 +83,16 @@ class ContextGraphResponse(BaseModel):
     nodes: List[ContextGraphNode]
     edges: List[ContextGraphEdge]
     omitted_by_parent: dict[str, int]
+
+class NodeBatchRequest(BaseModel):
+    node_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_NODE_IDS)
+    include_metadata: bool = False
+
+class NodeBatchItem(BaseModel):
+    requested_id: str
+    node: TreeNode
+    metadata: Optional[NodeMetadata] = None
+
+class NodeBatchResponse(BaseModel):
+    nodes: List[NodeBatchItem]
+    missing: List[str]
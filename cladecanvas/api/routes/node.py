@@ -1,20 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from sqlalchemy import select
+from sqlalchemy import false, func, null, or_, select
 from sqlalchemy.orm import Session
-from cladecanvas.schema import metadata_table, nodes
-from cladecanvas.api.models import NodeMetadata, TreeNode
+from cladecanvas.schema import metadata_table, node_aliases, nodes
+from cladecanvas.api.models import (
+    NodeBatchRequest,
+    NodeBatchResponse,
+    NodeMetadata,
+    TreeNode,
+)
 from cladecanvas.api.deps import get_db
-from cladecanvas.api.aliases import resolve_node_id, canonicalize_node_row
+from cladecanvas.profiling import ProfiledRoute
+from cladecanvas.api.aliases import (
+    canonicalize_node_row,
+    has_node_aliases,
+    resolve_node_id,
+    resolve_node_ids,
+)
 from cladecanvas.api.hardening import (
     MAX_BULK_NODE_IDS,
     apply_statement_timeout,
     hot_read_cache,
+    rate_limit_anonymous_batch_reads,
     rate_limit_anonymous_reads,
     set_public_cache_headers,
 )
-from typing import List
+from typing import Any, List
 
-router = APIRouter(dependencies=[Depends(rate_limit_anonymous_reads)])
+router = APIRouter(route_class=ProfiledRoute, dependencies=[Depends(rate_limit_anonymous_reads)])
 
 @router.get("/metadata/{node_id:path}", response_model=NodeMetadata)
 def get_node_metadata(node_id: str, response: Response, db: Session = Depends(get_db)):
@@ -49,6 +61,138 @@ def get_bulk_metadata(
 
     return hot_read_cache.get_or_set(("bulk_metadata", deduped_ids), load_bulk_metadata)
 
+@router.post(
+    "/batch",
+    response_model=NodeBatchResponse,
+    dependencies=[Depends(rate_limit_anonymous_batch_reads)],
+)
+def get_node_batch(request: NodeBatchRequest, db: Session = Depends(get_db)):
+    requested_ids = list(dict.fromkeys(request.node_ids))
+    keys = {node_id: ("node_batch", node_id, request.include_metadata) for node_id in requested_ids}
+    cached = hot_read_cache.get_many(list(keys.values()))
+    misses = [node_id for node_id in requested_ids if keys[node_id] not in cached]
+    if misses:
+        apply_statement_timeout(db)
+        loaded = _load_node_batch(misses, request.include_metadata, db)
+        # Unknown ids are cached as None so repeated batches do not re-query them.
+        loaded = {keys[node_id]: loaded.get(node_id) for node_id in misses}
+        hot_read_cache.set_many(loaded)
+        cached.update(loaded)
+
+    items = []
+    missing = []
+    for node_id in requested_ids:
+        item = cached.get(keys[node_id])
+        if item is None:
+            missing.append(node_id)
+        else:
+            items.append({"requested_id": node_id, **item})
+    return {"nodes": items, "missing": missing}
+
+
+NODE_COLUMNS = tuple(nodes.c.keys())
+METADATA_COLUMNS = tuple(metadata_table.c.keys())
+
+
+def _load_node_batch(node_ids: list[str], include_metadata: bool, db: Session) -> dict[str, dict[str, Any]]:
+    """Structure (and metadata) for ``node_ids`` in one aliased join.
+
+    ``requested -> node_aliases -> canonical`` resolves one alias hop and a
+    second ``node_aliases`` join canonicalizes the parent. Rows where either
+    side is itself an alias (an alias chain) are resolved together with
+    ``resolve_node_ids``; ids the join does not return are not in ``nodes``
+    and are left out. Databases without ``node_aliases`` (the dev seed) get
+    the same single query without the alias joins.
+    """
+    aliases = has_node_aliases(db)
+    requested = nodes.alias("requested")
+    if aliases:
+        canonical = nodes.alias("canonical")
+        requested_alias = node_aliases.alias("requested_alias")
+        canonical_alias = node_aliases.alias("canonical_alias")
+        parent_alias = node_aliases.alias("parent_alias")
+        parent_chain = node_aliases.alias("parent_chain")
+        joined = (
+            requested.outerjoin(requested_alias, requested_alias.c.alias_node_id == requested.c.node_id)
+            .join(canonical, canonical.c.node_id == func.coalesce(requested_alias.c.canonical_node_id, requested.c.node_id))
+            .outerjoin(canonical_alias, canonical_alias.c.alias_node_id == canonical.c.node_id)
+            .outerjoin(parent_alias, parent_alias.c.alias_node_id == canonical.c.parent_node_id)
+            .outerjoin(parent_chain, parent_chain.c.alias_node_id == parent_alias.c.canonical_node_id)
+        )
+        canonical_parent_id = parent_alias.c.canonical_node_id
+        chained = canonical_alias.c.alias_node_id.is_not(None) | parent_chain.c.alias_node_id.is_not(None)
+    else:
+        canonical = joined = requested
+        canonical_parent_id = null()
+        chained = false()
+    columns = [
+        requested.c.node_id.label("requested_id"),
+        *[canonical.c[name].label(name) for name in NODE_COLUMNS],
+        canonical_parent_id.label("canonical_parent_id"),
+        chained.label("chained"),
+    ]
+    if include_metadata:
+        # Canonical metadata first, the alias's own metadata as a fallback,
+        # as in GET /node/metadata/{node_id}.
+        metadata_join = metadata_table.alias("node_metadata")
+        joined = joined.outerjoin(
+            metadata_join,
+            or_(metadata_join.c.node_id == canonical.c.node_id, metadata_join.c.node_id == requested.c.node_id),
+        )
+        columns += [metadata_join.c[name].label(f"metadata_{name}") for name in METADATA_COLUMNS]
+    rows = db.execute(select(*columns).select_from(joined).where(requested.c.node_id.in_(node_ids))).mappings().all()
+
+    loaded: dict[str, dict[str, Any]] = {}
+    chained_ids = set()
+    for row in rows:
+        if row["chained"]:
+            chained_ids.add(row["requested_id"])
+            continue
+        node = {name: row[name] for name in NODE_COLUMNS}
+        if row["canonical_parent_id"]:
+            node["parent_node_id"] = row["canonical_parent_id"]
+        metadata = None
+        if include_metadata and row["metadata_node_id"] is not None:
+            metadata = {name: row[f"metadata_{name}"] for name in METADATA_COLUMNS}
+        # A second row only replaces the first when it carries canonical metadata.
+        if row["requested_id"] in loaded and (metadata is None or metadata["node_id"] != node["node_id"]):
+            continue
+        loaded[row["requested_id"]] = {"node": node, "metadata": metadata}
+
+    chained_ids -= loaded.keys()
+    if chained_ids:
+        loaded.update(_load_chained_nodes(chained_ids, include_metadata, db))
+    return loaded
+
+
+def _load_chained_nodes(node_ids: set[str], include_metadata: bool, db: Session) -> dict[str, dict[str, Any]]:
+    """Batch-load ids whose alias chain is longer than the join resolves."""
+    canonical_ids = resolve_node_ids(db, node_ids)
+    node_rows = {
+        row["node_id"]: dict(row)
+        for row in db.execute(
+            select(nodes).where(nodes.c.node_id.in_(set(canonical_ids.values())))
+        ).mappings()
+    }
+    metadata_by_id = {}
+    if include_metadata:
+        metadata_by_id = {
+            row["node_id"]: dict(row)
+            for row in db.execute(
+                select(metadata_table).where(
+                    metadata_table.c.node_id.in_(set(canonical_ids.values()) | node_ids)
+                )
+            ).mappings()
+        }
+    loaded = {}
+    for node_id, canonical_id in canonical_ids.items():
+        row = node_rows.get(canonical_id)
+        if row is None:
+            continue
+        metadata = metadata_by_id.get(canonical_id) or metadata_by_id.get(node_id)
+        loaded[node_id] = {"node": canonicalize_node_row(db, row), "metadata": metadata}
+    return loaded
+
 @router.get("/{node_id:path}", response_model=TreeNode)
 def get_node_struct(node_id: str, response: Response, db: Session = Depends(get_db)):
     set_public_cache_headers(response)
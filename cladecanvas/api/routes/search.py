@@ -1,29 +1,76 @@
+import contextvars
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from sqlalchemy import or_, select
+from sqlalchemy import Float, Text, case, desc, func, literal, null, or_, select, union_all
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, List
 
 from cladecanvas.api.deps import get_db
-from cladecanvas.api.aliases import resolve_node_id
+from cladecanvas.profiling import ProfiledRoute
+from cladecanvas.api.aliases import resolve_node_ids
 from cladecanvas.api.hardening import (
     MAX_SEARCH_LIMIT,
+    SEARCH_PARALLEL_STAGES,
+    SEARCH_STAGE_WORKERS,
     apply_statement_timeout,
     hot_read_cache,
     rate_limit_anonymous_reads,
     set_public_cache_headers,
 )
 from cladecanvas.api.models import SearchResult
+from cladecanvas.api.search_cache import (
+    FULL_DESCRIPTION_INDEPENDENT_MATCH_TYPES,
+    FULL_DESCRIPTION_UNKNOWN,
+    SearchCandidateCache,
+    SearchCandidates,
+    search_candidate_cache,
+)
 from cladecanvas.api.search_ranking import (
     MAX_CANDIDATES,
+    RankedSearchResult,
     expand_query_terms,
     extract_snippet,
     normalize_search_text,
     rank_search_row,
-    sort_ranked_results,
+    top_ranked_results,
 )
+from cladecanvas.observability import record_latency
 from cladecanvas.schema import metadata_table, nodes
 
-router = APIRouter(dependencies=[Depends(rate_limit_anonymous_reads)])
+router = APIRouter(route_class=ProfiledRoute, dependencies=[Depends(rate_limit_anonymous_reads)])
+
+MATCH_STAGES = ("prefix", "fuzzy", "description")
+
+# Extra ranked results alias-resolved per page to absorb duplicate clades.
+ALIAS_DEDUP_MARGIN = 8
+
+# Prefix-stage match types that always outscore description-stage candidates.
+PAGE_FILLING_MATCH_TYPES = frozenset({"exact_common_name", "display_name_alias", "prefix"})
+
+_search_stage_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+
+# Columns needed to rank a candidate and build its SearchResult. The article
+# body (full_description) is deliberately absent; see _candidate_branches.
+CANDIDATE_COLUMNS = (
+    metadata_table.c.node_id,
+    metadata_table.c.ott_id,
+    metadata_table.c.common_name,
+    nodes.c.display_name,
+    nodes.c.name,
+    metadata_table.c.description,
+    metadata_table.c.image_url,
+    metadata_table.c.wiki_page_url,
+    metadata_table.c.enriched_score,
+    metadata_table.c.source_label,
+    metadata_table.c.enriched_at,
+    metadata_table.c.provenance_confidence,
+)
 
 
 def _extract_snippet(text: str, query: str) -> str:
@@ -47,7 +94,9 @@ def search_nodes(
     normalized_query = _normalize_query_or_422(q)
 
     def load_search_results():
-        return _search_nodes(normalized_query, limit, offset, db)
+        return _search_nodes(
+            normalized_query, limit, offset, db, candidate_cache=search_candidate_cache
+        )
 
     return hot_read_cache.get_or_set(
         ("search", normalized_query.casefold(), limit, offset),
@@ -65,10 +114,313 @@ def _normalize_query_or_422(q: str) -> str:
     return normalized_query
 
 
-def _search_nodes(q: str, limit: int, offset: int, db: Session) -> list[SearchResult]:
+def _search_nodes(
+    q: str,
+    limit: int,
+    offset: int,
+    db: Session,
+    candidate_cache: SearchCandidateCache | None = None,
+) -> list[SearchResult]:
     apply_statement_timeout(db)
     query_terms = expand_query_terms(q)
+    page_size = offset + limit
+    candidate_limit = max(MAX_CANDIDATES, page_size)
+
+    candidates = None
+    if candidate_cache is not None:
+        candidates = candidate_cache.lookup(q, query_terms, candidate_limit)
+    ranked = _rank_candidates(candidates, q) if candidates is not None else None
+    if ranked is None:
+        if candidates is not None:
+            candidate_cache.record_fallback()
+        candidates = _load_candidates(q, query_terms, candidate_limit, page_size, db)
+        ranked = _rank_candidates(candidates, q)
+
+    selected = _select_page(ranked, page_size, db)
+    if len(selected) < page_size and candidates.rows_by_stage["description"] is None:
+        # The description stage was skipped on the assumption that prefix
+        # matches fill the page; alias de-duplication left it short.
+        candidates = _load_candidates(q, query_terms, candidate_limit, None, db)
+        ranked = _rank_candidates(candidates, q)
+        selected = _select_page(ranked, page_size, db)
+    if candidate_cache is not None:
+        candidate_cache.store(q, candidates)
+
+    page = selected[offset:offset + limit]
+    snippets = _full_description_snippets([result for result, _, _ in page], query_terms, db)
+    results = []
+    for result, row, canonical_id in page:
+        payload = {
+            **result.__dict__,
+            "node_id": canonical_id,
+            "match_snippet": snippets.get(result.node_id, result.match_snippet),
+            "source_label": row.get("source_label"),
+            "enriched_at": row.get("enriched_at"),
+            "provenance_confidence": row.get("provenance_confidence"),
+        }
+        results.append(SearchResult(**payload))
+    return results
+
+
+def _select_page(ranked, page_size: int, db: Session) -> list[tuple[Any, Any, str]]:
+    """Pick the top ``page_size`` results by canonical id.
+
+    Only the best ``page_size`` results (plus a small margin for alias
+    de-duplication) are selected and alias-resolved in one batch; the window
+    grows by twice the shortfall when aliases collapse too many of them.
+    """
+    row_by_id = {result.node_id: row for result, row in ranked}
+    results = [result for result, _ in ranked]
+    canonical_ids: dict[str, str] = {}
+    fetch = page_size + ALIAS_DEDUP_MARGIN
+    while True:
+        window = top_ranked_results(results, fetch)
+        unresolved = [result.node_id for result in window if result.node_id not in canonical_ids]
+        if unresolved:
+            canonical_ids.update(resolve_node_ids(db, unresolved))
+
+        selected = []
+        seen_canonical_ids = set()
+        for result in window:
+            canonical_id = canonical_ids[result.node_id]
+            if canonical_id in seen_canonical_ids:
+                continue
+            seen_canonical_ids.add(canonical_id)
+            selected.append((result, row_by_id[result.node_id], canonical_id))
+            if len(selected) >= page_size:
+                return selected
+        if fetch >= len(results):
+            return selected
+        fetch += 2 * (page_size - len(selected))
+
+
+def _load_candidates(
+    q: str,
+    query_terms: list[str],
+    candidate_limit: int,
+    page_size: int | None,
+    db: Session,
+) -> SearchCandidates:
+    """Load candidates in one UNION ALL, or per stage in parallel on Postgres.
+
+    ``page_size`` allows the parallel path to cancel stages that cannot
+    change the page; pass ``None`` to always load every stage.
+    """
     use_postgres_similarity = _search_dialect(db) == "postgresql"
+    branches = _candidate_branches(query_terms, candidate_limit, use_postgres_similarity)
+    if use_postgres_similarity and SEARCH_PARALLEL_STAGES:
+        rows_by_stage = _execute_stages_concurrently(
+            branches, q, candidate_limit, page_size, db.get_bind()
+        )
+    else:
+        statement = union_all(*[
+            select(*subquery.c)
+            for stage in MATCH_STAGES
+            for subquery in branches[stage]
+        ])
+        rows = db.execute(statement).mappings().fetchall()
+        rows_by_stage = {
+            stage: [row for row in rows if row["match_stage"] == stage]
+            for stage in MATCH_STAGES
+        }
+
+    branch_counts: Counter[str] = Counter()
+    deduped: dict[str, tuple[dict[str, Any], ...] | None] = {}
+    for stage, rows in rows_by_stage.items():
+        if rows is None:
+            deduped[stage] = None
+            continue
+        by_id: dict[str, dict[str, Any]] = {}
+        for row in rows:
+            branch_counts[row["candidate_branch"]] += 1
+            by_id.setdefault(row["node_id"], dict(row))
+        deduped[stage] = tuple(by_id.values())
+
+    return SearchCandidates(
+        query_terms=tuple(query_terms),
+        rows_by_stage=deduped,
+        candidate_limit=candidate_limit,
+        truncated=any(count >= candidate_limit for count in branch_counts.values()),
+        fuzzy_is_monotonic=not use_postgres_similarity,
+        loaded_at=time.monotonic(),
+    )
+
+
+def _execute_stages_concurrently(
+    branches: dict[str, list],
+    q: str,
+    candidate_limit: int,
+    page_size: int | None,
+    engine,
+) -> dict[str, list | None]:
+    """Run each candidate stage on its own pooled connection.
+
+    Stages draw from the app engine's pool, so their queries are accounted
+    like any other; the stage executor keeps at most
+    ``SEARCH_STAGE_WORKERS`` of those connections busy at once.
+
+    Fuzzy candidates only matter when no prefix candidate ranks, and
+    description candidates score below every prefix match, so once the
+    prefix stage is back those stages are cancelled when they cannot change
+    the page. Cancelled stages come back as ``None``. Only stages still
+    holding their connection are cancelled; a finished stage's connection
+    may already be serving another request.
+    """
+    cancelled: set[str] = set()
+    cancel_hooks: dict[str, Callable[[], None]] = {}
+    lock = Lock()
+
+    def run_stage(stage: str, statement) -> list[dict[str, Any]] | None:
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            dbapi_connection = conn.connection.dbapi_connection
+            with lock:
+                if stage in cancelled:
+                    return None
+                cancel_hooks[stage] = (
+                    getattr(dbapi_connection, "cancel", None)
+                    or getattr(dbapi_connection, "interrupt", None)
+                )
+            try:
+                apply_statement_timeout(conn)
+                rows = [dict(row) for row in conn.execute(statement).mappings()]
+            finally:
+                # Unregister before the connection goes back to the pool.
+                with lock:
+                    cancel_hooks.pop(stage, None)
+        record_latency("search", f"stage.{stage}", (time.perf_counter() - started) * 1000)
+        return rows
+
+    executor = _stage_executor()
+    futures = {
+        # Each stage runs in a copy of the request context so its queries
+        # are attributed to this request.
+        stage: executor.submit(
+            contextvars.copy_context().run,
+            run_stage,
+            stage,
+            union_all(*[select(*subquery.c) for subquery in branches[stage]]),
+        )
+        for stage in MATCH_STAGES
+        if branches[stage]
+    }
+    prefix_rows = futures["prefix"].result()
+    skip = _skippable_stages(prefix_rows, q, candidate_limit, page_size)
+    with lock:
+        cancelled.update(skip)
+        # Cancel under the lock so a running stage cannot release its
+        # connection between the lookup and the cancel.
+        for stage in skip:
+            hook = cancel_hooks.pop(stage, None)
+            if hook is not None:
+                try:
+                    hook()
+                except Exception:  # noqa: BLE001 - the query may finish first
+                    pass
+
+    rows_by_stage: dict[str, list | None] = {"prefix": prefix_rows}
+    for stage in MATCH_STAGES[1:]:
+        future = futures.get(stage)
+        if future is None:
+            rows_by_stage[stage] = []
+        elif stage in skip:
+            future.cancel()
+            rows_by_stage[stage] = None
+        else:
+            rows_by_stage[stage] = future.result()
+    return rows_by_stage
+
+
+def _skippable_stages(
+    prefix_rows: list[dict[str, Any]],
+    q: str,
+    candidate_limit: int,
+    page_size: int | None,
+) -> set[str]:
+    if page_size is None:
+        return set()
+    branch_counts = Counter(row["candidate_branch"] for row in prefix_rows)
+    unique_rows = {row["node_id"]: row for row in prefix_rows}.values()
+    ranked = _rank_rows(unique_rows, q) or []
+    skip = set()
+    if ranked:
+        skip.add("fuzzy")
+    page_filling = sum(
+        1 for result, _ in ranked if result.match_type in PAGE_FILLING_MATCH_TYPES
+    )
+    prefix_truncated = any(count >= candidate_limit for count in branch_counts.values())
+    if not prefix_truncated and page_filling >= page_size:
+        skip.add("description")
+    return skip
+
+
+def _stage_executor() -> ThreadPoolExecutor:
+    global _search_stage_executor
+    with _executor_lock:
+        if _search_stage_executor is None:
+            _search_stage_executor = ThreadPoolExecutor(
+                max_workers=SEARCH_STAGE_WORKERS,
+                thread_name_prefix="search-stage",
+            )
+        return _search_stage_executor
+
+
+def _rank_candidates(candidates: SearchCandidates, q: str) -> list[tuple[Any, Any]] | None:
+    """Rank candidates with prefix -> fuzzy -> description precedence.
+
+    Returns ``None`` when narrowed cached candidates cannot decide the ranking
+    and the caller has to reload from the database. A skipped description
+    stage is ranked as empty; _search_nodes reloads if the page comes up short.
+    """
+    ranked = _rank_rows(candidates.rows_by_stage["prefix"], q)
+    if ranked is None:
+        return None
+    if not ranked:
+        fuzzy_rows = candidates.rows_by_stage["fuzzy"]
+        if fuzzy_rows is None:
+            return None
+        ranked = _rank_rows(fuzzy_rows, q)
+        if ranked is None:
+            return None
+
+    existing_ids = {result.node_id for result, _ in ranked}
+    description_rows = [
+        row for row in candidates.rows_by_stage["description"] or ()
+        if row["node_id"] not in existing_ids
+    ]
+    description_ranked = _rank_rows(description_rows, q)
+    if description_ranked is None:
+        return None
+    return ranked + description_ranked
+
+
+def _rank_rows(rows, q: str) -> list[tuple[Any, Any]] | None:
+    ranked = []
+    for row in rows:
+        if row.get("full_description_match") is FULL_DESCRIPTION_UNKNOWN:
+            result = rank_search_row({**row, "full_description_match": None}, q)
+            if result is None or result.match_type not in FULL_DESCRIPTION_INDEPENDENT_MATCH_TYPES:
+                return None
+        else:
+            result = rank_search_row(row, q)
+        if result:
+            ranked.append((result, row))
+    return ranked
+
+
+def _candidate_branches(
+    query_terms: list[str],
+    candidate_limit: int,
+    use_postgres_similarity: bool,
+) -> dict[str, list]:
+    """Build the candidate subqueries for each match stage.
+
+    Each branch keeps its own ``LIMIT`` so stage budgets match the old
+    per-stage queries, and rows are tagged with ``match_stage`` so the caller
+    can still apply prefix -> fuzzy -> description precedence. The article
+    body is never selected here; ``full_description_match`` carries the first
+    query term it contains, which is all ranking needs.
+    """
     c = metadata_table.c
     n = nodes.c
 
@@ -76,8 +428,10 @@ def _search_nodes(q: str, limit: int, offset: int, db: Session) -> list[SearchRe
     node_prefix_filters = []
     metadata_fuzzy_filters = []
     node_fuzzy_filters = []
+    description_filters = []
     for term in query_terms:
         prefix_pattern = f"{term}%"
+        contains_pattern = f"%{term}%"
         metadata_prefix_filters.append(c.common_name.ilike(prefix_pattern))
         node_prefix_filters.extend([
             n.display_name.ilike(prefix_pattern),
@@ -90,103 +444,88 @@ def _search_nodes(q: str, limit: int, offset: int, db: Session) -> list[SearchRe
                 n.name.op("%")(term),
             ])
         else:
-            contains_pattern = f"%{term}%"
             metadata_fuzzy_filters.append(c.common_name.ilike(contains_pattern))
             node_fuzzy_filters.extend([
                 n.display_name.ilike(contains_pattern),
                 n.name.ilike(contains_pattern),
             ])
-
-    base_select = select(
-        c.node_id,
-        c.ott_id,
-        c.common_name,
-        n.display_name,
-        n.name,
-        c.description,
-        c.full_description,
-        c.image_url,
-        c.wiki_page_url,
-        c.enriched_score,
-        c.source_label,
-        c.enriched_at,
-        c.provenance_confidence,
-    ).select_from(metadata_table.join(nodes, c.node_id == n.node_id))
-
-    candidate_limit = max(MAX_CANDIDATES, offset + limit)
-    rows_by_id = {}
-
-    def load_candidates(filter_groups):
-        for filters in filter_groups:
-            if not filters:
-                continue
-            rows = db.execute(
-                base_select
-                .where(or_(*filters))
-                .order_by(c.node_id)
-                .limit(candidate_limit)
-            ).mappings().fetchall()
-            rows_by_id.update({row["node_id"]: row for row in rows})
-
-    load_candidates((metadata_prefix_filters, node_prefix_filters))
-
-    ranked = []
-    for row in rows_by_id.values():
-        result = rank_search_row(row, q)
-        if result:
-            ranked.append((result, row))
-
-    if not ranked:
-        load_candidates((metadata_fuzzy_filters, node_fuzzy_filters))
-        for row in rows_by_id.values():
-            result = rank_search_row(row, q)
-            if result:
-                ranked.append((result, row))
-
-    existing_ids = {result.node_id for result, _ in ranked}
-    description_filters = []
-    for term in query_terms:
-        contains_pattern = f"%{term}%"
         if len(term) >= 4:
             description_filters.append(c.description.ilike(contains_pattern))
         if len(term) >= 6:
             description_filters.append(c.full_description.ilike(contains_pattern))
 
-    if description_filters:
-        description_stmt = (
-            base_select
-            .where(or_(*description_filters))
-            .order_by(c.node_id)
-            .limit(candidate_limit)
+    if use_postgres_similarity:
+        similarity = func.coalesce(
+            func.greatest(
+                func.similarity(c.common_name, query_terms[0]),
+                func.similarity(n.display_name, query_terms[0]),
+                func.similarity(n.name, query_terms[0]),
+            ),
+            0.0,
         )
-        for row in db.execute(description_stmt).mappings().fetchall():
-            if row["node_id"] in existing_ids:
-                continue
-            result = rank_search_row(row, q)
-            if result:
-                ranked.append((result, row))
-                existing_ids.add(result.node_id)
+    else:
+        similarity = literal(0.0, Float)
 
-    if not ranked:
-        return []
+    full_description_match = case(
+        *[
+            (c.full_description.ilike(f"%{term}%"), literal(term, Text))
+            for term in query_terms
+        ],
+        else_=null(),
+    )
 
-    results = []
-    row_by_id = {result.node_id: row for result, row in ranked}
-    seen_canonical_ids = set()
-    for result in sort_ranked_results([result for result, _ in ranked]):
-        canonical_id = resolve_node_id(db, result.node_id)
-        if canonical_id in seen_canonical_ids:
-            continue
-        seen_canonical_ids.add(canonical_id)
-        row = row_by_id[result.node_id]
-        payload = {
-            **result.__dict__,
-            "node_id": canonical_id,
-            "source_label": row.get("source_label"),
-            "enriched_at": row.get("enriched_at"),
-            "provenance_confidence": row.get("provenance_confidence"),
-        }
-        results.append(SearchResult(**payload))
-        if len(results) >= offset + limit:
-            break
-    return results[offset:offset + limit]
+    def branch(name: str, stage: str, filters: list, order_by_similarity: bool = False):
+        order_by = (desc(similarity), c.node_id) if order_by_similarity else (c.node_id,)
+        return select(
+            *CANDIDATE_COLUMNS,
+            full_description_match.label("full_description_match"),
+            literal(stage, Text).label("match_stage"),
+            literal(name, Text).label("candidate_branch"),
+            similarity.label("sql_similarity"),
+        ).select_from(
+            metadata_table.join(nodes, c.node_id == n.node_id)
+        ).where(or_(*filters)).order_by(*order_by).limit(candidate_limit).subquery()
+
+    return {
+        "prefix": [
+            branch("prefix_metadata", "prefix", metadata_prefix_filters),
+            branch("prefix_node", "prefix", node_prefix_filters),
+        ],
+        "fuzzy": [
+            branch(
+                "fuzzy_metadata", "fuzzy", metadata_fuzzy_filters,
+                order_by_similarity=use_postgres_similarity,
+            ),
+            branch(
+                "fuzzy_node", "fuzzy", node_fuzzy_filters,
+                order_by_similarity=use_postgres_similarity,
+            ),
+        ],
+        "description": (
+            [branch("description", "description", description_filters)]
+            if description_filters else []
+        ),
+    }
+
+
+def _full_description_snippets(
+    page: list[RankedSearchResult],
+    query_terms: list[str],
+    db: Session,
+) -> dict[str, str]:
+    """Fetch article bodies for the final page only and build their snippets."""
+    source_ids = [
+        result.node_id for result in page if result.match_field == "full_description"
+    ]
+    if not source_ids:
+        return {}
+
+    c = metadata_table.c
+    rows = db.execute(
+        select(c.node_id, c.full_description).where(c.node_id.in_(source_ids))
+    ).fetchall()
+    return {
+        node_id: extract_snippet(text, query_terms) or text
+        for node_id, text in rows
+        if text
+    }
@@ -9,6 +9,7 @@ from cladecanvas.api.models import (
     SubtreeResponse,
 )
 from cladecanvas.api.deps import get_db
+from cladecanvas.profiling import ProfiledRoute
 from cladecanvas.api.aliases import (
     canonicalize_node_row,
     equivalent_node_ids,
@@ -26,7 +27,7 @@ from cladecanvas.api.hardening import (
 )
 from typing import List
 
-router = APIRouter(dependencies=[Depends(rate_limit_anonymous_reads)])
+router = APIRouter(route_class=ProfiledRoute, dependencies=[Depends(rate_limit_anonymous_reads)])
 
 NODE_ORDER = (
     desc(func.coalesce(nodes.c.num_tips, -1)),
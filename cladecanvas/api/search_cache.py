@@ -0,0 +1,265 @@
+"""Candidate cache for search-as-you-type traffic.
+
+Autocomplete sends a run of growing queries ("ca", "cat", "cats"). The cache
+keeps the full candidate set loaded for each normalized query so a longer
+query whose prefix is cached can be answered by filtering those candidates in
+memory and re-ranking them, instead of running the candidate query again.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from threading import RLock
+from typing import Any
+
+from cladecanvas.api.hardening import HOT_READ_CACHE_SECONDS
+from cladecanvas.observability import record_cache_latency
+
+
+SEARCH_CANDIDATE_CACHE_ENTRIES = 256
+
+# SQL LIKE metacharacters; terms containing them cannot be narrowed in Python.
+LIKE_WILDCARDS = ("%", "_", "\\")
+
+# Term-length thresholds for the description candidate filters.
+DESCRIPTION_MIN_TERM_LENGTH = 4
+FULL_DESCRIPTION_MIN_TERM_LENGTH = 6
+
+# Match types that _best_match decides before it looks at full_description.
+FULL_DESCRIPTION_INDEPENDENT_MATCH_TYPES = frozenset({
+    "exact_common_name",
+    "display_name_alias",
+    "prefix",
+    "description",
+})
+
+
+class _FullDescriptionUnknown:
+    def __repr__(self) -> str:
+        return "FULL_DESCRIPTION_UNKNOWN"
+
+
+# Marks narrowed rows whose article body contained a cached term; whether it
+# also contains the longer query terms cannot be known without the text.
+FULL_DESCRIPTION_UNKNOWN = _FullDescriptionUnknown()
+
+
+@dataclass(frozen=True)
+class SearchCandidates:
+    """Candidate rows for one query, grouped by the stage that matched them.
+
+    A stage set to ``None`` is unavailable: a missing fuzzy stage forces a
+    database reload if the ranking needs it, and a skipped description stage
+    is reloaded only if the page comes up short. ``truncated`` means a candidate branch hit its ``LIMIT``,
+    so rows may be missing and the set cannot be narrowed.
+    """
+
+    query_terms: tuple[str, ...]
+    rows_by_stage: dict[str, tuple[dict[str, Any], ...] | None]
+    candidate_limit: int
+    truncated: bool
+    fuzzy_is_monotonic: bool
+    loaded_at: float
+
+    def can_serve(self, candidate_limit: int) -> bool:
+        return not self.truncated or candidate_limit <= self.candidate_limit
+
+    def narrow(self, query_terms: list[str]) -> SearchCandidates | None:
+        """Return the candidates for ``query_terms`` or ``None`` if unknowable."""
+        if self.truncated:
+            return None
+        if any(wildcard in term for term in query_terms for wildcard in LIKE_WILDCARDS):
+            return None
+        if not all(
+            any(_covers(cached, term) for cached in self.query_terms)
+            for term in query_terms
+        ):
+            return None
+
+        prefix_rows = self.rows_by_stage["prefix"]
+        fuzzy_rows = self.rows_by_stage["fuzzy"]
+        description_rows = self.rows_by_stage["description"]
+        if prefix_rows is None:
+            return None
+
+        # A skipped description stage stays skipped: the prefix rows that let
+        # the loader skip it still outrank everything it could add.
+        narrowed_description = None
+        if description_rows is not None:
+            narrowed_description = []
+            for row in description_rows:
+                membership = _description_membership(row, query_terms)
+                if membership is None:
+                    return None
+                if membership:
+                    narrowed_description.append(_narrow_row(row))
+            narrowed_description = tuple(narrowed_description)
+
+        narrowed_fuzzy = None
+        if self.fuzzy_is_monotonic and fuzzy_rows is not None:
+            narrowed_fuzzy = tuple(
+                _narrow_row(row)
+                for row in fuzzy_rows
+                if _name_matches(row, query_terms, str.__contains__)
+            )
+
+        return replace(
+            self,
+            query_terms=tuple(query_terms),
+            rows_by_stage={
+                "prefix": tuple(
+                    _narrow_row(row)
+                    for row in prefix_rows
+                    if _name_matches(row, query_terms, str.startswith)
+                ),
+                "fuzzy": narrowed_fuzzy,
+                "description": narrowed_description,
+            },
+        )
+
+
+class SearchCandidateCache:
+    """LRU cache of search candidates keyed by normalized query."""
+
+    def __init__(
+        self,
+        ttl_seconds: int = HOT_READ_CACHE_SECONDS,
+        max_entries: int = SEARCH_CANDIDATE_CACHE_ENTRIES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, SearchCandidates] = OrderedDict()
+        self._lock = RLock()
+        self._counts = {
+            "hits": 0,
+            "narrowed_hits": 0,
+            "misses": 0,
+            "fallbacks": 0,
+            "evictions": 0,
+        }
+
+    def lookup(
+        self,
+        query: str,
+        query_terms: list[str],
+        candidate_limit: int,
+    ) -> SearchCandidates | None:
+        started = time.perf_counter()
+        now = time.monotonic()
+        result = None
+        outcome = "misses"
+        with self._lock:
+            entry = self._live_entry(query, now)
+            if (
+                entry is not None
+                and entry.query_terms == tuple(query_terms)
+                and entry.can_serve(candidate_limit)
+            ):
+                result, outcome = entry, "hits"
+            else:
+                for end in range(len(query) - 1, 1, -1):
+                    entry = self._live_entry(query[:end], now)
+                    narrowed = entry.narrow(query_terms) if entry is not None else None
+                    if narrowed is not None:
+                        result, outcome = narrowed, "narrowed_hits"
+                        break
+            self._counts[outcome] += 1
+
+        record_cache_latency(
+            "search_candidates",
+            "lookup",
+            (time.perf_counter() - started) * 1000,
+            hit=result is not None,
+        )
+        return result
+
+    def store(self, query: str, candidates: SearchCandidates) -> None:
+        with self._lock:
+            self._entries[query] = candidates
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def record_fallback(self) -> None:
+        """Count a cached answer that could not decide the ranking."""
+        with self._lock:
+            self._counts["fallbacks"] += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._entries)
+        lookups = counts["hits"] + counts["narrowed_hits"] + counts["misses"]
+        served = counts["hits"] + counts["narrowed_hits"] - counts["fallbacks"]
+        return {
+            **counts,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+        }
+
+    def invalidate(self) -> None:
+        """Drop cached candidates but keep the hit counts."""
+        with self._lock:
+            self._entries.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for key in self._counts:
+                self._counts[key] = 0
+
+    def _live_entry(self, query: str, now: float) -> SearchCandidates | None:
+        entry = self._entries.get(query)
+        if entry is None:
+            return None
+        if entry.loaded_at + self.ttl_seconds <= now:
+            del self._entries[query]
+            return None
+        self._entries.move_to_end(query)
+        return entry
+
+
+search_candidate_cache = SearchCandidateCache()
+
+
+def _covers(cached_term: str, term: str) -> bool:
+    # Every candidate filter for ``term`` must select a subset of the rows the
+    # cached term selected, including the length-gated description filters.
+    return (
+        term.startswith(cached_term)
+        and (len(term) < DESCRIPTION_MIN_TERM_LENGTH
+             or len(cached_term) >= DESCRIPTION_MIN_TERM_LENGTH)
+        and (len(term) < FULL_DESCRIPTION_MIN_TERM_LENGTH
+             or len(cached_term) >= FULL_DESCRIPTION_MIN_TERM_LENGTH)
+    )
+
+
+def _name_matches(row: dict[str, Any], query_terms: list[str], predicate) -> bool:
+    for field in ("common_name", "display_name", "name"):
+        value = (row.get(field) or "").lower()
+        if value and any(predicate(value, term) for term in query_terms):
+            return True
+    return False
+
+
+def _description_membership(row: dict[str, Any], query_terms: list[str]) -> bool | None:
+    description = (row.get("description") or "").lower()
+    if any(
+        len(term) >= DESCRIPTION_MIN_TERM_LENGTH and term in description
+        for term in query_terms
+    ):
+        return True
+    long_terms = [term for term in query_terms if len(term) >= FULL_DESCRIPTION_MIN_TERM_LENGTH]
+    if long_terms and row.get("full_description_match") is not None:
+        return None
+    return False
+
+
+def _narrow_row(row: dict[str, Any]) -> dict[str, Any]:
+    if row.get("full_description_match") is None:
+        return row
+    return {**row, "full_description_match": FULL_DESCRIPTION_UNKNOWN}
@@ -1,3 +1,4 @@
+import heapq
 import re
 from dataclasses import dataclass
 from difflib import SequenceMatcher
@@ -32,6 +33,8 @@ SYNONYM_BOOST = 30.0
 ENRICHED_SCORE_WEIGHT = 12.0
 PREFIX_BONUS = 20.0
 
+MAX_QUERY_TERMS = 8
+
 QUERY_SYNONYMS = {
     "human": ("homo sapiens", "humans", "person", "people"),
     "humans": ("homo sapiens", "human", "person", "people"),
@@ -48,6 +51,8 @@ QUERY_SYNONYMS = {
     "snakes": ("snake", "serpent", "serpentes"),
 }
 
+_synonym_map: Mapping[str, tuple[str, ...]] = QUERY_SYNONYMS
+
 
 @dataclass(frozen=True)
 class RankedSearchResult:
@@ -70,13 +75,37 @@ def normalize_search_text(value: str | None) -> str:
     return re.sub(r"\s+", " ", (value or "").strip().lower())
 
 
+def set_synonym_map(synonyms: Mapping[str, tuple[str, ...]]) -> None:
+    """Swap in a new synonym map; the built-in QUERY_SYNONYMS always apply."""
+    global _synonym_map
+    merged = dict(synonyms)
+    for term, builtin in QUERY_SYNONYMS.items():
+        merged[term] = tuple(dict.fromkeys((*builtin, *merged.get(term, ()))))
+    _synonym_map = merged
+
+
 def expand_query_terms(query: str) -> list[str]:
+    """Expand a query with whole-query and per-token synonyms.
+
+    Whole-query synonyms come first, then single-token substitutions for
+    multi-word queries. The result is capped at MAX_QUERY_TERMS because every
+    term adds several SQL filters to the candidate query.
+    """
     normalized = normalize_search_text(query)
+    synonyms = _synonym_map
     terms = [normalized]
-    for synonym in QUERY_SYNONYMS.get(normalized, ()):
+    for synonym in synonyms.get(normalized, ()):
         if synonym not in terms:
             terms.append(synonym)
-    return terms
+
+    tokens = normalized.split(" ")
+    if len(tokens) > 1:
+        for index, token in enumerate(tokens):
+            for synonym in synonyms.get(token, ()):
+                term = " ".join((*tokens[:index], synonym, *tokens[index + 1:]))
+                if term not in terms:
+                    terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
 
 
 def extract_snippet(text: str | None, query_terms: list[str]) -> str:
@@ -111,7 +140,7 @@ def rank_search_row(row: Mapping[str, Any], query: str) -> RankedSearchResult |
         "display_name": row.get("display_name"),
         "name": row.get("name"),
         "description": row.get("description"),
-        "full_description": row.get("full_description"),
+        "full_description": _full_description_text(row),
     }
     normalized_fields = {
         field: normalize_search_text(value)
@@ -163,8 +192,25 @@ def rank_search_row(row: Mapping[str, Any], query: str) -> RankedSearchResult |
     )
 
 
+def _full_description_text(row: Mapping[str, Any]) -> str | None:
+    # Search candidates leave the article body out and carry the first query
+    # term it contains instead; matching against that term is equivalent.
+    if "full_description" in row:
+        return row.get("full_description")
+    return row.get("full_description_match")
+
+
+def _ranking_key(result: RankedSearchResult) -> tuple[float, str]:
+    return (-result.score, result.node_id)
+
+
 def sort_ranked_results(results: list[RankedSearchResult]) -> list[RankedSearchResult]:
-    return sorted(results, key=lambda result: (-result.score, result.node_id))
+    return sorted(results, key=_ranking_key)
+
+
+def top_ranked_results(results: list[RankedSearchResult], k: int) -> list[RankedSearchResult]:
+    """Return ``sort_ranked_results(results)[:k]`` in O(n log k)."""
+    return heapq.nsmallest(k, results, key=_ranking_key)
 
 
 def _best_match(
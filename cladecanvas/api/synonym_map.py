@@ -0,0 +1,93 @@
+import os
+import sys
+import threading
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from cladecanvas.api.search_ranking import set_synonym_map
+from cladecanvas.observability import log_event
+from cladecanvas.schema import search_synonyms
+
+
+SYNONYM_REFRESH_SECONDS = int(os.environ.get("CLADECANVAS_SYNONYM_REFRESH_SECONDS", "300"))
+MAX_SYNONYM_ROWS = int(os.environ.get("CLADECANVAS_MAX_SYNONYM_ROWS", "500000"))
+MAX_SYNONYMS_PER_TERM = 4
+
+
+class SynonymRefresher:
+    """Reload the search synonym map from ``search_synonyms`` when it changes.
+
+    ``start`` runs the reload on a daemon thread once at startup and then every
+    refresh interval, so search requests never wait on it. A cheap
+    ``count``/``max(created_at)`` probe decides whether the full table is read.
+    Databases without the table (the dev SQLite seed) keep the built-in synonyms.
+    """
+
+    def __init__(self, refresh_seconds: int = SYNONYM_REFRESH_SECONDS) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._version: tuple | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def refresh(self, db: Session) -> bool:
+        """Reload the map if the table changed; return whether it was reloaded."""
+        s = search_synonyms.c
+        try:
+            version = tuple(db.execute(select(func.count(), func.max(s.created_at))).one())
+            if version == self._version:
+                return False
+            rows = db.execute(
+                select(s.term, s.synonym)
+                .order_by(s.term, s.synonym)
+                .limit(MAX_SYNONYM_ROWS)
+            ).fetchall()
+        except SQLAlchemyError:
+            db.rollback()
+            return False
+
+        set_synonym_map(build_synonym_map(rows))
+        self._version = version
+        log_event("search_synonyms_loaded", rows=len(rows))
+        return True
+
+    def start(self, session_factory) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(session_factory,), name="search-synonym-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, session_factory) -> None:
+        while True:
+            db = session_factory()
+            try:
+                self.refresh(db)
+            finally:
+                db.close()
+            if self._stop.wait(self.refresh_seconds):
+                return
+
+    def reset(self) -> None:
+        self._version = None
+
+
+def build_synonym_map(rows) -> dict[str, tuple[str, ...]]:
+    grouped: dict[str, list[str]] = {}
+    for term, synonym in rows:
+        synonyms = grouped.setdefault(sys.intern(term), [])
+        if len(synonyms) < MAX_SYNONYMS_PER_TERM and synonym != term:
+            synonyms.append(sys.intern(synonym))
+    return {term: tuple(synonyms) for term, synonyms in grouped.items() if synonyms}
+
+
+synonym_refresher = SynonymRefresher()
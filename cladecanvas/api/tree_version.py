@@ -0,0 +1,121 @@
+import os
+import threading
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from cladecanvas.api.hardening import hot_read_cache
+from cladecanvas.api.search_cache import search_candidate_cache
+from cladecanvas.observability import log_event
+from cladecanvas.schema import tree_data_versions, tree_node_changes
+
+
+TREE_VERSION_POLL_SECONDS = int(os.environ.get("CLADECANVAS_TREE_VERSION_POLL_SECONDS", "30"))
+# Past this many changed ids a targeted eviction costs more than a refill.
+MAX_TRACKED_CHANGES = int(os.environ.get("CLADECANVAS_MAX_TRACKED_CHANGES", "10000"))
+
+# Hot-read entries keyed by a single canonical node id.
+NODE_KEYS = frozenset({"node_struct", "node_metadata"})
+
+
+class TreeVersionWatcher:
+    """Invalidate API caches when a tree load records a new version.
+
+    ``start`` polls ``max(version)`` from ``tree_data_versions`` on a daemon
+    thread. A full load (NULL counts) clears the hot-read and search candidate
+    caches; an incremental load evicts the node entries for the ids listed in
+    ``tree_node_changes``. Listings, lineages and search candidates can gain or
+    lose any node, so they are dropped on every new version. Databases without
+    the tables (the dev SQLite seed) are never invalidated.
+    """
+
+    def __init__(self, poll_seconds: int = TREE_VERSION_POLL_SECONDS) -> None:
+        self.poll_seconds = poll_seconds
+        self._version: int | None = None
+        self._seen = False
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def refresh(self, db: Session) -> bool:
+        """Invalidate caches if the tree version moved; return whether it did."""
+        v = tree_data_versions.c
+        try:
+            version = db.execute(select(func.max(v.version))).scalar()
+            if not self._seen or version == self._version:
+                self._seen, self._version = True, version
+                return False
+            loads = db.execute(
+                select(v.version, v.inserted)
+                .where(v.version > (self._version or 0))
+            ).fetchall()
+            changed = None
+            if loads and all(inserted is not None for _, inserted in loads):
+                changed = set(db.scalars(
+                    select(tree_node_changes.c.node_id)
+                    .where(tree_node_changes.c.version.in_([row.version for row in loads]))
+                    .limit(MAX_TRACKED_CHANGES + 1)
+                ))
+        except SQLAlchemyError:
+            db.rollback()
+            return False
+
+        if changed is None or len(changed) > MAX_TRACKED_CHANGES:
+            evicted = hot_read_cache.evict()
+        else:
+            evicted = hot_read_cache.evict(lambda key, value: _is_stale(key, value, changed))
+        search_candidate_cache.invalidate()
+        self._version = version
+        log_event(
+            "tree_version_changed",
+            version=version,
+            full=changed is None,
+            changed_nodes=len(changed) if changed is not None else None,
+            evicted=evicted,
+        )
+        return True
+
+    def start(self, session_factory) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(session_factory,), name="tree-version-watch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, session_factory) -> None:
+        while True:
+            db = session_factory()
+            try:
+                self.refresh(db)
+            finally:
+                db.close()
+            if self._stop.wait(self.poll_seconds):
+                return
+
+    def reset(self) -> None:
+        self._version = None
+        self._seen = False
+
+
+def _is_stale(key, value, changed: set[str]) -> bool:
+    kind = key[0]
+    if kind in NODE_KEYS:
+        return key[1] in changed
+    if kind == "node_batch":
+        # Keyed by the requested id, which may be an alias of a changed node.
+        node = (value or {}).get("node") or {}
+        return key[1] in changed or node.get("node_id") in changed
+    if kind == "bulk_metadata":
+        return not changed.isdisjoint(key[1])
+    return True
+
+
+tree_version_watcher = TreeVersionWatcher()
@@ -0,0 +1,274 @@
+"""Columnar Parquet snapshots of the tree for analytics.
+
+``scripts/export_parquet.py`` writes ``nodes``, ``metadata``,
+``node_aliases`` and ``metadata_enrichment_attempts`` into one directory
+per table under an export root:
+
+    exports/
+      _manifest.json          row counts, files, tree data version
+      nodes/part-00000.parquet
+      nodes/part-00001.parquet
+      ...
+
+Rows are streamed from the database in chunks of ``batch_rows`` and rolled
+into a new zstd-compressed file every ``rows_per_file`` rows, so neither the
+export nor a reader that scans one part needs the whole table in memory.
+Low-cardinality string columns (rank, status, provider, ...) are stored as
+Arrow dictionaries and come back as categoricals; every other string column
+still gets Parquet's dictionary page encoding.
+
+The loader side (``read_table``, ``read_pandas``, ``read_manifest``)
+memory-maps the files and keeps pandas columns Arrow-backed, so a notebook
+can scan the whole tree without touching the production database. The
+schema (and with it the database configuration) is only imported by the
+export side, so reading needs neither ``POSTGRES_URL`` nor the dev seed.
+
+pyarrow is optional: the API never imports this module.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from sqlalchemy import DateTime, Float, Integer, JSON, Table, func, inspect, select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = None
+    pq = None
+
+
+DEFAULT_BATCH_ROWS = 50_000
+DEFAULT_ROWS_PER_FILE = 1_000_000
+DEFAULT_ROW_GROUP_ROWS = 100_000
+COMPRESSION = "zstd"
+MANIFEST_NAME = "_manifest.json"
+
+EXPORT_TABLES = ("nodes", "metadata", "node_aliases", "metadata_enrichment_attempts")
+
+# A few hundred distinct values at most; stored as Arrow dictionaries.
+DICTIONARY_COLUMNS: dict[str, frozenset[str]] = {
+    "nodes": frozenset({"rank"}),
+    "metadata": frozenset({"source_label", "source_match_method"}),
+    "node_aliases": frozenset({"reason"}),
+    "metadata_enrichment_attempts": frozenset({"status", "last_provider", "last_match_method"}),
+}
+
+
+def export_table(name: str) -> Table:
+    """The schema table exported as ``name``; imports the schema on first use."""
+    from cladecanvas import schema
+
+    return {
+        "nodes": schema.nodes,
+        "metadata": schema.metadata_table,
+        "node_aliases": schema.node_aliases,
+        "metadata_enrichment_attempts": schema.metadata_enrichment_attempts,
+    }[name]
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet exports: pip install pyarrow")
+
+
+def arrow_schema(table: Table) -> "pa.Schema":
+    """Arrow schema for a SQLAlchemy table; JSON columns are stored as text."""
+    _require_pyarrow()
+    dictionary_columns = DICTIONARY_COLUMNS.get(table.name, frozenset())
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif column.name in dictionary_columns:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type, nullable=not column.primary_key))
+    return pa.schema(fields)
+
+
+def _record_batch(table: Table, schema: "pa.Schema", rows: list) -> "pa.RecordBatch":
+    columns = {}
+    for index, column in enumerate(table.columns):
+        values = [row[index] for row in rows]
+        if isinstance(column.type, JSON):
+            values = [None if value is None else json.dumps(value, sort_keys=True) for value in values]
+        columns[column.name] = values
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def iter_record_batches(connection, table: Table, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator["pa.RecordBatch"]:
+    """Stream a table in primary-key order as Arrow record batches."""
+    schema = arrow_schema(table)
+    result = connection.execution_options(yield_per=batch_rows).execute(
+        select(*table.columns).order_by(*table.primary_key.columns)
+    )
+    for rows in result.partitions(batch_rows):
+        yield _record_batch(table, schema, rows)
+
+
+@dataclass
+class TableExport:
+    rows: int = 0
+    files: list[str] = field(default_factory=list)
+    bytes: int = 0
+
+    def as_dict(self) -> dict:
+        return {"rows": self.rows, "files": self.files, "bytes": self.bytes}
+
+
+def write_parquet_parts(
+    batches: Iterable["pa.RecordBatch"],
+    schema: "pa.Schema",
+    directory: Path,
+    rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+    row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+) -> TableExport:
+    """Write batches into ``part-NNNNN.parquet`` files of at most ``rows_per_file`` rows."""
+    _require_pyarrow()
+    directory.mkdir(parents=True, exist_ok=True)
+    export = TableExport()
+    writer = None
+    file_rows = 0
+
+    def open_part():
+        path = directory / f"part-{len(export.files):05d}.parquet"
+        export.files.append(path.name)
+        return pq.ParquetWriter(path, schema, compression=COMPRESSION, use_dictionary=True)
+
+    try:
+        for batch in batches:
+            offset = 0
+            while offset < batch.num_rows:
+                if writer is None or file_rows >= rows_per_file:
+                    if writer is not None:
+                        writer.close()
+                    writer = open_part()
+                    file_rows = 0
+                piece = batch.slice(offset, rows_per_file - file_rows)
+                writer.write_batch(piece, row_group_size=row_group_rows)
+                offset += piece.num_rows
+                file_rows += piece.num_rows
+                export.rows += piece.num_rows
+        if writer is None:
+            # Keep empty tables readable with their schema.
+            writer = open_part()
+    finally:
+        if writer is not None:
+            writer.close()
+    export.bytes = sum((directory / name).stat().st_size for name in export.files)
+    return export
+
+
+def _latest_tree_version(connection) -> int | None:
+    from cladecanvas.schema import tree_data_versions
+
+    if not inspect(connection).has_table(tree_data_versions.name):
+        return None
+    return connection.execute(select(func.max(tree_data_versions.c.version))).scalar()
+
+
+def export_tables(
+    engine,
+    root: Path,
+    tables: Iterable[str] = EXPORT_TABLES,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+    row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+) -> dict:
+    """Export tables under ``root`` and write the manifest.
+
+    All tables are read on one connection; on Postgres it runs at REPEATABLE
+    READ so the snapshot is consistent across tables. Each table is written to
+    a temporary directory first and swapped in, so a failed export leaves the
+    previous one intact. Tables the database does not have (the dev SQLite
+    seed only ships ``nodes`` and ``metadata``) are listed under ``missing``.
+    """
+    _require_pyarrow()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "tree_version": None,
+        "tables": {},
+        "missing": [],
+    }
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection = connection.execution_options(isolation_level="REPEATABLE READ")
+        with connection.begin():
+            manifest["tree_version"] = _latest_tree_version(connection)
+            inspector = inspect(connection)
+            for name in tables:
+                table = export_table(name)
+                if not inspector.has_table(name):
+                    manifest["missing"].append(name)
+                    continue
+                staging = root / f".{name}.tmp"
+                shutil.rmtree(staging, ignore_errors=True)
+                export = write_parquet_parts(
+                    iter_record_batches(connection, table, batch_rows),
+                    arrow_schema(table),
+                    staging,
+                    rows_per_file=rows_per_file,
+                    row_group_rows=row_group_rows,
+                )
+                shutil.rmtree(root / name, ignore_errors=True)
+                os.replace(staging, root / name)
+                manifest["tables"][name] = export.as_dict()
+
+    previous = read_manifest(root) if (root / MANIFEST_NAME).exists() else {}
+    merged = {**previous, **manifest, "tables": {**previous.get("tables", {}), **manifest["tables"]}}
+    manifest_tmp = root / f"{MANIFEST_NAME}.tmp"
+    manifest_tmp.write_text(json.dumps(merged, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(manifest_tmp, root / MANIFEST_NAME)
+    return merged
+
+
+def read_manifest(root: str | Path) -> dict:
+    return json.loads((Path(root) / MANIFEST_NAME).read_text(encoding="utf-8"))
+
+
+def read_table(
+    root: str | Path,
+    table: str,
+    columns: list[str] | None = None,
+    filters=None,
+) -> "pa.Table":
+    """Read an exported table as a memory-mapped Arrow table.
+
+    ``filters`` uses pyarrow's syntax, e.g. ``[("rank", "=", "species")]``;
+    row groups whose statistics rule the filter out are skipped.
+    """
+    _require_pyarrow()
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table {table!r}; expected one of {sorted(EXPORT_TABLES)}")
+    return pq.read_table(Path(root) / table, columns=columns, filters=filters, memory_map=True)
+
+
+def read_pandas(
+    root: str | Path,
+    table: str,
+    columns: list[str] | None = None,
+    filters=None,
+):
+    """Read an exported table into pandas with Arrow-backed columns.
+
+    The columns keep pointing at the Arrow buffers instead of being copied
+    into Python objects, which is what makes string-heavy tables cheap.
+    """
+    import pandas as pd
+
+    return read_table(root, table, columns=columns, filters=filters).to_pandas(types_mapper=pd.ArrowDtype)
@@ -8,7 +8,8 @@ from sqlalchemy import create_engine
 from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-from cladecanvas.observability import record_latency
+from cladecanvas.observability import record_latency, record_query
+from cladecanvas.query_insights import postgres_explainer, query_insights
 
 # Load from .env file if present
 load_dotenv()
@@ -108,3 +109,11 @@ def _after_cursor_execute(conn, cursor, statement, parameters, context, executem
     elapsed_ms = (time.perf_counter() - started) * 1000
     operation = statement.lstrip().split(maxsplit=1)[0].lower() if statement else "unknown"
     record_latency("db", operation, elapsed_ms, {"executemany": str(executemany).lower()})
+    # psycopg2 reports rows returned by SELECTs here; SQLite reports -1.
+    rows = cursor.rowcount if cursor is not None else 0
+    record_query(elapsed_ms, rows)
+    query_insights.record(statement or "", parameters, elapsed_ms, rows, executemany)
+
+
+if engine.dialect.name == "postgresql":
+    query_insights.explainer = postgres_explainer(engine)
@@ -1,9 +1,11 @@
-import requests
+import asyncio
 from datetime import datetime, timezone
 import re
 from pathlib import Path
 from urllib.parse import unquote
 
+from cladecanvas.http_client import AsyncEnrichmentClient
+
 WIKIDATA_SPARQL = 'https://query.wikidata.org/sparql'
 HEADERS = {
     'User-Agent': 'CladeCanvasBot/0.1 (https://github.com/shesanth/CladeCanvas)'
@@ -21,41 +23,111 @@ def clean_taxon_name(name: str) -> str:
     name = re.sub(r'\s+', ' ', name)
     return name.strip()
 
+WIKIDATA_API = 'https://www.wikidata.org/w/api.php'
+WIKIPEDIA_API = 'https://en.wikipedia.org/w/api.php'
+
+# wbgetentities accepts 50 ids per request; TextExtracts returns at most 20
+# intro extracts per request and continues the rest.
+WIKIDATA_IDS_PER_REQUEST = 50
+EXTRACT_TITLES_PER_REQUEST = 20
+FALLBACK_NAMES_PER_QUERY = 100
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _run_with_client(fetch, *args):
+    """Run an async fetcher on a fresh pooled client from synchronous code."""
+    async def runner():
+        async with AsyncEnrichmentClient(headers=HEADERS) as client:
+            return await fetch(client, *args)
+    return asyncio.run(runner())
+
+
 def fetch_wikipedia_extract(wikidata_q):
-    url = 'https://www.wikidata.org/w/api.php'
-    params = {
-        'action': 'wbgetentities',
-        'ids': wikidata_q,
-        'format': 'json',
-        'props': 'sitelinks'
-    }
-    r = requests.get(url, params=params, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    entities = r.json().get('entities', {})
-    sitelinks = entities.get(wikidata_q, {}).get('sitelinks', {})
-    title = sitelinks.get('enwiki', {}).get('title')
-    if not title:
-        return None, None
-
-    wiki_page_url = f'https://en.wikipedia.org/wiki/{title.replace(" ", "_")}'
-
-    wiki_url = 'https://en.wikipedia.org/w/api.php'
-    wiki_params = {
-        'action': 'query',
-        'prop': 'extracts',
-        'exintro': True,
-        'titles': title,
-        'format': 'json',
-        'formatversion': 2
-    }
-    wiki_r = requests.get(wiki_url, params=wiki_params, headers=HEADERS, timeout=30)
-    wiki_r.raise_for_status()
-    pages = wiki_r.json().get('query', {}).get('pages', [])
-    if pages and 'extract' in pages[0]:
-        text = pages[0]['extract']
-        clean = ' '.join(text.split())
-        return clean, wiki_page_url
-    return None, wiki_page_url
+    return fetch_wikipedia_extracts([wikidata_q]).get(wikidata_q, (None, None))
+
+
+def fetch_wikipedia_extracts(wikidata_qs):
+    return _run_with_client(fetch_wikipedia_extracts_async, wikidata_qs)
+
+
+async def fetch_enwiki_titles(client, wikidata_qs):
+    """Map QIDs to their English Wikipedia titles, 50 QIDs per request."""
+    async def fetch_chunk(chunk):
+        params = {
+            'action': 'wbgetentities',
+            'ids': '|'.join(chunk),
+            'format': 'json',
+            'props': 'sitelinks',
+            'sitefilter': 'enwiki',
+        }
+        entities = (await client.get_json(WIKIDATA_API, params=params, timeout=30)).get('entities', {})
+        return {
+            q: entities.get(q, {}).get('sitelinks', {}).get('enwiki', {}).get('title')
+            for q in chunk
+        }
+
+    titles = {}
+    chunks = _chunks(list(dict.fromkeys(wikidata_qs)), WIKIDATA_IDS_PER_REQUEST)
+    for chunk_titles in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+        titles.update({q: title for q, title in chunk_titles.items() if title})
+    return titles
+
+
+async def fetch_extracts_by_title(client, titles):
+    """Map Wikipedia titles to their cleaned intro extract (or None)."""
+    async def fetch_chunk(chunk):
+        params = {
+            'action': 'query',
+            'prop': 'extracts',
+            'exintro': True,
+            'exlimit': 'max',
+            'titles': '|'.join(chunk),
+            'format': 'json',
+            'formatversion': 2,
+        }
+        extracts = dict.fromkeys(chunk)
+        renamed = {}
+        while True:
+            payload = await client.get_json(WIKIPEDIA_API, params=params, timeout=30)
+            query = payload.get('query', {})
+            for item in query.get('normalized', []):
+                renamed[item['to']] = item['from']
+            for page in query.get('pages', []):
+                title = renamed.get(page.get('title'), page.get('title'))
+                if 'extract' in page:
+                    extracts[title] = ' '.join(page['extract'].split())
+            if 'continue' not in payload:
+                return extracts
+            params = {**params, **payload['continue']}
+
+    extracts = {}
+    chunks = _chunks(list(dict.fromkeys(titles)), EXTRACT_TITLES_PER_REQUEST)
+    for chunk_extracts in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+        extracts.update(chunk_extracts)
+    return extracts
+
+
+async def fetch_wikipedia_extracts_async(client, wikidata_qs):
+    """Batch version of the sitelink -> intro extract lookup.
+
+    Returns ``{qid: (extract, wiki_page_url)}``; QIDs without an English
+    article map to ``(None, None)``.
+    """
+    titles = await fetch_enwiki_titles(client, wikidata_qs)
+    extracts = await fetch_extracts_by_title(client, list(titles.values())) if titles else {}
+    results = {}
+    for q in wikidata_qs:
+        title = titles.get(q)
+        if not title:
+            results[q] = (None, None)
+            continue
+        wiki_page_url = f'https://en.wikipedia.org/wiki/{title.replace(" ", "_")}'
+        results[q] = (extracts.get(title), wiki_page_url)
+    return results
 
 
 def infer_common_name(label, wiki_page_url):
@@ -101,7 +173,60 @@ def build_field_sources(
         field_sources["wiki_page_url"] = wikipedia_source
     return field_sources
 
+def collect_vernacular_names(bindings, item_uri):
+    """Distinct English P1843 names across the SPARQL rows for one item."""
+    names = []
+    for b in bindings:
+        if b['item']['value'] != item_uri or 'vernacular' not in b:
+            continue
+        name = b['vernacular']['value']
+        if name not in names:
+            names.append(name)
+    return names
+
+def _sparql_string(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+async def fetch_taxon_name_bindings(client, names):
+    """P225 taxon-name lookup, ``FALLBACK_NAMES_PER_QUERY`` names per query.
+
+    Returns ``{name: [binding, ...]}`` in response order, so ``[0]`` is the
+    same first hit the per-name query used to return.
+    """
+    async def fetch_chunk(chunk):
+        values = ' '.join(_sparql_string(name) for name in chunk)
+        sparql = f"""
+SELECT ?name ?item ?itemLabel ?desc ?image ?rankLabel ?vernacular WHERE {{
+  VALUES ?name {{ {values} }}
+  ?item wdt:P225 ?name .
+  ?item wdt:P31 ?type . FILTER(?type IN (wd:Q16521, wd:Q713623))
+  OPTIONAL {{ ?item schema:description ?desc FILTER(LANG(?desc) = "en") }}
+  OPTIONAL {{ ?item wdt:P18 ?image }}
+  OPTIONAL {{ ?item wdt:P105 ?rank . ?rank rdfs:label ?rankLabel FILTER(LANG(?rankLabel) = "en") }}
+  OPTIONAL {{ ?item wdt:P1843 ?vernacular FILTER(LANG(?vernacular) = "en") }}
+  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en" }}
+}}
+        """
+        payload = await client.get_json(WIKIDATA_SPARQL, params={'query': sparql, 'format': 'json'}, timeout=60)
+        return payload.get('results', {}).get('bindings', [])
+
+    bindings_by_name = {}
+    unique_names = list(dict.fromkeys(name for name in names if name))
+    chunks = _chunks(unique_names, FALLBACK_NAMES_PER_QUERY)
+    for bindings in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+        for b in bindings:
+            bindings_by_name.setdefault(b['name']['value'], []).append(b)
+    return bindings_by_name
+
+
 def fetch_wikidata(ott_nodes):
+    if not ott_nodes:
+        return []
+    return _run_with_client(fetch_wikidata_async, ott_nodes)
+
+
+async def fetch_wikidata_async(client, ott_nodes):
     if not ott_nodes:
         return []
 
@@ -111,20 +236,20 @@ def fetch_wikidata(ott_nodes):
 
     values = ' '.join(f'"{i}"' for i in ott_ids)
     sparql = f"""
-SELECT ?ott ?item ?itemLabel ?desc ?image ?thumb ?rankLabel WHERE {{
+SELECT ?ott ?item ?itemLabel ?desc ?image ?thumb ?rankLabel ?vernacular WHERE {{
   VALUES ?ott {{ {values} }}
   ?item wdt:P9157 ?ott .
   OPTIONAL {{ ?item schema:description ?desc FILTER(LANG(?desc) = "en") }}
   OPTIONAL {{ ?item wdt:P18 ?image }}
   OPTIONAL {{ ?item wdt:P105 ?rank . ?rank rdfs:label ?rankLabel FILTER(LANG(?rankLabel) = "en") }}
+  OPTIONAL {{ ?item wdt:P1843 ?vernacular FILTER(LANG(?vernacular) = "en") }}
   SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en" }}
 }}
     """
-    r = requests.get(WIKIDATA_SPARQL, params={'query': sparql, 'format': 'json'}, headers=HEADERS, timeout=60)
-    r.raise_for_status()
-    data = r.json().get('results', {}).get('bindings', [])
+    payload = await client.get_json(WIKIDATA_SPARQL, params={'query': sparql, 'format': 'json'}, timeout=60)
+    data = payload.get('results', {}).get('bindings', [])
 
-    results = []
+    matches = []
     matched_ott_ids = set()
 
     # Group SPARQL hits by OTT ID — multiple Wikidata entries can share one P9157 value
@@ -144,85 +269,56 @@ SELECT ?ott ?item ?itemLabel ?desc ?image ?thumb ?rankLabel WHERE {{
                 best = b
                 break
 
-        b = best
-        q = b['item']['value'].rsplit('/', 1)[-1]
-        short_desc = b.get('desc', {}).get('value')
-        image = b.get('image', {}).get('value')
-        label = b['itemLabel']['value']
-        rank = b.get('rankLabel', {}).get('value') if 'rankLabel' in b else None
-        full_desc, wiki_page = fetch_wikipedia_extract(q)
-        common_name = infer_common_name(label, wiki_page)
-        enriched_at = datetime.now(timezone.utc)
-        source_url = f"https://www.wikidata.org/wiki/{q}"
-        confidence = 1.0 if full_desc or image else 0.0
+        matches.append((ott, best, collect_vernacular_names(bindings, best['item']['value']), False))
 
-        results.append({
-            'ott_id': ott,
-            'wikidata_q': q,
-            'common_name': common_name,
-            'description': short_desc,
-            'full_description': full_desc,
-            'image_url': image,
-            'image_thumb': image,
-            'wiki_page_url': wiki_page,
-            'rank': rank,
-            'last_updated': enriched_at,
-            'enriched_score': confidence,
-            'source_label': "Wikidata",
-            'source_url': source_url,
-            'source_match_method': "ott_id",
-            'enriched_at': enriched_at,
-            'provenance_confidence': confidence,
-            'field_sources': build_field_sources(
-                "Wikidata",
-                source_url,
-                wiki_page,
-                common_name_from_wikipedia=common_name != label,
-            ),
-        })
-
-    fallback_hits = 0
+    # Skip unidentified specimens — "sp." names would match their parent clade
+    # via P225, returning wrong metadata
+    fallback_names = {}
     for ott in ott_ids:
         if ott in matched_ott_ids:
             continue
-
         original_name = ott_id_map.get(ott, str(ott))
-        fallback_name = clean_taxon_name(original_name)
-
-        # Skip unidentified specimens — "sp." names would match their
-        # parent clade via P225, returning wrong metadata
         if re.search(r'\bsp\.', original_name):
             miss_log_file.write(f"{ott}\t{original_name}\tskipped-sp\n")
             continue
+        fallback_names[ott] = clean_taxon_name(original_name)
 
-        sparql = f"""
-SELECT ?item ?itemLabel ?desc ?image ?rankLabel WHERE {{
-  ?item wdt:P225 "{fallback_name}" .
-  ?item wdt:P31 ?type . FILTER(?type IN (wd:Q16521, wd:Q713623))
-  OPTIONAL {{ ?item schema:description ?desc FILTER(LANG(?desc) = "en") }}
-  OPTIONAL {{ ?item wdt:P18 ?image }}
-  OPTIONAL {{ ?item wdt:P105 ?rank . ?rank rdfs:label ?rankLabel FILTER(LANG(?rankLabel) = "en") }}
-  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en" }}
-}}
-        """
-        r = requests.get(WIKIDATA_SPARQL, params={'query': sparql, 'format': 'json'}, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        fallback_data = r.json().get('results', {}).get('bindings', [])
+    fallback_bindings = await fetch_taxon_name_bindings(client, list(fallback_names.values()))
+
+    fallback_hits = 0
+    for ott, fallback_name in fallback_names.items():
+        fallback_data = fallback_bindings.get(fallback_name)
         if not fallback_data:
             miss_log_file.write(f"{ott}\t{ott_id_map[ott]}\n")
             continue
 
         b = fallback_data[0]
+        matches.append((ott, b, collect_vernacular_names(fallback_data, b['item']['value']), True))
+        fallback_hits += 1
+
+    # One batched sitelink/extract pass for every matched item instead of two
+    # requests per taxon.
+    extracts = await fetch_wikipedia_extracts_async(
+        client, [b['item']['value'].rsplit('/', 1)[-1] for _, b, _, _ in matches]
+    )
+
+    results = []
+    for ott, b, vernacular_names, fallback in matches:
         q = b['item']['value'].rsplit('/', 1)[-1]
         short_desc = b.get('desc', {}).get('value')
         image = b.get('image', {}).get('value')
         label = b['itemLabel']['value']
         rank = b.get('rankLabel', {}).get('value') if 'rankLabel' in b else None
-        full_desc, wiki_page = fetch_wikipedia_extract(q)
+        full_desc, wiki_page = extracts.get(q, (None, None))
         common_name = infer_common_name(label, wiki_page)
         enriched_at = datetime.now(timezone.utc)
         source_url = f"https://www.wikidata.org/wiki/{q}"
-        confidence = 0.7 if (full_desc or image) else 0.35
+        if fallback:
+            source_label = "Wikidata fallback"
+            confidence = 0.7 if (full_desc or image) else 0.35
+        else:
+            source_label = "Wikidata"
+            confidence = 1.0 if full_desc or image else 0.0
 
         results.append({
             'ott_id': ott,
@@ -236,20 +332,20 @@ SELECT ?item ?itemLabel ?desc ?image ?rankLabel WHERE {{
             'rank': rank,
             'last_updated': enriched_at,
             'enriched_score': 1.0 if full_desc or image else 0.0,
-            'source_label': "Wikidata fallback",
+            'source_label': source_label,
             'source_url': source_url,
-            'source_match_method': "taxon_name",
+            'source_match_method': "taxon_name" if fallback else "ott_id",
             'enriched_at': enriched_at,
             'provenance_confidence': confidence,
             'field_sources': build_field_sources(
-                "Wikidata fallback",
+                source_label,
                 source_url,
                 wiki_page,
-                fallback=True,
+                fallback=fallback,
                 common_name_from_wikipedia=common_name != label,
             ),
+            'vernacular_names': vernacular_names,
         })
-        fallback_hits += 1
 
     miss_log_file.close()
     print(f"[fetch_wikidata] P9157 hits: {len(matched_ott_ids)}, fallback hits: {fallback_hits}, missed: {len(ott_ids) - len(matched_ott_ids) - fallback_hits}")
@@ -0,0 +1,219 @@
+"""Staged enrichment pipeline: one claimer, a pool of fetchers, one writer.
+
+The sequential loop left Postgres idle during Wikidata calls and the HTTP
+client idle during upserts. Here the stages overlap:
+
+    claim() --[claimed]--> fetch(batch) x N --[fetched]--> write(batch, ...)
+
+Both queues are bounded, so a slow writer stalls the fetchers and slow
+fetchers stall the claimer instead of leasing work nobody can process yet.
+The writer runs on the calling thread and owns its database session; the
+claimer and fetchers run on daemon threads.
+
+Per-stage latency goes to ``record_latency("pipeline", ...)`` and a progress
+event with per-stage throughput and queue depths is logged through
+``log_event`` every ``report_every`` batches and once at the end.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from cladecanvas.observability import log_event, record_latency
+
+
+DEFAULT_FETCHERS = 4
+
+_DONE = object()
+
+Claim = Callable[[], list[dict]]
+Fetch = Callable[[list[dict]], list[dict]]
+Write = Callable[[list[dict], list[dict], Exception | None], None]
+
+
+@dataclass
+class StageStats:
+    batches: int = 0
+    rows: int = 0
+    busy_seconds: float = 0.0
+    errors: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+            "busy_s": round(self.busy_seconds, 3),
+            "rows_per_s": round(self.rows / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+        }
+
+
+@dataclass
+class DepthStats:
+    samples: int = 0
+    total: int = 0
+    peak: int = 0
+
+    def sample(self, depth: int) -> None:
+        self.samples += 1
+        self.total += depth
+        self.peak = max(self.peak, depth)
+
+    def as_dict(self) -> dict:
+        return {
+            "avg": round(self.total / self.samples, 2) if self.samples else 0.0,
+            "peak": self.peak,
+        }
+
+
+class EnrichmentPipeline:
+    """Run claim/fetch/write stages concurrently with bounded hand-offs.
+
+    ``claim`` returns the next batch or an empty list once the queue is
+    drained. ``fetch`` exceptions are not fatal: the batch reaches ``write``
+    with the exception so it can be recorded as an error attempt. An
+    exception from ``write`` stops the claimer, lets in-flight batches drain
+    without writing them, and is re-raised from ``run``.
+    """
+
+    def __init__(
+        self,
+        claim: Claim,
+        fetch: Fetch,
+        write: Write,
+        fetchers: int = DEFAULT_FETCHERS,
+        queue_size: int | None = None,
+        name: str = "enrichment",
+        report_every: int = 10,
+    ) -> None:
+        self.claim = claim
+        self.fetch = fetch
+        self.write = write
+        self.fetchers = max(1, fetchers)
+        self.queue_size = queue_size or self.fetchers
+        self.name = name
+        self.report_every = report_every
+        self.stages = {stage: StageStats() for stage in ("claim", "fetch", "write")}
+        self.depths = {"claimed": DepthStats(), "fetched": DepthStats()}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, max_batches: int) -> dict:
+        claimed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        fetched: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        started = time.perf_counter()
+
+        threads = [
+            threading.Thread(
+                target=self._claimer, args=(claimed, max_batches),
+                name=f"{self.name}-claimer", daemon=True,
+            )
+        ]
+        threads += [
+            threading.Thread(
+                target=self._fetcher, args=(claimed, fetched),
+                name=f"{self.name}-fetcher-{index}", daemon=True,
+            )
+            for index in range(self.fetchers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        write_error: Exception | None = None
+        finished_fetchers = 0
+        while finished_fetchers < self.fetchers:
+            item = fetched.get()
+            if item is _DONE:
+                finished_fetchers += 1
+                continue
+            self._sample_depths(claimed, fetched)
+            if write_error is not None:
+                continue
+            batch, enriched, fetch_error = item
+            try:
+                self._timed("write", batch, lambda: self.write(batch, enriched, fetch_error))
+            except Exception as exc:  # noqa: BLE001 - drain the pipeline, then re-raise
+                write_error = exc
+                self._stop.set()
+                continue
+            if self.stages["write"].batches % self.report_every == 0:
+                self._report("enrichment_pipeline_progress", started)
+
+        for thread in threads:
+            thread.join()
+        summary = self._report("enrichment_pipeline_summary", started)
+        if write_error is not None:
+            raise write_error
+        return summary
+
+    def _claimer(self, claimed: queue.Queue, max_batches: int) -> None:
+        try:
+            for _ in range(max_batches):
+                if self._stop.is_set():
+                    break
+                batch = self._timed("claim", None, self.claim)
+                if not batch:
+                    break
+                claimed.put(batch)
+        except Exception as exc:  # noqa: BLE001 - stop claiming; in-flight batches still finish
+            log_event("enrichment_pipeline_claim_failed", pipeline=self.name, error=str(exc))
+        finally:
+            for _ in range(self.fetchers):
+                claimed.put(_DONE)
+
+    def _fetcher(self, claimed: queue.Queue, fetched: queue.Queue) -> None:
+        while True:
+            batch = claimed.get()
+            if batch is _DONE:
+                fetched.put(_DONE)
+                return
+            try:
+                enriched = self._timed("fetch", batch, lambda: self.fetch(batch))
+                fetched.put((batch, enriched, None))
+            except Exception as exc:  # noqa: BLE001 - the writer records the failed batch
+                fetched.put((batch, [], exc))
+
+    def _timed(self, stage: str, batch: list[dict] | None, func):
+        started = time.perf_counter()
+        error = False
+        result = None
+        try:
+            result = func()
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = len(batch if batch is not None else result or ())
+            with self._lock:
+                stats = self.stages[stage]
+                stats.batches += 1
+                stats.rows += rows
+                stats.busy_seconds += elapsed
+                stats.errors += error
+            record_latency("pipeline", f"{self.name}.{stage}", elapsed * 1000, {"rows": str(rows)})
+
+    def _sample_depths(self, claimed: queue.Queue, fetched: queue.Queue) -> None:
+        with self._lock:
+            self.depths["claimed"].sample(claimed.qsize())
+            self.depths["fetched"].sample(fetched.qsize())
+
+    def _report(self, event: str, started: float) -> dict:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            summary = {
+                "pipeline": self.name,
+                "fetchers": self.fetchers,
+                "queue_size": self.queue_size,
+                "elapsed_s": round(elapsed, 3),
+                "rows_per_s": round(self.stages["write"].rows / elapsed, 2) if elapsed else 0.0,
+                "stages": {stage: stats.as_dict() for stage, stats in self.stages.items()},
+                "queue_depth": {name: depth.as_dict() for name, depth in self.depths.items()},
+            }
+        log_event(event, **summary)
+        return summary
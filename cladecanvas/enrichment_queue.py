@@ -0,0 +1,394 @@
+"""Durable enrichment work queue on ``metadata_enrichment_attempts``.
+
+Candidate taxa are enqueued as ``pending`` attempt rows a chunk at a time,
+each with a ``priority`` (lower claims first) that continues from the
+highest one still queued, so a chunk keeps its candidate order behind the
+chunks before it. Workers
+claim batches in priority order with ``FOR UPDATE SKIP LOCKED``, so
+concurrent workers never pick the same taxa and claiming costs O(batch)
+instead of a full anti-join scan. A claim sets ``status = 'leased'``,
+``worker_id`` and ``leased_until``; a heartbeat extends the leases of every
+batch from claim until it is written, and leases that expire (a crashed
+worker) are claimed again. Finishing a batch records
+``success``/``no_match``/``error`` and clears the lease, but only on rows
+the worker still holds.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from cladecanvas.schema import metadata_enrichment_attempts
+
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_RETRY_DAYS = 30
+ERROR_RETRY_DAYS = 1
+# Candidates enqueued per refill, as a multiple of the claim size.
+REFILL_BATCHES = 10
+
+QUEUE_ORDERS = ("coverage", "largest", "random")
+
+CLAIM_SQL = """
+    WITH claimable AS (
+        SELECT node_id
+        FROM metadata_enrichment_attempts
+        WHERE status = 'pending'
+           OR (status = 'leased' AND leased_until < :now)
+        ORDER BY priority
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE metadata_enrichment_attempts a
+    SET status = 'leased',
+        worker_id = :worker_id,
+        leased_until = :leased_until,
+        updated_at = :now
+    FROM claimable
+    WHERE a.node_id = claimable.node_id
+    RETURNING a.node_id, a.ott_id, a.name
+"""
+
+EXTEND_SQL = """
+    UPDATE metadata_enrichment_attempts
+    SET leased_until = :leased_until
+    WHERE node_id = ANY(:node_ids)
+      AND worker_id = :worker_id
+      AND status = 'leased'
+"""
+
+RELEASE_SQL = """
+    UPDATE metadata_enrichment_attempts
+    SET status = 'pending', worker_id = NULL, leased_until = NULL, updated_at = :now
+    WHERE node_id = ANY(:node_ids)
+      AND worker_id = :worker_id
+      AND status = 'leased'
+"""
+
+
+def default_worker_id(suffix: str | None = None) -> str:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{worker_id}:{suffix}" if suffix else worker_id
+
+
+@dataclass
+class QueueFilter:
+    """Which taxa are eligible for enrichment and in what order."""
+
+    ott_ids: list[int] = field(default_factory=list)
+    node_ids: list[str] = field(default_factory=list)
+    ranks: list[str] = field(default_factory=list)
+    leaf_only: bool = False
+    name_like: str | None = None
+    refresh_existing: bool = False
+    include_attempted: bool = False
+    retry_errors: bool = False
+    retry_no_match_after_days: int | None = None
+    order: str = "coverage"
+
+    @property
+    def targeted(self) -> bool:
+        return bool(self.ott_ids or self.node_ids)
+
+    def candidate_sql(self, now: datetime) -> tuple[str, dict]:
+        """SELECT node_id, ott_id, name and their 1-based rank, in priority order."""
+        params: dict = {}
+        where = [
+            "n.ott_id IS NOT NULL",
+            "(a.status IS NULL OR a.status NOT IN ('pending', 'leased'))",
+        ]
+        if not self.refresh_existing:
+            where.append("m.node_id IS NULL")
+
+        if self.ott_ids:
+            where.append("n.ott_id = ANY(:ott_ids)")
+            params["ott_ids"] = self.ott_ids
+        if self.node_ids:
+            where.append("n.node_id = ANY(:node_ids)")
+            params["node_ids"] = self.node_ids
+        if self.ranks:
+            where.append("n.rank = ANY(:ranks)")
+            params["ranks"] = self.ranks
+        if self.leaf_only:
+            where.append("n.num_tips = 0")
+        if self.name_like:
+            where.append("n.name ILIKE :name_like")
+            params["name_like"] = self.name_like
+
+        if not self.targeted and not self.include_attempted:
+            retry_clauses = ["a.node_id IS NULL"]
+            if self.retry_errors:
+                retry_clauses.append("(a.status = 'error' AND (a.next_retry_at IS NULL OR a.next_retry_at <= :now))")
+                params["now"] = now
+            if self.retry_no_match_after_days is not None:
+                params["no_match_cutoff"] = now - timedelta(days=self.retry_no_match_after_days)
+                retry_clauses.append("(a.status = 'no_match' AND a.last_attempted_at <= :no_match_cutoff)")
+            where.append("(" + " OR ".join(retry_clauses) + ")")
+
+        if self.order == "random":
+            order_by = "ORDER BY random()"
+        elif self.order == "largest":
+            order_by = "ORDER BY n.num_tips DESC NULLS LAST, n.name, n.node_id"
+        else:
+            order_by = """
+            ORDER BY
+              CASE
+                WHEN n.rank = 'species' THEN 0
+                WHEN n.num_tips = 0 THEN 1
+                WHEN n.num_tips IS NULL THEN 2
+                ELSE 3
+              END,
+              n.num_tips DESC NULLS LAST,
+              n.name,
+              n.node_id
+            """
+
+        sql = f"""
+            SELECT n.node_id, n.ott_id, n.name, row_number() OVER ({order_by}) AS rank
+            FROM nodes n
+            LEFT JOIN metadata m ON m.node_id = n.node_id
+            LEFT JOIN metadata_enrichment_attempts a ON a.node_id = n.node_id
+            WHERE {' AND '.join(where)}
+            {order_by}
+            LIMIT :limit
+        """
+        return sql, params
+
+
+class EnrichmentQueue:
+    """Claim, heartbeat and release enrichment batches for one worker."""
+
+    def __init__(
+        self,
+        queue_filter: QueueFilter | None = None,
+        worker_id: str | None = None,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    ) -> None:
+        self.queue_filter = queue_filter or QueueFilter()
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        # Targeted and include-attempted runs would re-select the same rows on
+        # every refill, so they enqueue their matches exactly once.
+        self._single_pass = self.queue_filter.targeted or self.queue_filter.include_attempted
+        self._enqueued_once = False
+        # Node ids claimed by this worker and not yet finished or released.
+        self._in_flight: set[str] = set()
+        self._in_flight_lock = threading.Lock()
+
+    def preview(self, session, limit: int) -> list[dict]:
+        """Eligible taxa without touching queue state (dry runs)."""
+        sql, params = self.queue_filter.candidate_sql(datetime.now(timezone.utc))
+        rows = session.execute(text(sql), {**params, "limit": limit}).mappings().fetchall()
+        return [{key: row[key] for key in ("node_id", "ott_id", "name")} for row in rows]
+
+    def enqueue(self, session, limit: int) -> int:
+        """Add up to ``limit`` eligible taxa to the queue as ``pending``."""
+        if self._single_pass and self._enqueued_once:
+            return 0
+        self._enqueued_once = True
+        now = datetime.now(timezone.utc)
+        sql, params = self.queue_filter.candidate_sql(now)
+        result = session.execute(
+            text(f"""
+                INSERT INTO metadata_enrichment_attempts
+                    (node_id, ott_id, name, status, attempt_count, priority, created_at, updated_at)
+                SELECT c.node_id, c.ott_id, c.name, 'pending', 0, queued.last + c.rank, :queued_at, :queued_at
+                FROM ({sql}) c
+                CROSS JOIN (
+                    SELECT COALESCE(max(priority), 0) AS last
+                    FROM metadata_enrichment_attempts
+                    WHERE status IN ('pending', 'leased')
+                ) queued
+                ON CONFLICT (node_id) DO UPDATE
+                SET status = 'pending',
+                    worker_id = NULL,
+                    leased_until = NULL,
+                    priority = EXCLUDED.priority,
+                    updated_at = EXCLUDED.updated_at
+                WHERE metadata_enrichment_attempts.status NOT IN ('pending', 'leased')
+            """),
+            {**params, "limit": limit, "queued_at": now},
+        )
+        return result.rowcount or 0
+
+    def claim(self, session, limit: int) -> list[dict]:
+        """Lease up to ``limit`` queued taxa, refilling the queue when it runs low."""
+        batch = self._claim(session, limit)
+        if len(batch) < limit and self.enqueue(session, limit * REFILL_BATCHES):
+            batch += self._claim(session, limit - len(batch))
+        with self._in_flight_lock:
+            self._in_flight.update(row["node_id"] for row in batch)
+        return batch
+
+    def finish(self, node_ids: Iterable[str]) -> None:
+        """Stop extending leases on ``node_ids`` once their outcome is written."""
+        with self._in_flight_lock:
+            self._in_flight.difference_update(node_ids)
+
+    def in_flight(self) -> list[str]:
+        with self._in_flight_lock:
+            return sorted(self._in_flight)
+
+    def extend_leases(self, session, node_ids: list[str]) -> int:
+        result = session.execute(
+            text(EXTEND_SQL),
+            {
+                "node_ids": node_ids,
+                "worker_id": self.worker_id,
+                "leased_until": self._lease_deadline(),
+            },
+        )
+        return result.rowcount or 0
+
+    def release(self, session, node_ids: list[str]) -> int:
+        """Hand unfinished leases back to the queue (e.g. on shutdown)."""
+        result = session.execute(
+            text(RELEASE_SQL),
+            {"node_ids": node_ids, "worker_id": self.worker_id, "now": datetime.now(timezone.utc)},
+        )
+        self.finish(node_ids)
+        return result.rowcount or 0
+
+    @contextmanager
+    def heartbeat(self, session_factory, interval: float | None = None):
+        """Keep every in-flight lease alive while the block runs.
+
+        Batches are in flight from ``claim`` until ``finish`` or ``release``,
+        including while they wait in pipeline queues or are being written.
+        """
+        interval = interval if interval is not None else self.lease_seconds / 3
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(interval):
+                node_ids = self.in_flight()
+                if not node_ids:
+                    continue
+                try:
+                    with session_factory() as session:
+                        self.extend_leases(session, node_ids)
+                        session.commit()
+                except SQLAlchemyError as exc:
+                    print(f"[queue] lease heartbeat failed for {self.worker_id}: {exc}", flush=True)
+
+        thread = threading.Thread(target=beat, name=f"lease-heartbeat-{self.worker_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _claim(self, session, limit: int) -> list[dict]:
+        if limit <= 0:
+            return []
+        now = datetime.now(timezone.utc)
+        rows = session.execute(
+            text(CLAIM_SQL),
+            {
+                "limit": limit,
+                "now": now,
+                "worker_id": self.worker_id,
+                "leased_until": self._lease_deadline(now),
+            },
+        ).mappings().fetchall()
+        return [dict(row) for row in rows]
+
+    def _lease_deadline(self, now: datetime | None = None) -> datetime:
+        return (now or datetime.now(timezone.utc)) + timedelta(seconds=self.lease_seconds)
+
+
+def outcome_records(batch: list[dict], enriched: list[dict], success_ids: set[str]) -> list[dict]:
+    """Attempt rows recording success/no_match for a fetched batch."""
+    now = datetime.now(timezone.utc)
+    enriched_by_node_id = {row.get("node_id"): row for row in enriched if row.get("node_id")}
+    records = []
+    for original in batch:
+        node_id = original["node_id"]
+        result = enriched_by_node_id.get(node_id)
+        status = "success" if node_id in success_ids else "no_match"
+        records.append({
+            "node_id": node_id,
+            "ott_id": original["ott_id"],
+            "name": original["name"],
+            "status": status,
+            "attempt_count": 1,
+            "last_attempted_at": now,
+            "last_success_at": now if status == "success" else None,
+            "last_provider": result.get("source_label") if result else "Wikidata",
+            "last_match_method": result.get("source_match_method") if result else None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+            "next_retry_at": None if status == "success" else now + timedelta(days=DEFAULT_RETRY_DAYS),
+        })
+    return records
+
+
+def error_records(batch: Iterable[dict], error: Exception) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    message = str(error)[:1000]
+    return [
+        {
+            "node_id": row["node_id"],
+            "ott_id": row["ott_id"],
+            "name": row["name"],
+            "status": "error",
+            "attempt_count": 1,
+            "last_attempted_at": now,
+            "last_success_at": None,
+            "last_provider": "Wikidata",
+            "last_match_method": None,
+            "last_error": message,
+            "created_at": now,
+            "updated_at": now,
+            "next_retry_at": now + timedelta(days=ERROR_RETRY_DAYS),
+        }
+        for row in batch
+    ]
+
+
+def upsert_attempts(session, records: list[dict], worker_id: str | None = None) -> int:
+    """Record attempt outcomes and clear any lease held on those rows.
+
+    With ``worker_id``, existing rows are only updated while that worker
+    still holds their lease: a worker whose lease expired and was claimed
+    again must not overwrite the new owner's outcome. Returns the number of
+    rows written.
+    """
+    if not records:
+        return 0
+    attempts = metadata_enrichment_attempts.c
+    insert_stmt = pg_insert(metadata_enrichment_attempts).values(records)
+    result = session.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["node_id"],
+            set_={
+                "ott_id": insert_stmt.excluded.ott_id,
+                "name": insert_stmt.excluded.name,
+                "status": insert_stmt.excluded.status,
+                "attempt_count": attempts.attempt_count + 1,
+                "last_attempted_at": insert_stmt.excluded.last_attempted_at,
+                "last_success_at": insert_stmt.excluded.last_success_at,
+                "last_provider": insert_stmt.excluded.last_provider,
+                "last_match_method": insert_stmt.excluded.last_match_method,
+                "last_error": insert_stmt.excluded.last_error,
+                "updated_at": insert_stmt.excluded.updated_at,
+                "next_retry_at": insert_stmt.excluded.next_retry_at,
+                "leased_until": None,
+                "worker_id": None,
+            },
+            where=attempts.worker_id == worker_id if worker_id is not None else None,
+        )
+    )
+    return result.rowcount
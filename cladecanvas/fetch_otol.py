@@ -1,135 +1,427 @@
 import os
 import csv
+import itertools
+import json
+import random
 import re
-import sys
+import shutil
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
 import requests
 
+try:
+    import ijson
+except ImportError:  # optional: without it responses are decoded whole
+    ijson = None
+
+from cladecanvas.http_client import (
+    HTTP_BACKOFF_CAP_SECONDS,
+    HTTP_BACKOFF_SECONDS,
+    HTTP_MAX_RETRIES,
+    RETRY_STATUSES,
+    bucket_for,
+    retry_after_seconds,
+)
+
 TAXON = 'Metazoa'
 OTT_ID = 691846
 API_URL = 'https://api.opentreeoflife.org/v3/tree_of_life'
 DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
 CSV_PATH = os.path.join(DATA_DIR, f'{TAXON.lower()}_nodes_synth.csv')
+CSV_FIELDS = ['node_id', 'ott_id', 'name', 'parent_node_id', 'num_tips']
 
 MRCA_RE = re.compile(r'^mrcaott\d+ott\d+$', re.IGNORECASE)
 ARGUSON_DEPTH = 20  # levels per API call
+# Subtree requests in flight; the api.opentreeoflife.org token bucket in
+# http_client still caps the request rate.
+ARGUSON_CONCURRENCY = int(os.environ.get('CLADECANVAS_ARGUSON_CONCURRENCY', '4'))
+# Fetched subtrees between checkpoint saves; a crash refetches at most these.
+CHECKPOINT_EVERY = 25
 
-# Increase recursion limit for deep arguson trees
-sys.setrecursionlimit(10000)
 
+def _post_subtree(node_id: str, read, height_limit: int = ARGUSON_DEPTH, stream: bool = False):
+    """POST a subtree request and return ``read(response)``.
 
-def _arguson_subtree(node_id: str, height_limit: int = ARGUSON_DEPTH) -> dict | None:
-    """Fetch arguson tree structure for a node."""
+    Rate-limited by the shared OpenTree token bucket and retried on 429/5xx,
+    connection errors and truncated bodies; returns None once retries are
+    exhausted.
+    """
     payload = {'height_limit': height_limit, 'format': 'arguson'}
     if node_id.startswith('ott') and not node_id.startswith('mrcaott'):
         payload['ott_id'] = int(node_id[3:])
     else:
         payload['node_id'] = node_id
-    try:
-        resp = requests.post(f'{API_URL}/subtree', json=payload, timeout=300)
-        if resp.ok:
-            return resp.json().get('arguson')
-    except Exception as e:
-        print(f'  Error fetching {node_id}: {e}')
+    retryable_errors = (requests.RequestException,) + ((ijson.JSONError,) if ijson else ())
+    bucket = bucket_for(urlsplit(API_URL).hostname)
+    error = None
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        if bucket is not None:
+            time.sleep(bucket.reserve())
+        delay = random.uniform(0, min(HTTP_BACKOFF_CAP_SECONDS, HTTP_BACKOFF_SECONDS * 2 ** attempt))
+        try:
+            with requests.post(f'{API_URL}/subtree', json=payload, timeout=300, stream=stream) as resp:
+                if resp.ok:
+                    return read(resp)
+                error = f'HTTP {resp.status_code}'
+                if resp.status_code not in RETRY_STATUSES:
+                    break
+                retry_after = retry_after_seconds(resp)
+                if retry_after is not None:
+                    delay = retry_after
+                    if resp.status_code == 429 and bucket is not None:
+                        bucket.pause(delay)
+        except retryable_errors as e:
+            error = e
+        if attempt < HTTP_MAX_RETRIES:
+            time.sleep(delay)
+    print(f'  Error fetching {node_id}: {error}')
     return None
 
 
+def _arguson_subtree(node_id: str, height_limit: int = ARGUSON_DEPTH) -> dict | None:
+    """Fetch arguson tree structure for a node."""
+    return _post_subtree(node_id, lambda resp: resp.json().get('arguson'), height_limit)
+
+
+def _arguson_subtree_rows(node_id: str) -> tuple[list, list] | None:
+    """Fetch a subtree and parse it while the response streams in (ijson)."""
+    def read(resp):
+        resp.raw.decode_content = True
+        rows, frontier = [], []
+        _parse_arguson_events(ijson.basic_parse(resp.raw), None, rows, set(), frontier)
+        return rows, frontier
+
+    return _post_subtree(node_id, read, stream=True)
+
+
+def _decoded_subtree_rows(node_id: str) -> tuple[list, list] | None:
+    arguson = _arguson_subtree(node_id)
+    if not arguson:
+        return None
+    rows, frontier = [], []
+    _parse_arguson(arguson, None, rows, set(), frontier)
+    return rows, frontier
+
+
+def _node_row(nid: str, parent_node_id, taxon: dict, num_tips, descendant_names) -> dict:
+    if taxon:
+        name = taxon.get('name', nid)
+    else:
+        # Synthetic MRCA node — use descendant_name_list for a readable label
+        name = ' + '.join(descendant_names[:2]) if descendant_names else nid
+    return {
+        'node_id': nid,
+        'ott_id': taxon.get('ott_id'),
+        'name': name,
+        'parent_node_id': parent_node_id,
+        'num_tips': num_tips,
+    }
+
+
 def _parse_arguson(node: dict, parent_node_id: str | None,
                    rows: list, seen: set, frontier: list):
-    """Recursively parse an arguson node tree into flat rows.
+    """Parse an arguson node tree into flat rows, depth-first in document order.
 
-    Nodes that are truncated (have num_tips > 1 but no children in response)
-    are added to frontier for the next wave.
+    Uses an explicit stack, so tree depth is not bounded by Python's
+    recursion limit. Nodes that are truncated (have num_tips > 1 but no
+    children in response) are added to frontier for the next wave.
     """
-    nid = node.get('node_id', '')
-    if not nid:
-        return
-
-    # Record this node if not seen
-    is_new = nid not in seen
-    if is_new:
-        seen.add(nid)
-        taxon = node.get('taxon', {})
-        ott_id = taxon.get('ott_id')
-        num_tips = node.get('num_tips')
-
-        if taxon:
-            name = taxon.get('name', nid)
-        else:
-            # Synthetic MRCA node — use descendant_name_list for a readable label
-            desc = node.get('descendant_name_list', [])
-            name = ' + '.join(desc[:2]) if desc else nid
-
-        rows.append({
-            'node_id': nid,
-            'ott_id': ott_id,
-            'name': name,
-            'parent_node_id': parent_node_id,
-            'num_tips': num_tips,
-        })
-
-    # Process children if present in response
-    children = node.get('children')
-    if children is not None:
-        for child in children:
-            _parse_arguson(child, nid, rows, seen, frontier)
-    else:
-        # No children in response — check if truncated (has sub-tree we haven't explored)
-        num_tips = node.get('num_tips', 0)
-        if num_tips > 1:
+    stack = [(node, parent_node_id)]
+    while stack:
+        node, parent_node_id = stack.pop()
+        nid = node.get('node_id', '')
+        if not nid:
+            continue
+
+        # Record this node if not seen
+        if nid not in seen:
+            seen.add(nid)
+            rows.append(_node_row(
+                nid, parent_node_id, node.get('taxon') or {},
+                node.get('num_tips'), node.get('descendant_name_list') or [],
+            ))
+
+        # Process children if present in response
+        children = node.get('children')
+        if children is not None:
+            stack.extend((child, nid) for child in reversed(children))
+        elif (node.get('num_tips') or 0) > 1:
+            # No children in response but more than one tip: truncated
             frontier.append(nid)
 
 
-def download_synth_arguson():
-    """Download the Metazoa synthesis tree using arguson format for efficiency."""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    rows = []
-    seen = set()
+class _StreamNode:
+    __slots__ = ('parent', 'node_id', 'taxon', 'num_tips', 'names', 'has_children', 'orphans')
 
-    root_id = f'ott{OTT_ID}'
-    frontier = [root_id]
-    wave = 0
-
-    while frontier:
-        wave += 1
-        current_batch = frontier
-        frontier = []
-        print(f'\n=== Wave {wave}: {len(current_batch)} nodes to expand ===')
-
-        for i, nid in enumerate(current_batch):
-            print(f'  [{i+1}/{len(current_batch)}] Fetching {nid}...')
-            arguson = _arguson_subtree(nid)
-            if arguson:
-                n_before = len(rows)
-                # For the root of each fetch, use the parent we already recorded
-                # (except for the very first fetch where parent is None)
-                existing_parent = None
-                for r in rows:
-                    if r['node_id'] == nid:
-                        existing_parent = r['parent_node_id']
-                        break
-                _parse_arguson(arguson, existing_parent, rows, seen, frontier)
-                print(f'    +{len(rows) - n_before} nodes (total: {len(rows):,})')
+    def __init__(self, parent):
+        self.parent = parent
+        self.node_id = ''
+        self.taxon = {}
+        self.num_tips = None
+        self.names = []
+        self.has_children = False
+        # Children finished before this node's node_id key was read.
+        self.orphans = []
+
+
+def _parse_arguson_events(events, parent_node_id: str | None,
+                          rows: list, seen: set, frontier: list):
+    """Parse the ``arguson`` member of a subtree response from ijson events.
+
+    Consumes ``ijson.basic_parse`` events with an explicit container stack,
+    so no nested dicts are built and depth is unbounded. A node's row is
+    emitted when its map closes (children first); a child finished before
+    its parent's ``node_id`` arrived waits on the parent until it does.
+    """
+    root = _StreamNode(None)
+    stack = []  # [kind, node, current_key]
+
+    def finish(node: _StreamNode, nid: str, parent_id):
+        row = _node_row(nid, parent_id, node.taxon, node.num_tips, node.names)
+        truncated = not node.has_children and (node.num_tips or 0) > 1
+        if nid not in seen:
+            seen.add(nid)
+            rows.append(row)
+        if truncated:
+            frontier.append(nid)
+
+    def close_node(node: _StreamNode):
+        if not node.node_id:
+            return
+        for orphan, orphan_id in node.orphans:
+            finish(orphan, orphan_id, node.node_id)
+        parent = node.parent
+        if parent is root:
+            finish(node, node.node_id, parent_node_id)
+        elif parent.node_id:
+            finish(node, node.node_id, parent.node_id)
+        else:
+            parent.orphans.append((node, node.node_id))
+
+    for event, value in events:
+        top = stack[-1] if stack else None
+        kind, key = (top[0], top[2]) if top else (None, None)
+        if event == 'map_key':
+            top[2] = value
+        elif event == 'start_map':
+            if top is None:
+                stack.append(['response', None, None])
+            elif (kind == 'response' and key == 'arguson') or kind == 'children':
+                parent = top[1] if kind == 'children' else root
+                stack.append(['node', _StreamNode(parent), None])
+            elif kind == 'node' and key == 'taxon':
+                stack.append(['taxon', top[1], None])
             else:
-                print(f'    WARNING: no data for {nid}')
-            time.sleep(0.3)
+                stack.append(['skip', None, None])
+        elif event == 'start_array':
+            if kind == 'node' and key == 'children':
+                top[1].has_children = True
+                stack.append(['children', top[1], None])
+            elif kind == 'node' and key == 'descendant_name_list':
+                stack.append(['names', top[1], None])
+            else:
+                stack.append(['skip', None, None])
+        elif event in ('end_map', 'end_array'):
+            kind, node, _ = stack.pop()
+            if kind == 'node':
+                close_node(node)
+        elif kind == 'node':
+            if key == 'node_id':
+                top[1].node_id = value or ''
+            elif key == 'num_tips':
+                top[1].num_tips = int(value) if value is not None else None
+        elif kind == 'taxon' and key in ('ott_id', 'name'):
+            top[1].taxon[key] = int(value) if key == 'ott_id' and value is not None else value
+        elif kind == 'names':
+            top[1].names.append(value)
+
+
+def _fetch_concurrently(fetch, node_ids: list, concurrency: int):
+    """Yield (node_id, fetch(node_id)) as fetches finish, with bounded work in flight."""
+    pending = iter(node_ids)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {
+            pool.submit(fetch, nid): nid
+            for nid in itertools.islice(pending, concurrency * 2)
+        }
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                nid = in_flight.pop(future)
+                next_id = next(pending, None)
+                if next_id is not None:
+                    in_flight[pool.submit(fetch, next_id)] = next_id
+                yield nid, future.result()
+
+
+class _Checkpoint:
+    """Rows and frontier of an in-progress download, kept next to the CSV.
+
+    ``rows.csv`` is appended as subtrees are parsed and ``state.json`` records
+    the wave, the nodes still to fetch in it, the next frontier and the size
+    of ``rows.csv`` when it was saved. Saving flushes rows before replacing
+    the state, and resuming truncates ``rows.csv`` back to the saved size, so
+    rows appended after the last save (possibly ending in a half-written
+    line) are dropped and their subtrees fetched again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.rows_path = os.path.join(directory, 'rows.csv')
+        self.state_path = os.path.join(directory, 'state.json')
+        self._rows_file = None
+        self.writer = None
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def load(self, root_id: str):
+        """Return (state, seen, parents, n_synth), resuming if possible."""
+        state = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            # Checkpoints without a saved rows.csv size cannot be trusted.
+            if state.get('root') != root_id or 'rows_bytes' not in state:
+                state = None
+        if state is None:
+            self.clear()
+            os.makedirs(self.directory, exist_ok=True)
+            state = {'root': root_id, 'wave': 1, 'pending': [root_id], 'next_frontier': [], 'failed': []}
+            self._open_rows(write_header=True)
+            return state, set(), {}, 0
+
+        with open(self.rows_path, 'r+b') as f:
+            f.truncate(state.pop('rows_bytes'))
+        wanted = set(state['pending']) | set(state['next_frontier'])
+        seen, parents = set(), {}
+        n_synth = 0
+        with open(self.rows_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                seen.add(row['node_id'])
+                n_synth += not row['ott_id']
+                if row['node_id'] in wanted:
+                    parents[row['node_id']] = row['parent_node_id'] or None
+        self._open_rows(write_header=False)
+        print(f'Resuming wave {state["wave"]}: {len(seen):,} nodes recorded, '
+              f'{len(state["pending"]):,} still to fetch')
+        return state, seen, parents, n_synth
 
-        n_synth = sum(1 for r in rows if r['ott_id'] is None)
-        print(f'  Wave {wave} done. {len(rows):,} nodes ({n_synth:,} synthetic). '
-              f'Next frontier: {len(frontier)}')
+    def _open_rows(self, write_header: bool):
+        self._rows_file = open(self.rows_path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self._rows_file, fieldnames=CSV_FIELDS)
+        if write_header:
+            self.writer.writeheader()
 
-    # Write CSV
-    with open(CSV_PATH, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['node_id', 'ott_id', 'name', 'parent_node_id', 'num_tips'])
-        writer.writeheader()
-        writer.writerows(rows)
-    n_synth = sum(1 for r in rows if r['ott_id'] is None)
-    print(f'\nCSV saved to {CSV_PATH}  ({len(rows):,} nodes, {n_synth:,} synthetic)')
+    def save(self, state: dict):
+        self._rows_file.flush()
+        os.fsync(self._rows_file.fileno())
+        rows_bytes = os.fstat(self._rows_file.fileno()).st_size
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**state, 'rows_bytes': rows_bytes}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def close(self):
+        if self._rows_file is not None:
+            self._rows_file.close()
+            self._rows_file = None
+
+    def finish(self, csv_path: str):
+        self.close()
+        os.replace(self.rows_path, csv_path)
+        self.clear()
+
+
+def download_synth_arguson(concurrency: int = ARGUSON_CONCURRENCY, fresh: bool = False,
+                           stream: bool = False):
+    """Download the Metazoa synthesis tree using arguson format for efficiency.
+
+    Subtrees are fetched concurrently and the download checkpoints to
+    ``<CSV_PATH>.checkpoint/``, so rerunning after a crash resumes mid-wave.
+    With ``stream`` (requires ijson) responses are parsed as they arrive
+    instead of being decoded into nested dicts first.
+    """
+    if stream and ijson is None:
+        raise RuntimeError('stream=True requires the optional ijson package')
+    fetch = _arguson_subtree_rows if stream else _decoded_subtree_rows
+    os.makedirs(DATA_DIR, exist_ok=True)
+    checkpoint = _Checkpoint(f'{CSV_PATH}.checkpoint')
+    if fresh:
+        checkpoint.clear()
+    root_id = f'ott{OTT_ID}'
+    state, seen, parents, n_synth = checkpoint.load(root_id)
+
+    try:
+        while state['pending'] or state['next_frontier']:
+            if not state['pending']:
+                state['wave'] += 1
+                state['pending'], state['next_frontier'] = state['next_frontier'], []
+            wave = state['wave']
+            pending = state['pending']
+            remaining = set(pending)
+            queued = set(state['next_frontier'])
+            print(f'\n=== Wave {wave}: {len(pending)} nodes to expand ===')
+
+            for i, (nid, parsed) in enumerate(_fetch_concurrently(fetch, pending, concurrency)):
+                remaining.discard(nid)
+                if parsed is not None:
+                    fetched_rows, frontier = parsed
+                    # The root of each fetch keeps the parent recorded when it
+                    # was first seen (None for the very first fetch).
+                    root_parent = parents.pop(nid, None)
+                    rows = []
+                    for row in fetched_rows:
+                        if row['node_id'] not in seen:
+                            seen.add(row['node_id'])
+                            if row['node_id'] == nid:
+                                row['parent_node_id'] = root_parent
+                            rows.append(row)
+                    checkpoint.writer.writerows(rows)
+                    n_synth += sum(1 for r in rows if r['ott_id'] is None)
+                    parent_of = {r['node_id']: r['parent_node_id'] for r in rows}
+                    for child in frontier:
+                        if child not in queued:
+                            queued.add(child)
+                            state['next_frontier'].append(child)
+                            parents.setdefault(child, parent_of.get(child))
+                    print(f'  [{i+1}/{len(pending)}] {nid}: +{len(rows)} nodes (total: {len(seen):,})')
+                else:
+                    state['failed'].append(nid)
+                    print(f'  [{i+1}/{len(pending)}] WARNING: no data for {nid}')
+                if (i + 1) % CHECKPOINT_EVERY == 0:
+                    state['pending'] = [n for n in pending if n in remaining]
+                    checkpoint.save(state)
+
+            state['pending'] = []
+            checkpoint.save(state)
+            print(f'  Wave {wave} done. {len(seen):,} nodes ({n_synth:,} synthetic). '
+                  f'Next frontier: {len(state["next_frontier"])}')
+    finally:
+        checkpoint.close()
+
+    checkpoint.finish(CSV_PATH)
+    if state['failed']:
+        print(f'WARNING: {len(state["failed"])} subtrees could not be fetched: {state["failed"][:20]}')
+    print(f'\nCSV saved to {CSV_PATH}  ({len(seen):,} nodes, {n_synth:,} synthetic)')
 
 
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Download the OToL synthesis subtree via arguson.')
+    parser.add_argument('--concurrency', type=int, default=ARGUSON_CONCURRENCY,
+                        help='Subtree requests in flight (rate limits still apply)')
+    parser.add_argument('--fresh', action='store_true',
+                        help='Discard any checkpoint and start the download over')
+    parser.add_argument('--no-stream', dest='stream', action='store_false', default=ijson is not None,
+                        help='Decode whole responses instead of streaming them through ijson')
+    args = parser.parse_args()
+
     print('Downloading synthesis tree via arguson...')
-    download_synth_arguson()
+    download_synth_arguson(concurrency=args.concurrency, fresh=args.fresh, stream=args.stream)
 
 
 if __name__ == '__main__':
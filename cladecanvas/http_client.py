@@ -0,0 +1,186 @@
+"""Pooled async HTTP client for enrichment and alias discovery.
+
+Every outbound call to Wikidata, Wikipedia and OpenTree goes through
+``AsyncEnrichmentClient``: one keep-alive connection pool per client, a
+semaphore bounding in-flight requests, a token bucket per host, and retries
+with jittered exponential backoff on 429/5xx that honor ``Retry-After``.
+
+Token buckets are process-wide and independent of the event loop, so
+back-to-back ``asyncio.run`` batches still share one request budget per host.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import httpx
+
+
+HTTP_CONCURRENCY = int(os.environ.get("CLADECANVAS_HTTP_CONCURRENCY", "8"))
+HTTP_MAX_RETRIES = int(os.environ.get("CLADECANVAS_HTTP_MAX_RETRIES", "4"))
+HTTP_BACKOFF_SECONDS = 0.5
+HTTP_BACKOFF_CAP_SECONDS = 30.0
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# (requests per second, burst). The SPARQL endpoint is the strictest; the
+# OpenTree limits match the 0.3s sleeps the scripts used to rely on.
+HOST_RATE_LIMITS: dict[str, tuple[float, int]] = {
+    "query.wikidata.org": (1.0, 2),
+    "www.wikidata.org": (5.0, 10),
+    "en.wikipedia.org": (5.0, 10),
+    "api.opentreeoflife.org": (3.0, 6),
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out delays instead of blocking.
+
+    ``reserve`` takes a token immediately (the balance may go negative) and
+    returns how long the caller must wait before using it, so one bucket can
+    serve any number of threads and event loops.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hold every future reservation back by at least ``seconds``."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(host: str) -> TokenBucket | None:
+    limit = HOST_RATE_LIMITS.get(host)
+    if limit is None:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*limit)
+        return bucket
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AsyncEnrichmentClient:
+    """Rate-limited, retrying wrapper around one ``httpx.AsyncClient``."""
+
+    def __init__(
+        self,
+        headers: dict[str, str] | None = None,
+        max_concurrency: int = HTTP_CONCURRENCY,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_seconds: float = HTTP_BACKOFF_SECONDS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.headers = headers
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.transport = transport
+        self.retries = 0
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def __aenter__(self) -> AsyncEnrichmentClient:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            transport=self.transport,
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying 429/5xx and transport errors.
+
+        The final response is returned as-is (callers decide whether a non-2xx
+        status is fatal); the final transport error is re-raised.
+        """
+        bucket = bucket_for(urlsplit(url).hostname or "")
+        attempt = 0
+        while True:
+            if bucket is not None:
+                await asyncio.sleep(bucket.reserve())
+            async with self._semaphore:
+                try:
+                    response = await self._client.request(method, url, **kwargs)
+                except httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        return response
+                    delay = retry_after_seconds(response)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    elif bucket is not None and response.status_code == 429:
+                        bucket.pause(delay)
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get_json(self, url: str, params: dict | None = None, timeout: float = 30):
+        response = await self.request("GET", url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    async def post_json(self, url: str, json: dict, timeout: float = 30):
+        response = await self.request("POST", url, json=json, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _backoff(self, attempt: int) -> float:
+        ceiling = min(HTTP_BACKOFF_CAP_SECONDS, self.backoff_seconds * 2 ** attempt)
+        return random.uniform(0, ceiling)
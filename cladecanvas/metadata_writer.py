@@ -0,0 +1,82 @@
+"""Shared write path for fetch_wikidata results.
+
+populate_db.py, run_workers.py and backfill_metadata.py all store an enriched
+batch the same way: upsert the metadata rows, flag the matching nodes with
+their Wikidata rank and ``has_metadata = 1``, and record search synonyms.
+The node flags are set with one ``UPDATE nodes ... FROM (VALUES ...)`` per
+chunk instead of one UPDATE per row.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import Text, column, func, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from cladecanvas.schema import metadata_table, nodes
+from cladecanvas.synonyms import synonym_records, upsert_synonyms
+
+
+# Two bind parameters per row keeps each statement well under Postgres' limit.
+NODE_UPDATE_CHUNK = 10_000
+
+METADATA_COLUMNS = frozenset(column.name for column in metadata_table.columns)
+
+
+def attach_node_ids(batch: list[dict], enriched: list[dict]) -> None:
+    """Fill in node_id on enriched rows from the batch's ott_id lookup."""
+    node_id_by_ott = {row["ott_id"]: row["node_id"] for row in batch}
+    for row in enriched:
+        if not row.get("node_id"):
+            row["node_id"] = node_id_by_ott.get(row.get("ott_id"))
+
+
+def metadata_records(enriched: list[dict]) -> dict[str, dict]:
+    """Metadata rows keyed by node_id; the last result for a node wins."""
+    return {
+        row["node_id"]: {key: value for key, value in row.items() if key in METADATA_COLUMNS}
+        for row in enriched
+        if row.get("node_id")
+    }
+
+
+def upsert_metadata(session, records: list[dict]) -> int:
+    if not records:
+        return 0
+    insert_stmt = pg_insert(metadata_table).values(records)
+    session.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["node_id"],
+            set_={key: insert_stmt.excluded[key] for key in records[0] if key != "node_id"},
+        )
+    )
+    return len(records)
+
+
+def update_node_flags(session, ranks: dict[str, str | None]) -> int:
+    """Set ``has_metadata = 1`` and the rank (when known) for each node_id."""
+    if not ranks:
+        return 0
+    items = list(ranks.items())
+    updated = 0
+    for start in range(0, len(items), NODE_UPDATE_CHUNK):
+        enriched = values(
+            column("node_id", Text), column("rank", Text), name="enriched"
+        ).data(items[start:start + NODE_UPDATE_CHUNK])
+        result = session.execute(
+            update(nodes)
+            .where(nodes.c.node_id == enriched.c.node_id)
+            .values(rank=func.coalesce(enriched.c.rank, nodes.c.rank), has_metadata=1)
+        )
+        updated += result.rowcount or 0
+    return updated
+
+
+def write_enrichment(session, batch: list[dict], enriched: list[dict]) -> set[str]:
+    """Write one fetched batch and return the node_ids that got metadata."""
+    attach_node_ids(batch, enriched)
+    records = metadata_records(enriched)
+    upsert_metadata(session, list(records.values()))
+    # rank lives on nodes, not metadata, so it comes from the raw results.
+    update_node_flags(session, {row["node_id"]: row.get("rank") for row in enriched if row.get("node_id")})
+    upsert_synonyms(session, synonym_records(enriched))
+    return set(records)
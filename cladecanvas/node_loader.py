@@ -0,0 +1,392 @@
+"""Bulk loader for the synthesis tree CSV written by fetch_otol.py.
+
+``iter_node_chunks`` streams the CSV with the ``csv`` module into bounded
+chunks of typed rows, so memory stays flat regardless of tree size and any
+backend (batched upserts or ``COPY``) can consume it.
+
+``copy_nodes`` streams those chunks into an ``UNLOGGED`` staging table with
+``COPY FROM STDIN`` and merges them into ``nodes`` with a single ``INSERT ...
+SELECT ... ON CONFLICT``, all in one transaction. For full reloads the
+secondary indexes on ``nodes`` can be dropped before the merge and rebuilt
+afterwards, which is much cheaper than maintaining them row by row.
+
+``diff_nodes`` is the incremental alternative for new synthesis releases:
+it stages the CSV the same way, compares a hash of ``(parent_node_id, name,
+num_tips)`` per node against ``nodes`` and applies only the inserts, updates
+and deletes. Every load records a row in ``tree_data_versions``; incremental
+loads also record the touched node ids in ``tree_node_changes`` so caches and
+derived indexes can invalidate precisely.
+
+Postgres only; the API's dev-sqlite seed is read-only anyway.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from sqlalchemy import text
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGING_TABLE = "nodes_staging"
+CSV_COLUMNS = ("node_id", "ott_id", "name", "parent_node_id", "num_tips")
+INT_COLUMNS = frozenset({"ott_id", "num_tips"})
+DEFAULT_CHUNK_ROWS = 10_000
+
+CREATE_STAGING_SQL = f"""
+    CREATE UNLOGGED TABLE IF NOT EXISTS {STAGING_TABLE} (
+        node_id text,
+        ott_id integer,
+        name text,
+        parent_node_id text,
+        num_tips integer
+    )
+"""
+
+COPY_SQL = f"COPY {STAGING_TABLE} ({', '.join(CSV_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Same update set as the row-by-row upsert: ott_id, rank and the enrichment
+# columns are left alone on existing nodes. DISTINCT ON keeps one row per
+# node_id so a duplicated CSV line cannot abort the merge.
+MERGE_SQL = f"""
+    INSERT INTO nodes ({', '.join(CSV_COLUMNS)})
+    SELECT DISTINCT ON (node_id) {', '.join(CSV_COLUMNS)}
+    FROM {STAGING_TABLE}
+    ORDER BY node_id
+    ON CONFLICT (node_id) DO UPDATE
+    SET parent_node_id = EXCLUDED.parent_node_id,
+        name = EXCLUDED.name,
+        num_tips = EXCLUDED.num_tips
+"""
+
+# One row per node_id from staging (a duplicated CSV line keeps its first copy).
+INCOMING_SQL = f"""
+    CREATE TEMP TABLE nodes_incoming ON COMMIT DROP AS
+    SELECT DISTINCT ON (node_id) {', '.join(CSV_COLUMNS)}
+    FROM {STAGING_TABLE}
+    ORDER BY node_id
+"""
+
+# row(...)::text keeps NULL and '' distinct, unlike concat_ws.
+ROW_HASH = "md5(row(parent_node_id, name, num_tips)::text)"
+
+DIFF_SQL = f"""
+    CREATE TEMP TABLE node_diff ON COMMIT DROP AS
+    SELECT COALESCE(s.node_id, n.node_id) AS node_id,
+           CASE
+             WHEN n.node_id IS NULL THEN 'insert'
+             WHEN s.node_id IS NULL THEN 'delete'
+             ELSE 'update'
+           END AS change
+    FROM (SELECT node_id, {ROW_HASH} AS row_hash FROM nodes_incoming) s
+    FULL JOIN (SELECT node_id, {ROW_HASH} AS row_hash FROM nodes) n
+      ON n.node_id = s.node_id
+    WHERE s.node_id IS NULL OR n.node_id IS NULL OR s.row_hash <> n.row_hash
+"""
+
+DIFF_COUNTS_SQL = """
+    SELECT
+      (SELECT count(*) FROM nodes_incoming) AS incoming,
+      (SELECT count(*) FROM nodes) AS existing,
+      count(*) FILTER (WHERE change = 'insert') AS inserted,
+      count(*) FILTER (WHERE change = 'update') AS updated,
+      count(*) FILTER (WHERE change = 'delete') AS deleted
+    FROM node_diff
+"""
+
+DIFF_SAMPLE_SQL = """
+    SELECT change, node_id
+    FROM (
+      SELECT change, node_id, row_number() OVER (PARTITION BY change ORDER BY node_id) AS rn
+      FROM node_diff
+    ) ranked
+    WHERE rn <= :sample_size
+    ORDER BY change, node_id
+"""
+
+DELETED_IDS = "(SELECT node_id FROM node_diff WHERE change = 'delete')"
+
+# Rows referencing removed nodes go first; their metadata describes a taxon
+# that is no longer in the tree.
+APPLY_DIFF_SQL = (
+    f"DELETE FROM metadata WHERE node_id IN {DELETED_IDS}",
+    f"DELETE FROM metadata_enrichment_attempts WHERE node_id IN {DELETED_IDS}",
+    f"DELETE FROM node_aliases WHERE alias_node_id IN {DELETED_IDS} OR canonical_node_id IN {DELETED_IDS}",
+    f"DELETE FROM nodes WHERE node_id IN {DELETED_IDS}",
+    """
+    UPDATE nodes n
+    SET parent_node_id = s.parent_node_id, name = s.name, num_tips = s.num_tips
+    FROM node_diff d
+    JOIN nodes_incoming s ON s.node_id = d.node_id
+    WHERE d.change = 'update' AND n.node_id = d.node_id
+    """,
+    f"""
+    INSERT INTO nodes ({', '.join(CSV_COLUMNS)})
+    SELECT {', '.join('s.' + column for column in CSV_COLUMNS)}
+    FROM nodes_incoming s
+    JOIN node_diff d ON d.node_id = s.node_id
+    WHERE d.change = 'insert'
+    """,
+)
+
+RECORD_VERSION_SQL = """
+    INSERT INTO tree_data_versions (source, inserted, updated, deleted, unchanged, created_at)
+    VALUES (:source, :inserted, :updated, :deleted, :unchanged, :created_at)
+    RETURNING version
+"""
+
+RECORD_CHANGES_SQL = """
+    INSERT INTO tree_node_changes (version, node_id, change)
+    SELECT :version, node_id, change FROM node_diff
+"""
+
+# Refuse diffs that would delete more than this share of the tree unless the
+# caller raises it; a truncated download would otherwise wipe most metadata.
+DEFAULT_MAX_DELETE_FRACTION = 0.05
+
+# Secondary indexes only; the primary key backs ON CONFLICT.
+SECONDARY_INDEXES_SQL = """
+    SELECT indexname, indexdef
+    FROM pg_indexes
+    WHERE schemaname = current_schema()
+      AND tablename = 'nodes'
+      AND indexname NOT IN (
+        SELECT conname FROM pg_constraint WHERE conrelid = 'nodes'::regclass
+      )
+    ORDER BY indexname
+"""
+
+
+@dataclass
+class LoadReport:
+    rows_copied: int
+    rows_merged: int
+    seconds: float
+    peak_rss_mb: float | None
+    rebuilt_indexes: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_copied / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        peak = f"{self.peak_rss_mb:,.1f} MB" if self.peak_rss_mb is not None else "n/a"
+        return (
+            f"Loaded {self.rows_copied:,} rows ({self.rows_merged:,} merged) in {self.seconds:.1f}s "
+            f"({self.rows_per_second:,.0f} rows/s, peak RSS {peak}, "
+            f"{self.rebuilt_indexes} indexes rebuilt)"
+        )
+
+
+@dataclass
+class TreeDiffReport:
+    incoming: int
+    existing: int
+    inserted: int
+    updated: int
+    deleted: int
+    applied: bool
+    version: int | None = None
+    seconds: float = 0.0
+    samples: dict[str, list[str]] = field(default_factory=dict)
+
+    @property
+    def unchanged(self) -> int:
+        return self.incoming - self.inserted - self.updated
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "unchanged": self.unchanged}
+
+    def summary(self) -> str:
+        outcome = f"applied as tree version {self.version}" if self.applied else "not applied"
+        return (
+            f"Tree diff: +{self.inserted:,} inserted, ~{self.updated:,} updated, "
+            f"-{self.deleted:,} deleted, {self.unchanged:,} unchanged "
+            f"({self.seconds:.1f}s, {outcome})"
+        )
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _nullable_int(value: str) -> int | None:
+    value = value.strip()
+    if not value:
+        return None
+    # pandas-written CSVs can carry float-formatted integers ("12.0").
+    return int(float(value)) if "." in value else int(value)
+
+
+def iter_node_chunks(csv_path: Path, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[list[dict]]:
+    """Yield the CSV as lists of at most ``chunk_rows`` typed node rows.
+
+    Empty cells become ``None``; ``ott_id`` and ``num_tips`` are ints.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as source:
+        chunk = []
+        for raw in csv.DictReader(source):
+            row = {}
+            for column in CSV_COLUMNS:
+                value = raw.get(column) or ""
+                if column in INT_COLUMNS:
+                    row[column] = _nullable_int(value)
+                else:
+                    row[column] = value or None
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _copy_chunk(cursor, chunk: list[dict]) -> int:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in chunk:
+        # Unquoted empty fields are NULL in COPY's csv format.
+        writer.writerow(["" if row[column] is None else row[column] for column in CSV_COLUMNS])
+    buffer.seek(0)
+    cursor.copy_expert(COPY_SQL, buffer)
+    return cursor.rowcount
+
+
+def _stage_chunks(conn, chunks: Iterable[list[dict]]) -> int:
+    conn.execute(text(CREATE_STAGING_SQL))
+    conn.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+    rows_copied = 0
+    cursor = conn.connection.cursor()
+    try:
+        for chunk in chunks:
+            rows_copied += _copy_chunk(cursor, chunk)
+    finally:
+        cursor.close()
+    return rows_copied
+
+
+def _record_version(conn, source: str, counts: dict) -> int:
+    return conn.execute(
+        text(RECORD_VERSION_SQL),
+        {
+            "source": source,
+            "inserted": counts.get("inserted"),
+            "updated": counts.get("updated"),
+            "deleted": counts.get("deleted"),
+            "unchanged": counts.get("unchanged"),
+            "created_at": datetime.now(timezone.utc),
+        },
+    ).scalar_one()
+
+
+def copy_nodes(engine, chunks: Iterable[list[dict]], rebuild_indexes: bool = False) -> LoadReport:
+    """COPY node chunks into staging and merge them into ``nodes``."""
+    started = time.perf_counter()
+    rebuilt = 0
+    with engine.begin() as conn:
+        rows_copied = _stage_chunks(conn, chunks)
+
+        index_definitions = []
+        if rebuild_indexes:
+            index_definitions = conn.execute(text(SECONDARY_INDEXES_SQL)).fetchall()
+            for index_name, _ in index_definitions:
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index_name}"')
+
+        rows_merged = conn.execute(text(MERGE_SQL)).rowcount
+
+        for _, index_definition in index_definitions:
+            # Raw driver SQL: definitions can contain casts and LIKE patterns.
+            conn.exec_driver_sql(index_definition)
+            rebuilt += 1
+        conn.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        conn.execute(text("ANALYZE nodes"))
+        # A full load does not track which nodes changed: NULL counts tell
+        # consumers to invalidate everything.
+        _record_version(conn, "full_load", {})
+
+    return LoadReport(
+        rows_copied=rows_copied,
+        rows_merged=rows_merged,
+        seconds=time.perf_counter() - started,
+        peak_rss_mb=peak_rss_mb(),
+        rebuilt_indexes=rebuilt,
+    )
+
+
+def copy_nodes_from_csv(
+    engine,
+    csv_path: Path,
+    rebuild_indexes: bool = False,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> LoadReport:
+    return copy_nodes(engine, iter_node_chunks(csv_path, chunk_rows), rebuild_indexes)
+
+
+def diff_nodes(
+    engine,
+    chunks: Iterable[list[dict]],
+    apply: bool = True,
+    source: str = "diff",
+    max_delete_fraction: float = DEFAULT_MAX_DELETE_FRACTION,
+    sample_size: int = 20,
+) -> TreeDiffReport:
+    """Diff node chunks against ``nodes`` and apply only what changed.
+
+    With ``apply=False`` the diff is computed and reported, then rolled back.
+    Raises ``RuntimeError`` (and rolls back) if the diff would delete more
+    than ``max_delete_fraction`` of the existing nodes.
+    """
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            _stage_chunks(conn, chunks)
+            conn.execute(text(INCOMING_SQL))
+            conn.execute(text(DIFF_SQL))
+            counts = dict(conn.execute(text(DIFF_COUNTS_SQL)).mappings().one())
+            samples: dict[str, list[str]] = {}
+            for change, node_id in conn.execute(text(DIFF_SAMPLE_SQL), {"sample_size": sample_size}):
+                samples.setdefault(change, []).append(node_id)
+            report = TreeDiffReport(**counts, applied=False, samples=samples)
+
+            if counts["existing"] and counts["deleted"] > counts["existing"] * max_delete_fraction:
+                raise RuntimeError(
+                    f"tree diff would delete {counts['deleted']:,} of {counts['existing']:,} nodes "
+                    f"(more than {max_delete_fraction:.0%}); refusing. Check the CSV is complete "
+                    "or raise the delete limit."
+                )
+
+            if apply:
+                for statement in APPLY_DIFF_SQL:
+                    conn.execute(text(statement))
+                report.version = _record_version(
+                    conn, source, {**counts, "unchanged": report.unchanged}
+                )
+                conn.execute(text(RECORD_CHANGES_SQL), {"version": report.version})
+                conn.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+                transaction.commit()
+                report.applied = True
+            else:
+                transaction.rollback()
+        except Exception:
+            transaction.rollback()
+            raise
+
+    report.seconds = time.perf_counter() - started
+    return report
@@ -2,17 +2,24 @@
 
 from __future__ import annotations
 
+import atexit
 import contextvars
 import json
 import logging
+import os
+import queue
+import random
+import threading
 import time
-import uuid
-from collections import defaultdict, deque
+from bisect import bisect_left
+from collections import deque
 from dataclasses import asdict, dataclass
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
 from typing import Any
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger("cladecanvas.observability")
 
@@ -20,6 +27,62 @@ REQUEST_ID_HEADER = "X-Request-ID"
 request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar(
     "request_id", default=None
 )
+SERVER_TIMING_HEADER = "Server-Timing"
+# Requests issuing more queries than this log an http_request_query_budget warning.
+REQUEST_QUERY_WARN_THRESHOLD = int(os.environ.get("CLADECANVAS_REQUEST_QUERY_WARN_THRESHOLD", "25"))
+
+
+class RequestStats:
+    """Database and cache work attributed to one request.
+
+    The middleware stores one instance in ``request_stats_var``. Sync routes
+    run in threadpool workers that inherit a copy of the context, so they see
+    the same object; the lock covers routes that fan out to several threads.
+    """
+
+    __slots__ = ("queries", "db_ms", "rows", "cache_hits", "cache_misses", "_lock")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_ms = 0.0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, latency_ms: float, rows: int) -> None:
+        with self._lock:
+            self.queries += 1
+            self.db_ms += latency_ms
+            self.rows += max(rows, 0)
+
+    def add_cache_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def as_log_fields(self) -> dict[str, Any]:
+        return {
+            "db_queries": self.queries,
+            "db_ms": round(self.db_ms, 3),
+            "db_rows": self.rows,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+    def server_timing(self, total_ms: float) -> str:
+        return (
+            f'db;dur={self.db_ms:.3f};desc="{self.queries} queries, {self.rows} rows", '
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses", '
+            f"total;dur={total_ms:.3f}"
+        )
+
+
+request_stats_var: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
 
 
 @dataclass(frozen=True)
@@ -31,13 +94,106 @@ class LatencySample:
     tags: dict[str, str]
 
 
+# Upper bounds in milliseconds. Fixed buckets keep recording O(log n) and make
+# histograms from different worker processes mergeable by adding counts.
+LATENCY_BUCKETS_MS: tuple[float, ...] = (
+    0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+)
+PERCENTILES = (0.5, 0.95, 0.99)
+
+METRICS_DIR = os.environ.get("CLADECANVAS_METRICS_DIR", "").strip()
+METRICS_FLUSH_SECONDS = float(os.environ.get("CLADECANVAS_METRICS_FLUSH_SECONDS", "5"))
+PROMETHEUS_ENABLED = os.environ.get("CLADECANVAS_METRICS_PROMETHEUS", "1").strip() != "0"
+
+
+class LatencyHistogram:
+    """Per-bucket (non-cumulative) counts plus count, sum and max for one key."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, quantile: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = LATENCY_BUCKETS_MS[index - 1] if index else 0.0
+                upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+                estimate = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(estimate, self.max_ms)
+            cumulative += bucket_count
+        return self.max_ms
+
+    def rollup(self) -> dict[str, float]:
+        rollup = {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+        }
+        for quantile in PERCENTILES:
+            rollup[f"p{round(quantile * 100)}_ms"] = round(self.percentile(quantile), 3)
+        rollup["max_ms"] = round(self.max_ms, 3)
+        return rollup
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"counts": self.counts, "count": self.count, "total_ms": self.total_ms, "max_ms": self.max_ms}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        if len(data["counts"]) == len(histogram.counts):
+            histogram.counts = list(data["counts"])
+            histogram.count = data["count"]
+            histogram.total_ms = data["total_ms"]
+            histogram.max_ms = data["max_ms"]
+        return histogram
+
+
 class LatencyMetrics:
-    """In-memory latency rollup intended for local debugging and tests."""
+    """Thread-safe latency histograms per ``kind:name`` key.
+
+    Recording happens from the event loop and from threadpool workers, so all
+    state is guarded by one lock. With ``metrics_dir`` set, a daemon thread
+    started by the first ``record()`` writes this process' histograms to
+    ``metrics-<pid>.json`` there every ``flush_seconds``, so recording never
+    pays for serialization or file I/O; ``aggregate()`` merges the files of
+    live processes so any uvicorn worker can answer for the whole server.
+    """
 
-    def __init__(self, max_samples: int = 500) -> None:
+    def __init__(
+        self,
+        max_samples: int = 500,
+        metrics_dir: str | None = None,
+        flush_seconds: float = METRICS_FLUSH_SECONDS,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
         self._samples: deque[LatencySample] = deque(maxlen=max_samples)
-        self._counts: dict[str, int] = defaultdict(int)
-        self._totals_ms: dict[str, float] = defaultdict(float)
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self.metrics_dir = Path(metrics_dir) if metrics_dir else None
+        self.flush_seconds = flush_seconds
+        self._flusher: threading.Thread | None = None
+        self._stop_flusher = threading.Event()
 
     def record(
         self,
@@ -47,47 +203,178 @@ class LatencyMetrics:
         tags: dict[str, str] | None = None,
     ) -> None:
         key = f"{kind}:{name}"
-        self._counts[key] += 1
-        self._totals_ms[key] += latency_ms
-        self._samples.append(
-            LatencySample(
-                kind=kind,
-                name=name,
-                latency_ms=round(latency_ms, 3),
-                request_id=get_request_id(),
-                tags=tags or {},
-            )
+        sample = LatencySample(
+            kind=kind,
+            name=name,
+            latency_ms=round(latency_ms, 3),
+            request_id=get_request_id(),
+            tags=tags or {},
         )
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(latency_ms)
+            self._samples.append(sample)
+            start_flusher = self.metrics_dir is not None and self._flusher is None
+            if start_flusher:
+                self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        if start_flusher:
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def histograms(self) -> dict[str, LatencyHistogram]:
+        """Copies of this process' histograms."""
+        with self._lock:
+            return {key: LatencyHistogram.from_dict(h.to_dict()) for key, h in self._histograms.items()}
+
+    def _flush_loop(self) -> None:
+        while not self._stop_flusher.wait(self.flush_seconds):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the flush thread after a final flush."""
+        self._stop_flusher.set()
+        flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()
+        self.flush()
+
+    def flush(self) -> None:
+        """Write this process' histograms for other workers to aggregate."""
+        if self.metrics_dir is None or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            payload = {key: h.to_dict() for key, h in self.histograms().items()}
+            self.metrics_dir.mkdir(parents=True, exist_ok=True)
+            path = self.metrics_dir / f"metrics-{os.getpid()}.json"
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning("Could not flush metrics to %s: %s", self.metrics_dir, exc)
+        finally:
+            self._flush_lock.release()
+
+    def aggregate(self) -> tuple[dict[str, LatencyHistogram], int]:
+        """Histograms merged across live processes, and how many contributed."""
+        merged = self.histograms()
+        if self.metrics_dir is None:
+            return merged, 1
+        processes = 1
+        own = os.getpid()
+        for path in self.metrics_dir.glob("metrics-*.json"):
+            try:
+                pid = int(path.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if pid == own or not _process_alive(pid):
+                continue
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            processes += 1
+            for key, histogram_data in data.items():
+                merged.setdefault(key, LatencyHistogram()).merge(LatencyHistogram.from_dict(histogram_data))
+        return merged, processes
 
     def snapshot(self) -> dict[str, Any]:
-        rollups = {}
-        for key, count in self._counts.items():
-            total_ms = self._totals_ms[key]
-            rollups[key] = {
-                "count": count,
-                "total_ms": round(total_ms, 3),
-                "avg_ms": round(total_ms / count, 3) if count else 0,
-            }
+        histograms, processes = self.aggregate()
+        with self._lock:
+            recent = [asdict(sample) for sample in list(self._samples)[-25:]]
         return {
-            "rollups": rollups,
-            "recent": [asdict(sample) for sample in list(self._samples)[-25:]],
+            "rollups": {key: histograms[key].rollup() for key in sorted(histograms)},
+            "recent": recent,
+            "processes": processes,
         }
 
+    def prometheus(self) -> str:
+        """Render the aggregated histograms in Prometheus text format (seconds)."""
+        histograms, _ = self.aggregate()
+        lines = [
+            "# HELP cladecanvas_latency_seconds Latency of endpoints, database operations, caches and pipeline stages.",
+            "# TYPE cladecanvas_latency_seconds histogram",
+        ]
+        for key in sorted(histograms):
+            histogram = histograms[key]
+            kind, name = key.split(":", 1)
+            labels = f'kind="{_prometheus_label(kind)}",name="{_prometheus_label(name)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS_MS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'cladecanvas_latency_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'cladecanvas_latency_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"cladecanvas_latency_seconds_sum{{{labels}}} {histogram.total_ms / 1000:.6f}")
+            lines.append(f"cladecanvas_latency_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
     def reset(self) -> None:
-        self._samples.clear()
-        self._counts.clear()
-        self._totals_ms.clear()
+        with self._lock:
+            self._samples.clear()
+            self._histograms.clear()
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
 
+def _prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
 
-metrics = LatencyMetrics()
+
+metrics = LatencyMetrics(metrics_dir=METRICS_DIR or None)
+
+
+class JsonPayload:
+    """Log message that is serialized only when a handler formats it."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: dict[str, Any]) -> None:
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return json.dumps(self.payload, sort_keys=True, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Enqueue records as-is; the listener thread does all formatting.
+
+    ``QueueHandler.prepare`` formats the message in the calling thread, which
+    is the event loop for API requests. Records from ``log_event`` carry a
+    ``JsonPayload`` built from fresh dicts, so handing the record over
+    unformatted is safe. Exception info is still rendered here because
+    tracebacks cannot cross threads lazily.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+_log_listener: QueueListener | None = None
 
 
 def configure_logging() -> None:
+    """Route ``cladecanvas`` logs through a queue to a stderr writer thread."""
+    global _log_listener
     root = logging.getLogger("cladecanvas")
     if not root.handlers:
         handler = logging.StreamHandler()
         handler.setFormatter(logging.Formatter("%(message)s"))
-        root.addHandler(handler)
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _log_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+        root.addHandler(DeferredQueueHandler(log_queue))
     root.setLevel(logging.INFO)
 
 
@@ -96,7 +383,9 @@ def get_request_id() -> str | None:
 
 
 def new_request_id() -> str:
-    return uuid.uuid4().hex
+    # Same 32-hex shape as uuid4().hex; ids only need to be unique, and
+    # uuid4 costs an os.urandom syscall per request.
+    return f"{random.getrandbits(128):032x}"
 
 
 def record_latency(
@@ -108,12 +397,26 @@ def record_latency(
     metrics.record(kind, name, latency_ms, tags)
 
 
+def get_request_stats() -> RequestStats | None:
+    return request_stats_var.get()
+
+
+def record_query(latency_ms: float, rows: int) -> None:
+    """Attribute one executed statement to the current request, if any."""
+    stats = request_stats_var.get()
+    if stats is not None:
+        stats.add_query(latency_ms, rows)
+
+
 def record_cache_latency(
     cache_name: str,
     operation: str,
     latency_ms: float,
     hit: bool,
 ) -> None:
+    stats = request_stats_var.get()
+    if stats is not None:
+        stats.add_cache_lookup(hit)
     record_latency(
         "cache",
         f"{cache_name}.{operation}",
@@ -122,47 +425,79 @@ def record_cache_latency(
     )
 
 
-def log_event(event: str, **fields: Any) -> None:
+def log_event(event: str, _level: int = logging.INFO, **fields: Any) -> None:
     payload = {
         "event": event,
         "request_id": get_request_id(),
         **fields,
     }
-    logger.info(json.dumps(payload, sort_keys=True, default=str))
+    if logger.isEnabledFor(_level):
+        logger.log(_level, JsonPayload(payload))
+
+
+class RequestObservabilityMiddleware:
+    """Pure ASGI middleware: request ids, per-request stats and route latency.
 
+    Unlike ``BaseHTTPMiddleware`` it runs the app in the caller's task, adds
+    no per-request stream plumbing and passes streaming bodies through
+    untouched. Headers are attached to ``http.response.start``, so
+    ``Server-Timing`` reports time to first byte; the logged duration covers
+    the whole response.
+    """
 
-class RequestObservabilityMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER) or new_request_id()
         token = request_id_var.set(request_id)
+        stats = RequestStats()
+        stats_token = request_stats_var.set(stats)
         started = time.perf_counter()
         status_code = 500
-        response = None
+
+        async def send_with_headers(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers[REQUEST_ID_HEADER] = request_id
+                headers[SERVER_TIMING_HEADER] = stats.server_timing((time.perf_counter() - started) * 1000)
+            await send(message)
 
         try:
-            response = await call_next(request)
-            status_code = response.status_code
+            await self.app(scope, receive, send_with_headers)
         finally:
             elapsed_ms = (time.perf_counter() - started) * 1000
-            route = request.scope.get("route")
-            route_name = getattr(route, "path", request.url.path)
+            method = scope["method"]
+            path = scope["path"]
+            route_name = getattr(scope.get("route"), "path", path)
             record_latency(
                 "endpoint",
-                f"{request.method} {route_name}",
+                f"{method} {route_name}",
                 elapsed_ms,
                 {"status_code": str(status_code)},
             )
             log_event(
                 "http_request",
-                method=request.method,
-                path=request.url.path,
+                method=method,
+                path=path,
                 route=route_name,
                 status_code=status_code,
                 duration_ms=round(elapsed_ms, 3),
+                **stats.as_log_fields(),
             )
-
-            if response is not None:
-                response.headers[REQUEST_ID_HEADER] = request_id
+            if stats.queries > REQUEST_QUERY_WARN_THRESHOLD:
+                log_event(
+                    "http_request_query_budget",
+                    logging.WARNING,
+                    route=route_name,
+                    threshold=REQUEST_QUERY_WARN_THRESHOLD,
+                    **stats.as_log_fields(),
+                )
+            request_stats_var.reset(stats_token)
             request_id_var.reset(token)
-
-        return response
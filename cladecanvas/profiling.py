@@ -0,0 +1,276 @@
+"""Opt-in profiling for hot-path investigation in a running API.
+
+Two tools, both disabled unless ``CLADECANVAS_PROFILING_TOKEN`` is set and
+the caller sends it in the ``X-Profile-Token`` header:
+
+- Per-request: ``GET /tree/context/ott123?profile=1`` runs the request under
+  cProfile and returns the pstats report (``text/plain``) instead of the
+  normal body. Sync endpoints run in threadpool workers, so the profiler is
+  carried in a contextvar and enabled around the endpoint call by
+  ``ProfiledRoute``, in whichever thread it runs. From Python 3.12 cProfile
+  is process-wide: it records every thread and only one profiler may be
+  active, so profiled requests are serialized (409 while one is running)
+  and the report includes whatever other requests ran meanwhile.
+- Sampling: ``StackSampler`` snapshots every thread's stack at a fixed
+  interval via ``sys._current_frames()`` and counts collapsed stacks
+  (``root;caller;leaf count``), the input format of flamegraph.pl and
+  speedscope. It can run continuously
+  (``CLADECANVAS_PROFILE_SAMPLER_INTERVAL_MS``) or for a bounded window per
+  ``GET /debug/profile/stacks`` call.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import functools
+import hmac
+import inspect
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable
+from urllib.parse import parse_qs
+
+from fastapi import Header, HTTPException
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cladecanvas.observability import log_event
+
+PROFILING_TOKEN = os.environ.get("CLADECANVAS_PROFILING_TOKEN", "").strip()
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_REPORT_LINES = int(os.environ.get("CLADECANVAS_PROFILE_REPORT_LINES", "60"))
+SAMPLER_INTERVAL_MS = float(os.environ.get("CLADECANVAS_PROFILE_SAMPLER_INTERVAL_MS", "0"))
+MAX_SAMPLE_SECONDS = 60
+MAX_STACK_DEPTH = 128
+
+# Held for the whole of a profiled request; see the module docstring.
+_profile_lock = threading.Lock()
+
+profiler_var: contextvars.ContextVar[cProfile.Profile | None] = contextvars.ContextVar(
+    "profiler", default=None
+)
+
+# Leaf frames of threads that are parked rather than working.
+IDLE_LEAVES = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("_base_events.py", "_run_once"),
+})
+
+
+def profiling_authorized(token: str | None, configured: str | None = None) -> bool:
+    configured = PROFILING_TOKEN if configured is None else configured
+    return bool(configured and token) and hmac.compare_digest(token.encode(), configured.encode())
+
+
+def require_profiling_token(x_profile_token: str | None = Header(default=None)) -> None:
+    """FastAPI dependency guarding the profiling endpoints."""
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling_authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+def _profiled(call: Callable) -> Callable:
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        profiler = profiler_var.get()
+        if profiler is None:
+            return call(*args, **kwargs)
+        profiler.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoint honours a profiler set for the request."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def profile_report(profiler: cProfile.Profile, lines: int = PROFILE_REPORT_LINES) -> str:
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats("cumulative").print_stats(lines)
+    return buffer.getvalue()
+
+
+class ProfileRequestMiddleware:
+    """Answer authorized ``?profile=1`` requests with a cProfile report.
+
+    Mounted inside ``RequestObservabilityMiddleware`` so the request id and
+    stats context already exist. The app's own response is consumed and
+    summarized in the report header.
+    """
+
+    def __init__(self, app: ASGIApp, token: str | None = None) -> None:
+        self.app = app
+        self.token = PROFILING_TOKEN if token is None else token
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not self.token
+            or b"profile=" not in scope.get("query_string", b"")
+            or parse_qs(scope["query_string"].decode("latin-1")).get("profile", [""])[-1] not in {"1", "true"}
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not profiling_authorized(Headers(scope=scope).get(PROFILE_TOKEN_HEADER), self.token):
+            await self.app(scope, receive, send)
+            return
+
+        if not _profile_lock.acquire(blocking=False):
+            await _send_json(send, 409, {"detail": "Another profiled request is running"})
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            _profile_lock.release()
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = cProfile.Profile()
+        token = profiler_var.set(profiler)
+        status_code = 500
+        body_bytes = 0
+        started = time.perf_counter()
+
+        async def capture(message: Message) -> None:
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profiler_var.reset(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        report = (
+            f"{scope['method']} {scope['path']} -> {status_code}, {body_bytes} bytes, "
+            f"{elapsed_ms:.1f} ms wall\n"
+            "Process-wide profile: calls from other requests' threads may be included.\n\n"
+            f"{profile_report(profiler)}"
+        ).encode("utf-8")
+        log_event("request_profiled", path=scope["path"], status_code=status_code, duration_ms=round(elapsed_ms, 3))
+        start: Message = {"type": "http.response.start", "status": 200, "headers": []}
+        headers = MutableHeaders(scope=start)
+        headers["Content-Type"] = "text/plain; charset=utf-8"
+        headers["Content-Length"] = str(len(report))
+        headers["Cache-Control"] = "no-store"
+        await send(start)
+        await send({"type": "http.response.body", "body": report})
+
+
+async def _send_json(send: Send, status_code: int, payload: dict[str, Any]) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    start: Message = {"type": "http.response.start", "status": status_code, "headers": []}
+    headers = MutableHeaders(scope=start)
+    headers["Content-Type"] = "application/json"
+    headers["Content-Length"] = str(len(body))
+    await send(start)
+    await send({"type": "http.response.body", "body": body})
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse_stack(frame, max_depth: int = MAX_STACK_DEPTH) -> str | None:
+    """Root-to-leaf ``file:function`` labels joined by ``;``; None if idle."""
+    leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    if leaf in IDLE_LEAVES:
+        return None
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Aggregate stack samples of all other threads into collapsed stacks."""
+
+    def __init__(self, interval_ms: float = 10.0) -> None:
+        self.interval_ms = interval_ms
+        self.samples = 0
+        self._stacks: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def sample_once(self) -> None:
+        own = threading.get_ident()
+        collapsed = [
+            stack
+            for thread_id, frame in sys._current_frames().items()
+            if thread_id != own and (stack := collapse_stack(frame)) is not None
+        ]
+        with self._lock:
+            self.samples += 1
+            self._stacks.update(collapsed)
+
+    def _run(self) -> None:
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            self.sample_once()
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = 0
+            self._stacks.clear()
+
+
+def sample_for(seconds: float, interval_ms: float) -> StackSampler:
+    """Run a temporary sampler for a bounded window and return it stopped."""
+    sampler = StackSampler(interval_ms)
+    sampler.start()
+    time.sleep(min(max(seconds, 0.0), MAX_SAMPLE_SECONDS))
+    sampler.stop()
+    return sampler
+
+
+continuous_sampler = StackSampler(SAMPLER_INTERVAL_MS) if SAMPLER_INTERVAL_MS > 0 else None
@@ -0,0 +1,273 @@
+"""Per-statement query statistics keyed by normalized SQL fingerprints.
+
+The engine hooks in ``cladecanvas/db.py`` pass every executed statement here.
+Literals, bind parameters, ``IN`` lists and multi-row ``VALUES`` are collapsed
+so ``WHERE node_id IN (%(id_1)s, %(id_2)s)`` and a 40-id variant share one
+fingerprint and one latency histogram. Statements slower than
+``SLOW_QUERY_MS`` are logged as ``slow_query`` events with their bound
+parameters reduced to type names, and on Postgres a sampled fraction of slow
+SELECTs is re-run under ``EXPLAIN (ANALYZE, BUFFERS)`` on a background thread
+so the request that hit the slow path does not wait for the plan.
+
+Statistics are per process; ``GET /metrics/queries`` reports them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable
+
+from cladecanvas.observability import LatencyHistogram, log_event
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("CLADECANVAS_SLOW_QUERY_MS", "500"))
+# Fraction of slow SELECTs to EXPLAIN; 0 disables plan capture.
+EXPLAIN_SAMPLE_RATE = float(os.environ.get("CLADECANVAS_EXPLAIN_SAMPLE_RATE", "0"))
+EXPLAIN_INTERVAL_SECONDS = float(os.environ.get("CLADECANVAS_EXPLAIN_INTERVAL_SECONDS", "300"))
+EXPLAIN_TIMEOUT_MS = int(os.environ.get("CLADECANVAS_EXPLAIN_TIMEOUT_MS", "10000"))
+MAX_QUERY_FINGERPRINTS = int(os.environ.get("CLADECANVAS_MAX_QUERY_FINGERPRINTS", "1000"))
+
+OTHER_FINGERPRINT = "(other)"
+SORT_KEYS = ("total_ms", "p99_ms", "max_ms", "count", "slow")
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_BIND_PARAMS = re.compile(r"%\(\w+\)s|%s|(?<![:\w]):\w+|\$\d+|\?")
+_NUMBERS = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?:e[+-]?\d+)?(?![\w.])", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+_ARRAY_LIST = re.compile(r"\bARRAY\[\?(?:, \?)*\]", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+")
+# Writes, including data-modifying CTEs, and row-locking clauses (FOR [NO KEY] UPDATE, FOR [KEY] SHARE).
+_LOCKING_OR_WRITING = re.compile(r"\b(?:insert|update|delete|merge)\b|\bfor\s+(?:key\s+)?share\b")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so queries differing only in values compare equal."""
+    text = _COMMENTS.sub(" ", statement)
+    text = _STRINGS.sub("?", text)
+    text = _BIND_PARAMS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip().rstrip(";").strip()
+    text = re.sub(r"\( ", "(", re.sub(r" \)", ")", re.sub(r" ?, ?", ", ", text)))
+    text = _IN_LIST.sub("IN (?)", text)
+    text = _ARRAY_LIST.sub("ARRAY[?]", text)
+    return _VALUES_ROWS.sub(r"\1, ...", text)
+
+
+def fingerprint_id(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Keep the shape of bound parameters but none of their values."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} parameter sets>"
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def _explainable(statement: str) -> bool:
+    """SELECTs (and read-only CTEs) that EXPLAIN ANALYZE can re-run without side effects.
+
+    Data-modifying CTEs such as the enrichment queue claim would take row
+    locks even though the EXPLAIN transaction is rolled back.
+    """
+    head = _STRINGS.sub("?", _COMMENTS.sub(" ", statement)).lstrip().lower()
+    return head.startswith(("select", "with")) and not _LOCKING_OR_WRITING.search(head)
+
+
+@dataclass
+class FingerprintStats:
+    statement: str
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    rows: int = 0
+    slow: int = 0
+    plan: dict | None = None
+    last_explained: float = float("-inf")
+
+    def as_dict(self, fingerprint_key: str, include_plan: bool) -> dict[str, Any]:
+        summary = {
+            "fingerprint": fingerprint_key,
+            "statement": self.statement,
+            **self.histogram.rollup(),
+            "rows": self.rows,
+            "slow": self.slow,
+        }
+        if include_plan:
+            summary["plan"] = self.plan
+        return summary
+
+
+Explainer = Callable[[str, Any], Any]
+
+
+class QueryInsights:
+    """Thread-safe per-fingerprint latency histograms, slow log and plans."""
+
+    def __init__(
+        self,
+        slow_ms: float = SLOW_QUERY_MS,
+        explain_sample_rate: float = EXPLAIN_SAMPLE_RATE,
+        explain_interval_seconds: float = EXPLAIN_INTERVAL_SECONDS,
+        max_fingerprints: int = MAX_QUERY_FINGERPRINTS,
+    ) -> None:
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval_seconds = explain_interval_seconds
+        self.max_fingerprints = max_fingerprints
+        self.explainer: Explainer | None = None
+        self._stats: dict[str, FingerprintStats] = {}
+        self._lock = threading.Lock()
+        self._explain_queue: queue.Queue = queue.Queue(maxsize=8)
+        self._explain_thread: threading.Thread | None = None
+
+    def record(
+        self,
+        statement: str,
+        parameters: Any,
+        latency_ms: float,
+        rows: int = 0,
+        executemany: bool = False,
+    ) -> None:
+        if statement.lstrip()[:7].lower() == "explain":
+            return
+        normalized = fingerprint(statement)
+        key = fingerprint_id(normalized)
+        slow = latency_ms >= self.slow_ms
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    key = OTHER_FINGERPRINT
+                    stats = self._stats.setdefault(key, FingerprintStats(statement=OTHER_FINGERPRINT))
+                else:
+                    stats = self._stats[key] = FingerprintStats(statement=normalized)
+            stats.histogram.observe(latency_ms)
+            stats.rows += max(rows, 0)
+            stats.slow += slow
+            explain = slow and self._should_explain(stats, statement)
+        if not slow:
+            return
+        log_event(
+            "slow_query",
+            logging.WARNING,
+            fingerprint=key,
+            statement=normalized,
+            duration_ms=round(latency_ms, 3),
+            rows=rows,
+            executemany=executemany,
+            parameters=redact_parameters(parameters),
+        )
+        if explain:
+            self._submit_explain(key, statement, parameters)
+
+    def _should_explain(self, stats: FingerprintStats, statement: str) -> bool:
+        # Called with the lock held.
+        now = time.monotonic()
+        if (
+            self.explainer is None
+            or not self.explain_sample_rate
+            or now - stats.last_explained < self.explain_interval_seconds
+            or not _explainable(statement)
+            or random.random() >= self.explain_sample_rate
+        ):
+            return False
+        stats.last_explained = now
+        return True
+
+    def _submit_explain(self, key: str, statement: str, parameters: Any) -> None:
+        if self._explain_thread is None:
+            with self._lock:
+                if self._explain_thread is None:
+                    self._explain_thread = threading.Thread(
+                        target=self._explain_worker, name="query-explain", daemon=True
+                    )
+                    self._explain_thread.start()
+        try:
+            self._explain_queue.put_nowait((key, statement, parameters))
+        except queue.Full:
+            pass
+
+    def _explain_worker(self) -> None:
+        while True:
+            key, statement, parameters = self._explain_queue.get()
+            try:
+                self.explain_now(key, statement, parameters)
+            finally:
+                self._explain_queue.task_done()
+
+    def explain_now(self, key: str, statement: str, parameters: Any) -> None:
+        """Capture a plan for ``key`` synchronously."""
+        explainer = self.explainer
+        if explainer is None:
+            return
+        started = time.perf_counter()
+        try:
+            plan = explainer(statement, parameters)
+        except Exception as exc:  # noqa: BLE001 - plan capture must never break queries
+            logger.warning("EXPLAIN failed for fingerprint %s: %s", key, exc)
+            return
+        captured = {
+            "captured_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "explain_ms": round((time.perf_counter() - started) * 1000, 3),
+            "plan": plan,
+        }
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is not None:
+                stats.plan = captured
+        log_event("slow_query_plan", fingerprint=key, explain_ms=captured["explain_ms"])
+
+    def snapshot(self, limit: int = 50, sort: str = "total_ms", include_plans: bool = False) -> dict[str, Any]:
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {SORT_KEYS}")
+        with self._lock:
+            queries = [stats.as_dict(key, include_plans) for key, stats in self._stats.items()]
+        queries.sort(key=lambda item: item[sort], reverse=True)
+        return {
+            "slow_query_ms": self.slow_ms,
+            "explain_sample_rate": self.explain_sample_rate if self.explainer is not None else 0,
+            "fingerprints": len(queries),
+            "queries": queries[:limit],
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+def postgres_explainer(engine) -> Explainer:
+    """Re-run a statement under EXPLAIN ANALYZE in a rolled-back transaction."""
+
+    def explain(statement: str, parameters: Any) -> Any:
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            try:
+                connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(EXPLAIN_TIMEOUT_MS)}")
+                return connection.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}",
+                    parameters if parameters else (),
+                ).scalar()
+            finally:
+                transaction.rollback()
+
+    return explain
+
+
+query_insights = QueryInsights()
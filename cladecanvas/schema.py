@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    MetaData, Table, Column, Index, Integer, Text, ForeignKey, DateTime, Float,
+    MetaData, Table, Column, Index, BigInteger, Integer, Text, ForeignKey, DateTime, Float,
     JSON, text,
 )
 from cladecanvas.db import engine
@@ -64,6 +64,40 @@ metadata_enrichment_attempts = Table(
     Column("created_at", DateTime, nullable=True),
     Column("updated_at", DateTime, nullable=True),
     Column("next_retry_at", DateTime, nullable=True),
+    Column("leased_until", DateTime, nullable=True),
+    Column("worker_id", Text, nullable=True),
+    # Claim order; lower first. Set at enqueue from the queue order.
+    Column("priority", BigInteger, nullable=True),
+)
+
+search_synonyms = Table(
+    "search_synonyms", metadata,
+    Column("term", Text, primary_key=True),
+    Column("synonym", Text, primary_key=True),
+    Column("source", Text, nullable=False, server_default="manual"),
+    Column("created_at", DateTime, nullable=True),
+)
+
+# One row per tree load; the API's TreeVersionWatcher and the columnar export
+# compare versions to decide what to invalidate. NULL counts mean a full load
+# (invalidate all).
+tree_data_versions = Table(
+    "tree_data_versions", metadata,
+    Column("version", Integer, primary_key=True, autoincrement=True),
+    Column("source", Text, nullable=True),
+    Column("inserted", Integer, nullable=True),
+    Column("updated", Integer, nullable=True),
+    Column("deleted", Integer, nullable=True),
+    Column("unchanged", Integer, nullable=True),
+    Column("created_at", DateTime, nullable=True),
+)
+
+# Node ids touched by each incremental load, for precise invalidation.
+tree_node_changes = Table(
+    "tree_node_changes", metadata,
+    Column("version", Integer, ForeignKey("tree_data_versions.version"), primary_key=True),
+    Column("node_id", Text, primary_key=True),
+    Column("change", Text, nullable=False),
 )
 
 # Partial unique indexes — expressed here so Alembic autogenerate can see them
@@ -74,6 +108,16 @@ Index("ix_node_aliases_canonical_node_id", node_aliases.c.canonical_node_id)
 Index("ix_metadata_enrichment_attempts_status", metadata_enrichment_attempts.c.status)
 Index("ix_metadata_enrichment_attempts_next_retry_at", metadata_enrichment_attempts.c.next_retry_at)
 Index("ix_metadata_enrichment_attempts_ott_id", metadata_enrichment_attempts.c.ott_id)
+Index(
+    "ix_metadata_enrichment_attempts_claimable",
+    metadata_enrichment_attempts.c.leased_until,
+    postgresql_where=metadata_enrichment_attempts.c.status.in_(["pending", "leased"]),
+)
+Index(
+    "ix_metadata_enrichment_attempts_claim_priority",
+    metadata_enrichment_attempts.c.priority,
+    postgresql_where=metadata_enrichment_attempts.c.status.in_(["pending", "leased"]),
+)
 Index("ix_metadata_ott_id", metadata_table.c.ott_id,
       unique=True, postgresql_where=metadata_table.c.ott_id.isnot(None))
 Index("ix_metadata_common_name", metadata_table.c.common_name)
@@ -0,0 +1,71 @@
+"""Search synonym rows derived from enrichment results.
+
+Each row maps an alternative spelling a user might type (``term``) onto a name
+the search index already contains (``synonym``), e.g. ``house cat -> cat`` or
+``cats -> cat``. The API loads these into the query-expansion map.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from cladecanvas.api.search_ranking import normalize_search_text
+from cladecanvas.schema import search_synonyms
+
+# Same shape infer_common_name treats as a scientific binomial label.
+BINOMIAL_RE = re.compile(r"^[A-Z][a-z]+ [a-z][a-z-]+$")
+
+
+def pluralize(name: str) -> str | None:
+    """Return a naive, normalized English plural for a vernacular name."""
+    if not name or BINOMIAL_RE.match(name.strip()):
+        return None
+    name = normalize_search_text(name)
+    if name.endswith("s"):
+        return None
+    if name.endswith(("x", "z", "ch", "sh")):
+        return f"{name}es"
+    if name.endswith("y") and name[-2:-1] not in ("a", "e", "i", "o", "u"):
+        return f"{name[:-1]}ies"
+    return f"{name}s"
+
+
+def synonym_records(enriched: list[dict]) -> list[dict]:
+    """Build search_synonyms rows from fetch_wikidata results."""
+    now = datetime.now(timezone.utc)
+    pairs: dict[tuple[str, str], str] = {}
+    for record in enriched:
+        common_name = normalize_search_text(record.get("common_name"))
+        if not common_name:
+            continue
+        raw_names = {record["common_name"]: common_name}
+        for name in record.get("vernacular_names") or ():
+            vernacular = normalize_search_text(name)
+            if not vernacular:
+                continue
+            raw_names.setdefault(name, vernacular)
+            if vernacular != common_name:
+                pairs.setdefault((vernacular, common_name), "wikidata_vernacular")
+        for raw_name, name in raw_names.items():
+            plural = pluralize(raw_name)
+            if plural:
+                pairs.setdefault((plural, name), "plural")
+
+    return [
+        {"term": term, "synonym": synonym, "source": source, "created_at": now}
+        for (term, synonym), source in pairs.items()
+    ]
+
+
+def upsert_synonyms(session, records: list[dict]) -> int:
+    if not records:
+        return 0
+    session.execute(
+        pg_insert(search_synonyms)
+        .values(records)
+        .on_conflict_do_nothing(index_elements=["term", "synonym"])
+    )
+    return len(records)
@@ -5,29 +5,37 @@ high-priority taxon has no Wikidata match, it stays missing and can be selected
 again forever. This runner records every attempt, so the queue drains toward
 actual completion: success rows get metadata, misses get durable no_match state,
 and transient errors can be retried later.
+
+Batches are leased from the shared enrichment queue (see
+cladecanvas.enrichment_queue), so several backfill runs and run_workers.py can
+work the same backlog concurrently without picking the same taxa.
 """
 
 from __future__ import annotations
 
 import argparse
 import sys
-from datetime import datetime, timedelta, timezone
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Iterable
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from sqlalchemy import text
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-
 from cladecanvas.db import Session, assert_writes_allowed
 from cladecanvas.enrich import fetch_wikidata
-from cladecanvas.schema import metadata_enrichment_attempts, metadata_table
-
-
-DEFAULT_RETRY_DAYS = 30
+from cladecanvas.enrichment_pipeline import DEFAULT_FETCHERS, EnrichmentPipeline
+from cladecanvas.enrichment_queue import (
+    DEFAULT_LEASE_SECONDS,
+    QUEUE_ORDERS,
+    EnrichmentQueue,
+    QueueFilter,
+    error_records,
+    outcome_records,
+    upsert_attempts,
+)
+from cladecanvas.metadata_writer import attach_node_ids, metadata_records, write_enrichment
+from cladecanvas.observability import configure_logging
 
 
 def parse_args() -> argparse.Namespace:
@@ -63,189 +71,64 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "--order",
-        choices=("coverage", "largest", "random"),
+        choices=QUEUE_ORDERS,
         default="coverage",
         help="Queue ordering. coverage prioritizes ranked species and leaf taxa.",
     )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=DEFAULT_LEASE_SECONDS,
+        help="How long a claimed batch stays leased without a heartbeat.",
+    )
+    parser.add_argument("--worker-id", help="Queue worker id. Defaults to host:pid.")
+    parser.add_argument(
+        "--fetchers",
+        type=int,
+        default=DEFAULT_FETCHERS,
+        help="Batches fetched from Wikidata concurrently while the previous ones are written.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        help="Bound on claimed/fetched batches waiting between stages. Defaults to --fetchers.",
+    )
     return parser.parse_args()
 
 
-def load_batch(session, args: argparse.Namespace) -> list[dict]:
-    params: dict = {"limit": args.limit}
-    where = ["n.ott_id IS NOT NULL"]
-    if not args.refresh_existing:
-        where.append("m.node_id IS NULL")
-
-    if args.ott_id:
-        where.append("n.ott_id = ANY(:ott_ids)")
-        params["ott_ids"] = args.ott_id
-    if args.node_id:
-        where.append("n.node_id = ANY(:node_ids)")
-        params["node_ids"] = args.node_id
-    if args.rank:
-        where.append("n.rank = ANY(:ranks)")
-        params["ranks"] = args.rank
-    if args.leaf_only:
-        where.append("n.num_tips = 0")
-    if args.name_like:
-        where.append("n.name ILIKE :name_like")
-        params["name_like"] = args.name_like
+def queue_filter(args: argparse.Namespace) -> QueueFilter:
+    return QueueFilter(
+        ott_ids=args.ott_id,
+        node_ids=args.node_id,
+        ranks=args.rank,
+        leaf_only=args.leaf_only,
+        name_like=args.name_like,
+        refresh_existing=args.refresh_existing,
+        include_attempted=args.include_attempted,
+        retry_errors=args.retry_errors,
+        retry_no_match_after_days=args.retry_no_match_after_days,
+        order=args.order,
+    )
 
-    targeted = bool(args.ott_id or args.node_id)
-    if not targeted and not args.include_attempted:
-        retry_clauses = ["a.node_id IS NULL"]
-        if args.retry_errors:
-            retry_clauses.append("(a.status = 'error' AND (a.next_retry_at IS NULL OR a.next_retry_at <= now()))")
-        if args.retry_no_match_after_days is not None:
-            params["no_match_cutoff"] = datetime.now(timezone.utc) - timedelta(days=args.retry_no_match_after_days)
-            retry_clauses.append("(a.status = 'no_match' AND a.last_attempted_at <= :no_match_cutoff)")
-        where.append("(" + " OR ".join(retry_clauses) + ")")
 
-    if args.order == "random":
-        order_by = "ORDER BY random()"
-    elif args.order == "largest":
-        order_by = "ORDER BY n.num_tips DESC NULLS LAST, n.name, n.node_id"
+def store_enrichment(
+    session, batch: list[dict], enriched: list[dict], apply: bool, worker_id: str | None = None
+) -> tuple[int, int]:
+    if apply:
+        success_ids = write_enrichment(session, batch, enriched)
+        upsert_attempts(session, outcome_records(batch, enriched, success_ids), worker_id)
     else:
-        order_by = """
-        ORDER BY
-          CASE
-            WHEN n.rank = 'species' THEN 0
-            WHEN n.num_tips = 0 THEN 1
-            WHEN n.num_tips IS NULL THEN 2
-            ELSE 3
-          END,
-          n.num_tips DESC NULLS LAST,
-          n.name,
-          n.node_id
-        """
-
-    sql = f"""
-        SELECT n.node_id, n.ott_id, n.name
-        FROM nodes n
-        LEFT JOIN metadata m ON m.node_id = n.node_id
-        LEFT JOIN metadata_enrichment_attempts a ON a.node_id = n.node_id
-        WHERE {' AND '.join(where)}
-        {order_by}
-        LIMIT :limit
-    """
-    rows = session.execute(text(sql), params).mappings().fetchall()
-    return [dict(row) for row in rows]
-
-
-def store_enrichment(session, batch: list[dict], enriched: list[dict], apply: bool) -> tuple[int, int]:
-    now = datetime.now(timezone.utc)
-    node_id_by_ott = {row["ott_id"]: row["node_id"] for row in batch}
-    batch_by_node_id = {row["node_id"]: row for row in batch}
-
-    for row in enriched:
-        if not row.get("node_id"):
-            row["node_id"] = node_id_by_ott.get(row.get("ott_id"))
-
-    metadata_columns = {column.name for column in metadata_table.columns}
-    deduped = {
-        row["node_id"]: {key: value for key, value in row.items() if key in metadata_columns}
-        for row in enriched
-        if row.get("node_id")
-    }
-
-    success_ids = set(deduped)
-    if apply and deduped:
-        records = list(deduped.values())
-        insert_stmt = pg_insert(metadata_table).values(records)
-        update_fields = {
-            key: insert_stmt.excluded[key]
-            for key in records[0]
-            if key != "node_id"
-        }
-        session.execute(
-            insert_stmt.on_conflict_do_update(
-                index_elements=["node_id"],
-                set_=update_fields,
-            )
-        )
-        for row in enriched:
-            node_id = row.get("node_id")
-            if node_id in success_ids:
-                session.execute(
-                    text(
-                        "UPDATE nodes SET rank = COALESCE(:rank, rank), has_metadata = 1 "
-                        "WHERE node_id = :node_id"
-                    ),
-                    {"node_id": node_id, "rank": row.get("rank")},
-                )
-
-    attempt_records = []
-    enriched_by_node_id = {row.get("node_id"): row for row in enriched if row.get("node_id")}
-    for node_id, original in batch_by_node_id.items():
-        result = enriched_by_node_id.get(node_id)
-        status = "success" if node_id in success_ids else "no_match"
-        attempt_records.append({
-            "node_id": node_id,
-            "ott_id": original["ott_id"],
-            "name": original["name"],
-            "status": status,
-            "attempt_count": 1,
-            "last_attempted_at": now,
-            "last_success_at": now if status == "success" else None,
-            "last_provider": result.get("source_label") if result else "Wikidata",
-            "last_match_method": result.get("source_match_method") if result else None,
-            "last_error": None,
-            "created_at": now,
-            "updated_at": now,
-            "next_retry_at": None if status == "success" else now + timedelta(days=DEFAULT_RETRY_DAYS),
-        })
-
-    if apply and attempt_records:
-        upsert_attempts(session, attempt_records)
+        attach_node_ids(batch, enriched)
+        success_ids = set(metadata_records(enriched))
 
     return len(success_ids), len(batch) - len(success_ids)
 
 
-def record_error_attempts(session, batch: Iterable[dict], error: Exception, apply: bool) -> None:
-    now = datetime.now(timezone.utc)
-    message = str(error)[:1000]
-    records = [
-        {
-            "node_id": row["node_id"],
-            "ott_id": row["ott_id"],
-            "name": row["name"],
-            "status": "error",
-            "attempt_count": 1,
-            "last_attempted_at": now,
-            "last_success_at": None,
-            "last_provider": "Wikidata",
-            "last_match_method": None,
-            "last_error": message,
-            "created_at": now,
-            "updated_at": now,
-            "next_retry_at": now + timedelta(days=1),
-        }
-        for row in batch
-    ]
-    if apply and records:
-        upsert_attempts(session, records)
-
-
-def upsert_attempts(session, records: list[dict]) -> None:
-    insert_stmt = pg_insert(metadata_enrichment_attempts).values(records)
-    session.execute(
-        insert_stmt.on_conflict_do_update(
-            index_elements=["node_id"],
-            set_={
-                "ott_id": insert_stmt.excluded.ott_id,
-                "name": insert_stmt.excluded.name,
-                "status": insert_stmt.excluded.status,
-                "attempt_count": metadata_enrichment_attempts.c.attempt_count + 1,
-                "last_attempted_at": insert_stmt.excluded.last_attempted_at,
-                "last_success_at": insert_stmt.excluded.last_success_at,
-                "last_provider": insert_stmt.excluded.last_provider,
-                "last_match_method": insert_stmt.excluded.last_match_method,
-                "last_error": insert_stmt.excluded.last_error,
-                "updated_at": insert_stmt.excluded.updated_at,
-                "next_retry_at": insert_stmt.excluded.next_retry_at,
-            },
-        )
-    )
+def record_error_attempts(
+    session, batch: list[dict], error: Exception, apply: bool, worker_id: str | None = None
+) -> None:
+    if apply:
+        upsert_attempts(session, error_records(batch, error), worker_id)
 
 
 def main() -> None:
@@ -254,39 +137,64 @@ def main() -> None:
         assert_writes_allowed("metadata backfill")
     else:
         print("[dry-run] no database writes will be made; pass --apply to write")
-
-    total_success = 0
-    total_no_match = 0
-    total_errors = 0
-
-    with Session() as session:
-        for batch_index in range(args.max_batches):
-            batch = load_batch(session, args)
-            if not batch:
-                print("[done] no matching missing metadata rows remain")
-                break
-
-            print(
-                f"[batch {batch_index + 1}] attempting {len(batch)} taxa; "
-                f"first={batch[0]['node_id']} {batch[0]['name']}"
-            )
+    configure_logging()
+
+    totals = {"success": 0, "no_match": 0, "errors": 0, "batches": 0}
+    claims = {"count": 0, "drained": False}
+    queue = EnrichmentQueue(queue_filter(args), worker_id=args.worker_id, lease_seconds=args.lease_seconds)
+
+    with Session() as claim_session, Session() as session:
+        def claim() -> list[dict]:
+            claims["count"] += 1
+            if args.apply:
+                batch = queue.claim(claim_session, args.limit)
+                claim_session.commit()
+            elif claims["count"] == 1:
+                batch = queue.preview(claim_session, args.limit)
+            else:
+                # A dry run leases nothing, so every preview would be the same rows.
+                return []
+            claims["drained"] = not batch
+            return batch
+
+        def write(batch: list[dict], enriched: list[dict], error: Exception | None) -> None:
+            totals["batches"] += 1
+            label = f"[batch {totals['batches']}] {len(batch)} taxa; first={batch[0]['node_id']} {batch[0]['name']}"
             try:
-                enriched = fetch_wikidata(batch)
-                successes, no_matches = store_enrichment(session, batch, enriched, args.apply)
+                if error is not None:
+                    raise error
+                successes, no_matches = store_enrichment(session, batch, enriched, args.apply, queue.worker_id)
                 if args.apply:
                     session.commit()
-                total_success += successes
-                total_no_match += no_matches
-                print(f"[batch {batch_index + 1}] success={successes} no_match={no_matches}")
+                totals["success"] += successes
+                totals["no_match"] += no_matches
+                print(f"{label} success={successes} no_match={no_matches}")
             except Exception as exc:  # noqa: BLE001 - mark batch retryable and continue/exit cleanly
                 session.rollback()
-                record_error_attempts(session, batch, exc, args.apply)
+                record_error_attempts(session, batch, exc, args.apply, queue.worker_id)
                 if args.apply:
                     session.commit()
-                total_errors += len(batch)
-                print(f"[batch {batch_index + 1}] error={exc}")
-
-    print(f"[summary] success={total_success} no_match={total_no_match} errors={total_errors}")
+                totals["errors"] += len(batch)
+                print(f"{label} error={exc}")
+            finally:
+                queue.finish(row["node_id"] for row in batch)
+
+        pipeline = EnrichmentPipeline(
+            claim, fetch_wikidata, write,
+            fetchers=args.fetchers,
+            queue_size=args.queue_size,
+            name="backfill_metadata",
+        )
+        # Leases stay alive from claim until write, including queue waits.
+        with queue.heartbeat(Session) if args.apply else nullcontext():
+            summary = pipeline.run(args.max_batches)
+
+    if claims["drained"]:
+        print("[done] no matching missing metadata rows remain")
+    print(
+        f"[summary] success={totals['success']} no_match={totals['no_match']} "
+        f"errors={totals['errors']} rows_per_s={summary['rows_per_s']}"
+    )
 
 
 if __name__ == "__main__":
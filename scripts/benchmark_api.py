@@ -0,0 +1,538 @@
+"""Benchmark every read route against synthetic trees of several shapes and sizes.
+
+Run with ``python -m scripts.benchmark_api``. For each shape and size a SQLite
+database is generated from ``cladecanvas.schema`` (nodes, metadata, MRCA
+aliases and search-friendly names) and cached under ``--workdir``:
+
+- ``caterpillar``: a ladder, each spine node with one leaf and the next spine
+  node, so lineages are as deep as the tree allows.
+- ``polytomy``: one root with every other node as a direct child.
+- ``metazoa``: heavy-tailed branching grown depth-first, giving the mix of
+  deep ladders and wide genera seen in the Metazoa part of the synthesis tree.
+
+Each database is measured in a fresh subprocess running the API in dev-sqlite
+mode through ``TestClient``. Every route in ``tree.py``, ``node.py`` and
+``search.py`` gets warm-up requests, then timed requests against random
+targets from a fixed seed. The report has client-side p50/p95/p99 latency, the
+query count from ``Server-Timing``, the peak of Python allocations per request
+(tracemalloc) and the process max RSS. The hot-read cache is disabled unless
+``--warm-cache`` is given.
+
+``--save-baseline`` stores the results as JSON. ``--baseline`` compares a run
+against stored results and exits 1 on regressions: p95 or allocation peak
+beyond ``--tolerance``, or any route issuing more queries than before.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import quote, urlencode
+
+GENERATOR_VERSION = 1
+SHAPES = ("caterpillar", "polytomy", "metazoa")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_WORKDIR = Path("data") / "benchmarks"
+METADATA_FRACTION = 0.3
+ALIAS_FRACTION = 0.02
+BULK_IDS = 50
+# Lineage and context refuse lineages deeper than CLADECANVAS_MAX_LINEAGE_DEPTH.
+TARGET_MAX_DEPTH = 120
+# Latency regressions smaller than this are noise at these scales.
+MIN_REGRESSION_MS = 1.0
+MIN_REGRESSION_KIB = 64
+
+SYLLABLES = (
+    "ab", "ac", "an", "ar", "bo", "ca", "ce", "chi", "cor", "da", "del", "en", "er",
+    "fo", "ga", "hy", "il", "la", "li", "lo", "ma", "me", "mi", "mo", "na", "ne",
+    "or", "pa", "phi", "po", "ra", "ri", "ro", "sa", "si", "ta", "te", "th", "to",
+    "tri", "ul", "va", "xe", "zo",
+)
+COMMON_ADJECTIVES = ("spotted", "giant", "lesser", "striped", "common", "red", "pale", "horned")
+COMMON_NOUNS = ("beetle", "snail", "worm", "shrimp", "sponge", "moth", "spider", "coral", "fish")
+RANKS = ("phylum", "class", "order", "family", "genus")
+
+
+# ---------------------------------------------------------------------------
+# Synthetic trees
+
+
+def caterpillar_parents(size: int) -> list[int | None]:
+    parents: list[int | None] = [None]
+    spine = 0
+    while len(parents) < size:
+        parents.append(spine)  # leaf
+        if len(parents) < size:
+            parents.append(spine)
+            spine = len(parents) - 1
+    return parents
+
+
+def polytomy_parents(size: int) -> list[int | None]:
+    return [None] + [0] * (size - 1)
+
+
+def metazoa_parents(size: int, rng: random.Random) -> list[int | None]:
+    parents: list[int | None] = [None]
+    frontier = [0]
+    while len(parents) < size and frontier:
+        # Mostly extend the newest clade, sometimes return to an older one.
+        index = len(frontier) - 1 if rng.random() < 0.7 else rng.randrange(len(frontier))
+        parent = frontier.pop(index)
+        fanout = min(int(rng.paretovariate(1.1)) + 1, 2_000, size - len(parents))
+        for _ in range(fanout):
+            parents.append(parent)
+            # About half of new nodes are tips.
+            if rng.random() < 0.55:
+                frontier.append(len(parents) - 1)
+    return parents
+
+
+def tree_parents(shape: str, size: int, seed: int = 0) -> list[int | None]:
+    """Parent index per node index; node 0 is the root."""
+    if shape == "caterpillar":
+        return caterpillar_parents(size)
+    if shape == "polytomy":
+        return polytomy_parents(size)
+    if shape == "metazoa":
+        return metazoa_parents(size, random.Random(seed))
+    raise ValueError(f"Unknown tree shape {shape!r}; expected one of {SHAPES}")
+
+
+def _taxon_name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize() + rng.choice(("us", "a", "idae", "ia"))
+
+
+def synthetic_rows(shape: str, size: int, seed: int = 0) -> dict[str, Any]:
+    """Rows for ``nodes``, ``metadata`` and ``node_aliases`` plus route targets."""
+    rng = random.Random(seed)
+    parents = tree_parents(shape, size, seed)
+    children: list[list[int]] = [[] for _ in parents]
+    for index, parent in enumerate(parents):
+        if parent is not None:
+            children[parent].append(index)
+    depth = [0] * len(parents)
+    tips = [0] * len(parents)
+    for index in range(1, len(parents)):
+        depth[index] = depth[parents[index]] + 1
+    for index in reversed(range(len(parents))):
+        tips[index] = tips[index] or 1
+        if parents[index] is not None:
+            tips[parents[index]] += tips[index]
+
+    node_ids = [f"ott{index + 1}" for index in range(len(parents))]
+    names = [_taxon_name(rng) for _ in parents]
+    node_rows = []
+    metadata_rows = []
+    for index, parent in enumerate(parents):
+        has_metadata = index == 0 or rng.random() < METADATA_FRACTION
+        node_rows.append({
+            "node_id": node_ids[index],
+            "ott_id": index + 1,
+            "name": names[index],
+            "parent_node_id": None if parent is None else node_ids[parent],
+            "rank": "species" if not children[index] else RANKS[min(depth[index], len(RANKS) - 1)],
+            "child_count": len(children[index]),
+            "has_metadata": int(has_metadata),
+            "num_tips": tips[index],
+            "display_name": names[index],
+        })
+        if has_metadata:
+            metadata_rows.append({
+                "node_id": node_ids[index],
+                "ott_id": index + 1,
+                "common_name": f"{rng.choice(COMMON_ADJECTIVES)} {rng.choice(COMMON_NOUNS)}",
+                "description": f"{rng.choice(COMMON_NOUNS)} clade of {tips[index]} species",
+                "enriched_score": round(rng.random(), 3),
+            })
+
+    # MRCA aliases: an "mrcaott..." duplicate of an internal node that took
+    # over some of its children, as left behind by synthesis-tree releases.
+    internal = [index for index in range(1, len(parents)) if len(children[index]) >= 2]
+    alias_rows = []
+    for index in rng.sample(internal, min(len(internal), max(1, int(len(internal) * ALIAS_FRACTION)))):
+        moved = children[index][: max(1, len(children[index]) // 2)]
+        alias_id = f"mrca{node_ids[index]}{node_ids[moved[0]]}"
+        node_rows.append({
+            **node_rows[index],
+            "node_id": alias_id,
+            "ott_id": None,
+            "child_count": len(moved),
+            "has_metadata": 0,
+        })
+        for child in moved:
+            node_rows[child]["parent_node_id"] = alias_id
+        alias_rows.append({"alias_node_id": alias_id, "canonical_node_id": node_ids[index], "reason": "canonical_alias"})
+
+    shallow = [index for index in range(len(parents)) if depth[index] <= TARGET_MAX_DEPTH]
+    deepest = sorted(shallow, key=lambda index: depth[index], reverse=True)[:200]
+    wide = sorted(internal or [0], key=lambda index: len(children[index]), reverse=True)[:50]
+    sampled = rng.sample(range(len(parents)), min(len(parents), 2_000))
+    queries = {name[:length].lower() for name in rng.sample(names, min(len(names), 40)) for length in (3, 5)}
+    queries.update(f"{adjective} {noun}" for adjective in COMMON_ADJECTIVES[:3] for noun in COMMON_NOUNS[:3])
+    targets = {
+        "deep": [node_ids[index] for index in deepest],
+        "wide": [node_ids[index] for index in wide] + [row["alias_node_id"] for row in alias_rows[:10]],
+        "internal": [node_ids[index] for index in (internal[:2_000] or [0])],
+        "any": [node_ids[index] for index in sampled] + [row["alias_node_id"] for row in alias_rows[:50]],
+        "metadata": [row["node_id"] for row in metadata_rows[:2_000]],
+        "queries": sorted(queries),
+    }
+    summary = {
+        "nodes": len(node_rows),
+        "metadata": len(metadata_rows),
+        "aliases": len(alias_rows),
+        "max_depth": max(depth),
+        "max_fanout": max(len(child_ids) for child_ids in children),
+    }
+    return {"nodes": node_rows, "metadata": metadata_rows, "aliases": alias_rows, "targets": targets, "summary": summary}
+
+
+def build_database(path: Path, shape: str, size: int, seed: int = 0) -> dict[str, Any]:
+    """Write a synthetic tree to a fresh SQLite file; return targets and summary."""
+    from sqlalchemy import create_engine
+
+    from cladecanvas.schema import metadata, metadata_table, node_aliases, nodes
+
+    data = synthetic_rows(shape, size, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(nodes.insert(), data["nodes"])
+        connection.execute(metadata_table.insert(), data["metadata"])
+        if data["aliases"]:
+            connection.execute(node_aliases.insert(), data["aliases"])
+    engine.dispose()
+    return {
+        "generator": GENERATOR_VERSION,
+        "shape": shape,
+        "size": size,
+        "seed": seed,
+        "summary": data["summary"],
+        "targets": data["targets"],
+    }
+
+
+def ensure_database(workdir: Path, shape: str, size: int, seed: int, rebuild: bool = False) -> tuple[Path, dict]:
+    path = workdir / f"{shape}-{size}-{seed}.sqlite"
+    sidecar = path.with_suffix(".json")
+    if not rebuild and path.exists() and sidecar.exists():
+        info = json.loads(sidecar.read_text())
+        if info.get("generator") == GENERATOR_VERSION:
+            return path, info
+    info = build_database(path, shape, size, seed)
+    sidecar.write_text(json.dumps(info))
+    return path, info
+
+
+# ---------------------------------------------------------------------------
+# Routes and measurement
+
+
+def _bulk_path(targets: dict, rng: random.Random) -> str:
+    ids = rng.sample(targets["any"], min(BULK_IDS, len(targets["any"])))
+    return "/node/bulk?" + urlencode([("node_ids", node_id) for node_id in ids])
+
+
+def _batch_request(targets: dict, rng: random.Random) -> tuple[str, dict]:
+    ids = rng.sample(targets["any"], min(BULK_IDS, len(targets["any"])))
+    return "/node/batch", {"node_ids": ids, "include_metadata": True}
+
+
+# Route name -> target picker returning a GET path or a (path, JSON body) POST.
+ROUTES: dict[str, Callable[[dict, random.Random], str | tuple[str, dict]]] = {
+    "tree.root": lambda targets, rng: "/tree/root",
+    "tree.children": lambda targets, rng: f"/tree/children/{rng.choice(targets['wide'])}?limit=100",
+    "tree.lineage": lambda targets, rng: f"/tree/lineage/{rng.choice(targets['deep'])}",
+    "tree.context": lambda targets, rng: f"/tree/context/{rng.choice(targets['deep'])}",
+    "tree.subtree": lambda targets, rng: f"/tree/subtree/{rng.choice(targets['internal'])}?depth=2",
+    "node.struct": lambda targets, rng: f"/node/{rng.choice(targets['any'])}",
+    "node.metadata": lambda targets, rng: f"/node/metadata/{rng.choice(targets['metadata'])}",
+    "node.bulk": _bulk_path,
+    "node.batch": _batch_request,
+    "search": lambda targets, rng: f"/search?q={quote(rng.choice(targets['queries']))}",
+}
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def server_timing_queries(header: str | None) -> int | None:
+    if not header or 'desc="' not in header:
+        return None
+    return int(header.split('desc="', 1)[1].split(" ", 1)[0])
+
+
+def _send(client, request: str | tuple[str, dict]):
+    if isinstance(request, tuple):
+        return client.post(request[0], json=request[1])
+    return client.get(request)
+
+
+def measure_route(
+    client,
+    make_path: Callable[[dict, random.Random], str | tuple[str, dict]],
+    targets: dict,
+    requests: int,
+    warmup: int,
+    memory_requests: int,
+    seed: int,
+    before_request: Callable[[], None] = lambda: None,
+) -> dict[str, Any]:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        before_request()
+        _send(client, make_path(targets, rng))
+
+    latencies = []
+    queries = []
+    statuses: dict[str, int] = {}
+    for _ in range(requests):
+        path = make_path(targets, rng)
+        before_request()
+        started = time.perf_counter()
+        response = _send(client, path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        count = server_timing_queries(response.headers.get("Server-Timing"))
+        if count is not None:
+            queries.append(count)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(memory_requests):
+            path = make_path(targets, rng)
+            before_request()
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            _send(client, path)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries_median": statistics.median(queries) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "alloc_peak_kib": round(max(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def max_rss_mib() -> float:
+    # ru_maxrss survives exec on Linux, so it would report the parent's
+    # generation peak; VmHWM belongs to this process image only.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_case(info_path: Path, routes: list[str], requests: int, warmup: int, memory_requests: int, warm_cache: bool) -> dict:
+    """Measure one generated database; runs in the subprocess set up by ``main``."""
+    from fastapi.testclient import TestClient
+
+    from cladecanvas.api.main import app
+    from cladecanvas.api.search_cache import search_candidate_cache
+
+    info = json.loads(info_path.read_text())
+    before_request = (lambda: None) if warm_cache else search_candidate_cache.clear
+    results = {}
+    with TestClient(app) as client:
+        for offset, name in enumerate(routes):
+            results[name] = measure_route(
+                client,
+                ROUTES[name],
+                info["targets"],
+                requests,
+                warmup,
+                memory_requests,
+                seed=info["seed"] + offset,
+                before_request=before_request,
+            )
+    return {
+        "summary": info["summary"],
+        "max_rss_mib": max_rss_mib(),
+        "routes": results,
+    }
+
+
+def _case_env(database: Path, warm_cache: bool) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "CLADECANVAS_DEV_SQLITE": "1",
+        "CLADECANVAS_SQLITE_PATH": str(database.resolve()),
+        "CLADECANVAS_ANON_READS_PER_MINUTE": str(10**9),
+        "CLADECANVAS_SLOW_QUERY_MS": str(10**9),
+    })
+    if not warm_cache:
+        env["CLADECANVAS_HOT_READ_CACHE_SECONDS"] = "0"
+    for name in ("CLADECANVAS_METRICS_DIR", "CLADECANVAS_PROFILE_SAMPLER_INTERVAL_MS"):
+        env.pop(name, None)
+    return env
+
+
+def spawn_case(database: Path, args: argparse.Namespace) -> dict:
+    command = [
+        sys.executable, "-m", "scripts.benchmark_api",
+        "--run-case", str(database.with_suffix(".json")),
+        "--routes", *args.routes,
+        "--requests", str(args.requests),
+        "--warmup", str(args.warmup),
+        "--memory-requests", str(args.memory_requests),
+    ]
+    if args.warm_cache:
+        command.append("--warm-cache")
+    completed = subprocess.run(command, env=_case_env(database, args.warm_cache), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark case {database.name} failed:\n{completed.stderr[-4000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# ---------------------------------------------------------------------------
+# Baselines
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of ``current`` against ``baseline``; cases absent from either are skipped."""
+    regressions = []
+    for case, result in current["cases"].items():
+        previous_case = baseline.get("cases", {}).get(case)
+        if previous_case is None:
+            continue
+        for route, stats in result["routes"].items():
+            previous = previous_case["routes"].get(route)
+            if previous is None:
+                continue
+            if (
+                stats["p95_ms"] > previous["p95_ms"] * (1 + tolerance)
+                and stats["p95_ms"] - previous["p95_ms"] >= MIN_REGRESSION_MS
+            ):
+                regressions.append(f"{case} {route}: p95 {previous['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms")
+            if (stats["queries_max"] or 0) > (previous["queries_max"] or 0):
+                regressions.append(f"{case} {route}: max queries {previous['queries_max']} -> {stats['queries_max']}")
+            if (
+                stats["alloc_peak_kib"] is not None
+                and previous["alloc_peak_kib"] is not None
+                and stats["alloc_peak_kib"] > previous["alloc_peak_kib"] * (1 + tolerance)
+                and stats["alloc_peak_kib"] - previous["alloc_peak_kib"] >= MIN_REGRESSION_KIB
+            ):
+                regressions.append(
+                    f"{case} {route}: alloc peak {previous['alloc_peak_kib']:.0f} -> {stats['alloc_peak_kib']:.0f} KiB"
+                )
+    return regressions
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_case(case: str, result: dict) -> None:
+    summary = result["summary"]
+    print(
+        f"\n{case}: {summary['nodes']:,} nodes, {summary['metadata']:,} metadata, {summary['aliases']:,} aliases, "
+        f"max depth {summary['max_depth']:,}, max fan-out {summary['max_fanout']:,}, max RSS {result['max_rss_mib']} MiB"
+    )
+    print(f"  {'route':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>9} {'alloc KiB':>10}  statuses")
+    for route, stats in result["routes"].items():
+        queries = "-" if stats["queries_max"] is None else f"{stats['queries_median']:g}/{stats['queries_max']}"
+        alloc = "-" if stats["alloc_peak_kib"] is None else f"{stats['alloc_peak_kib']:,.0f}"
+        statuses = " ".join(f"{code}x{count}" for code, count in sorted(stats["statuses"].items()))
+        print(
+            f"  {route:<14} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+            f"{queries:>9} {alloc:>10}  {statuses}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per route.")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--memory-requests", type=int, default=3, help="Requests traced for allocation peaks.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the hot-read and search candidate caches on.")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR, help="Where generated databases are cached.")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate cached databases.")
+    parser.add_argument("--baseline", type=Path, help="Compare against results saved with --save-baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95/allocation growth (0.25 = 25%%).")
+    parser.add_argument("--save-baseline", type=Path, help="Write this run's results as JSON.")
+    parser.add_argument("--run-case", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        result = run_case(args.run_case, args.routes, args.requests, args.warmup, args.memory_requests, args.warm_cache)
+        print(json.dumps(result))
+        return
+
+    # Schema import needs a database profile; generation writes its own files.
+    os.environ.setdefault("CLADECANVAS_DEV_SQLITE", "1")
+    results = {
+        "meta": {
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "warm_cache": args.warm_cache,
+        },
+        "cases": {},
+    }
+    for shape in args.shapes:
+        for size in args.sizes:
+            case = f"{shape}-{size}"
+            started = time.perf_counter()
+            database, _ = ensure_database(args.workdir, shape, size, args.seed, args.rebuild)
+            generated = time.perf_counter() - started
+            results["cases"][case] = spawn_case(database, args)
+            print_case(case, results["cases"][case])
+            print(f"  (database ready in {generated:.1f}s)")
+
+    if args.save_baseline is not None:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nSaved baseline to {args.save_baseline}")
+    if args.baseline is not None:
+        regressions = compare_results(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
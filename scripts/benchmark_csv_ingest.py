@@ -0,0 +1,88 @@
+"""Benchmark pandas vs streaming ingestion of the synthesis tree CSV.
+
+Run with ``python -m scripts.benchmark_csv_ingest``. Writes a synthetic
+nodes CSV (same columns as fetch_otol.py, ~4% synthetic MRCA rows) and reads
+it two ways, each in a fresh process so peak RSS is measured independently:
+
+- ``pandas``: the old ``read_csv`` + ``to_dict("records")`` path, which holds
+  the DataFrame and every record dict at once.
+- ``stream``: ``iter_node_chunks``, consuming bounded chunks.
+
+No database is needed; this measures the reader that feeds either loader.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from cladecanvas.node_loader import CSV_COLUMNS, DEFAULT_CHUNK_ROWS, iter_node_chunks, peak_rss_mb
+
+
+def write_synthetic_csv(path: Path, rows: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerow(["ott691846", 691846, "Metazoa", "", rows])
+        for index in range(1, rows):
+            parent = f"ott{rng.randrange(index)}" if index > 1 else "ott691846"
+            if rng.random() < 0.04:
+                writer.writerow([f"mrcaott{index}ott{index + 1}", "", f"Clade {index}", parent, rng.randrange(2, 500)])
+            else:
+                writer.writerow([f"ott{index}", index, f"Taxon {index}", parent, rng.choice((0, 0, 0, 1, 7))])
+
+
+def read_pandas(path: str, chunk_rows: int) -> tuple[int, float, float | None]:
+    import pandas as pd
+
+    started = time.perf_counter()
+    df = pd.read_csv(path, dtype={"ott_id": "Int64", "num_tips": "Int64"})
+    records = df.where(pd.notna(df), other=None).to_dict("records")
+    rows = len(records)
+    return rows, time.perf_counter() - started, peak_rss_mb()
+
+
+def read_stream(path: str, chunk_rows: int) -> tuple[int, float, float | None]:
+    started = time.perf_counter()
+    rows = sum(len(chunk) for chunk in iter_node_chunks(Path(path), chunk_rows))
+    return rows, time.perf_counter() - started, peak_rss_mb()
+
+
+READERS = {"pandas": read_pandas, "stream": read_stream}
+
+
+def measure(reader: str, path: Path, chunk_rows: int) -> tuple[int, float, float | None]:
+    # A fresh process per run: ru_maxrss only ever grows within a process.
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(READERS[reader], str(path), chunk_rows).result()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500_000, 2_000_000])
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--readers", nargs="+", choices=sorted(READERS), default=sorted(READERS))
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'reader':>8} {'seconds':>9} {'rows/s':>11} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = Path(tmp) / f"nodes_{rows}.csv"
+            write_synthetic_csv(path, rows)
+            for reader in args.readers:
+                count, seconds, peak = measure(reader, path, args.chunk_rows)
+                assert count == rows, (reader, count, rows)
+                peak_text = f"{peak:>9.1f}" if peak is not None else f"{'n/a':>9}"
+                print(f"{rows:>10} {reader:>8} {seconds:>9.2f} {rows / seconds:>11,.0f} {peak_text}")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Benchmark request throughput with and without the observability middleware.
+
+Run with ``python -m scripts.benchmark_middleware``. Requests are driven
+straight into the ASGI app from one event loop (no sockets, no HTTP parsing),
+so the numbers isolate per-request middleware overhead:
+
+- ``none``: the bare FastAPI app.
+- ``base_http``: the previous ``BaseHTTPMiddleware`` implementation, logging
+  through a plain ``StreamHandler`` that serializes JSON on the event loop.
+- ``asgi``: ``RequestObservabilityMiddleware`` with ``configure_logging``'s
+  queue handler.
+
+Logs go to ``os.devnull`` in every variant. No database is needed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import time
+from logging.handlers import QueueListener
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from cladecanvas.observability import (
+    REQUEST_ID_HEADER,
+    DeferredQueueHandler,
+    RequestObservabilityMiddleware,
+    log_event,
+    metrics,
+    new_request_id,
+    record_latency,
+    request_id_var,
+)
+
+
+class BaseHTTPObservabilityMiddleware(BaseHTTPMiddleware):
+    """The request-id/latency middleware as it was before the ASGI rewrite."""
+
+    async def dispatch(self, request: Request, call_next):
+        request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = 500
+        response = None
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            route_name = getattr(request.scope.get("route"), "path", request.url.path)
+            record_latency("endpoint", f"{request.method} {route_name}", elapsed_ms, {"status_code": str(status_code)})
+            log_event(
+                "http_request",
+                method=request.method,
+                path=request.url.path,
+                route=route_name,
+                status_code=status_code,
+                duration_ms=round(elapsed_ms, 3),
+            )
+            if response is not None:
+                response.headers[REQUEST_ID_HEADER] = request_id
+            request_id_var.reset(token)
+        return response
+
+
+MIDDLEWARE = {
+    "none": None,
+    "base_http": BaseHTTPObservabilityMiddleware,
+    "asgi": RequestObservabilityMiddleware,
+}
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    if MIDDLEWARE[variant] is not None:
+        app.add_middleware(MIDDLEWARE[variant])
+
+    @app.get("/ping/{node_id}")
+    async def ping(node_id: str):
+        return {"node_id": node_id, "ok": True}
+
+    return app
+
+
+def configure_variant_logging(variant: str, devnull) -> QueueListener | None:
+    app_logger = logging.getLogger("cladecanvas")
+    app_logger.handlers.clear()
+    app_logger.setLevel(logging.INFO)
+    app_logger.propagate = False
+    sink = logging.StreamHandler(devnull)
+    sink.setFormatter(logging.Formatter("%(message)s"))
+    if variant != "asgi":
+        app_logger.addHandler(sink)
+        return None
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, sink)
+    listener.start()
+    app_logger.addHandler(DeferredQueueHandler(log_queue))
+    return listener
+
+
+async def _call(app, index: int) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": f"/ping/ott{index}",
+        "raw_path": f"/ping/ott{index}".encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 5000),
+        "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(app, requests: int, concurrency: int) -> float:
+    counter = iter(range(requests))
+
+    async def worker():
+        for index in counter:
+            assert await _call(app, index) == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--variants", nargs="+", choices=list(MIDDLEWARE), default=list(MIDDLEWARE))
+    args = parser.parse_args()
+
+    print(f"{'variant':>10} {'req/s (median)':>15} {'runs':>30}")
+    with open(os.devnull, "w") as devnull:
+        baseline = None
+        for variant in args.variants:
+            listener = configure_variant_logging(variant, devnull)
+            app = build_app(variant)
+            asyncio.run(run(app, min(args.requests, 1000), args.concurrency))  # warm-up
+            runs = []
+            for _ in range(args.repeats):
+                metrics.reset()
+                runs.append(asyncio.run(run(app, args.requests, args.concurrency)))
+            if listener is not None:
+                listener.stop()
+            median = statistics.median(runs)
+            baseline = baseline or median
+            runs_text = ", ".join(f"{value:,.0f}" for value in runs)
+            print(f"{variant:>10} {median:>15,.0f} {runs_text:>30}  ({median / baseline:.0%} of {args.variants[0]})")
+
+
+if __name__ == "__main__":
+    main()
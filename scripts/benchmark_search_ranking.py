@@ -0,0 +1,65 @@
+"""Benchmark full-sort vs heap top-k selection of ranked search results.
+
+Run with ``python -m scripts.benchmark_search_ranking``. Builds synthetic
+RankedSearchResult pools of increasing size and times
+``sort_ranked_results(...)[:k]`` against ``top_ranked_results(..., k)``. No
+database is needed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+
+from cladecanvas.api.search_ranking import (
+    RankedSearchResult,
+    sort_ranked_results,
+    top_ranked_results,
+)
+
+
+def synthetic_results(count: int, seed: int = 0) -> list[RankedSearchResult]:
+    rng = random.Random(seed)
+    return [
+        RankedSearchResult(
+            node_id=f"ott{index}",
+            ott_id=index,
+            common_name=None,
+            display_name=f"Taxon {index}",
+            description=None,
+            image_url=None,
+            wiki_page_url=None,
+            enriched_score=None,
+            match_field="name",
+            match_snippet="",
+            match_type="prefix",
+            score=round(rng.uniform(300.0, 1200.0), 3),
+            score_breakdown={},
+        )
+        for index in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=25, help="Page window (offset + limit).")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'candidates':>12} {'sort ms':>10} {'heap ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        results = synthetic_results(size)
+        assert top_ranked_results(results, args.k) == sort_ranked_results(results)[:args.k]
+        sort_ms = min(timeit.repeat(
+            lambda: sort_ranked_results(results)[:args.k], number=1, repeat=args.repeat
+        )) * 1000
+        heap_ms = min(timeit.repeat(
+            lambda: top_ranked_results(results, args.k), number=1, repeat=args.repeat
+        )) * 1000
+        print(f"{size:>12} {sort_ms:>10.2f} {heap_ms:>10.2f} {sort_ms / heap_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,13 +12,18 @@ Phase 3: Child-pair Wikidata search — for top unaliased MRCA nodes by num_tips
 """
 
 import argparse
-import time
-import requests
+import asyncio
 from cladecanvas.db import Session, assert_writes_allowed
+from cladecanvas.http_client import HOST_RATE_LIMITS, AsyncEnrichmentClient
 from sqlalchemy import text
 
 OTOL_API = "https://api.opentreeoflife.org/v3/tree_of_life/node_info"
+# Requests started per chunk; progress is printed after each chunk.
+CHUNK_SIZE = 200
 WIKIDATA_SPARQL = "https://query.wikidata.org/sparql"
+# The SPARQL endpoint allows ~1 request/s, so a chunk is capped at the bucket's
+# burst: a larger chunk would only queue in the rate limiter.
+SPARQL_CHUNK_SIZE = HOST_RATE_LIMITS["query.wikidata.org"][1]
 HEADERS = {
     "User-Agent": "CladeCanvasBot/0.1 (https://github.com/shesanth/CladeCanvas)"
 }
@@ -69,9 +74,26 @@ def write_aliases(aliases, dry_run=False):
     print(f"Wrote {len(aliases)} aliases to DB.")
 
 
+async def _otol_json(client, url, payload):
+    resp = await client.request("POST", url, json=payload, timeout=30)
+    return resp.json()
+
+
+async def _settled_chunks(items, request, chunk_size=CHUNK_SIZE):
+    """Yield (start, [(item, response), ...]) one chunk of requests at a time.
+
+    Requests within a chunk run concurrently; failures come back as
+    exception objects.
+    """
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        responses = await asyncio.gather(*(request(item) for item in chunk), return_exceptions=True)
+        yield start, list(zip(chunk, responses))
+
+
 # ── Phase 1: Wikidata reverse lookup ─────────────────────────────────────────
 
-def _fetch_wikidata_ott_ids(page_size=10000):
+async def _fetch_wikidata_ott_ids(client, page_size=10000):
     """Paginate through all Wikidata items with P9157 (OTT ID)."""
     all_items = []
     offset = 0
@@ -83,13 +105,12 @@ SELECT ?item ?itemLabel ?ott WHERE {{
 }} LIMIT {page_size} OFFSET {offset}
 """
         try:
-            r = requests.get(
+            payload = await client.get_json(
                 WIKIDATA_SPARQL,
                 params={"query": sparql, "format": "json"},
-                headers=HEADERS, timeout=60,
+                timeout=60,
             )
-            r.raise_for_status()
-            bindings = r.json().get("results", {}).get("bindings", [])
+            bindings = payload.get("results", {}).get("bindings", [])
         except Exception as e:
             print(f"  Wikidata query error at offset {offset}: {e}")
             break
@@ -110,18 +131,17 @@ SELECT ?item ?itemLabel ?ott WHERE {{
 
         if len(bindings) < page_size:
             break
-        time.sleep(1.0)
 
     return all_items
 
 
-def phase1_wikidata_reverse(existing, limit=None):
+async def phase1_wikidata_reverse(client, existing, limit=None, chunk_size=CHUNK_SIZE):
     """Phase 1: Wikidata bulk reverse lookup."""
     print("\n=== Phase 1: Wikidata Reverse Lookup ===")
 
     # Step 1: Get all OTT IDs from Wikidata
     print("Fetching all OTT IDs from Wikidata (P9157)...")
-    wikidata_items = _fetch_wikidata_ott_ids()
+    wikidata_items = await _fetch_wikidata_ott_ids(client)
     print(f"Got {len(wikidata_items)} Wikidata items with OTT IDs.")
 
     # Step 2: Filter to taxonomy-only nodes in our DB (num_tips IS NULL)
@@ -147,27 +167,27 @@ def phase1_wikidata_reverse(existing, limit=None):
     # Step 3: Query OToL node_info for each candidate
     aliases = []
     errors = 0
-    for i, ott_id in enumerate(candidate_otts):
-        try:
-            resp = requests.post(
-                OTOL_API, json={"ott_id": ott_id}, timeout=30
-            )
-            d = resp.json()
-            synth_node_id = d.get("node_id", "")
-            if synth_node_id.startswith("mrcaott") and synth_node_id not in existing:
-                label = ott_to_label.get(ott_id, f"ott{ott_id}")
-                aliases.append((synth_node_id, label))
-                existing.add(synth_node_id)
-                print(f"  [{i+1}/{len(candidate_otts)}] {label} ->{synth_node_id}")
-        except Exception as e:
-            errors += 1
-            if errors <= 5:
-                print(f"  [{i+1}/{len(candidate_otts)}] ott{ott_id} ERROR: {e}")
-
-        if (i + 1) % 100 == 0:
-            print(f"  ... progress: {i+1}/{len(candidate_otts)}, "
-                  f"{len(aliases)} aliases found")
-        time.sleep(0.3)
+    chunks = _settled_chunks(
+        candidate_otts, lambda ott_id: _otol_json(client, OTOL_API, {"ott_id": ott_id}), chunk_size
+    )
+    async for start, results in chunks:
+        for i, (ott_id, d) in enumerate(results, start):
+            try:
+                if isinstance(d, Exception):
+                    raise d
+                synth_node_id = d.get("node_id", "")
+                if synth_node_id.startswith("mrcaott") and synth_node_id not in existing:
+                    label = ott_to_label.get(ott_id, f"ott{ott_id}")
+                    aliases.append((synth_node_id, label))
+                    existing.add(synth_node_id)
+                    print(f"  [{i+1}/{len(candidate_otts)}] {label} ->{synth_node_id}")
+            except Exception as e:
+                errors += 1
+                if errors <= 5:
+                    print(f"  [{i+1}/{len(candidate_otts)}] ott{ott_id} ERROR: {e}")
+
+        print(f"  ... progress: {start + len(results)}/{len(candidate_otts)}, "
+              f"{len(aliases)} aliases found", flush=True)
 
     print(f"\nPhase 1 done: {len(aliases)} new aliases ({errors} errors).")
     return aliases
@@ -175,7 +195,7 @@ def phase1_wikidata_reverse(existing, limit=None):
 
 # ── Phase 2: Expanded OToL rank query ────────────────────────────────────────
 
-def phase2_expanded_ranks(existing, limit=None):
+async def phase2_expanded_ranks(client, existing, limit=None, chunk_size=CHUNK_SIZE):
     """Phase 2: Query OToL node_info for taxonomy-only nodes at all ranks."""
     print("\n=== Phase 2: Expanded Rank Query ===")
 
@@ -198,26 +218,24 @@ def phase2_expanded_ranks(existing, limit=None):
 
     aliases = []
     errors = 0
-    for i, (name, ott_id, rank) in enumerate(rows):
-        try:
-            resp = requests.post(
-                OTOL_API, json={"ott_id": ott_id}, timeout=30
-            )
-            d = resp.json()
-            synth_node_id = d.get("node_id", "")
-            if synth_node_id.startswith("mrcaott") and synth_node_id not in existing:
-                aliases.append((synth_node_id, name))
-                existing.add(synth_node_id)
-                print(f"  [{i+1}/{len(rows)}] {name} ({rank}) ->{synth_node_id}")
-        except Exception as e:
-            errors += 1
-            if errors <= 5:
-                print(f"  [{i+1}/{len(rows)}] {name} ERROR: {e}")
-
-        if (i + 1) % 200 == 0:
-            print(f"  ... progress: {i+1}/{len(rows)}, "
-                  f"{len(aliases)} aliases found")
-        time.sleep(0.3)
+    chunks = _settled_chunks(rows, lambda row: _otol_json(client, OTOL_API, {"ott_id": row[1]}), chunk_size)
+    async for start, results in chunks:
+        for i, ((name, ott_id, rank), d) in enumerate(results, start):
+            try:
+                if isinstance(d, Exception):
+                    raise d
+                synth_node_id = d.get("node_id", "")
+                if synth_node_id.startswith("mrcaott") and synth_node_id not in existing:
+                    aliases.append((synth_node_id, name))
+                    existing.add(synth_node_id)
+                    print(f"  [{i+1}/{len(rows)}] {name} ({rank}) ->{synth_node_id}")
+            except Exception as e:
+                errors += 1
+                if errors <= 5:
+                    print(f"  [{i+1}/{len(rows)}] {name} ERROR: {e}")
+
+        print(f"  ... progress: {start + len(results)}/{len(rows)}, "
+              f"{len(aliases)} aliases found", flush=True)
 
     print(f"\nPhase 2 done: {len(aliases)} new aliases ({errors} errors).")
     return aliases
@@ -225,7 +243,7 @@ def phase2_expanded_ranks(existing, limit=None):
 
 # ── Phase 3: Child-pair Wikidata search ──────────────────────────────────────
 
-def phase3_child_pair(existing, limit=500):
+async def phase3_child_pair(client, existing, limit=500, chunk_size=CHUNK_SIZE):
     """Phase 3: For top unaliased MRCA nodes, search Wikidata by child taxa."""
     print("\n=== Phase 3: Child-pair Wikidata Search ===")
 
@@ -244,8 +262,7 @@ def phase3_child_pair(existing, limit=500):
 
     print(f"Checking top {len(rows)} unaliased MRCA nodes by num_tips.")
 
-    aliases = []
-    errors = 0
+    jobs = []
     for i, (node_id, num_tips) in enumerate(rows):
         if node_id in existing:
             continue
@@ -281,29 +298,39 @@ SELECT ?item ?itemLabel ?ott WHERE {{
   SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en" }}
 }} LIMIT 1
 """
-        try:
-            r = requests.get(
-                WIKIDATA_SPARQL,
-                params={"query": sparql, "format": "json"},
-                headers=HEADERS, timeout=30,
-            )
-            bindings = r.json().get("results", {}).get("bindings", [])
-            if bindings:
-                label = bindings[0].get("itemLabel", {}).get("value", "")
-                if label and node_id not in existing:
-                    aliases.append((node_id, label))
-                    existing.add(node_id)
-                    print(f"  [{i+1}] {label} ->{node_id} "
-                          f"({name_a} + {name_b}, {num_tips:,} tips)")
-        except Exception as e:
-            errors += 1
-            if errors <= 5:
-                print(f"  [{i+1}] {node_id} ERROR: {e}")
+        jobs.append((i, node_id, num_tips, name_a, name_b, sparql))
+
+    async def child_pair_query(sparql):
+        r = await client.request(
+            "GET", WIKIDATA_SPARQL,
+            params={"query": sparql, "format": "json"},
+            timeout=30,
+        )
+        return r.json()
 
-        if (i + 1) % 50 == 0:
-            print(f"  ... progress: {i+1}/{len(rows)}, "
-                  f"{len(aliases)} aliases found")
-        time.sleep(1.0)  # be gentle with Wikidata
+    aliases = []
+    errors = 0
+    chunk_size = min(chunk_size, SPARQL_CHUNK_SIZE)
+    async for start, results in _settled_chunks(jobs, lambda job: child_pair_query(job[-1]), chunk_size):
+        for (i, node_id, num_tips, name_a, name_b, _), payload in results:
+            try:
+                if isinstance(payload, Exception):
+                    raise payload
+                bindings = payload.get("results", {}).get("bindings", [])
+                if bindings:
+                    label = bindings[0].get("itemLabel", {}).get("value", "")
+                    if label and node_id not in existing:
+                        aliases.append((node_id, label))
+                        existing.add(node_id)
+                        print(f"  [{i+1}] {label} ->{node_id} "
+                              f"({name_a} + {name_b}, {num_tips:,} tips)")
+            except Exception as e:
+                errors += 1
+                if errors <= 5:
+                    print(f"  [{i+1}] {node_id} ERROR: {e}")
+
+        print(f"  ... progress: {start + len(results)}/{len(jobs)} queries, "
+              f"{len(aliases)} aliases found", flush=True)
 
     print(f"\nPhase 3 done: {len(aliases)} new aliases ({errors} errors).")
     return aliases
@@ -320,7 +347,7 @@ def _get_all_node_ids():
     return {r[0] for r in rows}
 
 
-def phase4_wikidata_clades(existing, limit=None):
+async def phase4_wikidata_clades(client, existing, limit=None, chunk_size=CHUNK_SIZE):
     """Phase 4: Find Wikidata clades (no OTT ID) and match to MRCA nodes via OToL MRCA API."""
     print("\n=== Phase 4: Wikidata Clade -> MRCA Matching ===")
 
@@ -339,13 +366,12 @@ SELECT ?item ?itemLabel ?childOtt WHERE {
 """
     print("Querying Wikidata for clades without OTT IDs...")
     try:
-        r = requests.get(
+        payload = await client.get_json(
             WIKIDATA_SPARQL,
             params={"query": sparql, "format": "json"},
-            headers=HEADERS, timeout=120,
+            timeout=120,
         )
-        r.raise_for_status()
-        bindings = r.json().get("results", {}).get("bindings", [])
+        bindings = payload.get("results", {}).get("bindings", [])
     except Exception as e:
         print(f"  Wikidata query error: {e}")
         bindings = []
@@ -374,24 +400,29 @@ SELECT ?item ?itemLabel ?childOtt WHERE {
     # Step 2: Compute MRCA for each and match to our DB
     aliases = []
     errors = 0
-    for i, (qid, data) in enumerate(items):
-        label = data["label"]
-        otts = data["otts"][:3]
-        try:
-            resp = requests.post(MRCA_API, json={"ott_ids": otts}, timeout=30)
-            d = resp.json()
-            mrca = d.get("mrca", {}).get("node_id", "")
-            if (mrca.startswith("mrcaott")
-                    and mrca in our_nodes
-                    and mrca not in existing):
-                aliases.append((mrca, label))
-                existing.add(mrca)
-                print(f"  {label} -> {mrca}")
-        except Exception as e:
-            errors += 1
-            if errors <= 5:
-                print(f"  {label} ERROR: {e}")
-        time.sleep(0.3)
+    chunks = _settled_chunks(
+        items, lambda item: _otol_json(client, MRCA_API, {"ott_ids": item[1]["otts"][:3]}), chunk_size
+    )
+    async for start, results in chunks:
+        for (qid, data), d in results:
+            label = data["label"]
+            try:
+                if isinstance(d, Exception):
+                    raise d
+                mrca = d.get("mrca", {}).get("node_id", "")
+                if (mrca.startswith("mrcaott")
+                        and mrca in our_nodes
+                        and mrca not in existing):
+                    aliases.append((mrca, label))
+                    existing.add(mrca)
+                    print(f"  {label} -> {mrca}")
+            except Exception as e:
+                errors += 1
+                if errors <= 5:
+                    print(f"  {label} ERROR: {e}")
+
+        print(f"  ... progress: {start + len(results)}/{len(items)}, "
+              f"{len(aliases)} aliases found", flush=True)
 
     # Step 3: Also try well-known clades that lack Wikidata P171 child links
     # These are verified clade definitions from the phylogenetics literature
@@ -405,24 +436,27 @@ SELECT ?item ?itemLabel ?childOtt WHERE {
         "Ecdysozoa": [189832, 395057],         # Protostomia members: Arthropoda + Nematoda
         "Lophotrochozoa": [155737, 801601],    # Mollusca + Annelida
     }
-    for name, otts in well_known.items():
-        try:
-            resp = requests.post(MRCA_API, json={"ott_ids": otts}, timeout=30)
-            d = resp.json()
-            mrca = d.get("mrca", {}).get("node_id", "")
-            if (mrca.startswith("mrcaott")
-                    and mrca in our_nodes
-                    and mrca not in existing):
-                aliases.append((mrca, name))
-                existing.add(mrca)
-                print(f"  {name} -> {mrca}")
-            elif mrca in existing:
-                print(f"  {name} -> {mrca} (already aliased)")
-            elif not mrca.startswith("mrcaott"):
-                print(f"  {name} -> {mrca} (not an MRCA node)")
-        except Exception as e:
-            print(f"  {name} ERROR: {e}")
-        time.sleep(0.3)
+    chunks = _settled_chunks(
+        list(well_known.items()), lambda clade: _otol_json(client, MRCA_API, {"ott_ids": clade[1]}), chunk_size
+    )
+    async for _, results in chunks:
+        for (name, _), d in results:
+            try:
+                if isinstance(d, Exception):
+                    raise d
+                mrca = d.get("mrca", {}).get("node_id", "")
+                if (mrca.startswith("mrcaott")
+                        and mrca in our_nodes
+                        and mrca not in existing):
+                    aliases.append((mrca, name))
+                    existing.add(mrca)
+                    print(f"  {name} -> {mrca}")
+                elif mrca in existing:
+                    print(f"  {name} -> {mrca} (already aliased)")
+                elif not mrca.startswith("mrcaott"):
+                    print(f"  {name} -> {mrca} (not an MRCA node)")
+            except Exception as e:
+                print(f"  {name} ERROR: {e}")
 
     print(f"\nPhase 4 done: {len(aliases)} new aliases ({errors} errors).")
     return aliases
@@ -443,36 +477,45 @@ def main():
     parser.add_argument(
         "--limit", type=int, default=None,
         help="Cap API calls per phase")
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE,
+        help=f"Requests started per chunk; progress is printed per chunk (default: {CHUNK_SIZE}; "
+             f"SPARQL queries are capped at {SPARQL_CHUNK_SIZE})")
     parser.add_argument(
         "--resume", action="store_true", default=True,
         help="Skip MRCA nodes that already have display_name (default: true)")
     args = parser.parse_args()
 
+    asyncio.run(run_phases(args))
+
+
+async def run_phases(args):
     existing = get_existing_aliases() if args.resume else set()
     print(f"Starting with {len(existing)} existing aliases.")
 
     all_aliases = []
 
-    if args.phase in ("1", "all"):
-        aliases = phase1_wikidata_reverse(existing, limit=args.limit)
-        write_aliases(aliases, dry_run=args.dry_run)
-        all_aliases.extend(aliases)
-
-    if args.phase in ("2", "all"):
-        aliases = phase2_expanded_ranks(existing, limit=args.limit)
-        write_aliases(aliases, dry_run=args.dry_run)
-        all_aliases.extend(aliases)
-
-    if args.phase in ("3", "all"):
-        lim = args.limit or 500
-        aliases = phase3_child_pair(existing, limit=lim)
-        write_aliases(aliases, dry_run=args.dry_run)
-        all_aliases.extend(aliases)
-
-    if args.phase in ("4", "all"):
-        aliases = phase4_wikidata_clades(existing, limit=args.limit)
-        write_aliases(aliases, dry_run=args.dry_run)
-        all_aliases.extend(aliases)
+    async with AsyncEnrichmentClient(headers=HEADERS) as client:
+        if args.phase in ("1", "all"):
+            aliases = await phase1_wikidata_reverse(client, existing, limit=args.limit, chunk_size=args.chunk_size)
+            write_aliases(aliases, dry_run=args.dry_run)
+            all_aliases.extend(aliases)
+
+        if args.phase in ("2", "all"):
+            aliases = await phase2_expanded_ranks(client, existing, limit=args.limit, chunk_size=args.chunk_size)
+            write_aliases(aliases, dry_run=args.dry_run)
+            all_aliases.extend(aliases)
+
+        if args.phase in ("3", "all"):
+            lim = args.limit or 500
+            aliases = await phase3_child_pair(client, existing, limit=lim, chunk_size=args.chunk_size)
+            write_aliases(aliases, dry_run=args.dry_run)
+            all_aliases.extend(aliases)
+
+        if args.phase in ("4", "all"):
+            aliases = await phase4_wikidata_clades(client, existing, limit=args.limit, chunk_size=args.chunk_size)
+            write_aliases(aliases, dry_run=args.dry_run)
+            all_aliases.extend(aliases)
 
     print(f"\n{'='*60}")
     print(f"Total new aliases across all phases: {len(all_aliases)}")
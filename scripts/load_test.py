@@ -0,0 +1,464 @@
+"""Replay canvas navigation sessions against a running API and find its saturation point.
+
+Run with ``python -m scripts.load_test --url http://localhost:8600``. Each
+virtual user runs sessions one after another until its stage ends. A session
+is one of:
+
+- synthetic (default): a Markov walk over the canvas actions: load the root,
+  expand children, click a node for its context graph, fetch bulk metadata
+  for the visible nodes (``POST /node/batch`` with ``--batch``), or type a
+  search one keystroke at a time and open a result. Think time between
+  actions is exponential (``--think-ms``).
+- replayed (``--trace``): a JSON lines file of ``{"session", "at_ms",
+  "path"}`` records (plus ``"body"`` for POSTs), replayed per session with
+  the recorded gaps scaled by ``--speed``. ``--record`` writes synthetic
+  sessions in the same format.
+
+``--users 1 2 4 8 16 32`` ramps concurrency in stages of ``--stage-seconds``.
+Each stage reports throughput, latency percentiles, errors and 429s. It also
+reports queries per request and the combined cache hit ratio from
+``Server-Timing`` (hot-read and search candidate lookups together), and the
+search candidate cache hit rate on its own from ``GET /metrics``. The
+saturation point is the last stage before throughput stops growing while
+p95 climbs, or before errors (5xx or timeouts) appear. 429s are counted
+separately; they mean the rate limit, not the server, is the bottleneck.
+
+Every virtual user sends its own ``X-Forwarded-For`` address so the
+per-client anonymous rate limit applies per user, as in production
+(``--shared-client`` sends none). Note that the limit is 120 reads per
+minute by default.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote, urlencode
+
+import httpx
+
+DEFAULT_URL = "http://localhost:8600"
+DEFAULT_USERS = (1, 2, 4, 8, 16, 32)
+# Markov model of canvas navigation: action -> {next action: probability}.
+TRANSITIONS: dict[str, dict[str, float]] = {
+    "start": {"root": 0.85, "search": 0.15},
+    "root": {"children": 1.0},
+    "children": {"context": 0.55, "bulk": 0.3, "children": 0.1, "end": 0.05},
+    "context": {"bulk": 0.5, "children": 0.25, "context": 0.1, "search": 0.1, "end": 0.05},
+    "bulk": {"context": 0.5, "children": 0.2, "search": 0.15, "end": 0.15},
+    "search": {"context": 0.7, "search": 0.1, "end": 0.2},
+}
+FALLBACK_TERMS = ("mammalia", "insecta", "cat", "bee", "octopus", "fungi", "bird", "shark")
+MAX_SESSION_ACTIONS = 40
+BULK_SIZE = 40
+
+_SERVER_TIMING_QUERIES = re.compile(r'db;[^"]*desc="(\d+) queries')
+_SERVER_TIMING_CACHE = re.compile(r'cache;desc="(\d+) hits, (\d+) misses"')
+
+
+@dataclass
+class Sample:
+    route: str
+    status: int
+    latency_ms: float
+    queries: int | None = None
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+def route_name(path: str) -> str:
+    """Group a request path by endpoint, e.g. ``/tree/children/ott1`` -> ``tree/children``."""
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if parts[0] == "tree" and len(parts) > 1:
+        return f"tree/{parts[1]}"
+    if parts[0] == "node" and len(parts) > 1:
+        return f"node/{parts[1]}" if parts[1] in {"metadata", "bulk", "batch"} else "node"
+    return parts[0]
+
+
+def parse_server_timing(header: str | None) -> tuple[int | None, int, int]:
+    """``(queries, cache hits, cache misses)`` from the API's ``Server-Timing`` header."""
+    if not header:
+        return None, 0, 0
+    queries = _SERVER_TIMING_QUERIES.search(header)
+    cache = _SERVER_TIMING_CACHE.search(header)
+    return (
+        int(queries.group(1)) if queries else None,
+        int(cache.group(1)) if cache else 0,
+        int(cache.group(2)) if cache else 0,
+    )
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values``; 0 when empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class VirtualUser:
+    """One browser tab: issues requests and keeps the ids and names it has seen."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        samples: list[Sample],
+        rng: random.Random,
+        forwarded_for: str | None = None,
+        recorder: list[dict] | None = None,
+    ) -> None:
+        self.client = client
+        self.samples = samples
+        self.rng = rng
+        self.headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+        self.recorder = recorder
+        self.session_id = ""
+        self.session_started = 0.0
+
+    async def get(self, path: str, body: dict | None = None) -> Any:
+        """GET ``path``, or POST ``body`` to it as JSON; the decoded 200 body or None."""
+        if self.recorder is not None:
+            record = {
+                "session": self.session_id,
+                "at_ms": round((time.perf_counter() - self.session_started) * 1000, 1),
+                "path": path,
+            }
+            if body is not None:
+                record["body"] = body
+            self.recorder.append(record)
+        started = time.perf_counter()
+        try:
+            if body is None:
+                response = await self.client.get(path, headers=self.headers)
+            else:
+                response = await self.client.post(path, json=body, headers=self.headers)
+        except httpx.HTTPError:
+            self.samples.append(Sample(route_name(path), 0, (time.perf_counter() - started) * 1000))
+            return None
+        latency_ms = (time.perf_counter() - started) * 1000
+        queries, hits, misses = parse_server_timing(response.headers.get("Server-Timing"))
+        self.samples.append(Sample(route_name(path), response.status_code, latency_ms, queries, hits, misses))
+        if response.status_code != 200:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def start_session(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.session_started = time.perf_counter()
+
+
+class SyntheticSession:
+    """A Markov walk over canvas actions for one ``VirtualUser``."""
+
+    def __init__(
+        self,
+        user: VirtualUser,
+        think_ms: float,
+        typing_ms: float,
+        bulk_size: int = BULK_SIZE,
+        batch: bool = False,
+    ) -> None:
+        self.user = user
+        self.batch = batch
+        self.rng = user.rng
+        self.think_ms = think_ms
+        self.typing_ms = typing_ms
+        self.bulk_size = bulk_size
+        self.focus: str | None = None
+        self.visible: list[dict] = []
+
+    async def _pause(self, mean_ms: float) -> None:
+        if mean_ms > 0:
+            await asyncio.sleep(self.rng.expovariate(1000 / mean_ms))
+
+    def next_action(self, action: str) -> str:
+        choices = TRANSITIONS[action]
+        if action != "start" and self.focus is None:
+            return "root" if action != "root" else "end"
+        return self.rng.choices(list(choices), weights=list(choices.values()))[0]
+
+    def _remember(self, rows: Any) -> None:
+        if isinstance(rows, list) and rows:
+            self.visible = [row for row in rows if isinstance(row, dict) and row.get("node_id")]
+
+    async def root(self) -> None:
+        row = await self.user.get("/tree/root")
+        if row:
+            self.focus = row["node_id"]
+            self.visible = [row]
+
+    async def children(self) -> None:
+        target = self.rng.choice(self.visible)["node_id"] if self.visible and self.rng.random() < 0.5 else self.focus
+        rows = await self.user.get(f"/tree/children/{quote(target)}?limit=100")
+        if rows:
+            self.focus = target
+            self._remember(rows)
+
+    async def context(self) -> None:
+        target = self.rng.choice(self.visible)["node_id"] if self.visible else self.focus
+        graph = await self.user.get(f"/tree/context/{quote(target)}")
+        if graph:
+            self.focus = graph.get("focus_node_id", target)
+            self._remember(graph.get("nodes"))
+
+    async def bulk(self) -> None:
+        ids = [row["node_id"] for row in self.visible[: self.bulk_size]] or [self.focus]
+        if self.batch:
+            await self.user.get("/node/batch", {"node_ids": ids, "include_metadata": True})
+        else:
+            await self.user.get("/node/bulk?" + urlencode([("node_ids", node_id) for node_id in ids]))
+
+    async def search(self) -> None:
+        names = [row.get("display_name") or row.get("name") for row in self.visible]
+        words = [name.split()[0] for name in names if name] or list(FALLBACK_TERMS)
+        term = self.rng.choice(words).lower()[:10]
+        results = None
+        for length in range(2, len(term) + 1):
+            results = await self.user.get(f"/search?q={quote(term[:length])}") or results
+            await self._pause(self.typing_ms)
+        if results:
+            self.visible = [row for row in results if row.get("node_id")]
+            self.focus = self.focus or self.visible[0]["node_id"]
+
+    async def run(self, deadline: float, max_actions: int = MAX_SESSION_ACTIONS) -> None:
+        action = "start"
+        for _ in range(max_actions):
+            action = self.next_action(action)
+            if action == "end" or time.monotonic() >= deadline:
+                return
+            await getattr(self, action)()
+            await self._pause(self.think_ms)
+
+
+def load_trace(path: Path) -> list[list[dict]]:
+    """Group trace records into sessions, each sorted by ``at_ms``."""
+    sessions: dict[str, list[dict]] = defaultdict(list)
+    with open(path) as trace:
+        for line in trace:
+            if line.strip():
+                record = json.loads(line)
+                sessions[str(record.get("session", ""))].append(record)
+    return [sorted(records, key=lambda record: record.get("at_ms", 0)) for records in sessions.values()]
+
+
+async def replay_session(user: VirtualUser, records: list[dict], deadline: float, speed: float) -> None:
+    previous_ms = records[0].get("at_ms", 0) if records else 0
+    for record in records:
+        gap_ms = max(record.get("at_ms", 0) - previous_ms, 0) / speed
+        previous_ms = record.get("at_ms", 0)
+        if gap_ms:
+            await asyncio.sleep(gap_ms / 1000)
+        if time.monotonic() >= deadline:
+            return
+        await user.get(record["path"], record.get("body"))
+
+
+def forwarded_address(index: int) -> str:
+    return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+
+async def run_stage(
+    client: httpx.AsyncClient,
+    users: int,
+    seconds: float,
+    args: argparse.Namespace,
+    trace: list[list[dict]] | None,
+    recorder: list[dict] | None,
+    stage_index: int = 0,
+) -> tuple[list[Sample], float]:
+    samples: list[Sample] = []
+    deadline = time.monotonic() + seconds
+    session_counter = iter(range(10**9))
+
+    async def virtual_user(index: int) -> None:
+        rng = random.Random(f"{args.seed}-{stage_index}-{index}")
+        user = VirtualUser(
+            client,
+            samples,
+            rng,
+            forwarded_for=None if args.shared_client else forwarded_address(stage_index * 4096 + index + 1),
+            recorder=recorder,
+        )
+        while time.monotonic() < deadline:
+            number = next(session_counter)
+            user.start_session(f"{stage_index}-{index}-{number}")
+            if trace is not None:
+                await replay_session(user, trace[number % len(trace)], deadline, args.speed)
+            else:
+                await SyntheticSession(user, args.think_ms, args.typing_ms, batch=args.batch).run(deadline)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(index) for index in range(users)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict[str, Any]:
+    ok = [sample for sample in samples if 200 <= sample.status < 400 or sample.status == 404]
+    errors = sum(1 for sample in samples if sample.status == 0 or sample.status >= 500)
+    rate_limited = sum(1 for sample in samples if sample.status == 429)
+    latencies = [sample.latency_ms for sample in ok]
+    queries = [sample.queries for sample in ok if sample.queries is not None]
+    lookups = sum(sample.cache_hits + sample.cache_misses for sample in ok)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "errors": errors,
+        "rate_limited": rate_limited,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+        "cache_hit_ratio": round(sum(sample.cache_hits for sample in ok) / lookups, 4) if lookups else None,
+    }
+
+
+def find_saturation(
+    stages: list[dict[str, Any]],
+    min_throughput_gain: float = 0.10,
+    p95_growth: float = 1.5,
+    max_error_rate: float = 0.01,
+) -> dict[str, Any] | None:
+    """Last stage before errors appear or extra users stop buying throughput.
+
+    Returns ``None`` when every stage still scaled.
+    """
+    for previous, stage in zip(stages, stages[1:]):
+        if stage["error_rate"] > max_error_rate:
+            return {**previous, "reason": f"error rate {stage['error_rate']:.1%} at {stage['users']} users"}
+        if (
+            stage["throughput_rps"] < previous["throughput_rps"] * (1 + min_throughput_gain)
+            and stage["p95_ms"] > previous["p95_ms"] * p95_growth
+        ):
+            return {
+                **previous,
+                "reason": (
+                    f"{stage['users']} users added {stage['throughput_rps'] - previous['throughput_rps']:+.1f} req/s "
+                    f"while p95 went {previous['p95_ms']:.0f} -> {stage['p95_ms']:.0f} ms"
+                ),
+            }
+    if stages and stages[0]["error_rate"] > max_error_rate:
+        return {**stages[0], "reason": f"error rate {stages[0]['error_rate']:.1%} at {stages[0]['users']} users"}
+    return None
+
+
+async def search_candidate_stats(client: httpx.AsyncClient) -> dict[str, Any] | None:
+    try:
+        response = await client.get("/metrics")
+        return response.json()["caches"]["search_candidates"] if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError, KeyError):
+        return None
+
+
+def search_candidate_hit_rate(before: dict | None, after: dict | None) -> float | None:
+    if not before or not after:
+        return None
+    delta = {key: after.get(key, 0) - before.get(key, 0) for key in ("hits", "narrowed_hits", "misses", "fallbacks")}
+    lookups = delta["hits"] + delta["narrowed_hits"] + delta["misses"]
+    if lookups <= 0:
+        return None
+    return round((delta["hits"] + delta["narrowed_hits"] - delta["fallbacks"]) / lookups, 4)
+
+
+def _format_ratio(value: float | None) -> str:
+    return "-" if value is None else f"{value:.0%}"
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    trace = load_trace(args.trace) if args.trace else None
+    if trace is not None and not trace:
+        raise SystemExit(f"No sessions in {args.trace}")
+    recorder: list[dict] | None = [] if args.record else None
+    limits = httpx.Limits(max_connections=max(args.users) * 2, max_keepalive_connections=max(args.users))
+    stages = []
+    route_samples: dict[str, list[Sample]] = defaultdict(list)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        print(
+            f"{'users':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'429s':>6} "
+            f"{'queries':>8} {'caches':>9} {'search':>7}"
+        )
+        for stage_index, users in enumerate(args.users):
+            before = await search_candidate_stats(client)
+            samples, elapsed = await run_stage(client, users, args.stage_seconds, args, trace, recorder, stage_index)
+            after = await search_candidate_stats(client)
+            stage = {
+                "users": users,
+                **summarize(samples, elapsed),
+                "search_candidate_hit_rate": search_candidate_hit_rate(before, after),
+            }
+            stages.append(stage)
+            for sample in samples:
+                route_samples[sample.route].append(sample)
+            queries = "-" if stage["queries_per_request"] is None else f"{stage['queries_per_request']:.1f}"
+            print(
+                f"{users:>6} {stage['throughput_rps']:>9.1f} {stage['p50_ms']:>8.1f} {stage['p95_ms']:>8.1f} "
+                f"{stage['p99_ms']:>8.1f} {stage['errors']:>7} {stage['rate_limited']:>6} {queries:>8} "
+                f"{_format_ratio(stage['cache_hit_ratio']):>9} {_format_ratio(stage['search_candidate_hit_rate']):>7}"
+            )
+
+    routes = {}
+    print(f"\n{'route':<16} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name in sorted(route_samples):
+        summary = summarize(route_samples[name], 0)
+        routes[name] = {key: summary[key] for key in ("requests", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")}
+        queries = "-" if summary["queries_per_request"] is None else f"{summary['queries_per_request']:.1f}"
+        print(
+            f"{name:<16} {summary['requests']:>9} {summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} "
+            f"{summary['p99_ms']:>8.1f} {queries:>8}"
+        )
+
+    saturation = find_saturation(stages)
+    if saturation is None:
+        print(f"\nNo saturation up to {args.users[-1]} users.")
+    else:
+        print(
+            f"\nSaturation at ~{saturation['users']} users, {saturation['throughput_rps']:.1f} req/s "
+            f"(p95 {saturation['p95_ms']:.0f} ms): {saturation['reason']}"
+        )
+
+    if recorder is not None:
+        with open(args.record, "w") as trace_file:
+            for record in recorder:
+                trace_file.write(json.dumps(record) + "\n")
+        print(f"Recorded {len(recorder)} requests to {args.record}")
+    return {"url": args.url, "stages": stages, "routes": routes, "saturation": saturation}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=DEFAULT_URL, help="Base URL of a running API.")
+    parser.add_argument("--users", nargs="+", type=int, default=list(DEFAULT_USERS), help="Concurrent users per stage.")
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--think-ms", type=float, default=800.0, help="Mean pause between actions; 0 for a closed loop.")
+    parser.add_argument("--typing-ms", type=float, default=150.0, help="Mean pause between search keystrokes.")
+    parser.add_argument("--trace", type=Path, help="Replay sessions from a JSON lines trace.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier for --trace.")
+    parser.add_argument("--record", type=Path, help="Write the requests issued as a replayable trace.")
+    parser.add_argument("--batch", action="store_true", help="Load visible nodes with POST /node/batch instead of /node/bulk.")
+    parser.add_argument("--shared-client", action="store_true", help="Do not send per-user X-Forwarded-For.")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also write the results as JSON.")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
 import argparse
+import json
 from pathlib import Path
-import pandas as pd
 import logging
 
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy import text
 
-from cladecanvas.db import Session, assert_writes_allowed
-from cladecanvas.schema import initialize_postgres_db, nodes, metadata_table
+from cladecanvas.db import Session, assert_writes_allowed, engine
+from cladecanvas.schema import initialize_postgres_db, nodes
 from cladecanvas.enrich import fetch_wikidata
+from cladecanvas.metadata_writer import write_enrichment
+from cladecanvas.node_loader import (
+    DEFAULT_MAX_DELETE_FRACTION,
+    copy_nodes_from_csv,
+    diff_nodes,
+    iter_node_chunks,
+)
 
 DATA_CSV = Path("data/metazoa_nodes_synth.csv")
 LOG_FILE = Path("logs/enrich_errors.log")
@@ -18,13 +25,10 @@ logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s
 
 
 def load_nodes_from_csv(session, batch_size=10000):
-    df = pd.read_csv(DATA_CSV, dtype={"ott_id": "Int64", "num_tips": "Int64"})
-    # Convert pd.NA to None so SQLAlchemy handles nullable int correctly
-    records = df.where(pd.notna(df), other=None).to_dict("records")
-    n_synth = sum(1 for r in records if r.get("ott_id") is None)
+    # Stream the CSV in bounded chunks; memory stays flat however big the tree is.
+    n_synth = 0
     total_inserted = 0
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i + batch_size]
+    for batch in iter_node_chunks(DATA_CSV, batch_size):
         excluded = pg_insert(nodes).excluded
         stmt = pg_insert(nodes).values(batch).on_conflict_do_update(
             index_elements=["node_id"],
@@ -36,10 +40,11 @@ def load_nodes_from_csv(session, batch_size=10000):
         )
         session.execute(stmt)
         session.commit()
+        n_synth += sum(1 for r in batch if r["ott_id"] is None)
         total_inserted += len(batch)
         if total_inserted % 100000 < batch_size:
-            print(f"  ...{total_inserted:,}/{len(records):,} rows")
-    print(f"Upserted {len(records):,} nodes ({n_synth:,} synthetic, {len(records)-n_synth:,} taxon).")
+            print(f"  ...{total_inserted:,} rows")
+    print(f"Upserted {total_inserted:,} nodes ({n_synth:,} synthetic, {total_inserted-n_synth:,} taxon).")
 
 
 def get_missing_ott_ids(session, limit):
@@ -78,42 +83,13 @@ def enrich_and_store_metadata(session, ott_ids):
             text("SELECT node_id, ott_id, name FROM nodes WHERE ott_id = ANY(:ids)"),
             {"ids": ott_ids}
         ).fetchall()
-        enriched = fetch_wikidata([{"ott_id": row[1], "name": row[2], "node_id": row[0]} for row in rows])
-
-        # Attach node_id to each enriched record
-        node_id_map = {row[1]: row[0] for row in rows}  # ott_id -> node_id
-        for record in enriched:
-            if "node_id" not in record:
-                record["node_id"] = node_id_map.get(record["ott_id"])
-
-        # Deduplicate by node_id (last one wins)
-        metadata_columns = {c.name for c in metadata_table.columns}
-        deduped = {r["node_id"]: {k: v for k, v in r.items() if k in metadata_columns}
-                   for r in enriched if r.get("node_id")}.values()
-
-        if deduped:
-            insert_stmt = pg_insert(metadata_table).values(list(deduped))
-            update_fields = {
-                k: insert_stmt.excluded[k]
-                for k in next(iter(deduped)) if k != "node_id"
-            }
-            stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["node_id"],
-                set_=update_fields
-            )
-            session.execute(stmt)
-
-            # Update rank and has_metadata on nodes table
-            for record in enriched:
-                nid = record.get("node_id") or node_id_map.get(record.get("ott_id"))
-                if nid:
-                    session.execute(
-                        text("UPDATE nodes SET rank = :rank, has_metadata = 1 WHERE node_id = :nid"),
-                        {"rank": record.get("rank"), "nid": nid}
-                    )
+        batch = [{"ott_id": row[1], "name": row[2], "node_id": row[0]} for row in rows]
+        enriched = fetch_wikidata(batch)
 
+        stored = write_enrichment(session, batch, enriched)
+        if stored:
             session.commit()
-            print(f"Enriched and stored metadata for {len(deduped)} taxa.")
+            print(f"Enriched and stored metadata for {len(stored)} taxa.")
     except Exception as e:
         session.rollback()
         logging.error(f"Failed enrichment for {ott_ids}: {e}")
@@ -126,6 +102,17 @@ def main():
     parser = argparse.ArgumentParser(description="Populate DB with OpenTree + Wikidata metadata.")
     parser.add_argument("--limit", type=int, default=100, help="Batch size for enrichment")
     parser.add_argument("--skip-load", action="store_true", help="Skip loading nodes from CSV")
+    parser.add_argument("--loader", choices=("copy", "insert", "diff"), default="copy",
+                        help="copy: COPY into a staging table and merge once; insert: batched INSERT upserts; "
+                             "diff: apply only inserted/updated/deleted nodes and record a tree version")
+    parser.add_argument("--diff-dry-run", action="store_true",
+                        help="With --loader diff, report the changes without applying them")
+    parser.add_argument("--diff-report", type=Path, default=None,
+                        help="With --loader diff, write the change report as JSON to this path")
+    parser.add_argument("--max-delete-fraction", type=float, default=DEFAULT_MAX_DELETE_FRACTION,
+                        help="With --loader diff, refuse diffs deleting more than this share of nodes")
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="With --loader copy, drop secondary node indexes before the merge and rebuild them after")
     parser.add_argument("--skip-enrich", action="store_true", help="Skip metadata enrichment")
     parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
     parser.add_argument("--priority", action="store_true",
@@ -138,8 +125,23 @@ def main():
     session = Session()
 
     if not args.skip_load:
-        print("Loading nodes from CSV…")
-        load_nodes_from_csv(session)
+        print(f"Loading nodes from CSV ({args.loader})…")
+        if args.loader == "copy":
+            print(copy_nodes_from_csv(engine, DATA_CSV, rebuild_indexes=args.rebuild_indexes).summary())
+        elif args.loader == "diff":
+            report = diff_nodes(
+                engine,
+                iter_node_chunks(DATA_CSV),
+                apply=not args.diff_dry_run,
+                source=DATA_CSV.name,
+                max_delete_fraction=args.max_delete_fraction,
+            )
+            print(report.summary())
+            if args.diff_report:
+                args.diff_report.write_text(json.dumps(report.as_dict(), indent=2))
+                print(f"Wrote change report to {args.diff_report}")
+        else:
+            load_nodes_from_csv(session)
 
     if args.priority:
         priority_ids = get_priority_ott_ids(session, args.min_tips)
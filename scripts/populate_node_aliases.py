@@ -7,15 +7,15 @@ write aliases. The script is resumable because existing aliases are skipped.
 from __future__ import annotations
 
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 from datetime import datetime, timezone
 
-import requests
 from sqlalchemy import text
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from cladecanvas.db import Session, assert_writes_allowed
 from cladecanvas.enrich import HEADERS
+from cladecanvas.http_client import AsyncEnrichmentClient
 from cladecanvas.schema import node_aliases
 
 OTOL_NODE_INFO = "https://api.opentreeoflife.org/v3/tree_of_life/node_info"
@@ -51,15 +51,15 @@ def existing_node_ids(session, node_ids: list[str]) -> set[str]:
     return {row[0] for row in rows}
 
 
-def fetch_mapping(candidate: dict) -> dict:
+async def fetch_mapping(client: AsyncEnrichmentClient, candidate: dict) -> dict:
     try:
-        response = requests.post(
+        response = await client.request(
+            "POST",
             OTOL_NODE_INFO,
             json={"ott_id": int(candidate["ott_id"])},
-            headers=HEADERS,
             timeout=30,
         )
-        if not response.ok:
+        if not response.is_success:
             return {**candidate, "canonical_node_id": None, "error": f"http-{response.status_code}"}
         canonical_node_id = response.json().get("node_id")
         return {**candidate, "canonical_node_id": canonical_node_id, "error": None}
@@ -111,12 +111,33 @@ def write_aliases(session, mappings: list[dict], apply: bool) -> int:
     return len(records)
 
 
+async def populate(args: argparse.Namespace, candidates: list[dict]) -> None:
+    total_aliases = 0
+    total_checked = 0
+    async with AsyncEnrichmentClient(headers=HEADERS, max_concurrency=args.workers) as client:
+        for start in range(0, len(candidates), args.chunk_size):
+            chunk = candidates[start:start + args.chunk_size]
+            mappings = await asyncio.gather(*(fetch_mapping(client, candidate) for candidate in chunk))
+            total_checked += len(chunk)
+            with Session() as session:
+                written = write_aliases(session, mappings, args.apply)
+            total_aliases += written
+            errors = sum(1 for row in mappings if row.get("error"))
+            print(
+                f"[chunk] checked={total_checked}/{len(candidates)} "
+                f"aliases={total_aliases} errors={errors}",
+                flush=True,
+            )
+
+    print(f"[done] checked={total_checked} aliases={total_aliases}", flush=True)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--apply", action="store_true")
     parser.add_argument("--limit", type=int, default=None)
     parser.add_argument("--min-children", type=int, default=2)
-    parser.add_argument("--workers", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=12, help="Concurrent OpenTree requests.")
     parser.add_argument("--chunk-size", type=int, default=500)
     args = parser.parse_args()
 
@@ -129,27 +150,7 @@ def main() -> None:
         candidates = load_candidates(session, args.min_children, args.limit)
     print(f"[candidates] {len(candidates)} taxonomy-only nodes", flush=True)
 
-    total_aliases = 0
-    total_checked = 0
-    for start in range(0, len(candidates), args.chunk_size):
-        chunk = candidates[start:start + args.chunk_size]
-        mappings = []
-        with ThreadPoolExecutor(max_workers=args.workers) as executor:
-            futures = [executor.submit(fetch_mapping, candidate) for candidate in chunk]
-            for future in as_completed(futures):
-                mappings.append(future.result())
-        total_checked += len(chunk)
-        with Session() as session:
-            written = write_aliases(session, mappings, args.apply)
-        total_aliases += written
-        errors = sum(1 for row in mappings if row.get("error"))
-        print(
-            f"[chunk] checked={total_checked}/{len(candidates)} "
-            f"aliases={total_aliases} errors={errors}",
-            flush=True,
-        )
-
-    print(f"[done] checked={total_checked} aliases={total_aliases}", flush=True)
+    asyncio.run(populate(args, candidates))
 
 
 if __name__ == "__main__":
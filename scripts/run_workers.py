@@ -1,77 +1,67 @@
 import time
-import random
 from multiprocessing import Process
 from cladecanvas.db import Session, assert_writes_allowed
 from cladecanvas.enrich import fetch_wikidata
-from cladecanvas.schema import metadata_table
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy import text
+from cladecanvas.enrichment_pipeline import DEFAULT_FETCHERS, EnrichmentPipeline
+from cladecanvas.enrichment_queue import (
+    DEFAULT_LEASE_SECONDS,
+    EnrichmentQueue,
+    default_worker_id,
+    error_records,
+    outcome_records,
+    upsert_attempts,
+)
+from cladecanvas.metadata_writer import write_enrichment
+from cladecanvas.observability import configure_logging
 import argparse
 
-def get_batch(session, limit):
-    result = session.execute(text(f"""
-        SELECT n.ott_id, n.name, n.node_id
-        FROM nodes n
-        WHERE n.ott_id IS NOT NULL
-          AND NOT EXISTS (
-            SELECT 1 FROM metadata m WHERE m.node_id = n.node_id
-          )
-        ORDER BY RANDOM()
-        LIMIT {limit}
-    """))
-    return [{'ott_id': row[0], 'name': row[1], 'node_id': row[2]} for row in result.fetchall()]
+def store_batch(session, batch, enriched, worker_id=None):
+    success_ids = write_enrichment(session, batch, enriched)
+    upsert_attempts(session, outcome_records(batch, enriched, success_ids), worker_id)
+    return len(success_ids)
 
-def enrich_batch(worker_id, batch_size, sleep_time, loop_count):
-    for i in range(loop_count):
-        session = Session()
-        try:
-            print(f"[Worker {worker_id}] Requesting batch of {batch_size}…")
-            batch = get_batch(session, batch_size)
-            if not batch:
-                print(f"[Worker {worker_id}] No more taxa to enrich.")
-                break
+def enrich_batch(worker_id, batch_size, sleep_time, loop_count,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, fetchers=DEFAULT_FETCHERS):
+    # Batches come from the shared SKIP LOCKED queue, so workers never
+    # overlap and a crashed worker's lease is picked up once it expires.
+    # Within a worker, claiming, Wikidata fetches and upserts run as
+    # separate pipeline stages so the database and HTTP work overlap; the
+    # heartbeat keeps each batch leased from claim until it is written.
+    queue = EnrichmentQueue(worker_id=default_worker_id(f"w{worker_id}"), lease_seconds=lease_seconds)
 
-            enriched = fetch_wikidata(batch)
-            if enriched:
-                # Attach node_id from the batch lookup
-                node_id_map = {b['ott_id']: b['node_id'] for b in batch}
-                for row in enriched:
-                    if 'node_id' not in row:
-                        row['node_id'] = node_id_map.get(row['ott_id'])
-
-                metadata_columns = {c.name for c in metadata_table.columns}
-                deduped = {row['node_id']: {k: v for k, v in row.items() if k in metadata_columns}
-                           for row in enriched if row.get('node_id')}.values()
-
-                insert_stmt = pg_insert(metadata_table).values(list(deduped))
-                update_fields = {
-                    k: insert_stmt.excluded[k]
-                    for k in next(iter(deduped)) if k != "node_id"
-                }
-                stmt = insert_stmt.on_conflict_do_update(
-                    index_elements=["node_id"],
-                    set_=update_fields
-                )
-                session.execute(stmt)
-
-                for row in enriched:
-                    nid = row.get('node_id') or node_id_map.get(row.get('ott_id'))
-                    if nid:
-                        session.execute(
-                            text("UPDATE nodes SET rank = :rank, has_metadata = 1 WHERE node_id = :nid"),
-                            {"rank": row.get("rank"), "nid": nid}
-                        )
+    def claim():
+        print(f"[Worker {worker_id}] Requesting batch of {batch_size}…")
+        with Session() as session:
+            batch = queue.claim(session, batch_size)
+            session.commit()
+        if not batch:
+            print(f"[Worker {worker_id}] No more taxa to enrich.")
+        elif sleep_time:
+            time.sleep(sleep_time)
+        return batch
 
+    def write(batch, enriched, error):
+        with Session() as session:
+            try:
+                if error is not None:
+                    raise error
+                stored = store_batch(session, batch, enriched, queue.worker_id)
                 session.commit()
-                print(f"[Worker {worker_id}] Enriched {len(list(deduped))} entries.")
-        except Exception as e:
-            import traceback
-            print(f"[Worker {worker_id}] Error: {e}")
-            traceback.print_exc()
-            session.rollback()
-        finally:
-            session.close()
-        time.sleep(sleep_time + random.uniform(0, 0.5))
+                print(f"[Worker {worker_id}] Enriched {stored} entries.")
+            except Exception as e:
+                import traceback
+                print(f"[Worker {worker_id}] Error: {e}")
+                traceback.print_exc()
+                session.rollback()
+                upsert_attempts(session, error_records(batch, e), queue.worker_id)
+                session.commit()
+            finally:
+                queue.finish(row['node_id'] for row in batch)
+
+    configure_logging()
+    pipeline = EnrichmentPipeline(claim, fetch_wikidata, write, fetchers=fetchers, name=f"run_workers.w{worker_id}")
+    with queue.heartbeat(Session):
+        pipeline.run(loop_count)
 
 def main():
     assert_writes_allowed("background enrichment workers")
@@ -81,13 +71,15 @@ def main():
     parser.add_argument("--limit", type=int, default=100)
     parser.add_argument("--loops", type=int, default=10)
     parser.add_argument("--sleep", type=float, default=1.5)
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--fetchers", type=int, default=DEFAULT_FETCHERS)
     args = parser.parse_args()
 
     processes = []
     for i in range(args.workers):
         p = Process(
             target=enrich_batch,
-            args=(i, args.limit, args.sleep, args.loops)
+            args=(i, args.limit, args.sleep, args.loops, args.lease_seconds, args.fetchers)
         )
         p.start()
         processes.append(p)
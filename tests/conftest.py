@@ -8,3 +8,213 @@ if os.environ.get("CLADECANVAS_DEV_SQLITE") != "1":
 
 # Add project root to sys.path so `scripts/` is importable in tests.
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+
+class FakeHTTPServer:
+    """Local JSON HTTP server for exercising API clients offline.
+
+    ``routes`` maps a path to ``handler(params) -> dict`` where ``params`` is
+    the parsed query string with single values flattened, or the decoded JSON
+    body for POSTs. A handler may return ``(status, payload, headers)`` to
+    send a non-200 response. Every request is recorded in ``requests`` as
+    ``(path, params)``.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                params = {key: values[0] if len(values) == 1 else values
+                          for key, values in parse_qs(parts.query).items()}
+                self._respond(parts.path, params)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                self._respond(urlsplit(self.path).path, json.loads(body or b"{}"))
+
+            def _respond(self, path, params):
+                server.requests.append((path, params))
+                handler = server.routes.get(path)
+                if handler is None:
+                    self.send_error(404)
+                    return
+                result = handler(params)
+                status, payload, headers = result if isinstance(result, tuple) else (200, result, {})
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def fake_http_server():
+    with FakeHTTPServer() as server:
+        yield server
+
+
+class FakeResult:
+    """Stand-in for a SQLAlchemy ``Result`` with scripted rows and rowcount."""
+
+    def __init__(self, rows=(), rowcount=0):
+        self._rows = list(rows)
+        self.rowcount = rowcount
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def mappings(self):
+        return self
+
+    def fetchall(self):
+        return self._rows
+
+    def one(self):
+        return self._rows[0]
+
+    def scalar_one(self):
+        return self._rows[0][0]
+
+
+class RecordingSession:
+    """Stand-in for a Session or Connection that records what it executes.
+
+    Each statement is kept in ``statements`` as ``(sql, params)`` with
+    whitespace collapsed; with a ``dialect`` it is compiled first and the
+    compiled parameters are recorded. ``respond(sql, params)`` may return a
+    result for a statement; otherwise the scripted ``results`` are replayed
+    in order, then empty results.
+    """
+
+    def __init__(self, results=(), respond=None, dialect=None):
+        self.results = list(results)
+        self.respond = respond
+        self.dialect = dialect
+        self.statements = []
+        self.outcome = None
+
+    def execute(self, statement, params=None):
+        if self.dialect is not None:
+            compiled = statement.compile(dialect=self.dialect)
+            statement, params = compiled, compiled.params
+        sql = " ".join(str(statement).split())
+        self.statements.append((sql, params))
+        result = self.respond(sql, params) if self.respond is not None else None
+        if result is None:
+            result = self.results.pop(0) if self.results else FakeResult()
+        return result
+
+    @property
+    def sql(self):
+        return [sql for sql, _ in self.statements]
+
+    def begin(self):
+        return self
+
+    def commit(self):
+        self.outcome = "commit"
+
+    def rollback(self):
+        self.outcome = self.outcome or "rollback"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeEngine:
+    """Hands out one connection from both ``begin()`` and ``connect()``."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextmanager
+    def begin(self):
+        yield self.connection
+
+    @contextmanager
+    def connect(self):
+        yield self.connection
+
+
+@pytest.fixture
+def fake_result():
+    return FakeResult
+
+
+@pytest.fixture
+def recording_session():
+    return RecordingSession
+
+
+@pytest.fixture
+def fake_engine():
+    return FakeEngine
+
+
+@pytest.fixture
+def postgres_engine():
+    """Engine on a throwaway schema of ``CLADECANVAS_TEST_POSTGRES_URL``.
+
+    Every table is created without its indexes, so the fixture also works
+    on servers without extensions such as pg_trgm. Skips when the variable
+    is unset.
+    """
+    url = os.environ.get("CLADECANVAS_TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("set CLADECANVAS_TEST_POSTGRES_URL to run Postgres tests")
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.schema import CreateTable
+
+    from cladecanvas.schema import metadata
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        with engine.begin() as conn:
+            for table in metadata.sorted_tables:
+                conn.execute(CreateTable(table))
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+        admin.dispose()
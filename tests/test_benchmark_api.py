@@ -0,0 +1,112 @@
+import random
+
+from sqlalchemy import create_engine, func, select
+
+from cladecanvas.schema import metadata_table, node_aliases, nodes
+from scripts.benchmark_api import (
+    ROUTES,
+    build_database,
+    compare_results,
+    percentile,
+    server_timing_queries,
+    synthetic_rows,
+    tree_parents,
+)
+
+
+def _depths(parents):
+    depth = [0] * len(parents)
+    for index in range(1, len(parents)):
+        depth[index] = depth[parents[index]] + 1
+    return depth
+
+
+class TestSyntheticTrees:
+    def test_shapes(self):
+        caterpillar = tree_parents("caterpillar", 101)
+        polytomy = tree_parents("polytomy", 101)
+        metazoa = tree_parents("metazoa", 5_000, seed=3)
+
+        assert len(caterpillar) == len(polytomy) == 101
+        assert max(_depths(caterpillar)) == 50
+        assert max(_depths(polytomy)) == 1
+        assert len(metazoa) == 5_000
+        assert all(parent < index for index, parent in enumerate(metazoa) if parent is not None)
+        assert metazoa == tree_parents("metazoa", 5_000, seed=3)
+
+    def test_rows_are_consistent_and_aliases_take_over_children(self):
+        data = synthetic_rows("metazoa", 2_000, seed=1)
+        rows = {row["node_id"]: row for row in data["nodes"]}
+
+        assert len(rows) == len(data["nodes"]) == data["summary"]["nodes"]
+        root = [row for row in rows.values() if row["parent_node_id"] is None]
+        assert len(root) == 1 and root[0]["num_tips"] == sum(
+            1 for row in rows.values() if row["child_count"] == 0 and row["ott_id"] is not None
+        )
+        assert all(row["parent_node_id"] in rows for row in rows.values() if row["parent_node_id"])
+        assert data["aliases"]
+        for alias in data["aliases"]:
+            assert alias["canonical_node_id"] in rows
+            moved = [row for row in rows.values() if row["parent_node_id"] == alias["alias_node_id"]]
+            assert len(moved) == rows[alias["alias_node_id"]]["child_count"] >= 1
+        assert {row["node_id"] for row in data["metadata"]} <= set(rows)
+        assert data["targets"]["queries"]
+
+    def test_build_database(self, tmp_path):
+        info = build_database(tmp_path / "tree.sqlite", "polytomy", 300)
+        engine = create_engine(f"sqlite:///{tmp_path / 'tree.sqlite'}")
+
+        with engine.connect() as connection:
+            assert connection.execute(select(func.count()).select_from(nodes)).scalar_one() == 300
+            assert connection.execute(select(func.count()).select_from(node_aliases)).scalar_one() == 0
+            assert connection.execute(select(func.count()).select_from(metadata_table)).scalar_one() == info["summary"]["metadata"]
+        assert info["summary"]["max_fanout"] == 299
+
+
+def test_routes_cover_every_read_endpoint():
+    targets = synthetic_rows("caterpillar", 400)["targets"]
+    paths = {name: make_path(targets, random.Random(0)) for name, make_path in ROUTES.items()}
+
+    prefixes = {
+        "tree.root": "/tree/root",
+        "tree.children": "/tree/children/",
+        "tree.lineage": "/tree/lineage/",
+        "tree.context": "/tree/context/",
+        "tree.subtree": "/tree/subtree/",
+        "node.struct": "/node/",
+        "node.metadata": "/node/metadata/",
+        "node.bulk": "/node/bulk?",
+    }
+    for name, prefix in prefixes.items():
+        assert paths[name].startswith(prefix)
+    assert paths["search"].startswith("/search?q=")
+    assert paths["node.bulk"].count("node_ids=") == 50
+    assert paths["node.batch"][0] == "/node/batch" and len(paths["node.batch"][1]["node_ids"]) == 50
+
+
+def test_percentile_and_server_timing_parsing():
+    assert percentile([5.0, 1.0, 3.0, 2.0, 4.0], 0.5) == 3.0
+    assert percentile([5.0, 1.0, 3.0, 2.0, 4.0], 0.99) == 5.0
+    header = 'db;dur=1.234;desc="7 queries, 12 rows", cache;desc="0 hits, 1 misses", total;dur=3.000'
+    assert server_timing_queries(header) == 7
+    assert server_timing_queries(None) is None
+
+
+def _results(p95_ms, queries_max, alloc_peak_kib):
+    stats = {"p95_ms": p95_ms, "queries_max": queries_max, "alloc_peak_kib": alloc_peak_kib}
+    return {"cases": {"metazoa-1000": {"routes": {"tree.context": stats}}}}
+
+
+def test_compare_results_flags_latency_query_and_memory_regressions():
+    baseline = _results(10.0, 40, 500.0)
+
+    assert compare_results(_results(12.0, 40, 550.0), baseline, tolerance=0.25) == []
+    assert compare_results(_results(10.0, 40, 500.0), {"cases": {}}, tolerance=0.25) == []
+    regressions = compare_results(_results(20.0, 41, 900.0), baseline, tolerance=0.25)
+    assert regressions == [
+        "metazoa-1000 tree.context: p95 10.00 -> 20.00 ms",
+        "metazoa-1000 tree.context: max queries 40 -> 41",
+        "metazoa-1000 tree.context: alloc peak 500 -> 900 KiB",
+    ]
+    # Sub-millisecond p95 growth is noise, not a regression.
+    assert compare_results(_results(0.6, 40, 500.0), _results(0.3, 40, 500.0), tolerance=0.25) == []
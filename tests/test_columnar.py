@@ -0,0 +1,167 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+from cladecanvas.schema import metadata, metadata_table, node_aliases, nodes, tree_data_versions
+
+pa = pytest.importorskip("pyarrow")
+pd = pytest.importorskip("pandas")
+
+from cladecanvas.columnar import (  # noqa: E402 - after the pyarrow skip
+    EXPORT_TABLES,
+    arrow_schema,
+    export_table,
+    export_tables,
+    read_manifest,
+    read_pandas,
+    read_table,
+    write_parquet_parts,
+)
+
+
+def _engine(node_count=25):
+    engine = create_engine("sqlite:///:memory:")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            nodes.insert(),
+            [
+                {
+                    "node_id": f"ott{index}",
+                    "ott_id": index,
+                    "name": f"Taxon {index}",
+                    "parent_node_id": f"ott{index - 1}" if index else None,
+                    "rank": "species" if index % 2 else "genus",
+                    "child_count": 1,
+                    "has_metadata": int(index < 3),
+                    "num_tips": None if index % 5 == 0 else index,
+                }
+                for index in range(node_count)
+            ],
+        )
+        connection.execute(
+            metadata_table.insert(),
+            [
+                {
+                    "node_id": "ott1",
+                    "ott_id": 1,
+                    "common_name": "Cat",
+                    "last_updated": datetime(2026, 1, 2, 3, 4, 5),
+                    "enriched_score": 0.5,
+                    "field_sources": {"common_name": "wikidata"},
+                }
+            ],
+        )
+        connection.execute(
+            node_aliases.insert(),
+            [{"alias_node_id": "ott2", "canonical_node_id": "ott1", "reason": "canonical_alias"}],
+        )
+        connection.execute(tree_data_versions.insert(), [{"source": "full_load"}, {"source": "diff"}])
+    return engine
+
+
+class TestExport:
+    def test_round_trip_with_manifest(self, tmp_path):
+        manifest = export_tables(_engine(), tmp_path, rows_per_file=10, batch_rows=7)
+
+        assert manifest["tree_version"] == 2
+        assert set(manifest["tables"]) == set(EXPORT_TABLES)
+        assert manifest["tables"]["nodes"]["rows"] == 25
+        assert manifest["tables"]["nodes"]["files"] == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+        assert read_manifest(tmp_path) == manifest
+
+        table = read_table(tmp_path, "nodes")
+        assert table.num_rows == 25
+        assert table.schema.field("rank").type == pa.dictionary(pa.int32(), pa.string())
+        assert sorted(table.column("node_id").to_pylist()) == sorted(f"ott{i}" for i in range(25))
+        assert table.filter(pa.compute.field("node_id") == "ott5").column("num_tips").to_pylist() == [None]
+
+    def test_json_timestamps_and_empty_tables(self, tmp_path):
+        export_tables(_engine(), tmp_path)
+
+        row = read_table(tmp_path, "metadata").to_pylist()[0]
+        assert row["field_sources"] == '{"common_name": "wikidata"}'
+        assert row["last_updated"] == datetime(2026, 1, 2, 3, 4, 5)
+        assert row["source_label"] == "Wikidata/Wikipedia"
+
+        attempts = read_table(tmp_path, "metadata_enrichment_attempts")
+        assert attempts.num_rows == 0
+        assert attempts.schema == arrow_schema(export_table("metadata_enrichment_attempts"))
+
+    def test_reexport_replaces_one_table_and_keeps_the_rest(self, tmp_path):
+        export_tables(_engine(25), tmp_path, rows_per_file=10)
+        manifest = export_tables(_engine(4), tmp_path, tables=["nodes"])
+
+        assert read_table(tmp_path, "nodes").num_rows == 4
+        assert manifest["tables"]["nodes"]["files"] == ["part-00000.parquet"]
+        assert manifest["tables"]["node_aliases"]["rows"] == 1
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_filters_columns_and_pandas(self, tmp_path):
+        export_tables(_engine(), tmp_path)
+
+        species = read_table(tmp_path, "nodes", columns=["node_id"], filters=[("rank", "=", "species")])
+        assert species.column_names == ["node_id"]
+        assert species.num_rows == 12
+
+        df = read_pandas(tmp_path, "nodes", columns=["node_id", "rank", "num_tips"])
+        assert isinstance(df["node_id"].dtype, pd.ArrowDtype)
+        assert df["num_tips"].isna().sum() == 5
+
+    def test_tables_missing_from_the_database_are_skipped(self, tmp_path):
+        engine = create_engine("sqlite:///:memory:")
+        nodes.create(engine)
+
+        manifest = export_tables(engine, tmp_path)
+
+        assert manifest["tree_version"] is None
+        assert set(manifest["tables"]) == {"nodes"}
+        assert set(manifest["missing"]) == {"metadata", "node_aliases", "metadata_enrichment_attempts"}
+
+    def test_unknown_table(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown export table"):
+            read_table(tmp_path, "search_synonyms")
+
+
+def test_write_parquet_parts_splits_batches_across_files(tmp_path):
+    schema = pa.schema([pa.field("n", pa.int64())])
+    batches = [pa.RecordBatch.from_pydict({"n": list(range(start, start + 6))}, schema=schema) for start in (0, 6)]
+
+    export = write_parquet_parts(batches, schema, tmp_path, rows_per_file=5)
+
+    assert export.rows == 12
+    assert export.files == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+    assert read_counts(tmp_path, export.files) == [5, 5, 2]
+
+
+def test_reading_exports_needs_no_database_configuration(tmp_path):
+    export_tables(_engine(), tmp_path, tables=["nodes"])
+    env = {key: value for key, value in os.environ.items() if key not in {"POSTGRES_URL", "CLADECANVAS_DEV_SQLITE"}}
+    script = (
+        "import sys; from cladecanvas.columnar import read_table; "
+        "assert 'cladecanvas.db' not in sys.modules; "
+        f"print(read_table({str(tmp_path)!r}, 'nodes').num_rows)"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parent.parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "25"
+
+
+def read_counts(directory, files):
+    import pyarrow.parquet as pq
+
+    return [pq.ParquetFile(directory / name).metadata.num_rows for name in files]
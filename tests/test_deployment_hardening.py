@@ -3,15 +3,17 @@ from types import SimpleNamespace
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, insert
+from sqlalchemy import create_engine, insert, update
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from cladecanvas.api import hardening
 from cladecanvas.api.main import get_cors_origins
 from cladecanvas.api.main import app
+from cladecanvas.api.deps import get_db
 from cladecanvas.api.routes.tree import get_db as get_tree_db
-from cladecanvas.schema import metadata_table, nodes
+from cladecanvas.api.tree_version import TreeVersionWatcher
+from cladecanvas.schema import metadata, metadata_table, nodes, tree_data_versions, tree_node_changes
 from scripts.verify_db_indexes import REQUIRED_INDEXES
 
 
@@ -178,3 +180,81 @@ def test_children_endpoint_marks_last_page_not_truncated():
     assert response.headers["X-Limit"] == "2"
     assert response.headers["X-Offset"] == "1"
     assert response.headers["X-Has-More"] == "false"
+
+
+def _versioned_db():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(nodes), [
+            {"node_id": "ott1", "name": "Old name", "num_tips": 2},
+            {"node_id": "ott2", "name": "Untouched", "num_tips": 1},
+        ])
+    return engine, sessionmaker(bind=engine)
+
+
+def test_diff_load_evicts_cached_changed_nodes():
+    engine, SessionLocal = _versioned_db()
+    watcher = TreeVersionWatcher()
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    hardening.hot_read_cache._entries.clear()
+    hardening._rate_windows.clear()
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        client = TestClient(app)
+        with SessionLocal() as db:
+            assert watcher.refresh(db) is False
+        assert client.get("/node/ott1").json()["name"] == "Old name"
+        client.get("/node/ott2")
+
+        with engine.begin() as conn:
+            conn.execute(update(nodes).where(nodes.c.node_id == "ott1").values(name="New name"))
+            version = conn.execute(insert(tree_data_versions).values(
+                source="diff", inserted=0, updated=1, deleted=0, unchanged=1,
+            )).inserted_primary_key[0]
+            conn.execute(insert(tree_node_changes).values(version=version, node_id="ott1", change="update"))
+        assert client.get("/node/ott1").json()["name"] == "Old name"
+
+        with SessionLocal() as db:
+            assert watcher.refresh(db) is True
+            assert watcher.refresh(db) is False
+        assert ("node_struct", "ott1") not in hardening.hot_read_cache._entries
+        assert ("node_struct", "ott2") in hardening.hot_read_cache._entries
+        assert client.get("/node/ott1").json()["name"] == "New name"
+    finally:
+        app.dependency_overrides.clear()
+        hardening.hot_read_cache._entries.clear()
+
+
+def test_full_load_clears_hot_read_cache():
+    engine, SessionLocal = _versioned_db()
+    watcher = TreeVersionWatcher()
+    hardening.hot_read_cache._entries.clear()
+    try:
+        with SessionLocal() as db:
+            watcher.refresh(db)
+            hardening.hot_read_cache.set_many({("node_struct", "ott2"): {}, ("tree_root",): {}})
+            db.execute(insert(tree_data_versions).values(source="full_load"))
+            db.commit()
+            assert watcher.refresh(db) is True
+        assert hardening.hot_read_cache._entries == {}
+    finally:
+        hardening.hot_read_cache._entries.clear()
+
+
+def test_tree_version_watcher_ignores_databases_without_versions():
+    engine = create_engine("sqlite://")
+    nodes.create(engine)
+    with sessionmaker(bind=engine)() as db:
+        assert TreeVersionWatcher().refresh(db) is False
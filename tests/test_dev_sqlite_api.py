@@ -23,6 +23,25 @@ def test_dev_sqlite_read_only_routes_boot():
     search = client.get("/search?q=Eutheria")
     assert search.status_code == 200
     assert search.json()[0]["node_id"] == "ott683263"
+    assert search.headers["Server-Timing"].startswith("db;dur=")
+    assert "0 queries" not in search.headers["Server-Timing"]
+
+
+
+def test_dev_sqlite_node_batch_without_alias_table():
+    from cladecanvas.api.hardening import hot_read_cache
+    from cladecanvas.api.main import app
+
+    hot_read_cache._entries.clear()
+    response = TestClient(app).post(
+        "/node/batch",
+        json={"node_ids": ["ott683263", "ott691846", "ott0"], "include_metadata": True},
+    )
+
+    assert response.status_code == 200
+    assert [item["requested_id"] for item in response.json()["nodes"]] == ["ott683263", "ott691846"]
+    assert response.json()["nodes"][0]["node"]["name"] == "Eutheria"
+    assert response.json()["missing"] == ["ott0"]
 
 
 def test_dev_sqlite_database_is_read_only():
@@ -60,3 +79,44 @@ def test_dev_sqlite_write_scripts_fail_clearly():
 
     with pytest.raises(RuntimeError, match="metadata repair.*dev-sqlite"):
         runpy.run_module("scripts.fix_wrong_metadata", run_name="__main__")
+
+
+def test_dev_sqlite_metrics_report_percentiles_and_prometheus():
+    from cladecanvas.api.main import app
+
+    client = TestClient(app)
+    client.get("/tree/root")
+
+    rollups = client.get("/metrics").json()["rollups"]
+    rollup = next(value for key, value in rollups.items() if key.startswith("endpoint:GET ") and key.endswith("/root"))
+    assert {"count", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"} <= set(rollup)
+
+    prometheus = client.get("/metrics/prometheus")
+    assert prometheus.status_code == 200
+    assert prometheus.headers["content-type"].startswith("text/plain")
+    assert 'cladecanvas_latency_seconds_count{kind="endpoint",name="GET ' in prometheus.text
+
+
+def test_dev_sqlite_query_metrics_group_statements_by_fingerprint(monkeypatch):
+    from cladecanvas import profiling
+    from cladecanvas.api.main import app
+
+    client = TestClient(app)
+    client.get("/node/ott683263")
+    client.get("/node/ott691846")
+
+    response = client.get("/metrics/queries", params={"sort": "count", "limit": 500})
+    assert response.status_code == 200
+    queries = response.json()["queries"]
+    assert queries
+    assert all("'ott683263'" not in query["statement"] for query in queries)
+    assert {"fingerprint", "statement", "count", "p95_ms", "rows", "slow"} <= set(queries[0])
+
+    assert client.get("/metrics/queries", params={"sort": "name"}).status_code == 422
+    # Plans embed literal parameter values; without a profiling token they stay hidden.
+    assert client.get("/metrics/queries", params={"plans": "1"}).status_code == 404
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    assert client.get("/metrics/queries", params={"plans": "1"}).status_code == 403
+    assert client.get(
+        "/metrics/queries", params={"plans": "1"}, headers={profiling.PROFILE_TOKEN_HEADER: "secret"}
+    ).status_code == 200
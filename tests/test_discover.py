@@ -73,3 +73,53 @@ class TestWriteAliases:
         write_aliases(aliases, dry_run=True)
         captured = capsys.readouterr()
         assert "5 more" in captured.out
+
+
+# ── chunked request fan-out ──────────────────────────────────────────────────
+
+class TestSettledChunks:
+    def test_bounds_in_flight_requests_and_keeps_failures(self):
+        """Each chunk finishes before the next starts; errors come back as values."""
+        import asyncio
+        from scripts.discover_mrca_names import _settled_chunks
+
+        in_flight = 0
+        peak = 0
+
+        async def request(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            if item == 3:
+                raise ValueError("boom")
+            return item * 10
+
+        async def collect():
+            return [chunk async for chunk in _settled_chunks(list(range(5)), request, chunk_size=2)]
+
+        chunks = asyncio.run(collect())
+        assert peak == 2
+        assert [start for start, _ in chunks] == [0, 2, 4]
+        results = [pair for _, chunk in chunks for pair in chunk]
+        assert [item for item, _ in results] == [0, 1, 2, 3, 4]
+        assert isinstance(results[3][1], ValueError)
+        assert [resp for item, resp in results if item != 3] == [0, 10, 20, 40]
+
+    def test_sparql_phase_chunks_fit_the_query_rate(self, monkeypatch, recording_session):
+        """Phase 3 never starts more SPARQL queries than the Wikidata bucket's burst."""
+        import asyncio
+        import scripts.discover_mrca_names as discover
+
+        seen = []
+
+        async def fake_chunks(items, request, chunk_size=discover.CHUNK_SIZE):
+            seen.append(chunk_size)
+            return
+            yield
+
+        monkeypatch.setattr(discover, "Session", lambda: recording_session())
+        monkeypatch.setattr(discover, "_settled_chunks", fake_chunks)
+        asyncio.run(discover.phase3_child_pair(None, set(), limit=10, chunk_size=200))
+        assert seen == [discover.SPARQL_CHUNK_SIZE]
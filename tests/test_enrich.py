@@ -1,9 +1,11 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch
+from cladecanvas.synonyms import pluralize, synonym_records
 from cladecanvas.enrich import (
     build_field_sources,
     clean_taxon_name,
     fetch_wikipedia_extract,
+    fetch_wikipedia_extracts,
     fetch_wikidata,
     infer_common_name,
 )
@@ -57,11 +59,10 @@ class TestCleanTaxonName:
 # ── fetch_wikipedia_extract ──────────────────────────────────────────────────
 
 class TestFetchWikipediaExtract:
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_happy_path(self, mock_get):
         """Full pipeline: Wikidata sitelink -> Wikipedia extract."""
-        wikidata_resp = MagicMock()
-        wikidata_resp.json.return_value = {
+        wikidata_resp = {
             "entities": {
                 "Q5173": {
                     "sitelinks": {
@@ -70,10 +71,9 @@ class TestFetchWikipediaExtract:
                 }
             }
         }
-        wiki_resp = MagicMock()
-        wiki_resp.json.return_value = {
+        wiki_resp = {
             "query": {
-                "pages": [{"extract": "<p>Bilateria are animals.</p>"}]
+                "pages": [{"title": "Bilateria", "extract": "<p>Bilateria are animals.</p>"}]
             }
         }
         mock_get.side_effect = [wikidata_resp, wiki_resp]
@@ -83,11 +83,10 @@ class TestFetchWikipediaExtract:
         assert "Bilateria" in text
         assert url == "https://en.wikipedia.org/wiki/Bilateria"
 
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_no_enwiki_sitelink(self, mock_get):
         """No English Wikipedia article -> (None, None)."""
-        resp = MagicMock()
-        resp.json.return_value = {
+        resp = {
             "entities": {
                 "Q999": {"sitelinks": {"dewiki": {"title": "Etwas"}}}
             }
@@ -98,19 +97,17 @@ class TestFetchWikipediaExtract:
         assert text is None
         assert url is None
 
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_wikipedia_no_extract(self, mock_get):
         """Wikipedia page exists but has no extract field."""
-        wikidata_resp = MagicMock()
-        wikidata_resp.json.return_value = {
+        wikidata_resp = {
             "entities": {
                 "Q123": {
                     "sitelinks": {"enwiki": {"title": "SomeTaxon"}}
                 }
             }
         }
-        wiki_resp = MagicMock()
-        wiki_resp.json.return_value = {
+        wiki_resp = {
             "query": {"pages": [{"title": "SomeTaxon"}]}
         }
         mock_get.side_effect = [wikidata_resp, wiki_resp]
@@ -120,6 +117,57 @@ class TestFetchWikipediaExtract:
         assert url == "https://en.wikipedia.org/wiki/SomeTaxon"
 
 
+class TestFetchWikipediaExtractsBatched:
+    @pytest.fixture
+    def mediawiki(self, fake_http_server, monkeypatch):
+        sitelinks = {f"Q{i}": f"Taxon {i}" for i in range(120)}
+        extracts = {title: f"<p>About {title}.</p>" for title in sitelinks.values()}
+        sitelinks["Q7"] = "taxon_7"
+        del extracts["Taxon 3"]
+
+        def wbgetentities(params):
+            return {"entities": {
+                q: {"sitelinks": {"enwiki": {"title": sitelinks[q]}}} if q in sitelinks else {"missing": ""}
+                for q in params["ids"].split("|")
+            }}
+
+        def query(params):
+            titles = params["titles"].split("|")
+            normalized = [{"from": t, "to": "Taxon 7"} for t in titles if t == "taxon_7"]
+            pages = []
+            for title in titles:
+                title = "Taxon 7" if title == "taxon_7" else title
+                page = {"title": title}
+                if title in extracts:
+                    page["extract"] = extracts[title]
+                pages.append(page)
+            return {"query": {"normalized": normalized, "pages": pages}}
+
+        fake_http_server.routes = {"/wikidata": wbgetentities, "/wikipedia": query}
+        monkeypatch.setattr("cladecanvas.enrich.WIKIDATA_API", f"{fake_http_server.url}/wikidata")
+        monkeypatch.setattr("cladecanvas.enrich.WIKIPEDIA_API", f"{fake_http_server.url}/wikipedia")
+        return fake_http_server
+
+    def test_batches_sitelinks_and_extracts(self, mediawiki):
+        qids = [f"Q{i}" for i in range(120)] + ["Q999"]
+        results = fetch_wikipedia_extracts(qids)
+
+        paths = [path for path, _ in mediawiki.requests]
+        assert paths.count("/wikidata") == 3
+        assert paths.count("/wikipedia") == 6
+        assert results["Q0"] == ("<p>About Taxon 0.</p>", "https://en.wikipedia.org/wiki/Taxon_0")
+        assert results["Q3"] == (None, "https://en.wikipedia.org/wiki/Taxon_3")
+        assert results["Q7"] == ("<p>About Taxon 7.</p>", "https://en.wikipedia.org/wiki/taxon_7")
+        assert results["Q999"] == (None, None)
+
+    def test_single_qid_wrapper_uses_batch_path(self, mediawiki):
+        assert fetch_wikipedia_extract("Q1") == (
+            "<p>About Taxon 1.</p>",
+            "https://en.wikipedia.org/wiki/Taxon_1",
+        )
+        assert len(mediawiki.requests) == 2
+
+
 class TestInferCommonName:
     def test_prefers_wikipedia_title_for_scientific_label(self):
         assert infer_common_name(
@@ -160,24 +208,22 @@ class TestBuildFieldSources:
 # ── fetch_wikidata ───────────────────────────────────────────────────────────
 
 class TestFetchWikidata:
-    @patch("cladecanvas.enrich.fetch_wikipedia_extract", return_value=(None, None))
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock, return_value={})
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_empty_input(self, mock_get, mock_wiki):
         """Empty node list should return empty results."""
-        mock_resp = MagicMock()
-        mock_resp.json.return_value = {"results": {"bindings": []}}
+        mock_resp = {"results": {"bindings": []}}
         mock_get.return_value = mock_resp
 
         results = fetch_wikidata([])
         assert results == []
 
-    @patch("cladecanvas.enrich.fetch_wikipedia_extract")
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock)
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_p9157_hit(self, mock_get, mock_wiki):
         """P9157 SPARQL match returns enriched record."""
-        mock_wiki.return_value = ("<p>Description</p>", "https://en.wikipedia.org/wiki/Bilateria")
-        sparql_resp = MagicMock()
-        sparql_resp.json.return_value = {
+        mock_wiki.side_effect = lambda client, qids: dict.fromkeys(qids, ("<p>Description</p>", "https://en.wikipedia.org/wiki/Bilateria"))
+        sparql_resp = {
             "results": {
                 "bindings": [{
                     "ott": {"value": "117569"},
@@ -201,13 +247,12 @@ class TestFetchWikidata:
         assert results[0]["source_match_method"] == "ott_id"
         assert results[0]["field_sources"]["common_name"]["source_label"] == "Wikidata"
 
-    @patch("cladecanvas.enrich.fetch_wikipedia_extract")
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock)
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_enriched_score_zero_when_no_desc_no_image(self, mock_get, mock_wiki):
         """Score should be 0.0 when no full_description and no image."""
-        mock_wiki.return_value = (None, None)
-        sparql_resp = MagicMock()
-        sparql_resp.json.return_value = {
+        mock_wiki.side_effect = lambda client, qids: dict.fromkeys(qids, (None, None))
+        sparql_resp = {
             "results": {
                 "bindings": [{
                     "ott": {"value": "999"},
@@ -222,21 +267,20 @@ class TestFetchWikidata:
         assert len(results) == 1
         assert results[0]["enriched_score"] == 0.0
 
-    @patch("cladecanvas.enrich.fetch_wikipedia_extract")
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock)
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_fallback_by_name(self, mock_get, mock_wiki):
         """When P9157 misses, fallback queries by taxon name (P225)."""
-        mock_wiki.return_value = (None, "https://en.wikipedia.org/wiki/Rara")
+        mock_wiki.side_effect = lambda client, qids: dict.fromkeys(qids, (None, "https://en.wikipedia.org/wiki/Rara"))
 
         # First call: P9157 SPARQL returns nothing
-        sparql_empty = MagicMock()
-        sparql_empty.json.return_value = {"results": {"bindings": []}}
+        sparql_empty = {"results": {"bindings": []}}
 
         # Second call: P225 fallback returns a match
-        sparql_fallback = MagicMock()
-        sparql_fallback.json.return_value = {
+        sparql_fallback = {
             "results": {
                 "bindings": [{
+                    "name": {"value": "Rara"},
                     "item": {"value": "http://www.wikidata.org/entity/Q888"},
                     "itemLabel": {"value": "Rara"},
                 }]
@@ -250,15 +294,47 @@ class TestFetchWikidata:
         assert results[0]["source_match_method"] == "taxon_name"
         assert results[0]["field_sources"]["common_name"]["fallback"] is True
 
-    @patch("cladecanvas.enrich.fetch_wikipedia_extract")
-    @patch("cladecanvas.enrich.requests.get")
+    @patch("cladecanvas.enrich.FALLBACK_NAMES_PER_QUERY", 2)
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock)
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
+    def test_fallback_batches_names_and_keeps_first_hit(self, mock_get, mock_wiki):
+        """P225 fallback sends one VALUES query per chunk and maps hits back by name."""
+        mock_wiki.side_effect = lambda client, qids: dict.fromkeys(qids, (None, None))
+
+        def binding(name, q):
+            return {
+                "name": {"value": name},
+                "item": {"value": f"http://www.wikidata.org/entity/{q}"},
+                "itemLabel": {"value": name},
+            }
+
+        sparql_empty = {"results": {"bindings": []}}
+        first_chunk = {"results": {"bindings": [
+            binding("Rara", "Q1"), binding("Rara", "Q2"), binding('Quo"ta', "Q3"),
+        ]}}
+        second_chunk = {"results": {"bindings": []}}
+        mock_get.side_effect = [sparql_empty, first_chunk, second_chunk]
+
+        results = fetch_wikidata([
+            {"ott_id": 1, "name": "Rara", "node_id": "ott1"},
+            {"ott_id": 2, "name": "Rara (genus)", "node_id": "ott2"},
+            {"ott_id": 3, "name": 'Quo"ta', "node_id": "ott3"},
+            {"ott_id": 4, "name": "Missa", "node_id": "ott4"},
+        ])
+
+        assert mock_get.call_count == 3
+        first_query = mock_get.call_args_list[1].kwargs["params"]["query"]
+        assert 'VALUES ?name { "Rara" "Quo\\"ta" }' in first_query
+        assert {r["ott_id"]: r["wikidata_q"] for r in results} == {1: "Q1", 2: "Q1", 3: "Q3"}
+
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock)
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
     def test_sp_name_skips_fallback(self, mock_get, mock_wiki):
         """Nodes with 'sp.' in name should NOT fallback to parent clade."""
-        mock_wiki.return_value = (None, None)
+        mock_wiki.side_effect = lambda client, qids: dict.fromkeys(qids, (None, None))
 
         # P9157 returns nothing (no OTT match for this specimen)
-        sparql_empty = MagicMock()
-        sparql_empty.json.return_value = {"results": {"bindings": []}}
+        sparql_empty = {"results": {"bindings": []}}
         mock_get.return_value = sparql_empty
 
         results = fetch_wikidata([
@@ -267,3 +343,52 @@ class TestFetchWikidata:
         assert len(results) == 0
         # Should only have called SPARQL once (P9157), NOT the P225 fallback
         assert mock_get.call_count == 1
+
+    @patch("cladecanvas.enrich.fetch_wikipedia_extracts_async", new_callable=AsyncMock)
+    @patch("cladecanvas.enrich.AsyncEnrichmentClient.get_json", new_callable=AsyncMock)
+    def test_collects_english_vernacular_names(self, mock_get, mock_wiki):
+        """P1843 rows for the chosen item become vernacular_names."""
+        mock_wiki.side_effect = lambda client, qids: dict.fromkeys(qids, (None, "https://en.wikipedia.org/wiki/Cat"))
+        binding = {
+            "ott": {"value": "563166"},
+            "item": {"value": "http://www.wikidata.org/entity/Q146"},
+            "itemLabel": {"value": "Felis catus"},
+        }
+        sparql_resp = {
+            "results": {
+                "bindings": [
+                    {**binding, "vernacular": {"value": "house cat"}},
+                    {**binding, "vernacular": {"value": "domestic cat"}},
+                    {**binding, "vernacular": {"value": "house cat"}},
+                ]
+            }
+        }
+        mock_get.return_value = sparql_resp
+
+        results = fetch_wikidata([{"ott_id": 563166, "name": "Felis catus", "node_id": "ott563166"}])
+
+        assert results[0]["vernacular_names"] == ["house cat", "domestic cat"]
+
+
+# ── synonym_records ──────────────────────────────────────────────────────────
+
+class TestSynonymRecords:
+    def test_vernacular_and_plural_rows_point_at_common_name(self):
+        records = synonym_records([{
+            "common_name": "Cat",
+            "vernacular_names": ["house cat", "cat"],
+        }])
+        pairs = {(r["term"], r["synonym"], r["source"]) for r in records}
+
+        assert pairs == {
+            ("house cat", "cat", "wikidata_vernacular"),
+            ("cats", "cat", "plural"),
+            ("house cats", "house cat", "plural"),
+        }
+
+    def test_pluralize_skips_binomials_and_handles_suffixes(self):
+        assert pluralize("Felis catus") is None
+        assert pluralize("house cat") == "house cats"
+        assert pluralize("fox") == "foxes"
+        assert pluralize("butterfly") == "butterflies"
+        assert pluralize("monkey") == "monkeys"
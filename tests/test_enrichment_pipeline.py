@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from cladecanvas.enrichment_pipeline import EnrichmentPipeline
+from cladecanvas.observability import metrics
+
+
+def _claims(count, size=2):
+    batches = [[{"node_id": f"ott{b}-{i}"} for i in range(size)] for b in range(count)]
+    lock = threading.Lock()
+
+    def claim():
+        with lock:
+            return batches.pop(0) if batches else []
+
+    return claim
+
+
+class TestEnrichmentPipeline:
+    def test_every_claimed_batch_is_fetched_and_written_once(self):
+        metrics.reset()
+        written = []
+
+        def write(batch, enriched, error):
+            written.append((batch[0]["node_id"], len(enriched), error))
+
+        summary = EnrichmentPipeline(
+            _claims(6), lambda batch: list(batch), write, fetchers=3, name="test"
+        ).run(max_batches=100)
+
+        assert sorted(node_id for node_id, _, _ in written) == [f"ott{b}-0" for b in range(6)]
+        assert all(count == 2 and error is None for _, count, error in written)
+        assert summary["stages"]["write"]["rows"] == 12
+        assert summary["stages"]["claim"]["batches"] == 7  # six batches and the empty drain
+        rollups = metrics.snapshot()["rollups"]
+        assert rollups["pipeline:test.fetch"]["count"] == 6
+        assert rollups["pipeline:test.write"]["count"] == 6
+
+    def test_max_batches_bounds_claims(self):
+        written = []
+
+        EnrichmentPipeline(
+            _claims(10), lambda batch: batch, lambda batch, enriched, error: written.append(batch)
+        ).run(max_batches=3)
+
+        assert len(written) == 3
+
+    def test_fetch_errors_reach_the_writer(self):
+        written = []
+
+        def fetch(batch):
+            if batch[0]["node_id"] == "ott1-0":
+                raise RuntimeError("wikidata down")
+            return batch
+
+        EnrichmentPipeline(
+            _claims(3), fetch, lambda batch, enriched, error: written.append((batch[0]["node_id"], error)),
+            fetchers=2,
+        ).run(max_batches=10)
+
+        errors = {node_id: error for node_id, error in written}
+        assert str(errors["ott1-0"]) == "wikidata down"
+        assert errors["ott0-0"] is None and errors["ott2-0"] is None
+
+    def test_bounded_queues_apply_backpressure_to_the_claimer(self):
+        claimed = []
+        claim = _claims(20)
+
+        def counting_claim():
+            batch = claim()
+            claimed.append(batch)
+            return batch
+
+        def slow_write(batch, enriched, error):
+            time.sleep(0.01)
+            # In flight: this batch, two queues of one, two fetchers, one pending put.
+            assert len(claimed) - len(written) <= 6
+            written.append(batch)
+
+        written = []
+        summary = EnrichmentPipeline(
+            counting_claim, lambda batch: batch, slow_write, fetchers=2, queue_size=1
+        ).run(max_batches=20)
+
+        assert len(written) == 20
+        assert summary["queue_depth"]["claimed"]["peak"] <= 1
+        assert summary["queue_depth"]["fetched"]["peak"] <= 1
+
+    def test_writer_failure_stops_claiming_and_is_reraised(self):
+        claimed = []
+        claim = _claims(50)
+
+        def counting_claim():
+            batch = claim()
+            claimed.append(batch)
+            return batch
+
+        def write(batch, enriched, error):
+            raise ValueError("disk full")
+
+        with pytest.raises(ValueError, match="disk full"):
+            EnrichmentPipeline(counting_claim, lambda batch: batch, write, fetchers=2).run(max_batches=50)
+
+        assert len(claimed) < 50
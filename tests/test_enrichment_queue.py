@@ -0,0 +1,233 @@
+import queue as queue_module
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from cladecanvas.enrichment_queue import (
+    CLAIM_SQL,
+    EnrichmentQueue,
+    QueueFilter,
+    error_records,
+    outcome_records,
+    upsert_attempts,
+)
+from cladecanvas.schema import metadata_enrichment_attempts, nodes
+
+
+NOW = datetime(2026, 10, 19, tzinfo=timezone.utc)
+BATCH = [
+    {"node_id": "ott1", "ott_id": 1, "name": "Felis catus"},
+    {"node_id": "ott2", "ott_id": 2, "name": "Felis"},
+]
+
+
+class TestQueueFilter:
+    def test_default_filter_excludes_queued_and_attempted_rows(self):
+        sql, params = QueueFilter().candidate_sql(NOW)
+
+        assert "a.status NOT IN ('pending', 'leased')" in sql
+        assert "m.node_id IS NULL" in sql
+        assert "a.node_id IS NULL" in sql
+        assert "WHEN n.rank = 'species' THEN 0" in sql
+        assert params == {}
+
+    def test_retry_clauses_and_ordering(self):
+        sql, params = QueueFilter(
+            retry_errors=True, retry_no_match_after_days=7, order="largest"
+        ).candidate_sql(NOW)
+
+        assert "a.status = 'error'" in sql
+        assert "a.status = 'no_match'" in sql
+        assert "ORDER BY n.num_tips DESC" in sql
+        assert params["now"] == NOW
+        assert params["no_match_cutoff"] == datetime(2026, 10, 12, tzinfo=timezone.utc)
+
+    def test_targeted_filter_ignores_attempt_history(self):
+        queue_filter = QueueFilter(ott_ids=[1, 2], refresh_existing=True)
+        sql, params = queue_filter.candidate_sql(NOW)
+
+        assert queue_filter.targeted
+        assert "a.node_id IS NULL" not in sql
+        assert "m.node_id IS NULL" not in sql
+        assert params == {"ott_ids": [1, 2]}
+
+
+class TestEnrichmentQueue:
+    def test_claim_uses_skip_locked_and_reclaims_expired_leases(self):
+        assert "ORDER BY priority" in CLAIM_SQL
+        assert "FOR UPDATE SKIP LOCKED" in CLAIM_SQL
+        assert "leased_until < :now" in CLAIM_SQL
+
+    def test_claim_refills_queue_when_short(self, recording_session, fake_result):
+        session = recording_session([
+            fake_result([BATCH[0]]),
+            fake_result(rowcount=5),
+            fake_result([BATCH[1]]),
+        ])
+        queue = EnrichmentQueue(worker_id="w1", lease_seconds=60)
+
+        batch = queue.claim(session, 2)
+
+        assert batch == BATCH
+        claim, enqueue, reclaim = session.statements
+        assert "SKIP LOCKED" in claim[0] and claim[1]["limit"] == 2
+        assert "INSERT INTO metadata_enrichment_attempts" in enqueue[0]
+        assert enqueue[1]["limit"] == 20
+        assert reclaim[1]["limit"] == 1
+        assert reclaim[1]["worker_id"] == "w1"
+
+    def test_targeted_queue_enqueues_once(self, recording_session, fake_result):
+        session = recording_session([
+            fake_result(), fake_result(rowcount=1), fake_result([BATCH[0]]),
+            fake_result(),
+        ])
+        queue = EnrichmentQueue(QueueFilter(ott_ids=[1]), worker_id="w1")
+
+        assert queue.claim(session, 10) == [BATCH[0]]
+        assert queue.claim(session, 10) == []
+        assert len(session.statements) == 4
+
+    def test_heartbeat_extends_claimed_leases_until_they_finish(self, recording_session, fake_result):
+        beats = queue_module.Queue()
+
+        class HeartbeatSession(recording_session):
+            def commit(self):
+                statement, params = self.statements[0]
+                assert "SET leased_until" in statement and params["worker_id"] == "w1"
+                beats.put(params["node_ids"])
+
+        def next_extended(node_ids):
+            while beats.get(timeout=2) != node_ids:
+                pass
+
+        queue = EnrichmentQueue(worker_id="w1", lease_seconds=60)
+        queue.claim(recording_session([fake_result(BATCH)]), 2)
+        with queue.heartbeat(lambda: HeartbeatSession([fake_result(rowcount=2)]), interval=0.01):
+            next_extended(["ott1", "ott2"])
+            queue.finish(["ott1"])
+            next_extended(["ott2"])
+            queue.finish(["ott2"])
+
+        assert queue.in_flight() == []
+        while not beats.empty():
+            beats.get()
+        # Nothing left in flight: the heartbeat stops touching the database.
+        with queue.heartbeat(lambda: HeartbeatSession([fake_result()]), interval=0.01):
+            threading.Event().wait(0.05)
+        assert beats.empty()
+
+
+def _claimed_ids(batch):
+    return [row["node_id"] for row in batch]
+
+
+@pytest.mark.postgres
+class TestEnrichmentQueuePostgres:
+    @pytest.fixture
+    def engine(self, postgres_engine):
+        # num_tips 1..6: "largest" order is ott6, ott5, ..., ott1.
+        with postgres_engine.begin() as conn:
+            conn.execute(nodes.insert(), [
+                {"node_id": f"ott{n}", "ott_id": n, "name": f"Taxon {n}", "num_tips": n} for n in range(1, 7)
+            ])
+        return postgres_engine
+
+    def test_claims_follow_the_enqueue_priority(self, engine):
+        queue = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w1")
+        with Session(engine) as session:
+            queue.enqueue(session, 3)
+            queue.enqueue(session, 6)
+            session.commit()
+            first, second = queue.claim(session, 2), queue.claim(session, 4)
+
+        assert _claimed_ids(first) == ["ott6", "ott5"]
+        # The second refill queued ott3..ott1 behind the first chunk.
+        assert _claimed_ids(second) == ["ott4", "ott3", "ott2", "ott1"]
+
+    def test_concurrent_claims_skip_locked_rows(self, engine):
+        first_worker = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w1")
+        second_worker = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w2")
+        with Session(engine) as setup:
+            first_worker.enqueue(setup, 6)
+            setup.commit()
+
+        with Session(engine) as first, Session(engine) as second:
+            # The first claim is still uncommitted, so its rows stay locked.
+            held = first_worker.claim(first, 2)
+            skipped = second_worker.claim(second, 2)
+            second.commit()
+            first.commit()
+
+        assert _claimed_ids(held) == ["ott6", "ott5"]
+        assert _claimed_ids(skipped) == ["ott4", "ott3"]
+
+    def test_expired_leases_are_claimed_again(self, engine):
+        crashed = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w1", lease_seconds=-60)
+        live = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w2")
+        with Session(engine) as session:
+            crashed.enqueue(session, 6)
+            expired = crashed.claim(session, 2)
+            session.commit()
+            reclaimed = live.claim(session, 2)
+            session.commit()
+            owners = dict(session.execute(
+                select(metadata_enrichment_attempts.c.node_id, metadata_enrichment_attempts.c.worker_id)
+                .where(metadata_enrichment_attempts.c.status == "leased")
+            ).all())
+
+        assert _claimed_ids(reclaimed) == _claimed_ids(expired) == ["ott6", "ott5"]
+        assert owners == {"ott6": "w2", "ott5": "w2"}
+
+
+    def test_late_write_after_a_lost_lease_is_skipped(self, engine):
+        crashed = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w1", lease_seconds=-60)
+        live = EnrichmentQueue(QueueFilter(order="largest"), worker_id="w2")
+        with Session(engine) as session:
+            crashed.enqueue(session, 6)
+            lost = crashed.claim(session, 2)
+            session.commit()
+            reclaimed = live.claim(session, 2)
+            session.commit()
+
+            late = upsert_attempts(session, error_records(lost, RuntimeError("timeout")), crashed.worker_id)
+            session.commit()
+            leased = dict(session.execute(
+                select(metadata_enrichment_attempts.c.node_id, metadata_enrichment_attempts.c.worker_id)
+                .where(metadata_enrichment_attempts.c.status == "leased")
+            ).all())
+            written = upsert_attempts(session, outcome_records(reclaimed, [], set()), live.worker_id)
+            session.commit()
+            rows = session.execute(
+                select(
+                    metadata_enrichment_attempts.c.node_id,
+                    metadata_enrichment_attempts.c.status,
+                    metadata_enrichment_attempts.c.attempt_count,
+                    metadata_enrichment_attempts.c.worker_id,
+                ).where(metadata_enrichment_attempts.c.node_id.in_(["ott6", "ott5"]))
+            ).all()
+
+        assert late == 0
+        assert leased == {"ott6": "w2", "ott5": "w2"}
+        assert written == 2
+        assert sorted(rows) == [("ott5", "no_match", 1, None), ("ott6", "no_match", 1, None)]
+
+
+class TestAttemptRecords:
+    def test_outcome_records_split_success_and_no_match(self):
+        enriched = [{"node_id": "ott1", "source_label": "Wikidata", "source_match_method": "P1843"}]
+
+        records = outcome_records(BATCH, enriched, {"ott1"})
+
+        assert [r["status"] for r in records] == ["success", "no_match"]
+        assert records[0]["next_retry_at"] is None
+        assert records[0]["last_match_method"] == "P1843"
+        assert records[1]["next_retry_at"] > records[1]["last_attempted_at"]
+
+    def test_error_records_truncate_message(self):
+        records = error_records(BATCH, RuntimeError("x" * 2000))
+
+        assert {r["status"] for r in records} == {"error"}
+        assert len(records[0]["last_error"]) == 1000
@@ -1,6 +1,7 @@
 import csv
 import json
 import importlib
+import pytest
 from unittest.mock import patch
 from cladecanvas import fetch_otol
 
@@ -243,3 +244,263 @@ def test_download_handles_none_subtree(tmp_path, monkeypatch):
 
     rows = list(csv.DictReader(open(csv_path)))
     assert len(rows) == 0  # no data, but CSV still created with headers
+
+
+# ── Concurrent, resumable download ──────────────────────────────────────────
+
+def _wide_tree(root, children, truncated=True):
+    node = {"node_id": root, "taxon": {"ott_id": int(root[3:]), "name": root.upper()}, "num_tips": 10}
+    node["children"] = [
+        {"node_id": child, "taxon": {"ott_id": int(child[3:]), "name": child.upper()}, "num_tips": 5}
+        if truncated else
+        {"node_id": child, "taxon": {"ott_id": int(child[3:]), "name": child.upper()}, "num_tips": 1, "children": []}
+        for child in children
+    ]
+    return node
+
+
+class _Crash(Exception):
+    pass
+
+
+def _subtrees():
+    children = [f"ott{200 + i}" for i in range(6)]
+    trees = {"ott100": _wide_tree("ott100", children)}
+    for index, child in enumerate(children):
+        trees[child] = _wide_tree(child, [f"ott{300 + 10 * index + j}" for j in range(2)], truncated=False)
+    return trees
+
+
+def test_download_resumes_mid_wave_after_crash(tmp_path, monkeypatch):
+    importlib.reload(fetch_otol)
+    monkeypatch.setattr(fetch_otol, "DATA_DIR", str(tmp_path))
+    csv_path = str(tmp_path / "metazoa_nodes_synth.csv")
+    monkeypatch.setattr(fetch_otol, "CSV_PATH", csv_path)
+    monkeypatch.setattr(fetch_otol, "OTT_ID", 100)
+    monkeypatch.setattr(fetch_otol, "CHECKPOINT_EVERY", 1)
+    trees = _subtrees()
+    calls = []
+
+    def crashing(node_id):
+        calls.append(node_id)
+        if node_id == "ott203":
+            raise _Crash()
+        return trees[node_id]
+
+    with patch.object(fetch_otol, "_arguson_subtree", side_effect=crashing):
+        try:
+            fetch_otol.download_synth_arguson(concurrency=1)
+        except _Crash:
+            pass
+        else:
+            raise AssertionError("expected the simulated crash")
+
+    assert not (tmp_path / "metazoa_nodes_synth.csv").exists()
+    state = json.load(open(f"{csv_path}.checkpoint/state.json"))
+    assert state["wave"] == 2
+    assert state["pending"][0] == "ott203"
+    # Rows appended after the last save, ending in a line cut short by the crash.
+    with open(f"{csv_path}.checkpoint/rows.csv", "a") as rows_file:
+        rows_file.write("ott999,999,Unsaved,ott100,1\nott998,99")
+
+    resumed = []
+
+    def fetch(node_id):
+        resumed.append(node_id)
+        return trees[node_id]
+
+    with patch.object(fetch_otol, "_arguson_subtree", side_effect=fetch):
+        fetch_otol.download_synth_arguson(concurrency=1)
+
+    # ott204 may have finished (and been checkpointed) before ott203 crashed.
+    assert {"ott203", "ott205"} <= set(resumed) <= {"ott203", "ott204", "ott205"}
+    assert len(resumed) == len(set(resumed))
+    rows = list(csv.DictReader(open(csv_path)))
+    ids = [r["node_id"] for r in rows]
+    assert len(ids) == len(set(ids)) == 1 + 6 + 12
+    parents = {r["node_id"]: r["parent_node_id"] for r in rows}
+    assert parents["ott203"] == "ott100"
+    assert parents["ott330"] == "ott203"
+    assert not (tmp_path / "metazoa_nodes_synth.csv.checkpoint").exists()
+
+
+def test_download_fetches_wave_concurrently(tmp_path, monkeypatch):
+    import threading
+
+    importlib.reload(fetch_otol)
+    monkeypatch.setattr(fetch_otol, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(fetch_otol, "CSV_PATH", str(tmp_path / "metazoa_nodes_synth.csv"))
+    monkeypatch.setattr(fetch_otol, "OTT_ID", 100)
+    trees = _subtrees()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fetch(node_id):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        if node_id != "ott100":
+            barrier.wait()  # only passes if three fetches overlap
+        with lock:
+            active[0] -= 1
+        return trees[node_id]
+
+    with patch.object(fetch_otol, "_arguson_subtree", side_effect=fetch):
+        fetch_otol.download_synth_arguson(concurrency=3)
+
+    assert peak[0] == 3
+    rows = list(csv.DictReader(open(tmp_path / "metazoa_nodes_synth.csv")))
+    assert len(rows) == 19
+
+
+def test_fresh_discards_checkpoint(tmp_path, monkeypatch):
+    importlib.reload(fetch_otol)
+    monkeypatch.setattr(fetch_otol, "DATA_DIR", str(tmp_path))
+    csv_path = str(tmp_path / "metazoa_nodes_synth.csv")
+    monkeypatch.setattr(fetch_otol, "CSV_PATH", csv_path)
+    checkpoint = tmp_path / "metazoa_nodes_synth.csv.checkpoint"
+    checkpoint.mkdir()
+    (checkpoint / "state.json").write_text(json.dumps({
+        "root": f"ott{fetch_otol.OTT_ID}", "wave": 4, "pending": ["ott999"], "next_frontier": [], "failed": [],
+        "rows_bytes": 45,
+    }))
+    (checkpoint / "rows.csv").write_text("node_id,ott_id,name,parent_node_id,num_tips\n")
+
+    with patch.object(fetch_otol, "_arguson_subtree", return_value=_make_arguson_tree()) as fetch:
+        fetch_otol.download_synth_arguson(fresh=True)
+
+    fetch.assert_called_once_with(f"ott{fetch_otol.OTT_ID}")
+    assert len(list(csv.DictReader(open(csv_path)))) == 3
+
+
+def test_arguson_subtree_retries_rate_limited_requests(fake_http_server, monkeypatch):
+    importlib.reload(fetch_otol)
+    monkeypatch.setattr(fetch_otol, "API_URL", fake_http_server.url)
+    responses = iter([
+        (429, {}, {"Retry-After": "0"}),
+        (503, {}, {"Retry-After": "0"}),
+        {"arguson": _make_arguson_tree()},
+    ])
+    fake_http_server.routes["/subtree"] = lambda params: next(responses)
+
+    tree = fetch_otol._arguson_subtree("ott3")
+
+    assert tree["node_id"] == "ott3"
+    assert [params for _, params in fake_http_server.requests] == [
+        {"height_limit": 20, "format": "arguson", "ott_id": 3}
+    ] * 3
+
+
+# ── Iterative and streaming parsers ─────────────────────────────────────────
+
+def _caterpillar(depth):
+    """A chain of ``depth`` nested nodes, built without recursion."""
+    leaf = {"node_id": f"ott{depth}", "taxon": {"ott_id": depth, "name": f"T{depth}"}, "num_tips": 1, "children": []}
+    node = leaf
+    for level in range(depth - 1, 0, -1):
+        node = {"node_id": f"ott{level}", "taxon": {"ott_id": level, "name": f"T{level}"}, "num_tips": 1, "children": [node]}
+    return node
+
+
+def _caterpillar_json(depth):
+    opening = "".join(
+        f'{{"node_id": "ott{level}", "taxon": {{"ott_id": {level}, "name": "T{level}"}}, "num_tips": 1, "children": ['
+        for level in range(1, depth)
+    )
+    leaf = f'{{"node_id": "ott{depth}", "taxon": {{"ott_id": {depth}, "name": "T{depth}"}}, "num_tips": 1, "children": []}}'
+    return '{"arguson": ' + opening + leaf + "]}" * (depth - 1) + ', "lineage": []}'
+
+
+def _events(payload):
+    import io
+
+    ijson = pytest.importorskip("ijson")
+    if not isinstance(payload, str):
+        payload = json.dumps(payload)
+    return ijson.basic_parse(io.BytesIO(payload.encode()))
+
+
+def test_parse_arguson_handles_deep_trees_without_recursion():
+    importlib.reload(fetch_otol)
+    rows, seen, frontier = [], set(), []
+
+    fetch_otol._parse_arguson(_caterpillar(20_000), None, rows, seen, frontier)
+
+    assert len(rows) == 20_000
+    assert rows[0]["parent_node_id"] is None
+    assert rows[-1] == {"node_id": "ott20000", "ott_id": 20000, "name": "T20000",
+                        "parent_node_id": "ott19999", "num_tips": 1}
+
+
+def test_parse_arguson_keeps_document_order():
+    importlib.reload(fetch_otol)
+    rows = []
+    fetch_otol._parse_arguson(_make_arguson_tree(), None, rows, set(), [])
+    assert [r["node_id"] for r in rows] == ["ott3", "ott1", "ott2"]
+
+
+def test_stream_parser_matches_dict_parser():
+    importlib.reload(fetch_otol)
+    tree = {
+        "node_id": "ott1",
+        "taxon": {"ott_id": 1, "name": "Root", "tax_sources": ["ncbi:1"]},
+        "num_tips": 40,
+        "supported_by": {"synth": {"x": [1, 2]}},
+        "children": [
+            {"node_id": "mrcaott2ott3", "descendant_name_list": ["Bilateria", "Cnidaria", "X"], "num_tips": 30},
+            {"node_id": "ott4", "taxon": {"ott_id": 4, "name": "Leaf"}, "num_tips": 1},
+            {"node_id": "", "num_tips": 3, "children": []},
+        ],
+    }
+    expected_rows, expected_frontier = [], []
+    fetch_otol._parse_arguson(tree, "ott0", expected_rows, set(), expected_frontier)
+
+    rows, frontier = [], []
+    fetch_otol._parse_arguson_events(_events({"arguson": tree, "lineage": [{"node_id": "ott0"}]}),
+                                     "ott0", rows, set(), frontier)
+
+    key = lambda row: row["node_id"]
+    assert sorted(rows, key=key) == sorted(expected_rows, key=key)
+    assert frontier == expected_frontier == ["mrcaott2ott3"]
+
+
+def test_stream_parser_waits_for_late_node_ids():
+    importlib.reload(fetch_otol)
+    payload = (
+        '{"arguson": {"children": [{"children": [], "num_tips": 1, "node_id": "ott2",'
+        ' "taxon": {"name": "Child", "ott_id": 2}}], "num_tips": 1, "node_id": "ott1",'
+        ' "taxon": {"ott_id": 1, "name": "Parent"}}}'
+    )
+    rows = []
+
+    fetch_otol._parse_arguson_events(_events(payload), None, rows, set(), [])
+
+    assert {r["node_id"]: r["parent_node_id"] for r in rows} == {"ott1": None, "ott2": "ott1"}
+
+
+def test_stream_parser_handles_deep_trees():
+    importlib.reload(fetch_otol)
+    rows = []
+
+    fetch_otol._parse_arguson_events(_events(_caterpillar_json(20_000)), None, rows, set(), [])
+
+    parents = {r["node_id"]: r["parent_node_id"] for r in rows}
+    assert len(parents) == 20_000
+    assert parents["ott1"] is None and parents["ott20000"] == "ott19999"
+
+
+def test_download_streams_responses(tmp_path, fake_http_server, monkeypatch):
+    pytest.importorskip("ijson")
+    importlib.reload(fetch_otol)
+    monkeypatch.setattr(fetch_otol, "API_URL", fake_http_server.url)
+    monkeypatch.setattr(fetch_otol, "DATA_DIR", str(tmp_path))
+    csv_path = str(tmp_path / "metazoa_nodes_synth.csv")
+    monkeypatch.setattr(fetch_otol, "CSV_PATH", csv_path)
+    monkeypatch.setattr(fetch_otol, "OTT_ID", 3)
+    fake_http_server.routes["/subtree"] = lambda params: {"arguson": _make_arguson_tree()}
+
+    fetch_otol.download_synth_arguson(stream=True)
+
+    rows = list(csv.DictReader(open(csv_path)))
+    assert {r["node_id"]: r["parent_node_id"] for r in rows} == {"ott1": "ott3", "ott2": "ott3", "ott3": ""}
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from cladecanvas import http_client
+from cladecanvas.http_client import AsyncEnrichmentClient, TokenBucket, retry_after_seconds
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestTokenBucket:
+    def test_burst_is_free_then_requests_are_spaced_by_rate(self):
+        bucket = TokenBucket(rate=10.0, burst=2)
+
+        delays = [bucket.reserve() for _ in range(4)]
+
+        assert delays[:2] == [0.0, 0.0]
+        assert delays[2] == pytest.approx(0.1, abs=0.01)
+        assert delays[3] == pytest.approx(0.2, abs=0.01)
+
+    def test_pause_holds_back_future_reservations(self):
+        bucket = TokenBucket(rate=10.0, burst=5)
+
+        bucket.pause(2.0)
+
+        assert bucket.reserve() == pytest.approx(2.1, abs=0.01)
+
+
+class TestRetryAfter:
+    def test_seconds_and_http_date(self):
+        assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "3"})) == 3.0
+        assert retry_after_seconds(
+            httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        ) == 0.0
+        assert retry_after_seconds(httpx.Response(429)) is None
+
+
+class TestAsyncEnrichmentClient:
+    def test_retries_429_honoring_retry_after_then_succeeds(self, fake_http_server):
+        calls = []
+
+        def flaky(params):
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                return 429, {"error": "slow down"}, {"Retry-After": "0.2"}
+            if len(calls) == 2:
+                return 503, {"error": "unavailable"}, {}
+            return {"ok": params["q"]}
+
+        fake_http_server.routes = {"/api": flaky}
+
+        async def fetch():
+            async with AsyncEnrichmentClient(backoff_seconds=0.01) as client:
+                return await client.get_json(f"{fake_http_server.url}/api", params={"q": "x"}), client.retries
+
+        payload, retries = _run(fetch())
+
+        assert payload == {"ok": "x"}
+        assert retries == 2
+        assert calls[1] - calls[0] >= 0.2
+
+    def test_gives_up_after_max_retries(self, fake_http_server):
+        fake_http_server.routes = {"/api": lambda params: (500, {}, {})}
+
+        async def fetch():
+            async with AsyncEnrichmentClient(max_retries=2, backoff_seconds=0.001) as client:
+                return await client.request("GET", f"{fake_http_server.url}/api")
+
+        response = _run(fetch())
+
+        assert response.status_code == 500
+        assert len(fake_http_server.requests) == 3
+
+    def test_concurrency_is_bounded_and_host_is_rate_limited(self, fake_http_server, monkeypatch):
+        active = []
+        peak = []
+
+        def slow(params):
+            active.append(1)
+            peak.append(len(active))
+            time.sleep(0.05)
+            active.pop()
+            return params
+
+        fake_http_server.routes = {"/slow": slow}
+        monkeypatch.setattr(http_client, "HOST_RATE_LIMITS", {"127.0.0.1": (20.0, 1)})
+        monkeypatch.setattr(http_client, "_buckets", {})
+
+        async def fetch_all():
+            async with AsyncEnrichmentClient(max_concurrency=2) as client:
+                return await asyncio.gather(*(
+                    client.post_json(f"{fake_http_server.url}/slow", json={"i": i})
+                    for i in range(6)
+                ))
+
+        started = time.monotonic()
+        results = _run(fetch_all())
+
+        assert results == [{"i": i} for i in range(6)]
+        assert max(peak) <= 2
+        assert time.monotonic() - started >= 0.25
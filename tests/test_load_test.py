@@ -0,0 +1,175 @@
+import asyncio
+import json
+import random
+import time
+from argparse import Namespace
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from scripts.load_test import (
+    Sample,
+    SyntheticSession,
+    VirtualUser,
+    find_saturation,
+    load_trace,
+    parse_server_timing,
+    route_name,
+    run_stage,
+    search_candidate_hit_rate,
+    summarize,
+)
+
+TIMING = 'db;dur=1.500;desc="{queries} queries, 4 rows", cache;desc="{hits} hits, {misses} misses", total;dur=2.000'
+
+
+def _fake_api(requests):
+    """A canvas-shaped API over a three-level tree with ids ott1..ott13."""
+    children = {"ott1": ["ott2", "ott3", "ott4"], **{f"ott{n}": [f"ott{3 * n - 1 + k}" for k in range(3)] for n in (2, 3, 4)}}
+
+    def node(node_id):
+        return {"node_id": node_id, "name": f"Taxon {node_id}", "display_name": f"Taxon{node_id}"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        requests.append((path, request.headers.get("x-forwarded-for")))
+        headers = {"Server-Timing": TIMING.format(queries=3, hits=1, misses=1)}
+        if path == "/tree/root":
+            return httpx.Response(200, json=node("ott1"), headers=headers)
+        if path.startswith("/tree/children/"):
+            return httpx.Response(200, json=[node(child) for child in children.get(path.rsplit("/", 1)[1], [])], headers=headers)
+        if path.startswith("/tree/context/"):
+            focus = path.rsplit("/", 1)[1]
+            return httpx.Response(200, json={"focus_node_id": focus, "nodes": [node(focus), node("ott1")]}, headers=headers)
+        if path == "/node/bulk":
+            ids = parse_qs(urlsplit(str(request.url)).query)["node_ids"]
+            return httpx.Response(200, json=[{"node_id": node_id} for node_id in ids], headers=headers)
+        if path == "/node/batch":
+            body = json.loads(request.content)
+            return httpx.Response(200, json={"nodes": [], "missing": body["node_ids"]}, headers=headers)
+        if path == "/search":
+            return httpx.Response(200, json=[node("ott7")], headers=headers)
+        if path == "/metrics":
+            return httpx.Response(200, json={"caches": {"search_candidates": {"hits": 0, "narrowed_hits": 0, "misses": 0, "fallbacks": 0}}})
+        return httpx.Response(404, json={"detail": "Not Found"})
+
+    return httpx.MockTransport(handler)
+
+
+def _client(requests):
+    return httpx.AsyncClient(transport=_fake_api(requests), base_url="http://api")
+
+
+def test_parse_server_timing_and_route_names():
+    assert parse_server_timing(TIMING.format(queries=12, hits=2, misses=3)) == (12, 2, 3)
+    assert parse_server_timing(None) == (None, 0, 0)
+    assert route_name("/tree/children/ott1?limit=100") == "tree/children"
+    assert route_name("/node/ott5") == "node"
+    assert route_name("/node/bulk?node_ids=ott1") == "node/bulk"
+    assert route_name("/search?q=cat") == "search"
+
+
+def test_synthetic_sessions_follow_the_canvas_flow():
+    requests = []
+
+    async def scenario():
+        samples = []
+        async with _client(requests) as client:
+            for seed in range(20):
+                user = VirtualUser(client, samples, random.Random(seed), forwarded_for="10.0.0.1")
+                await SyntheticSession(user, think_ms=0, typing_ms=0).run(deadline=time.monotonic() + 5)
+        return samples
+
+    samples = asyncio.run(scenario())
+
+    paths = [path for path, _ in requests]
+    assert {route_name(path) for path in paths} >= {"tree/root", "tree/children", "tree/context", "node/bulk", "search"}
+    assert all(forwarded == "10.0.0.1" for _, forwarded in requests)
+    # Children and context requests only target ids the user has seen.
+    seen_ids = {f"ott{n}" for n in range(1, 14)}
+    assert all(path.rsplit("/", 1)[1] in seen_ids for path in paths if path.startswith(("/tree/children/", "/tree/context/")))
+    assert all(sample.status == 200 and sample.queries == 3 for sample in samples)
+
+
+def test_search_types_one_request_per_keystroke():
+    requests = []
+
+    async def scenario():
+        async with _client(requests) as client:
+            user = VirtualUser(client, [], random.Random(0))
+            session = SyntheticSession(user, think_ms=0, typing_ms=0)
+            session.visible = [{"node_id": "ott2", "display_name": "Felis catus"}]
+            await session.search()
+            return session
+
+    session = asyncio.run(scenario())
+
+    assert [path for path, _ in requests] == ["/search"] * 4
+    assert session.visible[0]["node_id"] == "ott7"
+
+
+def test_batch_mode_posts_visible_ids_and_records_the_body():
+    requests = []
+    recorded = []
+
+    async def scenario():
+        async with _client(requests) as client:
+            user = VirtualUser(client, [], random.Random(0), recorder=recorded)
+            session = SyntheticSession(user, think_ms=0, typing_ms=0, batch=True)
+            session.visible = [{"node_id": "ott2"}, {"node_id": "ott3"}]
+            await session.bulk()
+
+    asyncio.run(scenario())
+
+    assert requests == [("/node/batch", None)]
+    assert recorded[0]["body"] == {"node_ids": ["ott2", "ott3"], "include_metadata": True}
+
+
+def test_recorded_sessions_replay_in_order(tmp_path):
+    recorded = []
+    requests = []
+    args = Namespace(seed=0, shared_client=False, think_ms=0, typing_ms=0, speed=100.0, batch=False)
+
+    async def record_then_replay():
+        async with _client(requests) as client:
+            await run_stage(client, 2, 0.05, args, None, recorded)
+            trace_path = tmp_path / "trace.jsonl"
+            trace_path.write_text("".join(json.dumps(record) + "\n" for record in recorded))
+            trace = load_trace(trace_path)
+            requests.clear()
+            await run_stage(client, 1, 0.2, args, trace[:1], None)
+            return trace
+
+    trace = asyncio.run(record_then_replay())
+
+    assert recorded and all({"session", "at_ms", "path"} <= set(record) for record in recorded)
+    first_session = [record["path"].split("?")[0] for record in trace[0]]
+    assert [path for path, _ in requests][: len(first_session)] == first_session
+
+
+def _stage(users, rps, p95, error_rate=0.0):
+    return {"users": users, "throughput_rps": rps, "p95_ms": p95, "error_rate": error_rate}
+
+
+def test_find_saturation():
+    assert find_saturation([_stage(1, 10, 50), _stage(2, 19, 55), _stage(4, 36, 60)]) is None
+
+    knee = find_saturation([_stage(1, 10, 50), _stage(2, 19, 55), _stage(4, 20, 120)])
+    assert knee["users"] == 2 and "p95" in knee["reason"]
+
+    errors = find_saturation([_stage(1, 10, 50), _stage(2, 19, 55, error_rate=0.05)])
+    assert errors["users"] == 1 and "error rate" in errors["reason"]
+
+
+def test_summarize_counts_rate_limits_separately_from_errors():
+    samples = [Sample("search", 200, 10.0, 2, 1, 0), Sample("search", 429, 1.0), Sample("search", 503, 5.0), Sample("node", 404, 2.0, 1, 0, 1)]
+    summary = summarize(samples, elapsed=1.0)
+
+    assert summary["throughput_rps"] == 2
+    assert (summary["errors"], summary["rate_limited"], summary["error_rate"]) == (1, 1, 0.25)
+    assert summary["cache_hit_ratio"] == 0.5
+    assert summary["queries_per_request"] == 1.5
+    assert search_candidate_hit_rate(
+        {"hits": 1, "narrowed_hits": 0, "misses": 1, "fallbacks": 0},
+        {"hits": 4, "narrowed_hits": 1, "misses": 2, "fallbacks": 1},
+    ) == 0.6
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from cladecanvas import metadata_writer
+from cladecanvas.metadata_writer import (
+    attach_node_ids,
+    metadata_records,
+    update_node_flags,
+    write_enrichment,
+)
+from cladecanvas.schema import metadata_table, nodes, search_synonyms
+
+
+@pytest.fixture
+def session(recording_session, fake_result):
+    return recording_session(
+        respond=lambda sql, params: fake_result(rowcount=2), dialect=postgresql.dialect()
+    )
+
+
+class TestUpdateNodeFlags:
+    def test_one_values_join_per_batch(self, session):
+        updated = update_node_flags(session, {"ott1": "species", "ott2": None})
+
+        assert updated == 2
+        [(sql, params)] = session.statements
+        assert sql.startswith("UPDATE nodes SET rank=coalesce(enriched.rank, nodes.rank)")
+        assert "FROM (VALUES" in sql
+        assert "AS enriched (node_id, rank)" in sql
+        assert "WHERE nodes.node_id = enriched.node_id" in sql
+        assert params["has_metadata"] == 1
+
+    def test_large_batches_are_chunked(self, session, monkeypatch):
+        monkeypatch.setattr(metadata_writer, "NODE_UPDATE_CHUNK", 2)
+
+        updated = update_node_flags(session, {"ott1": "species", "ott2": "genus", "ott3": "genus"})
+
+        assert len(session.statements) == 2
+        assert updated == 4
+
+    def test_empty_batch_issues_no_statement(self, session):
+        assert update_node_flags(session, {}) == 0
+        assert session.statements == []
+
+
+class TestEnrichmentRecords:
+    def test_node_ids_attached_and_last_result_wins(self):
+        batch = [{"node_id": "ott1", "ott_id": 1, "name": "Felis catus"}]
+        enriched = [
+            {"ott_id": 1, "common_name": "cat", "rank": "species", "vernacular_names": ["cat"]},
+            {"ott_id": 1, "common_name": "house cat"},
+            {"ott_id": 99, "common_name": "unmatched"},
+        ]
+
+        attach_node_ids(batch, enriched)
+        records = metadata_records(enriched)
+
+        assert enriched[0]["node_id"] == "ott1"
+        assert enriched[2]["node_id"] is None
+        assert records == {"ott1": {"ott_id": 1, "common_name": "house cat", "node_id": "ott1"}}
+
+
+@pytest.mark.postgres
+class TestWriteEnrichmentPostgres:
+    BATCH = [
+        {"node_id": "ott1", "ott_id": 1, "name": "Felis catus"},
+        {"node_id": "ott2", "ott_id": 2, "name": "Felis"},
+    ]
+
+    @pytest.fixture
+    def engine(self, postgres_engine):
+        with postgres_engine.begin() as conn:
+            conn.execute(nodes.insert(), [
+                {"node_id": "ott1", "ott_id": 1, "name": "Felis catus", "rank": None},
+                {"node_id": "ott2", "ott_id": 2, "name": "Felis", "rank": "genus"},
+                {"node_id": "ott3", "ott_id": 3, "name": "Canis", "rank": None},
+            ])
+        return postgres_engine
+
+    def _write(self, engine, enriched):
+        with Session(engine) as session:
+            written = write_enrichment(session, self.BATCH, enriched)
+            session.commit()
+        return written
+
+    def test_rows_are_written_and_upserted(self, engine):
+        written = self._write(engine, [
+            {"ott_id": 1, "common_name": "cat", "rank": "species", "vernacular_names": ["house cat"]},
+            {"ott_id": 2, "common_name": "cats", "rank": None},
+        ])
+        self._write(engine, [{"ott_id": 1, "common_name": "domestic cat", "rank": None}])
+
+        with engine.connect() as conn:
+            flags = {
+                row.node_id: (row.rank, row.has_metadata)
+                for row in conn.execute(select(nodes.c.node_id, nodes.c.rank, nodes.c.has_metadata))
+            }
+            names = dict(conn.execute(select(metadata_table.c.node_id, metadata_table.c.common_name)).all())
+            synonyms = set(conn.execute(select(search_synonyms.c.term, search_synonyms.c.synonym)).all())
+
+        assert written == {"ott1", "ott2"}
+        # A missing rank keeps the one already on the node.
+        assert flags == {"ott1": ("species", 1), "ott2": ("genus", 1), "ott3": (None, None)}
+        assert names == {"ott1": "domestic cat", "ott2": "cats"}
+        assert synonyms == {
+            ("house cat", "cat"),
+            ("cats", "cat"),
+            ("house cats", "house cat"),
+            ("domestic cats", "domestic cat"),
+        }
@@ -124,3 +124,218 @@ def test_context_graph_excludes_alias_equivalents_from_siblings():
     assert lineage_ids == ["root", "canonical", "alias-child"]
     assert "alias" not in sibling_ids
     assert "canonical" not in sibling_ids
+
+
+def test_resolve_node_ids_matches_single_resolution():
+    from cladecanvas.api.aliases import resolve_node_id, resolve_node_ids
+    from cladecanvas.schema import metadata, node_aliases
+
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(node_aliases), [
+            {"alias_node_id": "a", "canonical_node_id": "b", "reason": "test", "confidence": 1.0},
+            {"alias_node_id": "b", "canonical_node_id": "c", "reason": "test", "confidence": 1.0},
+            {"alias_node_id": "x", "canonical_node_id": "y", "reason": "test", "confidence": 1.0},
+            {"alias_node_id": "y", "canonical_node_id": "x", "reason": "test", "confidence": 1.0},
+        ])
+    db = sessionmaker(bind=engine)()
+    try:
+        ids = ["a", "b", "c", "x", "plain"]
+        resolved = resolve_node_ids(db, ids)
+        assert resolved == {node_id: resolve_node_id(db, node_id) for node_id in ids}
+        assert resolved["a"] == "c"
+        assert resolve_node_ids(db, ["a"], max_depth=1) == {"a": resolve_node_id(db, "a", max_depth=1)}
+    finally:
+        db.close()
+
+
+def _counting_statements(app):
+    from sqlalchemy import event
+
+    from cladecanvas.api.deps import get_db
+
+    engine = next(app.dependency_overrides[get_db]()).get_bind()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_node_batch_resolves_aliases_in_one_query():
+    from cladecanvas.api.hardening import hot_read_cache
+
+    hot_read_cache._entries.clear()
+    app, client = _client_with_alias_db()
+    statements = _counting_statements(app)
+    try:
+        response = client.post(
+            "/node/batch",
+            json={"node_ids": ["alias", "alias-child", "missing", "root", "alias"], "include_metadata": True},
+        )
+    finally:
+        app.dependency_overrides.clear()
+        hot_read_cache._entries.clear()
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["requested_id"] for item in data["nodes"]] == ["alias", "alias-child", "root"]
+    assert data["missing"] == ["missing"]
+    alias, alias_child, root = data["nodes"]
+    assert alias["node"]["node_id"] == "canonical"
+    assert alias["metadata"]["description"] == "canonical clade metadata"
+    assert alias_child["node"]["parent_node_id"] == "canonical"
+    assert alias_child["metadata"] is None and root["node"]["parent_node_id"] is None
+    assert len([sql for sql in statements if "FROM nodes AS requested" in sql]) == 1
+    assert "Cache-Control" not in response.headers
+
+
+def test_node_batch_of_unknown_ids_is_one_query():
+    from cladecanvas.api.hardening import hot_read_cache
+
+    hot_read_cache._entries.clear()
+    app, client = _client_with_alias_db()
+    client.post("/node/batch", json={"node_ids": ["root"]})
+    statements = _counting_statements(app)
+    unknown = [f"typo{i}" for i in range(50)]
+    try:
+        response = client.post("/node/batch", json={"node_ids": unknown, "include_metadata": True})
+    finally:
+        app.dependency_overrides.clear()
+        hot_read_cache._entries.clear()
+
+    assert response.json() == {"nodes": [], "missing": unknown}
+    # The statement timeout plus the aliased join; no per-id lookups.
+    queries = [sql for sql in statements if not sql.startswith("SET LOCAL")]
+    assert len(queries) == 1 and "FROM nodes AS requested" in queries[0]
+
+
+def test_node_batch_only_loads_cache_misses(monkeypatch):
+    from cladecanvas.api.hardening import hot_read_cache
+    from cladecanvas.api.routes import node
+
+    loaded = []
+    load_node_batch = node._load_node_batch
+
+    def recording_load(node_ids, include_metadata, db):
+        loaded.append(list(node_ids))
+        return load_node_batch(node_ids, include_metadata, db)
+
+    monkeypatch.setattr(node, "_load_node_batch", recording_load)
+    hot_read_cache._entries.clear()
+    app, client = _client_with_alias_db()
+    try:
+        first = client.post("/node/batch", json={"node_ids": ["root", "alias"]})
+        second = client.post("/node/batch", json={"node_ids": ["alias", "canonical-child", "root"]})
+        third = client.post("/node/batch", json={"node_ids": ["root"]})
+        with_metadata = client.post("/node/batch", json={"node_ids": ["root"], "include_metadata": True})
+    finally:
+        app.dependency_overrides.clear()
+        hot_read_cache._entries.clear()
+
+    assert loaded == [["root", "alias"], ["canonical-child"], ["root"]]
+    assert [item["node"]["node_id"] for item in second.json()["nodes"]] == ["canonical", "canonical-child", "root"]
+    assert 'cache;desc="2 hits, 1 misses"' in second.headers["Server-Timing"]
+    assert third.json() == {"nodes": [first.json()["nodes"][0]], "missing": []}
+    assert with_metadata.json()["nodes"][0]["metadata"] is None
+
+
+def test_node_batch_caches_missing_ids(monkeypatch):
+    from cladecanvas.api.hardening import hot_read_cache
+    from cladecanvas.api.routes import node
+
+    loaded = []
+    load_node_batch = node._load_node_batch
+
+    def recording_load(node_ids, include_metadata, db):
+        loaded.append(list(node_ids))
+        return load_node_batch(node_ids, include_metadata, db)
+
+    monkeypatch.setattr(node, "_load_node_batch", recording_load)
+    hot_read_cache._entries.clear()
+    app, client = _client_with_alias_db()
+    try:
+        responses = [client.post("/node/batch", json={"node_ids": ["root", "nope"]}) for _ in range(2)]
+    finally:
+        app.dependency_overrides.clear()
+        hot_read_cache._entries.clear()
+
+    assert loaded == [["root", "nope"]]
+    assert responses[0].json() == responses[1].json()
+    assert responses[1].json()["missing"] == ["nope"]
+
+
+def test_node_batch_without_alias_table_is_one_query_and_surfaces_db_errors():
+    import pytest
+    from sqlalchemy import event, text
+    from sqlalchemy.exc import OperationalError
+
+    from cladecanvas.api.routes.node import _load_node_batch
+    from cladecanvas.schema import metadata_table, nodes
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    nodes.create(engine)
+    metadata_table.create(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(nodes), [
+            {"node_id": "root", "name": "Root", "parent_node_id": None},
+            {"node_id": "leaf", "name": "Leaf", "parent_node_id": "root"},
+        ])
+        conn.execute(insert(metadata_table), [{"node_id": "leaf", "common_name": "Leafy"}])
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db = sessionmaker(bind=engine)()
+    try:
+        loaded = _load_node_batch(["leaf", "root", "nope"], True, db)
+        node_queries = [sql for sql in statements if "FROM nodes" in sql]
+        db.execute(text("DROP TABLE metadata"))
+        with pytest.raises(OperationalError):
+            _load_node_batch(["leaf"], True, db)
+    finally:
+        db.close()
+
+    assert loaded["leaf"]["metadata"]["common_name"] == "Leafy"
+    assert loaded["leaf"]["node"]["parent_node_id"] == "root"
+    assert set(loaded) == {"leaf", "root"}
+    assert len(node_queries) == 1
+
+
+def test_node_batch_rejects_empty_and_oversized_requests():
+    from cladecanvas.api.hardening import MAX_BATCH_NODE_IDS
+
+    app, client = _client_with_alias_db()
+    try:
+        empty = client.post("/node/batch", json={"node_ids": []})
+        oversized = client.post("/node/batch", json={"node_ids": [f"ott{i}" for i in range(MAX_BATCH_NODE_IDS + 1)]})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert empty.status_code == 422
+    assert oversized.status_code == 422
+
+
+def test_node_batch_falls_back_for_alias_chains():
+    from cladecanvas.api.routes.node import _load_node_batch
+    from cladecanvas.schema import metadata, metadata_table, node_aliases, nodes
+
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(nodes), [
+            {"node_id": node_id, "ott_id": None, "name": node_id.upper(), "parent_node_id": parent, "child_count": 0, "has_metadata": 0, "num_tips": 1}
+            for node_id, parent in [("root", None), ("a", "root"), ("b", "root"), ("c", "root"), ("leaf", "a")]
+        ])
+        conn.execute(insert(node_aliases), [
+            {"alias_node_id": "a", "canonical_node_id": "b", "reason": "test", "confidence": 1.0},
+            {"alias_node_id": "b", "canonical_node_id": "c", "reason": "test", "confidence": 1.0},
+        ])
+        conn.execute(insert(metadata_table), [{"node_id": "c", "common_name": "Chained"}])
+    db = sessionmaker(bind=engine)()
+    try:
+        loaded = _load_node_batch(["a", "leaf", "root"], True, db)
+    finally:
+        db.close()
+
+    assert loaded["a"]["node"]["node_id"] == "c"
+    assert loaded["a"]["metadata"]["common_name"] == "Chained"
+    assert loaded["leaf"]["node"]["parent_node_id"] == "c"
+    assert loaded["root"]["node"]["parent_node_id"] is None
@@ -0,0 +1,278 @@
+import pytest
+from sqlalchemy import select, text
+
+from cladecanvas.node_loader import (
+    COPY_SQL,
+    LoadReport,
+    copy_nodes_from_csv,
+    diff_nodes,
+    iter_node_chunks,
+    peak_rss_mb,
+)
+from cladecanvas.schema import metadata_table, nodes, tree_data_versions, tree_node_changes
+
+
+class FakeCursor:
+    """DBAPI cursor that logs COPY input alongside the connection's statements."""
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.rowcount = -1
+
+    def copy_expert(self, sql, source):
+        data = source.read()
+        self.statements.append((sql, data))
+        self.rowcount = data.count("\n")
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def loader_engine(recording_session, fake_result, fake_engine):
+    """Build a fake engine that answers the loader's queries and accepts COPY."""
+
+    def make(indexes=(), counts=None, samples=()):
+        def respond(sql, params):
+            if "FROM pg_indexes" in sql:
+                return fake_result(indexes)
+            if sql.startswith("INSERT INTO nodes"):
+                return fake_result(rowcount=2)
+            if sql.startswith("INSERT INTO tree_data_versions"):
+                return fake_result([(1,)])
+            if "FILTER (WHERE change = 'insert')" in sql:
+                return fake_result([counts])
+            if "row_number() OVER" in sql:
+                return fake_result(samples)
+            return None
+
+        connection = recording_session(respond=respond)
+        connection.connection = connection
+        connection.cursor = lambda: FakeCursor(connection.statements)
+        connection.exec_driver_sql = lambda sql: connection.statements.append((sql, None))
+        return fake_engine(connection)
+
+    return make
+
+
+def _csv(tmp_path):
+    path = tmp_path / "nodes.csv"
+    path.write_text(
+        "node_id,ott_id,name,parent_node_id,num_tips\n"
+        "ott1,1,Metazoa,,2\n"
+        "mrcaott2ott3,,A + B,ott1,1\n"
+    )
+    return path
+
+
+class TestCopyNodesFromCsv:
+    def test_streams_csv_through_staging_then_merges_once(self, tmp_path, loader_engine):
+        engine = loader_engine()
+
+        report = copy_nodes_from_csv(engine, _csv(tmp_path), chunk_rows=1)
+
+        statements = engine.connection.statements
+        sql = engine.connection.sql
+        assert sql[0].startswith("CREATE UNLOGGED TABLE IF NOT EXISTS nodes_staging")
+        assert sql[1] == "TRUNCATE nodes_staging"
+        assert statements[2:4] == [(COPY_SQL, "ott1,1,Metazoa,,2\n"), (COPY_SQL, "mrcaott2ott3,,A + B,ott1,1\n")]
+        assert len(sql) == 8
+        assert sql[-1].startswith("INSERT INTO tree_data_versions")
+        merges = [s for s in sql if s.startswith("INSERT INTO nodes")]
+        assert len(merges) == 1
+        assert "ON CONFLICT (node_id) DO UPDATE" in merges[0]
+        assert not any(s.startswith(("DROP INDEX", "CREATE INDEX")) for s in sql)
+        assert report.rows_copied == 2 and report.rows_merged == 2
+        assert report.rebuilt_indexes == 0
+
+    def test_rebuild_drops_and_recreates_secondary_indexes_around_merge(self, tmp_path, loader_engine):
+        definition = "CREATE INDEX ix_nodes_parent ON public.nodes USING btree (parent_node_id)"
+        engine = loader_engine(indexes=[("ix_nodes_parent", definition)])
+
+        report = copy_nodes_from_csv(engine, _csv(tmp_path), rebuild_indexes=True)
+
+        events = [
+            s[:18] if s.startswith("INSERT") else s
+            for s in engine.connection.sql
+            if s.startswith(("DROP INDEX", "CREATE INDEX", "INSERT INTO nodes "))
+        ]
+        assert events == ['DROP INDEX IF EXISTS "ix_nodes_parent"', "INSERT INTO nodes ", definition]
+        assert report.rebuilt_indexes == 1
+
+
+class TestDiffNodes:
+    COUNTS = {"incoming": 100, "existing": 100, "inserted": 2, "updated": 3, "deleted": 2}
+
+    def test_applies_only_changed_rows_and_records_version(self, tmp_path, loader_engine):
+        engine = loader_engine(counts=self.COUNTS, samples=[("insert", "ott9"), ("update", "ott1")])
+
+        report = diff_nodes(engine, iter_node_chunks(_csv(tmp_path)), source="release-15")
+
+        sql = engine.connection.sql
+        assert any(s.startswith("CREATE TEMP TABLE node_diff") and "md5(row(" in s for s in sql)
+        applied = [s.split(" WHERE")[0] for s in sql if s.startswith(("DELETE", "UPDATE nodes", "INSERT INTO nodes"))]
+        assert applied == [
+            "DELETE FROM metadata",
+            "DELETE FROM metadata_enrichment_attempts",
+            "DELETE FROM node_aliases",
+            "DELETE FROM nodes",
+            "UPDATE nodes n SET parent_node_id = s.parent_node_id, name = s.name, num_tips = s.num_tips FROM node_diff d JOIN nodes_incoming s ON s.node_id = d.node_id",
+            "INSERT INTO nodes (node_id, ott_id, name, parent_node_id, num_tips) SELECT s.node_id, s.ott_id, s.name, s.parent_node_id, s.num_tips FROM nodes_incoming s JOIN node_diff d ON d.node_id = s.node_id",
+        ]
+        assert any(s.startswith("INSERT INTO tree_node_changes") for s in sql)
+        assert engine.connection.outcome == "commit"
+        assert report.applied and report.version == 1
+        assert report.unchanged == 95
+        assert report.samples == {"insert": ["ott9"], "update": ["ott1"]}
+        assert report.as_dict()["unchanged"] == 95
+
+    def test_dry_run_reports_and_rolls_back(self, tmp_path, loader_engine):
+        engine = loader_engine(counts=self.COUNTS)
+
+        report = diff_nodes(engine, iter_node_chunks(_csv(tmp_path)), apply=False)
+
+        sql = engine.connection.sql
+        assert not any(s.startswith(("DELETE", "UPDATE nodes", "INSERT INTO tree_data_versions")) for s in sql)
+        assert engine.connection.outcome == "rollback"
+        assert not report.applied and report.version is None
+        assert "not applied" in report.summary()
+
+    def test_mass_delete_is_refused(self, tmp_path, loader_engine):
+        engine = loader_engine(counts={**self.COUNTS, "deleted": 40})
+
+        with pytest.raises(RuntimeError, match="would delete 40 of 100 nodes"):
+            diff_nodes(engine, iter_node_chunks(_csv(tmp_path)))
+
+        assert engine.connection.outcome == "rollback"
+        assert not any(s.startswith("DELETE") for s in engine.connection.sql)
+
+
+class TestIterNodeChunks:
+    def test_chunks_are_bounded_and_typed(self, tmp_path):
+        path = tmp_path / "nodes.csv"
+        path.write_text(
+            "node_id,ott_id,name,parent_node_id,num_tips\n"
+            + "".join(f"ott{i},{i},Taxon {i},ott0,{i % 3}\n" for i in range(1, 6))
+            + "mrcaott1ott2,,A + B,,12.0\n"
+        )
+
+        chunks = list(iter_node_chunks(path, chunk_rows=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 2]
+        assert chunks[0][0] == {
+            "node_id": "ott1", "ott_id": 1, "name": "Taxon 1", "parent_node_id": "ott0", "num_tips": 1,
+        }
+        assert chunks[-1][-1] == {
+            "node_id": "mrcaott1ott2", "ott_id": None, "name": "A + B", "parent_node_id": None, "num_tips": 12,
+        }
+
+    def test_reader_is_lazy(self, tmp_path):
+        path = _csv(tmp_path)
+
+        chunks = iter_node_chunks(path, chunk_rows=1)
+        first = next(chunks)
+
+        assert first[0]["node_id"] == "ott1"
+
+
+def test_load_report_summary_includes_throughput_and_memory():
+    report = LoadReport(rows_copied=1_000_000, rows_merged=999_000, seconds=4.0, peak_rss_mb=88.5)
+
+    assert report.rows_per_second == 250_000
+    assert "250,000 rows/s" in report.summary()
+    assert "peak RSS 88.5 MB" in report.summary()
+    assert peak_rss_mb() is None or peak_rss_mb() > 0
+
+
+def _node_rows(engine):
+    with engine.connect() as conn:
+        return {
+            row.node_id: (row.name, row.parent_node_id, row.num_tips)
+            for row in conn.execute(select(nodes.c.node_id, nodes.c.name, nodes.c.parent_node_id, nodes.c.num_tips))
+        }
+
+
+@pytest.mark.postgres
+class TestNodeLoaderPostgres:
+    def _write_csv(self, tmp_path, name, lines):
+        path = tmp_path / name
+        path.write_text("node_id,ott_id,name,parent_node_id,num_tips\n" + "".join(f"{line}\n" for line in lines))
+        return path
+
+    def test_copy_merges_rows_and_rebuilds_indexes(self, tmp_path, postgres_engine):
+        with postgres_engine.begin() as conn:
+            conn.execute(text("CREATE INDEX ix_nodes_parent_node_id ON nodes (parent_node_id)"))
+            conn.execute(nodes.insert(), [
+                {"node_id": "ott1", "ott_id": 1, "name": "Old name", "parent_node_id": None, "num_tips": 1, "rank": "kingdom"},
+            ])
+        path = self._write_csv(tmp_path, "nodes.csv", [
+            "ott1,1,Metazoa,,2",
+            "mrcaott2ott3,,A + B,ott1,1",
+            "mrcaott2ott3,,A + B,ott1,1",
+        ])
+
+        report = copy_nodes_from_csv(postgres_engine, path, rebuild_indexes=True, chunk_rows=2)
+
+        assert _node_rows(postgres_engine) == {
+            "ott1": ("Metazoa", None, 2),
+            "mrcaott2ott3": ("A + B", "ott1", 1),
+        }
+        with postgres_engine.connect() as conn:
+            rank = conn.execute(select(nodes.c.rank).where(nodes.c.node_id == "ott1")).scalar_one()
+            versions = conn.execute(select(tree_data_versions.c.source, tree_data_versions.c.inserted)).all()
+            indexes = conn.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'nodes'"
+            )).scalars().all()
+            staged = conn.execute(text("SELECT count(*) FROM nodes_staging")).scalar_one()
+        # The merge leaves columns the CSV does not carry alone.
+        assert rank == "kingdom"
+        assert versions == [("full_load", None)]
+        assert "ix_nodes_parent_node_id" in indexes
+        assert staged == 0
+        assert report.rows_copied == 3 and report.rows_merged == 2 and report.rebuilt_indexes == 1
+
+    def test_diff_applies_inserts_updates_and_deletes(self, tmp_path, postgres_engine):
+        copy_nodes_from_csv(postgres_engine, self._write_csv(tmp_path, "old.csv", [
+            "ott1,1,Metazoa,,3",
+            "ott2,2,Porifera,ott1,1",
+            "ott3,3,Cnidaria,ott1,1",
+            "ott4,4,Placozoa,ott1,1",
+        ]))
+        with postgres_engine.begin() as conn:
+            conn.execute(metadata_table.insert(), [
+                {"node_id": "ott2", "ott_id": 2, "common_name": "sponges"},
+                {"node_id": "ott3", "ott_id": 3, "common_name": "cnidarians"},
+            ])
+        new_csv = self._write_csv(tmp_path, "new.csv", [
+            "ott1,1,Metazoa,,3",
+            "ott3,3,Cnidaria,ott1,2",
+            "ott4,4,Placozoa,ott1,1",
+            "ott5,5,Ctenophora,ott1,1",
+        ])
+
+        dry_run = diff_nodes(postgres_engine, iter_node_chunks(new_csv), apply=False, max_delete_fraction=1)
+        assert "ott2" in _node_rows(postgres_engine)
+
+        report = diff_nodes(postgres_engine, iter_node_chunks(new_csv), source="release-2", max_delete_fraction=1)
+
+        assert (dry_run.inserted, dry_run.updated, dry_run.deleted) == (1, 1, 1)
+        assert (report.inserted, report.updated, report.deleted, report.unchanged) == (1, 1, 1, 2)
+        assert report.samples == {"delete": ["ott2"], "insert": ["ott5"], "update": ["ott3"]}
+        assert _node_rows(postgres_engine) == {
+            "ott1": ("Metazoa", None, 3),
+            "ott3": ("Cnidaria", "ott1", 2),
+            "ott4": ("Placozoa", "ott1", 1),
+            "ott5": ("Ctenophora", "ott1", 1),
+        }
+        with postgres_engine.connect() as conn:
+            remaining_metadata = conn.execute(select(metadata_table.c.node_id)).scalars().all()
+            changes = set(conn.execute(
+                select(tree_node_changes.c.node_id, tree_node_changes.c.change)
+                .where(tree_node_changes.c.version == report.version)
+            ).all())
+            source = conn.execute(
+                select(tree_data_versions.c.source).where(tree_data_versions.c.version == report.version)
+            ).scalar_one()
+        assert remaining_metadata == ["ott3"]
+        assert changes == {("ott2", "delete"), ("ott3", "update"), ("ott5", "insert")}
+        assert source == "release-2"
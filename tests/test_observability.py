@@ -1,11 +1,28 @@
+import json
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueListener
+from unittest.mock import patch
+
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
 
+from cladecanvas import observability
 from cladecanvas.observability import (
     REQUEST_ID_HEADER,
+    SERVER_TIMING_HEADER,
+    DeferredQueueHandler,
+    LatencyHistogram,
+    LatencyMetrics,
     RequestObservabilityMiddleware,
+    get_request_stats,
+    log_event,
     metrics,
     record_cache_latency,
+    record_query,
 )
 
 
@@ -37,3 +54,201 @@ def test_cache_latency_primitive_records_hit_tag():
     snapshot = metrics.snapshot()
     assert snapshot["rollups"]["cache:node.get"]["count"] == 1
     assert snapshot["recent"][-1]["tags"] == {"hit": "true"}
+
+
+def test_histogram_percentiles_interpolate_within_buckets():
+    histogram = LatencyHistogram()
+    for latency_ms in range(1, 101):
+        histogram.observe(float(latency_ms))
+
+    assert histogram.count == 100
+    assert 25 <= histogram.percentile(0.5) <= 50
+    assert 50 <= histogram.percentile(0.95) <= 100
+    assert histogram.percentile(0.99) <= histogram.max_ms == 100
+    assert LatencyHistogram().percentile(0.99) == 0.0
+
+
+def test_metrics_are_thread_safe_and_roll_up_percentiles():
+    latency_metrics = LatencyMetrics()
+
+    def hammer():
+        for _ in range(2000):
+            latency_metrics.record("db", "select", 3.0)
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rollup = latency_metrics.snapshot()["rollups"]["db:select"]
+    assert rollup["count"] == 16000
+    assert rollup["total_ms"] == 48000
+    assert 2.5 <= rollup["p50_ms"] <= rollup["p99_ms"] <= rollup["max_ms"] == 3.0
+
+
+def test_metrics_aggregate_live_worker_files(tmp_path):
+    worker = LatencyHistogram()
+    worker.observe(40.0)
+    (tmp_path / f"metrics-{os.getppid()}.json").write_text(json.dumps({"endpoint:GET /ping": worker.to_dict()}))
+    (tmp_path / "metrics-999999999.json").write_text(json.dumps({"endpoint:GET /ping": worker.to_dict()}))
+    latency_metrics = LatencyMetrics(metrics_dir=str(tmp_path), flush_seconds=3600)
+
+    latency_metrics.record("endpoint", "GET /ping", 2.0)
+    latency_metrics.close()
+
+    assert (tmp_path / f"metrics-{os.getpid()}.json").exists()
+    snapshot = latency_metrics.snapshot()
+    assert snapshot["processes"] == 2
+    assert snapshot["rollups"]["endpoint:GET /ping"]["count"] == 2
+    assert snapshot["rollups"]["endpoint:GET /ping"]["max_ms"] == 40.0
+
+
+def test_metrics_flush_runs_off_the_recording_thread(tmp_path, monkeypatch):
+    latency_metrics = LatencyMetrics(metrics_dir=str(tmp_path), flush_seconds=0.01)
+    flushed = threading.Event()
+    flushing_threads = []
+    flush = latency_metrics.flush
+
+    def recording_flush():
+        flushing_threads.append(threading.current_thread())
+        flush()
+        flushed.set()
+
+    monkeypatch.setattr(latency_metrics, "flush", recording_flush)
+    try:
+        latency_metrics.record("endpoint", "GET /ping", 2.0)
+        assert flushed.wait(5)
+    finally:
+        latency_metrics.close()
+
+    # record() only touches memory; the first flush came from the flush thread.
+    assert flushing_threads[0].name == "metrics-flush"
+    data = json.loads((tmp_path / f"metrics-{os.getpid()}.json").read_text())
+    assert data["endpoint:GET /ping"]["count"] == 1
+
+
+def test_prometheus_exposition_is_cumulative_and_in_seconds():
+    latency_metrics = LatencyMetrics()
+    latency_metrics.record("endpoint", 'GET /node/{node_id}', 3.0)
+    latency_metrics.record("endpoint", 'GET /node/{node_id}', 700.0)
+
+    text = latency_metrics.prometheus()
+
+    labels = 'kind="endpoint",name="GET /node/{node_id}"'
+    assert "# TYPE cladecanvas_latency_seconds histogram" in text
+    assert f'cladecanvas_latency_seconds_bucket{{{labels},le="0.0025"}} 0' in text
+    assert f'cladecanvas_latency_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'cladecanvas_latency_seconds_bucket{{{labels},le="1"}} 2' in text
+    assert f'cladecanvas_latency_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"cladecanvas_latency_seconds_sum{{{labels}}} 0.703000" in text
+    assert f"cladecanvas_latency_seconds_count{{{labels}}} 2" in text
+
+
+def _stats_app():
+    app = FastAPI()
+    app.add_middleware(RequestObservabilityMiddleware)
+
+    @app.get("/busy")
+    def busy(queries: int = 3):
+        # Sync routes run in the threadpool with a copy of the request context.
+        for _ in range(queries):
+            record_query(2.0, 5)
+        record_cache_latency("node", "get", 0.1, hit=True)
+        record_cache_latency("node", "get", 0.1, hit=False)
+        return {"stats": get_request_stats().as_log_fields()}
+
+    return app
+
+
+def test_request_stats_reach_log_and_server_timing(caplog):
+    client = TestClient(_stats_app())
+
+    with caplog.at_level(logging.INFO, logger="cladecanvas.observability"):
+        response = client.get("/busy")
+
+    assert response.json()["stats"] == {
+        "db_queries": 3, "db_ms": 6.0, "db_rows": 15, "cache_hits": 1, "cache_misses": 1,
+    }
+    timing = response.headers[SERVER_TIMING_HEADER]
+    assert timing.startswith('db;dur=6.000;desc="3 queries, 15 rows", cache;desc="1 hits, 1 misses", total;dur=')
+
+    events = [json.loads(record.getMessage()) for record in caplog.records]
+    http_request = next(event for event in events if event["event"] == "http_request")
+    assert http_request["db_queries"] == 3
+    assert http_request["cache_misses"] == 1
+    assert not any(event["event"] == "http_request_query_budget" for event in events)
+    assert get_request_stats() is None
+
+
+def test_request_over_query_budget_logs_warning(caplog, monkeypatch):
+    monkeypatch.setattr(observability, "REQUEST_QUERY_WARN_THRESHOLD", 4)
+    client = TestClient(_stats_app())
+
+    with caplog.at_level(logging.INFO, logger="cladecanvas.observability"):
+        client.get("/busy", params={"queries": 4})
+        client.get("/busy", params={"queries": 5})
+
+    warnings = [json.loads(r.getMessage()) for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert warnings[0]["event"] == "http_request_query_budget"
+    assert warnings[0]["db_queries"] == 5
+    assert warnings[0]["threshold"] == 4
+
+
+def test_middleware_passes_streaming_responses_through():
+    app = FastAPI()
+    app.add_middleware(RequestObservabilityMiddleware)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a", b"b", b"c"]), media_type="text/plain")
+
+    with TestClient(app).stream("GET", "/stream", headers={REQUEST_ID_HEADER: "streamed"}) as response:
+        assert response.headers[REQUEST_ID_HEADER] == "streamed"
+        assert SERVER_TIMING_HEADER in response.headers
+        assert b"".join(response.iter_bytes()) == b"abc"
+
+
+def test_middleware_records_unhandled_errors_as_500(caplog):
+    metrics.reset()
+    app = FastAPI()
+    app.add_middleware(RequestObservabilityMiddleware)
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    client = TestClient(app, raise_server_exceptions=False)
+    with caplog.at_level(logging.INFO, logger="cladecanvas.observability"):
+        assert client.get("/boom").status_code == 500
+
+    event = next(json.loads(r.getMessage()) for r in caplog.records if "http_request" in r.getMessage())
+    assert event["status_code"] == 500
+    assert metrics.snapshot()["rollups"]["endpoint:GET /boom"]["count"] == 1
+    assert get_request_stats() is None
+
+
+def test_log_events_are_serialized_on_the_listener_thread():
+    formatted_on = []
+
+    class RecordingHandler(logging.Handler):
+        def emit(self, record):
+            formatted_on.append((threading.current_thread().name, record.getMessage()))
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, RecordingHandler())
+    handler = DeferredQueueHandler(log_queue)
+    test_logger = logging.getLogger("cladecanvas.observability")
+    test_logger.addHandler(handler)
+    listener.start()
+    try:
+        with patch.object(test_logger, "level", logging.INFO):
+            log_event("queued", answer=42)
+    finally:
+        listener.stop()
+        test_logger.removeHandler(handler)
+
+    [(thread_name, message)] = formatted_on
+    assert thread_name != threading.current_thread().name
+    assert json.loads(message) == {"event": "queued", "request_id": None, "answer": 42}
@@ -0,0 +1,170 @@
+import threading
+import time
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from cladecanvas import profiling
+from cladecanvas.observability import REQUEST_ID_HEADER, RequestObservabilityMiddleware
+from cladecanvas.profiling import (
+    PROFILE_TOKEN_HEADER,
+    ProfiledRoute,
+    ProfileRequestMiddleware,
+    StackSampler,
+    collapse_stack,
+    profiling_authorized,
+    require_profiling_token,
+)
+
+
+def expensive_context_walk(depth: int) -> int:
+    return sum(i * i for i in range(depth * 1000))
+
+
+def _app(token="secret"):
+    router = APIRouter(route_class=ProfiledRoute)
+
+    @router.get("/context/{node_id}")
+    def get_context(node_id: str, depth: int = 2):
+        return {"node_id": node_id, "total": expensive_context_walk(depth)}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/tree")
+    app.add_middleware(ProfileRequestMiddleware, token=token)
+    app.add_middleware(RequestObservabilityMiddleware)
+    return app
+
+
+def test_profiling_authorized_requires_a_configured_matching_token():
+    assert profiling_authorized("secret", "secret")
+    assert not profiling_authorized("wrong", "secret")
+    assert not profiling_authorized(None, "secret")
+    assert not profiling_authorized("", "")
+
+
+class TestProfileRequests:
+    def test_authorized_profile_returns_a_report_from_the_worker_thread(self):
+        client = TestClient(_app())
+
+        response = client.get(
+            "/tree/context/ott1",
+            params={"depth": 3, "profile": "1"},
+            headers={PROFILE_TOKEN_HEADER: "secret", REQUEST_ID_HEADER: "profiled"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert response.headers["cache-control"] == "no-store"
+        assert response.headers[REQUEST_ID_HEADER] == "profiled"
+        assert response.text.startswith("GET /tree/context/ott1 -> 200")
+        # The sync endpoint runs in a threadpool worker; its frames must be there.
+        assert "expensive_context_walk" in response.text
+
+    def test_unauthorized_or_disabled_profiles_get_the_normal_response(self):
+        for app, headers in (
+            (_app(), {PROFILE_TOKEN_HEADER: "wrong"}),
+            (_app(), {}),
+            (_app(token=""), {PROFILE_TOKEN_HEADER: ""}),
+        ):
+            response = TestClient(app).get("/tree/context/ott1", params={"profile": "1"}, headers=headers)
+            assert response.status_code == 200
+            assert response.json()["node_id"] == "ott1"
+
+    def test_concurrent_profiled_requests_get_409(self):
+        client = TestClient(_app())
+        headers = {PROFILE_TOKEN_HEADER: "secret"}
+
+        assert profiling._profile_lock.acquire(blocking=False)
+        try:
+            busy = client.get("/tree/context/ott1", params={"profile": "1"}, headers=headers)
+        finally:
+            profiling._profile_lock.release()
+        profiled = client.get("/tree/context/ott1", params={"profile": "1"}, headers=headers)
+
+        assert busy.status_code == 409
+        assert busy.json() == {"detail": "Another profiled request is running"}
+        assert profiled.status_code == 200
+        assert "Process-wide profile" in profiled.text
+
+    def test_profiled_route_keeps_the_endpoint_signature(self):
+        response = TestClient(_app()).get("/tree/context/ott9", params={"depth": 1})
+
+        assert response.json() == {"node_id": "ott9", "total": expensive_context_walk(1)}
+        assert TestClient(_app()).get("/tree/context/ott9", params={"depth": "x"}).status_code == 422
+
+
+def test_profiling_endpoints_are_hidden_without_a_token(monkeypatch):
+    app = FastAPI()
+
+    @app.get("/debug", dependencies=[Depends(require_profiling_token)])
+    def debug():
+        return {"ok": True}
+
+    client = TestClient(app)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "")
+    assert client.get("/debug", headers={PROFILE_TOKEN_HEADER: "secret"}).status_code == 404
+
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    assert client.get("/debug", headers={PROFILE_TOKEN_HEADER: "wrong"}).status_code == 403
+    assert client.get("/debug", headers={PROFILE_TOKEN_HEADER: "secret"}).json() == {"ok": True}
+
+
+def busy_marker(stop):
+    while not stop.is_set():
+        expensive_context_walk(1)
+
+
+class TestStackSampler:
+    def test_collapses_busy_threads_and_skips_idle_ones(self):
+        stop = threading.Event()
+        idle = threading.Event()
+        busy_thread = threading.Thread(target=busy_marker, args=(stop,))
+        idle_thread = threading.Thread(target=idle.wait)
+        busy_thread.start()
+        idle_thread.start()
+        sampler = StackSampler()
+        try:
+            for _ in range(20):
+                sampler.sample_once()
+        finally:
+            stop.set()
+            idle.set()
+            busy_thread.join()
+            idle_thread.join()
+
+        assert sampler.samples == 20
+        lines = sampler.collapsed().splitlines()
+        busy = [line for line in lines if "test_profiling.py:busy_marker" in line]
+        assert busy
+        stack, count = busy[0].rsplit(" ", 1)
+        assert stack.startswith("threading.py:_bootstrap")
+        assert int(count) >= 1
+        assert not any(line.split(" ")[0].endswith("threading.py:wait") for line in lines)
+
+        sampler.reset()
+        assert sampler.collapsed() == "" and sampler.samples == 0
+
+    def test_background_sampler_runs_until_stopped(self):
+        stop = threading.Event()
+        busy_thread = threading.Thread(target=busy_marker, args=(stop,))
+        busy_thread.start()
+        sampler = StackSampler(interval_ms=1)
+        sampler.start()
+        try:
+            deadline = time.monotonic() + 5
+            while sampler.samples < 5 and time.monotonic() < deadline:
+                time.sleep(0.001)
+        finally:
+            sampler.stop()
+            stop.set()
+            busy_thread.join()
+
+        assert not sampler.running
+        assert "busy_marker" in sampler.collapsed()
+
+
+def test_collapse_stack_is_root_first():
+    import sys
+
+    stack = collapse_stack(sys._getframe())
+    assert stack.split(";")[-1] == "test_profiling.py:test_collapse_stack_is_root_first"
@@ -0,0 +1,132 @@
+import json
+import logging
+
+import pytest
+
+from cladecanvas.query_insights import (
+    OTHER_FINGERPRINT,
+    QueryInsights,
+    fingerprint,
+    fingerprint_id,
+    redact_parameters,
+)
+
+
+class TestFingerprint:
+    def test_collapses_literals_and_bind_parameters(self):
+        assert fingerprint(
+            "SELECT * FROM nodes WHERE node_id = 'ott42' AND num_tips > 10 LIMIT %(limit)s"
+        ) == "SELECT * FROM nodes WHERE node_id = ? AND num_tips > ? LIMIT ?"
+        assert fingerprint("select name from nodes where node_id = :node_id") == "select name from nodes where node_id = ?"
+
+    def test_in_lists_of_any_length_share_a_fingerprint(self):
+        short = fingerprint("SELECT * FROM metadata WHERE node_id IN (%(id_1)s, %(id_2)s)")
+        long = fingerprint(
+            "SELECT * FROM metadata\n  WHERE node_id IN (" + ", ".join(f"%(id_{i})s" for i in range(40)) + ")"
+        )
+        assert short == long == "SELECT * FROM metadata WHERE node_id IN (?)"
+
+    def test_multi_row_values_and_arrays_collapse(self):
+        assert fingerprint(
+            "INSERT INTO nodes (node_id, name) VALUES (%s, %s), (%s, %s), (%s, %s) ON CONFLICT DO NOTHING"
+        ) == "INSERT INTO nodes (node_id, name) VALUES (?, ?), ... ON CONFLICT DO NOTHING"
+        assert fingerprint("SELECT 1 WHERE x = ANY(ARRAY[1, 2, 3])") == "SELECT ? WHERE x = ANY(ARRAY[?])"
+
+    def test_keeps_identifiers_casts_and_drops_comments(self):
+        assert fingerprint(
+            "/* route */ SELECT md5(row(ott1.name)::text) FROM ott1 -- trailing\n WHERE a = 'it''s';"
+        ) == "SELECT md5(row(ott1.name)::text) FROM ott1 WHERE a = ?"
+
+
+def test_redact_parameters_keeps_shape_only():
+    assert redact_parameters({"node_id": "ott42", "limit": 10}) == {"node_id": "str", "limit": "int"}
+    assert redact_parameters(("ott42", None)) == ["str", "NoneType"]
+    assert redact_parameters([{"a": 1}, {"a": 2}]) == "<2 parameter sets>"
+    assert redact_parameters(None) is None
+
+
+class TestQueryInsights:
+    def test_histograms_per_fingerprint_sorted_by_total_time(self):
+        insights = QueryInsights(slow_ms=1000)
+        insights.record("SELECT * FROM nodes WHERE node_id IN (%(a)s)", {"a": "x"}, 5.0, rows=1)
+        insights.record("SELECT * FROM nodes WHERE node_id IN (%(a)s, %(b)s)", {"a": "x", "b": "y"}, 7.0, rows=2)
+        insights.record("SELECT count(*) FROM metadata", {}, 1.0, rows=1)
+
+        snapshot = insights.snapshot()
+
+        assert snapshot["fingerprints"] == 2
+        top = snapshot["queries"][0]
+        assert top["fingerprint"] == fingerprint_id("SELECT * FROM nodes WHERE node_id IN (?)")
+        assert (top["count"], top["total_ms"], top["rows"], top["slow"]) == (2, 12.0, 3, 0)
+        assert "p99_ms" in top and "plan" not in top
+        assert insights.snapshot(sort="count", limit=1)["queries"][0]["count"] == 2
+        with pytest.raises(ValueError):
+            insights.snapshot(sort="name")
+
+    def test_fingerprints_beyond_the_cap_are_pooled(self):
+        insights = QueryInsights(slow_ms=1000, max_fingerprints=2)
+        for table in ("a", "b", "c", "d"):
+            insights.record(f"SELECT * FROM {table}", None, 1.0)
+
+        queries = {item["fingerprint"]: item for item in insights.snapshot()["queries"]}
+        assert len(queries) == 3
+        assert queries[OTHER_FINGERPRINT]["count"] == 2
+
+    def test_slow_queries_are_logged_without_parameter_values(self, caplog):
+        insights = QueryInsights(slow_ms=50)
+
+        with caplog.at_level(logging.INFO, logger="cladecanvas.observability"):
+            insights.record("SELECT * FROM nodes WHERE name = %(name)s", {"name": "Secret Species"}, 10.0)
+            insights.record("SELECT * FROM nodes WHERE name = %(name)s", {"name": "Secret Species"}, 80.0, rows=3)
+
+        assert len(caplog.records) == 1
+        assert caplog.records[0].levelno == logging.WARNING
+        assert "Secret Species" not in caplog.text
+        event = json.loads(caplog.records[0].getMessage())
+        assert event["event"] == "slow_query"
+        assert event["statement"] == "SELECT * FROM nodes WHERE name = ?"
+        assert event["parameters"] == {"name": "str"}
+        assert insights.snapshot()["queries"][0]["slow"] == 1
+
+    def test_sampled_slow_selects_are_explained_in_the_background(self):
+        insights = QueryInsights(slow_ms=50, explain_sample_rate=1.0, explain_interval_seconds=3600)
+        explained = []
+
+        def explainer(statement, parameters):
+            explained.append((statement, parameters))
+            return [{"Plan": {"Node Type": "Seq Scan"}}]
+
+        insights.explainer = explainer
+        select = "SELECT * FROM nodes WHERE name = %(name)s"
+        insights.record(select, {"name": "x"}, 80.0)
+        insights.record(select, {"name": "y"}, 90.0)  # inside the interval
+        insights.record("UPDATE nodes SET rank = %(rank)s", {"rank": "x"}, 90.0)  # not a SELECT
+        insights.record("SELECT * FROM metadata FOR UPDATE", None, 90.0)  # would take locks
+        insights.record(
+            "WITH claimable AS (SELECT id FROM q FOR UPDATE SKIP LOCKED)\n"
+            "UPDATE q SET claimed_by = %(worker)s FROM claimable RETURNING q.id",
+            {"worker": "w1"},
+            90.0,
+        )  # data-modifying CTE
+        insights.record("WITH t AS (DELETE FROM q RETURNING id) SELECT count(*) FROM t", None, 90.0)
+        insights._explain_queue.join()
+
+        assert explained == [(select, {"name": "x"})]
+        query = insights.snapshot(include_plans=True)["queries"]
+        plan = next(item["plan"] for item in query if item["statement"].startswith("SELECT * FROM nodes"))
+        assert plan["plan"] == [{"Plan": {"Node Type": "Seq Scan"}}]
+
+    def test_explain_failures_and_explain_statements_are_ignored(self):
+        insights = QueryInsights(slow_ms=50, explain_sample_rate=1.0)
+
+        def explainer(statement, parameters):
+            raise RuntimeError("canceling statement due to statement timeout")
+
+        insights.explainer = explainer
+        insights.record("SELECT 1", None, 80.0)
+        insights._explain_queue.join()
+        insights.record("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT 1", None, 80.0)
+
+        [query] = insights.snapshot(include_plans=True)["queries"]
+        assert query["count"] == 1
+        assert query["plan"] is None
@@ -1,13 +1,28 @@
+import sqlite3
+import threading
+from dataclasses import replace
+
 import pytest
 from fastapi import HTTPException
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
+from cladecanvas.api.routes import search as search_route
 from cladecanvas.api.routes.search import _extract_snippet
 from cladecanvas.api.routes.search import _normalize_query_or_422
 from cladecanvas.api.routes.search import _search_nodes
-from cladecanvas.api.search_ranking import rank_search_row, sort_ranked_results
-from cladecanvas.schema import metadata, metadata_table, nodes
+from cladecanvas.api.search_cache import SearchCandidateCache
+from cladecanvas.api.search_ranking import (
+    MAX_CANDIDATES,
+    MAX_QUERY_TERMS,
+    expand_query_terms,
+    rank_search_row,
+    set_synonym_map,
+    sort_ranked_results,
+    top_ranked_results,
+)
+from cladecanvas.api.synonym_map import SynonymRefresher
+from cladecanvas.schema import metadata, metadata_table, nodes, search_synonyms
 
 
 class TestExtractSnippet:
@@ -140,6 +155,16 @@ class TestSearchRanking:
         assert result.match_type == "typo"
         assert result.score_breakdown["similarity_boost"] > 0
 
+    def test_top_ranked_results_matches_sorted_prefix(self):
+        rows = [
+            self._row(f"n{index:02d}", common_name=f"cat {index % 5}", enriched_score=(index % 3) / 2)
+            for index in range(40)
+        ]
+        ranked = [rank_search_row(row, "cat") for row in rows]
+
+        for k in (0, 1, 7, 40, 60):
+            assert top_ranked_results(ranked, k) == sort_ranked_results(ranked)[:k]
+
     def test_no_match_returns_none(self):
         assert rank_search_row(self._row("cat", common_name="Cat"), "otter") is None
 
@@ -234,3 +259,307 @@ class TestSearchRoute:
 
         assert exc_info.value.status_code == 422
         assert "non-whitespace" in exc_info.value.detail
+
+    def test_search_is_one_candidate_query_plus_snippet_hydration(self):
+        session = self._sqlite_session()
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = session.get_bind()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            results = _search_nodes("carnivorous", 25, 0, session)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+            session.close()
+
+        assert [result.node_id for result in results] == ["cat"]
+        assert results[0].match_field == "full_description"
+        assert results[0].match_snippet == "Cats are small carnivorous mammals."
+        candidate_queries = [s for s in statements if "UNION ALL" in s]
+        assert len(candidate_queries) == 1
+        assert "full_description AS" not in candidate_queries[0]
+        hydration_queries = [s for s in statements if "metadata.full_description \nFROM" in s]
+        assert len(hydration_queries) == 1
+
+
+class TestSearchCandidateCache(TestSearchRoute):
+    def _candidate_queries(self, session, fn):
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if "UNION ALL" in statement:
+                statements.append(statement)
+
+        engine = session.get_bind()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            result = fn()
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        return result, len(statements)
+
+    def test_longer_query_is_narrowed_from_cached_prefix(self):
+        cache = SearchCandidateCache()
+        session = self._sqlite_session()
+        try:
+            _, first_queries = self._candidate_queries(
+                session, lambda: _search_nodes("ca", 25, 0, session, candidate_cache=cache)
+            )
+            narrowed, narrowed_queries = self._candidate_queries(
+                session, lambda: _search_nodes("can", 25, 0, session, candidate_cache=cache)
+            )
+            uncached = _search_nodes("can", 25, 0, session)
+        finally:
+            session.close()
+
+        assert first_queries == 1
+        assert narrowed_queries == 0
+        assert [result.node_id for result in narrowed] == ["dog"]
+        assert narrowed == uncached
+        stats = cache.stats()
+        assert stats["narrowed_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_truncated_candidates_fall_back_to_database(self, monkeypatch):
+        monkeypatch.setattr(search_route, "MAX_CANDIDATES", 1)
+        cache = SearchCandidateCache()
+        session = self._sqlite_session()
+        try:
+            _search_nodes("ca", 1, 0, session, candidate_cache=cache)
+            results, queries = self._candidate_queries(
+                session, lambda: _search_nodes("cat", 1, 0, session, candidate_cache=cache)
+            )
+        finally:
+            session.close()
+
+        assert queries == 1
+        assert [result.node_id for result in results] == ["cat"]
+        assert cache.stats()["misses"] == 2
+
+    def test_unknown_full_description_match_falls_back(self):
+        cache = SearchCandidateCache()
+        session = self._sqlite_session()
+        try:
+            _search_nodes("carnivo", 25, 0, session, candidate_cache=cache)
+            results, queries = self._candidate_queries(
+                session, lambda: _search_nodes("carnivor", 25, 0, session, candidate_cache=cache)
+            )
+        finally:
+            session.close()
+
+        assert queries == 1
+        assert [result.match_field for result in results] == ["full_description"]
+        assert cache.stats()["misses"] == 2
+
+    def test_lru_evicts_least_recently_used_query(self):
+        cache = SearchCandidateCache(max_entries=2)
+        session = self._sqlite_session()
+        try:
+            for query in ("cat", "dog", "cat", "feline"):
+                _search_nodes(query, 25, 0, session, candidate_cache=cache)
+        finally:
+            session.close()
+
+        assert list(cache._entries) == ["cat", "feline"]
+        assert cache.stats()["evictions"] == 1
+
+
+class TestParallelSearchStages(TestSearchRoute):
+    def _file_session(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'search.sqlite'}")
+        memory_session = self._sqlite_session()
+        metadata.create_all(engine)
+        with engine.begin() as conn:
+            for table in (nodes, metadata_table):
+                rows = [dict(row) for row in memory_session.execute(table.select()).mappings()]
+                conn.execute(table.insert(), rows)
+        memory_session.close()
+        return sessionmaker(bind=engine)()
+
+    def _stage_rows(self, session, query, page_size):
+        query_terms = expand_query_terms(query)
+        branches = search_route._candidate_branches(query_terms, MAX_CANDIDATES, False)
+        return search_route._execute_stages_concurrently(
+            branches, query, MAX_CANDIDATES, page_size, session.get_bind()
+        )
+
+    def test_concurrent_stages_match_union_candidates(self, tmp_path):
+        session = self._file_session(tmp_path)
+        try:
+            for query in ("ca", "carnivorous", "mammals"):
+                concurrent = self._stage_rows(session, query, page_size=None)
+                # SQLite always takes the single UNION ALL path.
+                union = search_route._load_candidates(query, expand_query_terms(query), MAX_CANDIDATES, None, session)
+                for stage in search_route.MATCH_STAGES:
+                    assert {row["node_id"] for row in concurrent[stage]} == {
+                        row["node_id"] for row in union.rows_by_stage[stage]
+                    }
+        finally:
+            session.close()
+
+    def test_prefix_stage_that_fills_the_page_skips_other_stages(self, tmp_path):
+        session = self._file_session(tmp_path)
+        try:
+            filled = self._stage_rows(session, "cat", page_size=1)
+            short = self._stage_rows(session, "cat", page_size=25)
+        finally:
+            session.close()
+
+        assert {row["node_id"] for row in filled["prefix"]} == {"cat"}
+        assert filled["fuzzy"] is None
+        assert filled["description"] is None
+        assert short["fuzzy"] is None
+        assert short["description"] is not None
+
+    def test_finished_stages_are_not_cancelled(self, tmp_path):
+        path = self._file_session(tmp_path).get_bind().url.database
+        interrupted = []
+
+        class RecordingConnection(sqlite3.Connection):
+            def interrupt(self):
+                interrupted.append(self)
+                super().interrupt()
+
+        engine = create_engine(
+            "sqlite://",
+            creator=lambda: sqlite3.connect(path, factory=RecordingConnection, check_same_thread=False),
+        )
+        returned = threading.Semaphore(0)
+
+        def hold_prefix_until_other_stages_return(conn, cursor, statement, parameters, context, executemany):
+            if "prefix" in parameters:
+                for _ in ("fuzzy", "description"):
+                    returned.acquire(timeout=5)
+
+        event.listen(engine, "before_cursor_execute", hold_prefix_until_other_stages_return)
+        event.listen(engine, "checkin", lambda dbapi_connection, record: returned.release())
+        branches = search_route._candidate_branches(expand_query_terms("cat"), MAX_CANDIDATES, False)
+        rows = search_route._execute_stages_concurrently(branches, "cat", MAX_CANDIDATES, 1, engine)
+
+        assert rows["fuzzy"] is None and rows["description"] is None
+        assert interrupted == []
+
+    def test_stages_run_on_the_session_engine(self, monkeypatch):
+        session = self._sqlite_session()
+        engines = []
+
+        def record_engine(branches, q, candidate_limit, page_size, engine):
+            engines.append(engine)
+            return {stage: [] for stage in search_route.MATCH_STAGES}
+
+        monkeypatch.setattr(search_route, "_search_dialect", lambda db: "postgresql")
+        monkeypatch.setattr(search_route, "_execute_stages_concurrently", record_engine)
+        try:
+            search_route._load_candidates("cat", ["cat"], MAX_CANDIDATES, 1, session)
+        finally:
+            session.close()
+
+        # The app engine carries the connect_args and query accounting hooks.
+        assert engines == [session.get_bind()]
+
+    def test_short_page_reloads_skipped_description_stage(self, monkeypatch):
+        session = self._sqlite_session()
+        calls = []
+        load_candidates = search_route._load_candidates
+
+        def skip_description(q, query_terms, candidate_limit, page_size, db):
+            calls.append(page_size)
+            candidates = load_candidates(q, query_terms, candidate_limit, page_size, db)
+            if page_size is None:
+                return candidates
+            return replace(candidates, rows_by_stage={**candidates.rows_by_stage, "description": None})
+
+        monkeypatch.setattr(search_route, "_load_candidates", skip_description)
+        try:
+            results = _search_nodes("mammals", 25, 0, session)
+        finally:
+            session.close()
+
+        assert calls == [25, None]
+        assert sorted(result.node_id for result in results) == ["cat", "dog"]
+
+
+class TestSynonymExpansion:
+    def teardown_method(self):
+        set_synonym_map({})
+
+    def test_builtin_synonyms_still_expand_whole_query(self):
+        assert expand_query_terms("Human") == ["human", "homo sapiens", "humans", "person", "people"]
+
+    def test_token_level_expansion_for_multi_word_queries(self):
+        set_synonym_map({"cats": ("cat",), "house": ("domestic",)})
+
+        terms = expand_query_terms("house cats")
+
+        assert terms[0] == "house cats"
+        assert "domestic cats" in terms
+        assert "house cat" in terms
+
+    def test_expansion_is_capped(self):
+        set_synonym_map({"x": tuple(f"x{i}" for i in range(20))})
+
+        assert len(expand_query_terms("x")) == MAX_QUERY_TERMS
+
+    def test_refresher_loads_table_and_reloads_when_it_changes(self):
+        engine = create_engine("sqlite:///:memory:")
+        metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        session.execute(search_synonyms.insert(), [
+            {"term": "moggy", "synonym": "cat", "source": "wikidata_vernacular"},
+        ])
+        session.commit()
+        refresher = SynonymRefresher()
+        try:
+            assert refresher.refresh(session) is True
+            assert expand_query_terms("moggy") == ["moggy", "cat"]
+            assert refresher.refresh(session) is False
+
+            session.execute(search_synonyms.insert(), [
+                {"term": "moggies", "synonym": "moggy", "source": "plural"},
+            ])
+            session.commit()
+            assert refresher.refresh(session) is True
+            assert expand_query_terms("moggies") == ["moggies", "moggy"]
+        finally:
+            session.close()
+
+    def test_refresher_loads_on_a_background_thread(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'synonyms.sqlite'}")
+        metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(search_synonyms.insert(), [
+                {"term": "moggy", "synonym": "cat", "source": "wikidata_vernacular"},
+            ])
+        loaded = threading.Event()
+        refresher = SynonymRefresher(refresh_seconds=3600)
+        refresh = refresher.refresh
+
+        def record_refresh(db):
+            try:
+                return refresh(db)
+            finally:
+                loaded.set()
+
+        refresher.refresh = record_refresh
+        refresher.start(sessionmaker(bind=engine))
+        try:
+            assert loaded.wait(5)
+            assert expand_query_terms("moggy") == ["moggy", "cat"]
+        finally:
+            refresher.stop()
+        assert refresher._thread is None
+
+    def test_refresher_keeps_builtins_when_table_is_missing(self):
+        engine = create_engine("sqlite:///:memory:")
+        nodes.create(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            assert SynonymRefresher().refresh(session) is False
+        finally:
+            session.close()
+
+        assert "feline" in expand_query_terms("cat")